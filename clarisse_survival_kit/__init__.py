@@ -72,6 +72,6 @@ if user_path:
     logging.basicConfig(filename=log_path, level=log_level, format='%(message)s')
     log_start = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     logging.debug("--------------------------------------")
-    logging.debug("Log start: " + log_start)
+    logging.debug("Log start: %s", log_start)
 else:
     print "Could not generate log or user settings!!!"
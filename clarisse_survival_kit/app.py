@@ -1,14 +1,21 @@
 from clarisse_survival_kit.selectors import *
 from clarisse_survival_kit.utility import *
-from clarisse_survival_kit.surface import Surface
+from clarisse_survival_kit.surface import Surface, get_target_state
+from clarisse_survival_kit.command_buffer import get_command_buffer, buffer_commands
+from clarisse_survival_kit.connection_index import get_connection_index, index_connections
+from clarisse_survival_kit.event_pump import get_event_pump, pump_events
+from clarisse_survival_kit.profiling import profiled
+from clarisse_survival_kit.scan import get_asset_scan
+from clarisse_survival_kit.surface_manifest import get_manifest_mtl, read_surface_manifest
+from clarisse_survival_kit.scan_index import flush_scan_index
 import importlib
-import time
 
 
+@profiled
 def import_controller(asset_directory, selected_provider=None, **kwargs):
     """Imports a surface, atlas or object."""
     logging.debug("Importing asset...")
-    logging.debug("Arguments: " + str(kwargs))
+    logging.debug("Arguments: %s", kwargs)
     ix = get_ix(kwargs.get("ix"))
 
     provider_names = PROVIDERS
@@ -16,21 +23,25 @@ def import_controller(asset_directory, selected_provider=None, **kwargs):
         provider_names = [PROVIDERS[PROVIDERS.index(selected_provider)]]
 
     asset = None
+    scan = get_asset_scan(asset_directory)
     for provider_name in provider_names:
-        logging.debug("Checking if provider matches inspection: " + provider_name)
+        logging.debug("Checking if provider matches inspection: %s", provider_name)
         provider = importlib.import_module('clarisse_survival_kit.providers.' + provider_name)
-        report = provider.inspect_asset(asset_directory)
+        report = provider.inspect_asset(asset_directory, scan=scan)
         if report:
-            asset = provider.import_asset(asset_directory, report=report, **kwargs)
+            asset = provider.import_asset(asset_directory, report=report, scan=scan, **kwargs)
             break
         else:
-            logging.debug('Provider %s did not pass inspection' % provider_name)
+            logging.debug('Provider %s did not pass inspection', provider_name)
             if selected_provider:
                 ix.log_warning('Content provider could not find asset in the specified directory.')
                 return None
+    flush_scan_index()
     return asset
 
 
+@profiled
+@buffer_commands
 def moisten_surface(ctx,
                     height_blend=True,
                     fractal_blend=False,
@@ -45,33 +56,46 @@ def moisten_surface(ctx,
                     roughness_multiplier=MOISTURE_DEFAULT_ROUGHNESS_MULTIPLIER,
                     **kwargs):
     """Moistens the selected material."""
-    logging.debug("Moistening context: " + str(ctx))
+    logging.debug("Moistening context: %s", ctx)
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not check_context(ctx, ix=ix):
         return None
     surface_name = os.path.basename(str(ctx))
-    ctx_members = get_items(ctx, ix=ix)
-
-    mtl = None
-    diffuse_tx = None
-    specular_tx = None
-    roughness_tx = None
-    disp = None
-    disp_tx = None
-    for ctx_member in ctx_members:
-        if ctx_member.get_contextual_name().endswith(DIFFUSE_SUFFIX):
-            diffuse_tx = ctx_member
-        if ctx_member.get_contextual_name().endswith(SPECULAR_COLOR_SUFFIX):
-            specular_tx = ctx_member
-        if ctx_member.get_contextual_name().endswith(SPECULAR_ROUGHNESS_SUFFIX):
-            roughness_tx = ctx_member
-        if ctx_member.is_kindof("MaterialPhysicalStandard"):
-            if ctx_member.is_local() or not mtl:
-                mtl = ctx_member
-        if ctx_member.is_kindof("Displacement"):
-            disp = ctx_member
-        if ctx_member.get_contextual_name().endswith(DISPLACEMENT_SUFFIX):
-            disp_tx = ctx_member
+
+    manifest = read_surface_manifest(ctx, ix)
+    if manifest:
+        mtl = manifest.mtl
+        diffuse_tx = manifest.get('diffuse')
+        specular_tx = manifest.get('specular')
+        # Gloss maps have the roughness suffix.
+        roughness_tx = manifest.get('roughness') or manifest.get('gloss')
+        disp = manifest.get('displacement_map')
+        disp_tx = manifest.get('displacement')
+    else:
+        ctx_members = get_items(ctx, ix=ix)
+
+        mtl = None
+        diffuse_tx = None
+        specular_tx = None
+        roughness_tx = None
+        disp = None
+        disp_tx = None
+        for ctx_member in ctx_members:
+            member_name = ctx_member.get_contextual_name()
+            if member_name.endswith(DIFFUSE_SUFFIX):
+                diffuse_tx = ctx_member
+            if member_name.endswith(SPECULAR_COLOR_SUFFIX):
+                specular_tx = ctx_member
+            if member_name.endswith(SPECULAR_ROUGHNESS_SUFFIX):
+                roughness_tx = ctx_member
+            if ctx_member.is_kindof("MaterialPhysicalStandard"):
+                if ctx_member.is_local() or not mtl:
+                    mtl = ctx_member
+            if ctx_member.is_kindof("Displacement"):
+                disp = ctx_member
+            if member_name.endswith(DISPLACEMENT_SUFFIX):
+                disp_tx = ctx_member
     if not mtl:
         logging.debug("No MaterialPhysicalStandard found in ctx")
         ix.log_warning("No MaterialPhysicalStandard found in context.")
@@ -113,50 +137,51 @@ def moisten_surface(ctx,
         disp_selector = create_displacement_selector(disp_tx, selectors_ctx, surface_name, "_moisture", ix=ix)
 
     logging.debug("Assigning selectors")
-    multi_blend_tx.attrs.layer_1_label[0] = "Base intensity"
+    cmds.set_value(str(multi_blend_tx) + ".layer_1_label[0]", "Base intensity")
     # Attach Ambient Occlusion blend
-    multi_blend_tx.attrs.enable_layer_2 = True
-    multi_blend_tx.attrs.layer_2_mode = 1
-    multi_blend_tx.attrs.layer_2_label[0] = "Ambient Occlusion Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_2_color"], str(ao_selector))
-    if not ao_blend: multi_blend_tx.attrs.enable_layer_2 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_2_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_2_label[0]", "Ambient Occlusion Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_2_color", str(ao_selector))
+    if not ao_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", False)
     # Attach displacement blend
     if disp_selector:
-        multi_blend_tx.attrs.enable_layer_3 = True
-        multi_blend_tx.attrs.layer_3_label[0] = "Displacement Blend"
-        multi_blend_tx.attrs.layer_3_mode = 1
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_3_color"], str(disp_selector))
-        if not displacement_blend: multi_blend_tx.attrs.enable_layer_3 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_3", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_3_label[0]", "Displacement Blend")
+        cmds.set_value(str(multi_blend_tx) + ".layer_3_mode", 1)
+        cmds.set_texture(str(multi_blend_tx) + ".layer_3_color", str(disp_selector))
+        if not displacement_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_3", False)
     # Attach height blend
-    multi_blend_tx.attrs.enable_layer_4 = True
-    multi_blend_tx.attrs.layer_4_mode = 1
-    multi_blend_tx.attrs.layer_4_label[0] = "Height Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_4_color"], str(height_selector))
-    if not height_blend: multi_blend_tx.attrs.enable_layer_4 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_4_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_4_label[0]", "Height Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_4_color", str(height_selector))
+    if not height_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", False)
     # Attach slope blend
-    multi_blend_tx.attrs.enable_layer_5 = True
-    multi_blend_tx.attrs.layer_5_mode = 1
-    multi_blend_tx.attrs.layer_5_label[0] = "Slope Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_5_color"], str(slope_selector))
-    if not slope_blend: multi_blend_tx.attrs.enable_layer_5 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_5_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_5_label[0]", "Slope Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_5_color", str(slope_selector))
+    if not slope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", False)
     # Attach triplanar blend
-    multi_blend_tx.attrs.enable_layer_6 = True
-    multi_blend_tx.attrs.layer_6_mode = 1
-    multi_blend_tx.attrs.layer_6_label[0] = "Triplanar Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_6_color"], str(triplanar_selector))
-    if not triplanar_blend: multi_blend_tx.attrs.enable_layer_6 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_6_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_6_label[0]", "Triplanar Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_6_color", str(triplanar_selector))
+    if not triplanar_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", False)
     # Attach scope blend
-    multi_blend_tx.attrs.enable_layer_7 = True
-    multi_blend_tx.attrs.layer_7_mode = 1
-    multi_blend_tx.attrs.layer_7_label[0] = "Scope Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_7_color"], str(scope_selector))
-    if not scope_blend: multi_blend_tx.attrs.enable_layer_7 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_7_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_7_label[0]", "Scope Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_7_color", str(scope_selector))
+    if not scope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", False)
     # Attach fractal blend
-    multi_blend_tx.attrs.enable_layer_8 = True
-    multi_blend_tx.attrs.layer_8_label[0] = "Fractal Blend"
-    multi_blend_tx.attrs.layer_8_mode = 4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_8_color"], str(fractal_selector))
-    if not fractal_blend: multi_blend_tx.attrs.enable_layer_8 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_8_label[0]", "Fractal Blend")
+    cmds.set_value(str(multi_blend_tx) + ".layer_8_mode",
+                   4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1)
+    cmds.set_texture(str(multi_blend_tx) + ".layer_8_color", str(fractal_selector))
+    if not fractal_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", False)
 
     # Setup diffuse blend
     logging.debug("Setup diffuse blend")
@@ -165,14 +190,14 @@ def moisten_surface(ctx,
 
     diffuse_blend_tx = ix.cmds.CreateObject(surface_name + MOISTURE_DIFFUSE_BLEND_SUFFIX, "TextureBlend", "Global",
                                             str(diffuse_ctx))
-    diffuse_blend_tx.attrs.input1[0] = diffuse_multiplier
-    diffuse_blend_tx.attrs.input1[1] = diffuse_multiplier
-    diffuse_blend_tx.attrs.input1[2] = diffuse_multiplier
-    diffuse_blend_tx.attrs.mode = 7
-    ix.cmds.SetTexture([str(diffuse_blend_tx) + ".mix"], str(multi_blend_tx))
+    cmds.set_value(str(diffuse_blend_tx) + ".input1[0]", diffuse_multiplier)
+    cmds.set_value(str(diffuse_blend_tx) + ".input1[1]", diffuse_multiplier)
+    cmds.set_value(str(diffuse_blend_tx) + ".input1[2]", diffuse_multiplier)
+    cmds.set_value(str(diffuse_blend_tx) + ".mode", 7)
+    cmds.set_texture(str(diffuse_blend_tx) + ".mix", str(multi_blend_tx))
 
     replace_connections(diffuse_blend_tx, diffuse_tx, ignored_attributes=['runtime_materials', ], ix=ix)
-    ix.cmds.SetTexture([str(diffuse_blend_tx) + ".input2"], str(diffuse_tx))
+    cmds.set_texture(str(diffuse_blend_tx) + ".input2", str(diffuse_tx))
 
     # Setup specular blend
     logging.debug("Setup specular blend")
@@ -180,14 +205,14 @@ def moisten_surface(ctx,
     specular_ctx = sub_ctx if sub_ctx else ctx
     specular_blend_tx = ix.cmds.CreateObject(surface_name + MOISTURE_SPECULAR_BLEND_SUFFIX, "TextureBlend", "Global",
                                              str(specular_ctx))
-    ix.cmds.SetTexture([str(specular_blend_tx) + ".mix"], str(multi_blend_tx))
-    specular_blend_tx.attrs.input1[0] = specular_multiplier
-    specular_blend_tx.attrs.input1[1] = specular_multiplier
-    specular_blend_tx.attrs.input1[2] = specular_multiplier
-    specular_blend_tx.attrs.mode = 8
+    cmds.set_texture(str(specular_blend_tx) + ".mix", str(multi_blend_tx))
+    cmds.set_value(str(specular_blend_tx) + ".input1[0]", specular_multiplier)
+    cmds.set_value(str(specular_blend_tx) + ".input1[1]", specular_multiplier)
+    cmds.set_value(str(specular_blend_tx) + ".input1[2]", specular_multiplier)
+    cmds.set_value(str(specular_blend_tx) + ".mode", 8)
 
     replace_connections(specular_blend_tx, specular_tx, ignored_attributes=['runtime_materials', ], ix=ix)
-    ix.cmds.SetTexture([str(specular_blend_tx) + ".input2"], str(specular_tx))
+    cmds.set_texture(str(specular_blend_tx) + ".input2", str(specular_tx))
 
     # Setup roughness blend
     logging.debug("Setup roughness blend")
@@ -195,48 +220,52 @@ def moisten_surface(ctx,
     roughness_ctx = sub_ctx if sub_ctx else ctx
     roughness_blend_tx = ix.cmds.CreateObject(surface_name + MOISTURE_ROUGHNESS_BLEND_SUFFIX, "TextureBlend", "Global",
                                               str(roughness_ctx))
-    ix.cmds.SetTexture([str(roughness_blend_tx) + ".mix"], str(multi_blend_tx))
-    roughness_blend_tx.attrs.input1[0] = roughness_multiplier
-    roughness_blend_tx.attrs.input1[1] = roughness_multiplier
-    roughness_blend_tx.attrs.input1[2] = roughness_multiplier
-    roughness_blend_tx.attrs.mode = 7
+    cmds.set_texture(str(roughness_blend_tx) + ".mix", str(multi_blend_tx))
+    cmds.set_value(str(roughness_blend_tx) + ".input1[0]", roughness_multiplier)
+    cmds.set_value(str(roughness_blend_tx) + ".input1[1]", roughness_multiplier)
+    cmds.set_value(str(roughness_blend_tx) + ".input1[2]", roughness_multiplier)
+    cmds.set_value(str(roughness_blend_tx) + ".mode", 7)
 
     replace_connections(roughness_blend_tx, roughness_tx, ignored_attributes=['runtime_materials', ], ix=ix)
-    ix.cmds.SetTexture([str(roughness_blend_tx) + ".input2"], str(roughness_tx))
+    cmds.set_texture(str(roughness_blend_tx) + ".input2", str(roughness_tx))
 
     # Setup IOR blend
     ior_ctx = get_sub_contexts(ctx, name='ior', ix=ix)
     if not ior_ctx:
         ior_ctx = ix.cmds.CreateContext('ior', "Global", str(ctx))
     ior_tx = ix.cmds.CreateObject(surface_name + MOISTURE_IOR_BLEND_SUFFIX, "TextureBlend", "Global", str(ior_ctx))
-    ior_tx.attrs.input2[0] = DEFAULT_IOR
-    ior_tx.attrs.input2[1] = DEFAULT_IOR
-    ior_tx.attrs.input2[2] = DEFAULT_IOR
-    ior_tx.attrs.input1[0] = ior
-    ior_tx.attrs.input1[1] = ior
-    ior_tx.attrs.input1[2] = ior
-    ix.cmds.SetTexture([str(ior_tx) + ".mix"], str(multi_blend_tx))
+    cmds.set_value(str(ior_tx) + ".input2[0]", DEFAULT_IOR)
+    cmds.set_value(str(ior_tx) + ".input2[1]", DEFAULT_IOR)
+    cmds.set_value(str(ior_tx) + ".input2[2]", DEFAULT_IOR)
+    cmds.set_value(str(ior_tx) + ".input1[0]", ior)
+    cmds.set_value(str(ior_tx) + ".input1[1]", ior)
+    cmds.set_value(str(ior_tx) + ".input1[2]", ior)
+    cmds.set_texture(str(ior_tx) + ".mix", str(multi_blend_tx))
     logging.debug("Attaching IOR")
-    ix.cmds.SetTexture([str(mtl) + ".specular_1_index_of_refraction"], str(ior_tx))
+    cmds.set_texture(str(mtl) + ".specular_1_index_of_refraction", str(ior_tx))
     logging.debug("Done moistening!!!")
 
 
+@profiled
+@buffer_commands
 def tint_surface(ctx, color, strength=.5, **kwargs):
     """
     Tints the diffuse texture with the specified color
     """
     logging.debug("Tint surface started")
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not check_context(ctx, ix=ix):
         return None
 
-    ctx_members = get_items(ctx, ix=ix)
     surface_name = os.path.basename(str(ctx))
-    mtl = None
-    for ctx_member in ctx_members:
-        if ctx_member.is_kindof("MaterialPhysicalStandard"):
-            if ctx_member.is_local() or not mtl:
-                mtl = ctx_member
+    mtl = get_manifest_mtl(ctx, ix)
+    if not mtl:
+        ctx_members = get_items(ctx, ix=ix)
+        for ctx_member in ctx_members:
+            if ctx_member.is_kindof("MaterialPhysicalStandard"):
+                if ctx_member.is_local() or not mtl:
+                    mtl = ctx_member
     if not mtl:
         ix.log_warning("No valid material or displacement found.")
         return False
@@ -246,13 +275,13 @@ def tint_surface(ctx, color, strength=.5, **kwargs):
         sub_ctx = get_sub_contexts(ctx, name='diffuse', ix=ix)
         target_ctx = sub_ctx if sub_ctx else ctx
         tint_tx = ix.cmds.CreateObject(surface_name + DIFFUSE_TINT_SUFFIX, "TextureBlend", "Global", str(target_ctx))
-        tint_tx.attrs.mix = strength
-        tint_tx.attrs.mode = 12
-        tint_tx.attrs.input1[0] = color[0]
-        tint_tx.attrs.input1[1] = color[1]
-        tint_tx.attrs.input1[2] = color[2]
-        ix.cmds.SetTexture([str(tint_tx) + ".input2"], str(diffuse_tx))
-        ix.cmds.SetTexture([str(mtl) + ".diffuse_front_color"], str(tint_tx))
+        cmds.set_value(str(tint_tx) + ".mix", strength)
+        cmds.set_value(str(tint_tx) + ".mode", 12)
+        cmds.set_value(str(tint_tx) + ".input1[0]", color[0])
+        cmds.set_value(str(tint_tx) + ".input1[1]", color[1])
+        cmds.set_value(str(tint_tx) + ".input1[2]", color[2])
+        cmds.set_texture(str(tint_tx) + ".input2", str(diffuse_tx))
+        cmds.set_texture(str(mtl) + ".diffuse_front_color", str(tint_tx))
         logging.debug("Tint succeeded!!!")
         return tint_tx
     else:
@@ -261,13 +290,17 @@ def tint_surface(ctx, color, strength=.5, **kwargs):
         return None
 
 
+@profiled
+@buffer_commands
 def replace_surface(ctx, surface_directory, selected_provider=None, **kwargs):
     """
     Replace the selected surface context with a different surface.
-    Links between blend materials are maintained.
+    Links between blend materials are maintained. Only the textures and settings that differ are changed.
+    Pass resolution to pick the maps of one resolution and dry_run=True to get the planned edits without applying
+    them, see Surface.plan_update.
     """
     logging.debug("Replace surface called...")
-    logging.debug("Arguments: " + str(kwargs))
+    logging.debug("Arguments: %s", kwargs)
     ix = get_ix(kwargs.get("ix"))
     if not check_context(ctx, ix=ix):
         return None
@@ -280,7 +313,7 @@ def replace_surface(ctx, surface_directory, selected_provider=None, **kwargs):
     surface_height = DEFAULT_DISPLACEMENT_HEIGHT
     displacement_offset = DEFAULT_DISPLACEMENT_OFFSET
     tileable = True
-    color_spaces = kwargs.get('color_spaces', DEFAULT_COLOR_SPACES)
+    color_spaces = get_color_spaces(kwargs.get('color_spaces', DEFAULT_COLOR_SPACES), ix=ix)
     clip_opacity = kwargs.get('clip_opacity', True)
     ior = kwargs.get('ior', DEFAULT_IOR)
     metallic_ior = kwargs.get('metallic_ior', DEFAULT_METALLIC_IOR)
@@ -289,10 +322,11 @@ def replace_surface(ctx, surface_directory, selected_provider=None, **kwargs):
     triplanar_blend = kwargs.get('triplanar_blend', 0.5)
     projection_type = kwargs.get('projection_type', 'triplanar')
 
+    scan = get_asset_scan(surface_directory)
     for provider_name in provider_names:
-        logging.debug("Checking if provider matches inspection: " + provider_name)
+        logging.debug("Checking if provider matches inspection: %s", provider_name)
         provider = importlib.import_module('clarisse_survival_kit.providers.' + provider_name)
-        report = provider.inspect_asset(surface_directory)
+        report = provider.inspect_asset(surface_directory, scan=scan)
         if report:
             if report.get('scan_area'):
                 uv_scale = report.get('scan_area')
@@ -300,7 +334,7 @@ def replace_surface(ctx, surface_directory, selected_provider=None, **kwargs):
                 tileable = report.get('tileable')
             break
         else:
-            logging.debug('Provider %s did not pass inspection' % provider_name)
+            logging.debug('Provider %s did not pass inspection', provider_name)
             if selected_provider:
                 ix.log_warning('Content provider could not find asset in the specified directory.')
                 return None
@@ -312,55 +346,49 @@ def replace_surface(ctx, surface_directory, selected_provider=None, **kwargs):
     surface_directory = os.path.normpath(surface_directory)
     if not os.path.isdir(surface_directory):
         return ix.log_warning("Invalid directory specified: " + surface_directory)
-    logging.debug("Surface directory:" + surface_directory)
+    logging.debug("Surface directory: %s", surface_directory)
 
     # Let's find the textures
-    textures = get_textures_from_directory(surface_directory)
+    resolution = kwargs.get('resolution')
+    textures = scan.get_textures(resolution=resolution)
     streamed_maps = get_stream_map_files(textures)
     if not textures:
         ix.log_warning("No textures found in directory.")
         return False
+    available_maps = None
+    if resolution:
+        if not [index for index in textures if index != 'preview']:
+            ix.log_warning("No textures found with resolution " + str(resolution) + ".")
+            return False
+        # Maps missing in this resolution are left as they are instead of being removed.
+        available_maps = scan.get_textures().keys()
 
     surface = Surface(ix)
-    surface.load(ctx)
-    update_textures = {}
-    for key, tx in surface.textures.copy().iteritems():
-        if tx.is_kindof('TextureMapFile') or tx.is_kindof('TextureStreamedMapFile'):
-            # Swap filename
-            if key in textures:
-                print "UPDATING FROM SURFACE: " + key
-                logging.debug("Texture needing update: " + key)
-                update_textures[key] = textures.get(key)
-            elif key not in textures:
-                print "DELETING FROM SURFACE: " + key
-                logging.debug("Texture no longer needed: " + key)
-                surface.destroy_tx(key)
-    new_textures = {}
-    for key, tx in textures.iteritems():
-        if key not in surface.textures:
-            print "NOT IN SURFACE: " + key
-            logging.debug("New texture: " + key)
-            new_textures[key] = tx
-
-    surface.create_textures(new_textures, color_spaces=color_spaces, streamed_maps=streamed_maps,
-                            clip_opacity=clip_opacity)
-    surface.update_ior(ior, metallic_ior=metallic_ior)
-    surface.update_textures(update_textures, color_spaces=color_spaces, streamed_maps=streamed_maps)
-    surface.update_names(surface_name)
-    surface.update_displacement(surface_height, displacement_offset=displacement_offset)
-    surface.update_opacity(clip_opacity=clip_opacity, found_textures=textures, update_textures=update_textures)
-    surface.update_projection(projection=projection_type, uv_scale=uv_scale,
-                              triplanar_blend=triplanar_blend, object_space=object_space, tile=True)
-    surface.clean()
+    if not surface.load(ctx):
+        return False
+    target = get_target_state(surface_name, textures, streamed_maps=streamed_maps, color_spaces=color_spaces,
+                              ior=ior, metallic_ior=metallic_ior, height=surface_height,
+                              displacement_offset=displacement_offset, clip_opacity=clip_opacity,
+                              projection=projection_type, uv_scale=uv_scale, object_space=object_space,
+                              triplanar_blend=triplanar_blend, available_maps=available_maps)
+    # Only the steps whose settings changed are applied, swapping the resolution only updates the filenames.
+    plan = surface.plan_update(target)
+    if kwargs.get('dry_run'):
+        logging.debug("Dry run, surface edits not applied: %s", plan)
+        return plan
+    surface.apply_plan(plan)
     return surface
 
 
+@profiled
+@buffer_commands
 def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_SUFFIX,
                  target_context=None, displacement_blend=True, height_blend=False,
                  ao_blend=False, fractal_blend=True, triplanar_blend=True,
                  slope_blend=True, scope_blend=True, assign_mtls=True, **kwargs):
     """Mixes one or multiple surfaces with a cover surface."""
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not target_context:
         target_context = ix.application.get_working_context()
     if not check_context(target_context, ix=ix):
@@ -375,7 +403,7 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
         cover_mtl = get_mtl_from_context(cover_ctx, ix=ix)
         cover_disp = get_disp_from_context(cover_ctx, ix=ix)
         cover_name = cover_ctx.get_name()
-        logging.debug("Cover mtl: " + cover_name)
+        logging.debug("Cover mtl: %s", cover_name)
         logging.debug("Setting up common selectors...")
         # Setup all common selectors
         # Setup fractal noise
@@ -400,47 +428,48 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
         logging.debug("Generate master multi blend and attach selectors: ")
         multi_blend_tx = ix.cmds.CreateObject(mix_name + MULTI_BLEND_SUFFIX, "TextureMultiBlend",
                                               "Global", str(root_ctx))
-        multi_blend_tx.attrs.layer_1_label[0] = "Base intensity"
+        cmds.set_value(str(multi_blend_tx) + ".layer_1_label[0]", "Base intensity")
         # Attach displacement blend
-        multi_blend_tx.attrs.enable_layer_2 = True
-        multi_blend_tx.attrs.layer_2_label[0] = "Displacement Blend"
-        multi_blend_tx.attrs.layer_2_mode = 1
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_2_label[0]", "Displacement Blend")
+        cmds.set_value(str(multi_blend_tx) + ".layer_2_mode", 1)
         # Attach Ambient Occlusion blend
-        multi_blend_tx.attrs.enable_layer_3 = True
-        multi_blend_tx.attrs.layer_3_mode = 1
-        multi_blend_tx.attrs.layer_3_label[0] = "Ambient Occlusion Blend"
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_3_color"], str(ao_selector))
-        if not ao_blend: multi_blend_tx.attrs.enable_layer_3 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_3", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_3_mode", 1)
+        cmds.set_value(str(multi_blend_tx) + ".layer_3_label[0]", "Ambient Occlusion Blend")
+        cmds.set_texture(str(multi_blend_tx) + ".layer_3_color", str(ao_selector))
+        if not ao_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_3", False)
         # Attach height blend
-        multi_blend_tx.attrs.enable_layer_4 = True
-        multi_blend_tx.attrs.layer_4_mode = 1
-        multi_blend_tx.attrs.layer_4_label[0] = "Height Blend"
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_4_color"], str(height_selector))
-        if not height_blend: multi_blend_tx.attrs.enable_layer_4 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_4_mode", 1)
+        cmds.set_value(str(multi_blend_tx) + ".layer_4_label[0]", "Height Blend")
+        cmds.set_texture(str(multi_blend_tx) + ".layer_4_color", str(height_selector))
+        if not height_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", False)
         # Attach slope blend
-        multi_blend_tx.attrs.enable_layer_5 = True
-        multi_blend_tx.attrs.layer_5_mode = 1
-        multi_blend_tx.attrs.layer_5_label[0] = "Slope Blend"
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_5_color"], str(slope_selector))
-        if not slope_blend: multi_blend_tx.attrs.enable_layer_5 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_5_mode", 1)
+        cmds.set_value(str(multi_blend_tx) + ".layer_5_label[0]", "Slope Blend")
+        cmds.set_texture(str(multi_blend_tx) + ".layer_5_color", str(slope_selector))
+        if not slope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", False)
         # Attach triplanar blend
-        multi_blend_tx.attrs.enable_layer_6 = True
-        multi_blend_tx.attrs.layer_6_mode = 1
-        multi_blend_tx.attrs.layer_6_label[0] = "Triplanar Blend"
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_6_color"], str(triplanar_selector))
-        if not triplanar_blend: multi_blend_tx.attrs.enable_layer_6 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_6_mode", 1)
+        cmds.set_value(str(multi_blend_tx) + ".layer_6_label[0]", "Triplanar Blend")
+        cmds.set_texture(str(multi_blend_tx) + ".layer_6_color", str(triplanar_selector))
+        if not triplanar_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", False)
         # Attach scope blend
-        multi_blend_tx.attrs.enable_layer_7 = True
-        multi_blend_tx.attrs.layer_7_mode = 1
-        multi_blend_tx.attrs.layer_7_label[0] = "Scope Blend"
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_7_color"], str(scope_selector))
-        if not scope_blend: multi_blend_tx.attrs.enable_layer_7 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_7_mode", 1)
+        cmds.set_value(str(multi_blend_tx) + ".layer_7_label[0]", "Scope Blend")
+        cmds.set_texture(str(multi_blend_tx) + ".layer_7_color", str(scope_selector))
+        if not scope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", False)
         # Attach fractal blend
-        multi_blend_tx.attrs.enable_layer_8 = True
-        multi_blend_tx.attrs.layer_8_label[0] = "Fractal Blend"
-        multi_blend_tx.attrs.layer_8_mode = 4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1
-        ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_8_color"], str(fractal_selector))
-        if not fractal_blend: multi_blend_tx.attrs.enable_layer_8 = False
+        cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", True)
+        cmds.set_value(str(multi_blend_tx) + ".layer_8_label[0]", "Fractal Blend")
+        cmds.set_value(str(multi_blend_tx) + ".layer_8_mode",
+                   4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1)
+        cmds.set_texture(str(multi_blend_tx) + ".layer_8_color", str(fractal_selector))
+        if not fractal_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", False)
     elif mode == 'add':
         root_ctx = cover_ctx
         previous_blend_mtl = get_items(root_ctx, kind=['MaterialPhysicalBlend'], return_first_hit=True, ix=ix)
@@ -460,7 +489,7 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
     # Set up each surface mix
     for srf_ctx in srf_ctxs:
         mix_srf_name = srf_ctx.get_name()
-        logging.debug("Generating mix of base surface: " + mix_srf_name)
+        logging.debug("Generating mix of base surface: %s", mix_srf_name)
         mix_ctx = ix.cmds.CreateContext(mix_srf_name + MIX_SUFFIX, "Global", str(root_ctx))
         mix_selectors_ctx = ix.cmds.CreateContext("custom_selectors", "Global", str(mix_ctx))
 
@@ -469,15 +498,17 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
 
         has_displacement = base_disp and cover_disp
 
+        # The multi blend is instanced with the values set on it so far.
+        cmds.barrier()
         mix_multi_blend_tx = ix.cmds.Instantiate([str(multi_blend_tx)])[0]
         ix.cmds.MoveItemsTo([str(mix_multi_blend_tx)], mix_selectors_ctx)
         ix.cmds.RenameItem(str(mix_multi_blend_tx), mix_srf_name + MULTI_BLEND_SUFFIX)
         # Blend materials
         mix_mtl = ix.cmds.CreateObject(mix_srf_name + MIX_SUFFIX + MATERIAL_SUFFIX, "MaterialPhysicalBlend", "Global",
                                        str(mix_ctx))
-        ix.cmds.SetTexture([str(mix_mtl) + ".mix"], str(mix_multi_blend_tx))
-        ix.cmds.SetValue(str(mix_mtl) + ".input2", [str(base_mtl)])
-        ix.cmds.SetValue(str(mix_mtl) + ".input1", [str(cover_mtl)])
+        cmds.set_texture(str(mix_mtl) + ".mix", str(mix_multi_blend_tx))
+        cmds.set_value(str(mix_mtl) + ".input2", base_mtl)
+        cmds.set_value(str(mix_mtl) + ".input1", cover_mtl)
 
         mix_disp = ''
         if has_displacement:
@@ -497,24 +528,24 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
                 print "Base surface height: " + str(base_srf_height)
                 base_disp_height_scale_tx = ix.cmds.CreateObject(mix_srf_name + DISPLACEMENT_HEIGHT_SCALE_SUFFIX,
                                                                  "TextureMultiply", "Global", str(mix_selectors_ctx))
-                ix.cmds.SetTexture([str(base_disp_height_scale_tx) + ".input1"], str(base_disp_tx))
+                cmds.set_texture(str(base_disp_height_scale_tx) + ".input1", str(base_disp_tx))
 
-                base_disp_height_scale_tx.attrs.input2[0] = base_srf_height
-                base_disp_height_scale_tx.attrs.input2[1] = base_srf_height
-                base_disp_height_scale_tx.attrs.input2[2] = base_srf_height
-                ix.cmds.SetTexture([str(base_disp_blend_offset_tx) + ".input1"], str(base_disp_height_scale_tx))
+                cmds.set_value(str(base_disp_height_scale_tx) + ".input2[0]", base_srf_height)
+                cmds.set_value(str(base_disp_height_scale_tx) + ".input2[1]", base_srf_height)
+                cmds.set_value(str(base_disp_height_scale_tx) + ".input2[2]", base_srf_height)
+                cmds.set_texture(str(base_disp_blend_offset_tx) + ".input1", str(base_disp_height_scale_tx))
                 base_disp_offset_tx = ix.cmds.CreateObject(mix_srf_name + DISPLACEMENT_OFFSET_SUFFIX, "TextureAdd",
                                                            "Global", str(mix_selectors_ctx))
-                base_disp_offset_tx.attrs.input2[0] = -0.5 * base_srf_height + 0.5
-                base_disp_offset_tx.attrs.input2[1] = -0.5 * base_srf_height + 0.5
-                base_disp_offset_tx.attrs.input2[2] = -0.5 * base_srf_height + 0.5
-                ix.cmds.SetTexture([str(base_disp_offset_tx) + ".input1"], str(base_disp_height_scale_tx))
+                cmds.set_value(str(base_disp_offset_tx) + ".input2[0]", -0.5 * base_srf_height + 0.5)
+                cmds.set_value(str(base_disp_offset_tx) + ".input2[1]", -0.5 * base_srf_height + 0.5)
+                cmds.set_value(str(base_disp_offset_tx) + ".input2[2]", -0.5 * base_srf_height + 0.5)
+                cmds.set_texture(str(base_disp_offset_tx) + ".input1", str(base_disp_height_scale_tx))
                 legacy_mode = True
             else:
-                base_disp_blend_offset_tx.attrs.input2[0] = 1
-                base_disp_blend_offset_tx.attrs.input2[1] = 1
-                base_disp_blend_offset_tx.attrs.input2[2] = 1
-                ix.cmds.SetTexture([str(base_disp_blend_offset_tx) + ".input1"], str(base_disp_tx))
+                cmds.set_value(str(base_disp_blend_offset_tx) + ".input2[0]", 1)
+                cmds.set_value(str(base_disp_blend_offset_tx) + ".input2[1]", 1)
+                cmds.set_value(str(base_disp_blend_offset_tx) + ".input2[2]", 1)
+                cmds.set_texture(str(base_disp_blend_offset_tx) + ".input1", str(base_disp_tx))
                 base_disp_offset_tx = base_disp_tx
 
             # Surface 2
@@ -529,66 +560,68 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
                 print "Surface 2 height: " + str(cover_srf_height)
                 cover_disp_height_scale_tx = ix.cmds.CreateObject(cover_name + DISPLACEMENT_HEIGHT_SCALE_SUFFIX,
                                                                   "TextureMultiply", "Global", str(mix_selectors_ctx))
-                ix.cmds.SetTexture([str(cover_disp_height_scale_tx) + ".input1"], str(cover_disp_tx))
-                cover_disp_height_scale_tx.attrs.input2[0] = cover_srf_height
-                cover_disp_height_scale_tx.attrs.input2[1] = cover_srf_height
-                cover_disp_height_scale_tx.attrs.input2[2] = cover_srf_height
-                ix.cmds.SetTexture([str(cover_disp_blend_offset_tx) + ".input1"], str(cover_disp_height_scale_tx))
+                cmds.set_texture(str(cover_disp_height_scale_tx) + ".input1", str(cover_disp_tx))
+                cmds.set_value(str(cover_disp_height_scale_tx) + ".input2[0]", cover_srf_height)
+                cmds.set_value(str(cover_disp_height_scale_tx) + ".input2[1]", cover_srf_height)
+                cmds.set_value(str(cover_disp_height_scale_tx) + ".input2[2]", cover_srf_height)
+                cmds.set_texture(str(cover_disp_blend_offset_tx) + ".input1", str(cover_disp_height_scale_tx))
                 cover_disp_offset_tx = ix.cmds.CreateObject(cover_name + DISPLACEMENT_OFFSET_SUFFIX, "TextureAdd",
                                                             "Global", str(mix_selectors_ctx))
-                cover_disp_offset_tx.attrs.input2[0] = -0.5 * cover_srf_height + 0.5
-                cover_disp_offset_tx.attrs.input2[1] = -0.5 * cover_srf_height + 0.5
-                cover_disp_offset_tx.attrs.input2[2] = -0.5 * cover_srf_height + 0.5
-                ix.cmds.SetTexture([str(cover_disp_offset_tx) + ".input1"], str(cover_disp_height_scale_tx))
+                cmds.set_value(str(cover_disp_offset_tx) + ".input2[0]", -0.5 * cover_srf_height + 0.5)
+                cmds.set_value(str(cover_disp_offset_tx) + ".input2[1]", -0.5 * cover_srf_height + 0.5)
+                cmds.set_value(str(cover_disp_offset_tx) + ".input2[2]", -0.5 * cover_srf_height + 0.5)
+                cmds.set_texture(str(cover_disp_offset_tx) + ".input1", str(cover_disp_height_scale_tx))
                 legacy_mode = True
             else:
-                cover_disp_blend_offset_tx.attrs.input2[0] = 1
-                cover_disp_blend_offset_tx.attrs.input2[1] = 1
-                cover_disp_blend_offset_tx.attrs.input2[2] = 1
-                ix.cmds.SetTexture([str(cover_disp_blend_offset_tx) + ".input1"], str(cover_disp_tx))
+                cmds.set_value(str(cover_disp_blend_offset_tx) + ".input2[0]", 1)
+                cmds.set_value(str(cover_disp_blend_offset_tx) + ".input2[1]", 1)
+                cmds.set_value(str(cover_disp_blend_offset_tx) + ".input2[2]", 1)
+                cmds.set_texture(str(cover_disp_blend_offset_tx) + ".input1", str(cover_disp_tx))
                 cover_disp_offset_tx = cover_disp_tx
 
             disp_branch_selector = ix.cmds.CreateObject(mix_srf_name + DISPLACEMENT_BRANCH_SUFFIX, "TextureBranch",
                                                         "Global", str(mix_selectors_ctx))
 
-            ix.cmds.SetTexture([str(disp_branch_selector) + ".input_a"], str(base_disp_blend_offset_tx))
-            ix.cmds.SetTexture([str(disp_branch_selector) + ".input_b"], str(cover_disp_blend_offset_tx))
-            disp_branch_selector.attrs.mode = 2
+            cmds.set_texture(str(disp_branch_selector) + ".input_a", str(base_disp_blend_offset_tx))
+            cmds.set_texture(str(disp_branch_selector) + ".input_b", str(cover_disp_blend_offset_tx))
+            cmds.set_value(str(disp_branch_selector) + ".mode", 2)
 
             # Hook to multiblend instance
-            ix.cmds.SetTexture([str(mix_multi_blend_tx) + ".layer_2_color"], str(disp_branch_selector))
-            if not displacement_blend: mix_multi_blend_tx.attrs.enable_layer_2 = False
+            cmds.set_texture(str(mix_multi_blend_tx) + ".layer_2_color", str(disp_branch_selector))
+            if not displacement_blend: cmds.set_value(str(mix_multi_blend_tx) + ".enable_layer_2", False)
             # Finalize new Displacement map
             disp_multi_blend_tx = ix.cmds.CreateObject(mix_srf_name + DISPLACEMENT_BLEND_SUFFIX,
                                                        "TextureMultiBlend", "Global", str(mix_selectors_ctx))
-            ix.cmds.SetTexture([str(disp_multi_blend_tx) + ".layer_1_color"], str(base_disp_offset_tx))
-            disp_multi_blend_tx.attrs.enable_layer_2 = True
-            disp_multi_blend_tx.attrs.layer_2_label[0] = "Mix mode"
-            ix.cmds.SetTexture([str(disp_multi_blend_tx) + ".layer_2_color"], str(cover_disp_offset_tx))
-            ix.cmds.SetTexture([str(disp_multi_blend_tx) + ".layer_2_mix"], str(mix_multi_blend_tx))
-            disp_multi_blend_tx.attrs.enable_layer_3 = True
-            disp_multi_blend_tx.attrs.layer_3_label[0] = "Add mode"
-            ix.cmds.SetTexture([str(disp_multi_blend_tx) + ".layer_3_color"], str(cover_disp_offset_tx))
-            ix.cmds.SetTexture([str(disp_multi_blend_tx) + ".layer_3_mix"], str(mix_multi_blend_tx))
-            disp_multi_blend_tx.attrs.layer_3_mode = 6
-            disp_multi_blend_tx.attrs.enable_layer_3 = False
+            cmds.set_texture(str(disp_multi_blend_tx) + ".layer_1_color", str(base_disp_offset_tx))
+            cmds.set_value(str(disp_multi_blend_tx) + ".enable_layer_2", True)
+            cmds.set_value(str(disp_multi_blend_tx) + ".layer_2_label[0]", "Mix mode")
+            cmds.set_texture(str(disp_multi_blend_tx) + ".layer_2_color", str(cover_disp_offset_tx))
+            cmds.set_texture(str(disp_multi_blend_tx) + ".layer_2_mix", str(mix_multi_blend_tx))
+            cmds.set_value(str(disp_multi_blend_tx) + ".enable_layer_3", True)
+            cmds.set_value(str(disp_multi_blend_tx) + ".layer_3_label[0]", "Add mode")
+            cmds.set_texture(str(disp_multi_blend_tx) + ".layer_3_color", str(cover_disp_offset_tx))
+            cmds.set_texture(str(disp_multi_blend_tx) + ".layer_3_mix", str(mix_multi_blend_tx))
+            cmds.set_value(str(disp_multi_blend_tx) + ".layer_3_mode", 6)
+            cmds.set_value(str(disp_multi_blend_tx) + ".enable_layer_3", False)
 
             mix_disp = ix.cmds.CreateObject(mix_srf_name + DISPLACEMENT_MAP_SUFFIX, "Displacement",
                                             "Global",
                                             str(mix_ctx))
-            mix_disp.attrs.bound[0] = 1
-            mix_disp.attrs.bound[1] = 1
-            mix_disp.attrs.bound[2] = 1
-            mix_disp.attrs.front_value = 1
+            cmds.set_value(str(mix_disp) + ".bound[0]", 1)
+            cmds.set_value(str(mix_disp) + ".bound[1]", 1)
+            cmds.set_value(str(mix_disp) + ".bound[2]", 1)
+            cmds.set_value(str(mix_disp) + ".front_value", 1)
             if legacy_mode:
-                mix_disp.attrs.front_offset = -0.5
-            ix.cmds.SetTexture([str(mix_disp) + ".front_value"], str(disp_multi_blend_tx))
+                cmds.set_value(str(mix_disp) + ".front_offset", -0.5)
+            cmds.set_texture(str(mix_disp) + ".front_value", str(disp_multi_blend_tx))
         if assign_mtls:
+            # The outputs of the materials are looked up from the scene.
+            cmds.barrier()
             mtls = get_all_mtls_from_context(srf_ctx, ix=ix)
             for mtl in mtls:
                 logging.debug("Material assignment...")
                 ix.selection.deselect_all()
-                ix.application.check_for_events()
+                pump_events(ix, 'mix_surfaces', required=True)
                 ix.selection.select(mtl)
                 ix.application.select_next_outputs()
                 selection = [i for i in ix.selection]
@@ -599,66 +632,93 @@ def mix_surfaces(srf_ctxs, cover_ctx, mode="create", mix_name="mix" + MATERIAL_S
                         for j in range(count):
                             shader = sel.attrs.materials[j]
                             if shader == mtl:
-                                ix.cmds.SetValues([str(sel) + ".materials" + str([j])], [str(mix_mtl)])
+                                cmds.set_value(str(sel) + ".materials" + str([j]), mix_mtl)
                             if has_displacement:
                                 if sel.attrs.displacements[j] == base_disp:
-                                    ix.cmds.SetValues([str(sel) + ".displacements" + str([j])], [str(mix_disp)])
+                                    cmds.set_value(str(sel) + ".displacements" + str([j]), mix_disp)
                 ix.selection.deselect_all()
-                ix.application.check_for_events()
+                pump_events(ix, 'mix_surfaces')
                 logging.debug("... done material assignment.")
     logging.debug("Done mixing!!!")
     return root_ctx
 
 
+@profiled
+@buffer_commands
 def toggle_surface_complexity(ctx, **kwargs):
     """Temporarily replaces the current surface with a much simpeler MaterialPhysicalDiffuse material."""
+    return toggle_surfaces_complexity([ctx], **kwargs)
+
+
+@profiled
+@index_connections
+@buffer_commands
+def toggle_surfaces_complexity(ctxs, **kwargs):
+    """
+    Toggles the complexity of every surface context, see toggle_surface_complexity.
+    The material connections of all surfaces are swapped at once. Returns False if a context had no material.
+    """
     logging.debug("Toggle surface complexity...")
     ix = get_ix(kwargs.get("ix"))
-    objects_array = ix.api.OfObjectArray(ctx.get_object_count())
-    flags = ix.api.CoreBitFieldHelper()
-    ctx.get_all_objects(objects_array, flags, False)
-    surface_name = os.path.basename(str(ctx))
-
-    mtl = None
-    preview_mtl = None
-    disp = None
-    for ctx_member in objects_array:
-        if ctx_member.is_kindof("MaterialPhysicalStandard"):
-            if ctx_member.is_local() or not mtl:
+    cmds = get_command_buffer(ix)
+    swaps = collections.OrderedDict()
+    delete_items = []
+    disable_items = {True: [], False: []}
+    success = True
+    for ctx in ctxs:
+        objects_array = ix.api.OfObjectArray(ctx.get_object_count())
+        flags = ix.api.CoreBitFieldHelper()
+        ctx.get_all_objects(objects_array, flags, False)
+        surface_name = os.path.basename(str(ctx))
+
+        mtl = None
+        preview_mtl = None
+        disp = None
+        for ctx_member in objects_array:
+            if ctx_member.is_kindof("MaterialPhysicalStandard"):
+                if ctx_member.is_local() or not mtl:
+                    mtl = ctx_member
+            if ctx_member.is_kindof("MaterialPhysicalBlend"):
                 mtl = ctx_member
-        if ctx_member.is_kindof("MaterialPhysicalBlend"):
-            mtl = ctx_member
-        if ctx_member.is_kindof("MaterialPhysicalDiffuse"):
-            preview_mtl = ctx_member
-        if ctx_member.is_kindof("Displacement"):
-            disp = ctx_member
-    if not mtl:
-        ix.log_warning("No MaterialPhysicalStandard found in context.")
-        ix.selection.deselect_all()
-        return False
-    if disp:
-        # Disable the displacement
-        ix.cmds.DisableItems([str(disp)], disp.is_enabled())
-    if mtl.is_kindof("MaterialPhysicalBlend"):
-        ix.selection.deselect_all()
-        return True
-    if not preview_mtl:
-        logging.debug("Switching to simple mode...")
-        diffuse_tx = ix.get_item(str(mtl) + '.diffuse_front_color').get_texture()
-        new_preview_mtl = ix.cmds.CreateObject(surface_name + PREVIEW_MATERIAL_SUFFIX, "MaterialPhysicalDiffuse",
-                                               "Global", str(ctx))
-        ix.cmds.SetTexture([str(new_preview_mtl) + ".front_color"],
-                           str(diffuse_tx))
-
-        replace_connections(new_preview_mtl, mtl, ignored_attributes=['runtime_materials', ], ix=ix)
-    else:
-        logging.debug("Reverting back to complex mode...")
-        replace_connections(mtl, preview_mtl, ignored_attributes=['runtime_materials', ], ix=ix)
-        ix.cmds.DeleteItems([str(preview_mtl)])
+            if ctx_member.is_kindof("MaterialPhysicalDiffuse"):
+                preview_mtl = ctx_member
+            if ctx_member.is_kindof("Displacement"):
+                disp = ctx_member
+        if not mtl:
+            ix.log_warning("No MaterialPhysicalStandard found in context.")
+            success = False
+            continue
+        if disp:
+            # Disable the displacement
+            disable_items[disp.is_enabled()].append(str(disp))
+        if mtl.is_kindof("MaterialPhysicalBlend"):
+            continue
+        if not preview_mtl:
+            logging.debug("Switching to simple mode...")
+            diffuse_tx = ix.get_item(str(mtl) + '.diffuse_front_color').get_texture()
+            new_preview_mtl = ix.cmds.CreateObject(surface_name + PREVIEW_MATERIAL_SUFFIX, "MaterialPhysicalDiffuse",
+                                                   "Global", str(ctx))
+            cmds.set_texture(str(new_preview_mtl) + ".front_color", str(diffuse_tx))
+            swaps[mtl] = new_preview_mtl
+        else:
+            logging.debug("Reverting back to complex mode...")
+            swaps[preview_mtl] = mtl
+            delete_items.append(str(preview_mtl))
+    for enabled, items in disable_items.iteritems():
+        if items:
+            ix.cmds.DisableItems(items, enabled)
+    replace_connections_bulk(swaps, ignored_attributes=['runtime_materials', ], ix=ix)
+    if delete_items:
+        cmds.barrier()
+        ix.cmds.DeleteItems(delete_items)
+        get_connection_index(ix).forget(delete_items)
     ix.selection.deselect_all()
     logging.debug("Done toggling surface complexity!!!")
+    return success
 
 
+@profiled
+@buffer_commands
 def generate_decimated_pointcloud(geometry, ctx=None,
                                   pc_type="GeometryPointCloud",
                                   use_density=False,
@@ -673,9 +733,10 @@ def generate_decimated_pointcloud(geometry, ctx=None,
                                   **kwargs):
     """Generates a pointcloud from the selected geometry."""
     logging.debug("Generating decimated pointcloud...")
-    logging.debug("Type: " + pc_type)
-    logging.debug("Use density: " + str(use_density))
+    logging.debug("Type: %s", pc_type)
+    logging.debug("Use density: %s", use_density)
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not ctx:
         ctx = ix.application.get_working_context()
     if not check_context(ctx, ix=ix):
@@ -685,23 +746,24 @@ def generate_decimated_pointcloud(geometry, ctx=None,
     pc_ctx = ix.cmds.CreateContext(POINTCLOUD_CTX, "Global", str(ctx))
     selectors_ctx = ix.cmds.CreateContext('selectors', "Global", str(pc_ctx))
     pc = ix.cmds.CreateObject(geo_name + POINTCLOUD_SUFFIX, pc_type, "Global", str(pc_ctx))
-    ix.application.check_for_events()
+    pump_events(ix, 'generate_decimated_pointcloud', required=True)
     if pc_type == "GeometryPointCloud":
         if use_density:
-            ix.cmds.SetValue(str(pc) + ".use_density", [str(1)])
-            ix.application.check_for_events()
-            ix.cmds.SetValue(str(pc) + ".density", [str(density)])
+            cmds.set_value(str(pc) + ".use_density", 1)
+            pump_events(ix, 'generate_decimated_pointcloud', required=True)
+            cmds.set_value(str(pc) + ".density", density)
         else:
-            pc.attrs.point_count = int(point_count)
+            cmds.set_value(str(pc) + ".point_count", int(point_count))
     else:
-        pc.attrs.point_count = int(point_count)
+        cmds.set_value(str(pc) + ".point_count", int(point_count))
 
     logging.debug("Parenting...")
     ix.cmds.AddValues([str(pc) + ".constraints"], ["ConstraintParent"])
-    ix.application.check_for_events()
-    time.sleep(0.25)
-    ix.cmds.SetValues([str(pc) + ".parent.target"], [str(geometry)])
-    ix.application.check_for_events()
+    # The target attribute exists once the constraint is created.
+    get_event_pump(ix).wait_until(lambda: ix.item_exists(str(pc) + ".parent.target"),
+                                  'generate_decimated_pointcloud')
+    cmds.set_value(str(pc) + ".parent.target", geometry)
+    pump_events(ix, 'generate_decimated_pointcloud')
     logging.debug("Setting up multi blend and selectors...")
     multi_blend_tx = ix.cmds.CreateObject(geo_name + DECIMATE_SUFFIX + MULTI_BLEND_SUFFIX, "TextureMultiBlend",
                                           "Global", str(pc_ctx))
@@ -723,55 +785,58 @@ def generate_decimated_pointcloud(geometry, ctx=None,
     # Setup height blend
     height_selector = create_height_selector(selectors_ctx, geo_name, DECIMATE_SUFFIX, ix=ix)
 
-    multi_blend_tx.attrs.layer_1_label[0] = "Base intensity"
+    cmds.set_value(str(multi_blend_tx) + ".layer_1_label[0]", "Base intensity")
     # Attach Ambient Occlusion blend
-    multi_blend_tx.attrs.enable_layer_2 = True
-    multi_blend_tx.attrs.layer_2_mode = 1
-    multi_blend_tx.attrs.layer_2_label[0] = "Ambient Occlusion Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_2_color"], str(ao_selector))
-    if not ao_blend: multi_blend_tx.attrs.enable_layer_2 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_2_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_2_label[0]", "Ambient Occlusion Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_2_color", str(ao_selector))
+    if not ao_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", False)
     # Attach height blend
-    multi_blend_tx.attrs.enable_layer_4 = True
-    multi_blend_tx.attrs.layer_4_mode = 1
-    multi_blend_tx.attrs.layer_4_label[0] = "Height Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_4_color"], str(height_selector))
-    if not height_blend: multi_blend_tx.attrs.enable_layer_4 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_4_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_4_label[0]", "Height Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_4_color", str(height_selector))
+    if not height_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", False)
     # Attach slope blend
-    multi_blend_tx.attrs.enable_layer_5 = True
-    multi_blend_tx.attrs.layer_5_mode = 1
-    multi_blend_tx.attrs.layer_5_label[0] = "Slope Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_5_color"], str(slope_selector))
-    if not slope_blend: multi_blend_tx.attrs.enable_layer_5 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_5_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_5_label[0]", "Slope Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_5_color", str(slope_selector))
+    if not slope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", False)
     # Attach triplanar blend
-    multi_blend_tx.attrs.enable_layer_6 = True
-    multi_blend_tx.attrs.layer_6_mode = 1
-    multi_blend_tx.attrs.layer_6_label[0] = "Triplanar Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_6_color"], str(triplanar_selector))
-    if not triplanar_blend: multi_blend_tx.attrs.enable_layer_6 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_6_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_6_label[0]", "Triplanar Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_6_color", str(triplanar_selector))
+    if not triplanar_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", False)
     # Attach scope blend
-    multi_blend_tx.attrs.enable_layer_7 = True
-    multi_blend_tx.attrs.layer_7_mode = 1
-    multi_blend_tx.attrs.layer_7_label[0] = "Scope Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_7_color"], str(scope_selector))
-    if not scope_blend: multi_blend_tx.attrs.enable_layer_7 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_7_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_7_label[0]", "Scope Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_7_color", str(scope_selector))
+    if not scope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", False)
     # Attach fractal blend
-    multi_blend_tx.attrs.enable_layer_8 = True
-    multi_blend_tx.attrs.layer_8_label[0] = "Fractal Blend"
-    multi_blend_tx.attrs.layer_8_mode = 4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_8_color"], str(fractal_selector))
-    if not fractal_blend: multi_blend_tx.attrs.enable_layer_8 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_8_label[0]", "Fractal Blend")
+    cmds.set_value(str(multi_blend_tx) + ".layer_8_mode",
+                   4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1)
+    cmds.set_texture(str(multi_blend_tx) + ".layer_8_color", str(fractal_selector))
+    if not fractal_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", False)
 
     if pc_type == "GeometryPointCloud":
-        ix.cmds.SetValue(str(pc) + ".decimate_texture", [str(multi_blend_tx)])
-        ix.cmds.SetValue(str(multi_blend_tx) + ".invert", [str(1)])
+        cmds.set_value(str(pc) + ".decimate_texture", multi_blend_tx)
+        cmds.set_value(str(multi_blend_tx) + ".invert", 1)
     else:
-        ix.cmds.SetValue(str(pc) + ".texture", [str(multi_blend_tx)])
+        cmds.set_value(str(pc) + ".texture", multi_blend_tx)
 
-    ix.cmds.SetValue(str(pc) + ".geometry", [str(geometry)])
+    cmds.set_value(str(pc) + ".geometry", geometry)
     logging.debug("Done generating point cloud!!!")
     return pc
 
 
+@profiled
+@buffer_commands
 def mask_blend_nodes(blend_nodes, ctx=None, mix_name='mix',
                      height_blend=False,
                      fractal_blend=False,
@@ -783,6 +848,7 @@ def mask_blend_nodes(blend_nodes, ctx=None, mix_name='mix',
     """Generates masks on the selected blend textures/materials."""
     logging.debug("Masking blend items...")
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not ctx:
         ctx = ix.application.get_working_context()
     if not check_context(ctx, ix=ix):
@@ -810,56 +876,60 @@ def mask_blend_nodes(blend_nodes, ctx=None, mix_name='mix',
     # Setup height blend
     height_selector = create_height_selector(selectors_ctx, mix_name, MIX_SUFFIX, ix=ix)
 
-    multi_blend_tx.attrs.layer_1_label[0] = "Base intensity"
+    cmds.set_value(str(multi_blend_tx) + ".layer_1_label[0]", "Base intensity")
     # Attach Ambient Occlusion blend
-    multi_blend_tx.attrs.enable_layer_2 = True
-    multi_blend_tx.attrs.layer_2_mode = 1
-    multi_blend_tx.attrs.layer_2_label[0] = "Ambient Occlusion Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_2_color"], str(ao_selector))
-    if not ao_blend: multi_blend_tx.attrs.enable_layer_2 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_2_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_2_label[0]", "Ambient Occlusion Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_2_color", str(ao_selector))
+    if not ao_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_2", False)
     # Attach height blend
-    multi_blend_tx.attrs.enable_layer_4 = True
-    multi_blend_tx.attrs.layer_4_mode = 1
-    multi_blend_tx.attrs.layer_4_label[0] = "Height Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_4_color"], str(height_selector))
-    if not height_blend: multi_blend_tx.attrs.enable_layer_4 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_4_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_4_label[0]", "Height Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_4_color", str(height_selector))
+    if not height_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_4", False)
     # Attach slope blend
-    multi_blend_tx.attrs.enable_layer_5 = True
-    multi_blend_tx.attrs.layer_5_mode = 1
-    multi_blend_tx.attrs.layer_5_label[0] = "Slope Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_5_color"], str(slope_selector))
-    if not slope_blend: multi_blend_tx.attrs.enable_layer_5 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_5_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_5_label[0]", "Slope Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_5_color", str(slope_selector))
+    if not slope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_5", False)
     # Attach triplanar blend
-    multi_blend_tx.attrs.enable_layer_6 = True
-    multi_blend_tx.attrs.layer_6_mode = 1
-    multi_blend_tx.attrs.layer_6_label[0] = "Triplanar Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_6_color"], str(triplanar_selector))
-    if not triplanar_blend: multi_blend_tx.attrs.enable_layer_6 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_6_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_6_label[0]", "Triplanar Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_6_color", str(triplanar_selector))
+    if not triplanar_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_6", False)
     # Attach scope blend
-    multi_blend_tx.attrs.enable_layer_7 = True
-    multi_blend_tx.attrs.layer_7_mode = 1
-    multi_blend_tx.attrs.layer_7_label[0] = "Scope Blend"
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_7_color"], str(scope_selector))
-    if not scope_blend: multi_blend_tx.attrs.enable_layer_7 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_7_mode", 1)
+    cmds.set_value(str(multi_blend_tx) + ".layer_7_label[0]", "Scope Blend")
+    cmds.set_texture(str(multi_blend_tx) + ".layer_7_color", str(scope_selector))
+    if not scope_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_7", False)
     # Attach fractal blend
-    multi_blend_tx.attrs.enable_layer_8 = True
-    multi_blend_tx.attrs.layer_8_label[0] = "Fractal Blend"
-    multi_blend_tx.attrs.layer_8_mode = 4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1
-    ix.cmds.SetTexture([str(multi_blend_tx) + ".layer_8_color"], str(fractal_selector))
-    if not fractal_blend: multi_blend_tx.attrs.enable_layer_8 = False
+    cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", True)
+    cmds.set_value(str(multi_blend_tx) + ".layer_8_label[0]", "Fractal Blend")
+    cmds.set_value(str(multi_blend_tx) + ".layer_8_mode",
+                   4 if True in [ao_blend, height_blend, slope_blend, scope_blend] else 1)
+    cmds.set_texture(str(multi_blend_tx) + ".layer_8_color", str(fractal_selector))
+    if not fractal_blend: cmds.set_value(str(multi_blend_tx) + ".enable_layer_8", False)
 
     for blend_node in blend_nodes:
-        ix.cmds.SetTexture([str(blend_node) + ".mix"], str(multi_blend_tx))
+        cmds.set_texture(str(blend_node) + ".mix", str(multi_blend_tx))
 
     logging.debug("Done adding selectors!!!")
     return multi_blend_tx
 
 
+@profiled
+@buffer_commands
 def create_tiled_terrain(divisions_x, divisions_y, ctx=None, tile_flip_x=False, tile_flip_y=False,
                          tile_pattern=r".*_x(?P<tile_x>\d+)_y(?P<tile_y>\d+)\.", **kwargs):
     """Generates a tiled displaced terrain from the selected heightmap."""
     logging.debug("Generating tiled terrain...")
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not ctx:
         ctx = ix.application.get_working_context()
     if not check_context(ctx, ix=ix):
@@ -942,10 +1012,11 @@ def create_tiled_terrain(divisions_x, divisions_y, ctx=None, tile_flip_x=False,
                                               position=position, **kwargs)
                 tiles.append(terrain_tile)
 
+    cmds.barrier()
     terrain_root_ctrl = ix.cmds.CombineItems(tiles, str(terrain_ctx))
     ix.cmds.RenameItem(str(terrain_root_ctrl), 'terrain_master_ctrl')
-    ix.cmds.SetValue(str(terrain_root_ctrl) + ".display_pickable", ['0'])
-    ix.cmds.SetValue(str(terrain_root_ctrl) + ".highlight_mode", ['1'])
+    cmds.set_value(str(terrain_root_ctrl) + ".display_pickable", '0')
+    cmds.set_value(str(terrain_root_ctrl) + ".highlight_mode", '1')
     # Proxy switch boolean
     # ix.cmds.CreateCustomAttribute([str(terrain_root_ctrl)], "show_tiles", 0,
     #                               ["container", "vhint", "group", "count", "allow_expression"],
@@ -960,9 +1031,9 @@ def create_tiled_terrain(divisions_x, divisions_y, ctx=None, tile_flip_x=False,
     # ix.cmds.SetValue(str(terrain_root_ctrl) + ".lod_radius", ['1024'])
 
     # terrain_root_ctrl = ix.cmds.CreateObject("terrain_master_ctrl", "Locator", "Global", str(terrain_ctx))
-    ix.application.check_for_events()
+    pump_events(ix, 'create_tiled_terrain', required=True)
     for tile in tiles:
-        ix.cmds.SetValue(str(tile) + ".unseen_by_renderer", ['1'])
+        cmds.set_value(str(tile) + ".unseen_by_renderer", '1')
         ix.cmds.LockAttributes([str(tile) + ".translate"], True)
         ix.cmds.LockAttributes([str(tile) + ".rotate"], True)
         ix.cmds.LockAttributes([str(tile) + ".scale"], True)
@@ -989,6 +1060,8 @@ def create_tiled_terrain(divisions_x, divisions_y, ctx=None, tile_flip_x=False,
     return terrain_root_ctrl
 
 
+@profiled
+@buffer_commands
 def create_terrain(heightmap_file, terrain_name='terrain', ctx=None,
                    dimensions=('2048', '2048', '400'),
                    stream=True,
@@ -1007,6 +1080,7 @@ def create_terrain(heightmap_file, terrain_name='terrain', ctx=None,
     """Generates a displaced terrain from the selected heightmap. Dimensions are stored as [w,l,h]."""
     logging.debug("Generating terrain...")
     ix = get_ix(kwargs.get("ix"))
+    cmds = get_command_buffer(ix)
     if not ctx:
         ctx = ix.application.get_working_context()
     if not check_context(ctx, ix=ix):
@@ -1034,25 +1108,27 @@ def create_terrain(heightmap_file, terrain_name='terrain', ctx=None,
             proxy_spans_x = int(float(dimensions[0]) / (dimensions[1]) * proxy_spans)
 
     terrain_geo = ix.cmds.CreateObject("terrain_geo", "GeometryPolygrid", "Global", str(terrain_ctx))
-    ix.cmds.SetValue(str(terrain_geo) + ".displacement_adaptive_span_count", [str(adaptive_spans)])
-    ix.cmds.SetValue(str(terrain_geo) + ".size[0]", [str(dimensions[0])])
-    ix.cmds.SetValue(str(terrain_geo) + ".size[1]", [str(dimensions[1])])
-    ix.cmds.SetValue(str(terrain_geo) + ".spans[0]", [str(spans_x)])
-    ix.cmds.SetValue(str(terrain_geo) + ".spans[1]", [str(spans_y)])
-    ix.cmds.SetValue(str(terrain_geo) + ".unseen_by_renderer", [str(1)])
-    ix.cmds.SetValue(str(terrain_geo) + ".display_visible", [str(0)])
+    cmds.set_value(str(terrain_geo) + ".displacement_adaptive_span_count", adaptive_spans)
+    cmds.set_value(str(terrain_geo) + ".size[0]", dimensions[0])
+    cmds.set_value(str(terrain_geo) + ".size[1]", dimensions[1])
+    cmds.set_value(str(terrain_geo) + ".spans[0]", spans_x)
+    cmds.set_value(str(terrain_geo) + ".spans[1]", spans_y)
+    cmds.set_value(str(terrain_geo) + ".unseen_by_renderer", 1)
+    cmds.set_value(str(terrain_geo) + ".display_visible", 0)
     terrain_geo_items.append(terrain_geo)
 
     if generate_proxy:
+        # The proxy is instanced with the values set on the terrain so far.
+        cmds.barrier()
         proxy_geo = ix.cmds.Instantiate([str(terrain_geo)])[0]
         ix.cmds.LocalizeAttributes([str(proxy_geo) + ".displacement_adaptive_span_count", str(proxy_geo) + ".spans"],
                                    True)
-        ix.cmds.SetValue(str(proxy_geo) + ".displacement_adaptive_span_count", [str(int(proxy_adaptive_spans))])
-        ix.cmds.SetValue(str(proxy_geo) + ".spans[0]", [str(proxy_spans_x)])
-        ix.cmds.SetValue(str(proxy_geo) + ".spans[1]", [str(proxy_spans_y)])
-        ix.application.check_for_events()
+        cmds.set_value(str(proxy_geo) + ".displacement_adaptive_span_count", int(proxy_adaptive_spans))
+        cmds.set_value(str(proxy_geo) + ".spans[0]", proxy_spans_x)
+        cmds.set_value(str(proxy_geo) + ".spans[1]", proxy_spans_y)
+        pump_events(ix, 'create_terrain', required=True)
         ix.cmds.RenameItem(str(proxy_geo), 'proxy_geo')
-        ix.application.check_for_events()
+        pump_events(ix, 'create_terrain')
         terrain_geo_items.append(proxy_geo)
     else:
         proxy_geo = None
@@ -1063,93 +1139,51 @@ def create_terrain(heightmap_file, terrain_name='terrain', ctx=None,
         if displacement_mode == 0:
             reorder_tx = ix.cmds.CreateObject('heightmap' + SINGLE_CHANNEL_SUFFIX, "TextureReorder",
                                               "Global", str(terrain_ctx))
-            ix.cmds.SetValue(str(reorder_tx) + ".channel_order[0]", ["rrr1"])
-            ix.cmds.SetTexture([str(reorder_tx) + ".input"], str(tx))
-        attrs = ix.api.CoreStringArray(6)
-        attrs[0] = str(tx) + ".interpolation_mode"
-        attrs[1] = str(tx) + ".mipmap_mode"
-        attrs[2] = str(tx) + ".u_repeat_mode"
-        attrs[3] = str(tx) + ".v_repeat_mode"
-        attrs[4] = str(tx) + ".use_raw_data"
-        attrs[5] = str(tx) + ".filename"
-        values = ix.api.CoreStringArray(6)
-        values[0] = str(3)
-        values[1] = str(3)
-        values[2] = str(2 if repeat == 'edge' else 3)
-        values[3] = str(2 if repeat == 'edge' else 3)
-        values[4] = str(1)
-        values[5] = r'{}'.format(heightmap_file)
-        ix.cmds.SetValues(attrs, values)
+            cmds.set_value(str(reorder_tx) + ".channel_order[0]", "rrr1")
+            cmds.set_texture(str(reorder_tx) + ".input", str(tx))
+        cmds.set_value(str(tx) + ".interpolation_mode", 3)
+        cmds.set_value(str(tx) + ".mipmap_mode", 3)
+        cmds.set_value(str(tx) + ".u_repeat_mode", 2 if repeat == 'edge' else 3)
+        cmds.set_value(str(tx) + ".v_repeat_mode", 2 if repeat == 'edge' else 3)
+        cmds.set_value(str(tx) + ".use_raw_data", 1)
+        cmds.set_value(str(tx) + ".filename", r'{}'.format(heightmap_file))
     else:
         tx = ix.cmds.CreateObject('heightmap', "TextureMapFile", "Global", str(terrain_ctx))
-        attrs = ix.api.CoreStringArray(5)
-        attrs[0] = str(tx) + ".single_channel_file_behavior"
-        attrs[1] = str(tx) + ".u_repeat_mode"
-        attrs[2] = str(tx) + ".v_repeat_mode"
-        attrs[3] = str(tx) + ".use_raw_data"
-        attrs[4] = str(tx) + ".filename"
-        values = ix.api.CoreStringArray(5)
-        values[0] = str(1)
-        values[1] = str(1 if repeat == 'edge' else 0)
-        values[2] = str(1 if repeat == 'edge' else 0)
-        values[3] = str(1)
-        values[4] = r'{}'.format(heightmap_file)
-        ix.cmds.SetValues(attrs, values)
+        cmds.set_value(str(tx) + ".single_channel_file_behavior", 1)
+        cmds.set_value(str(tx) + ".u_repeat_mode", 1 if repeat == 'edge' else 0)
+        cmds.set_value(str(tx) + ".v_repeat_mode", 1 if repeat == 'edge' else 0)
+        cmds.set_value(str(tx) + ".use_raw_data", 1)
+        cmds.set_value(str(tx) + ".filename", r'{}'.format(heightmap_file))
 
     # set projection scale
     if 1 not in [u_scale, v_scale]:
-        attrs = ix.api.CoreStringArray(4)
-        attrs[0] = str(tx) + ".uv_translate[0]"
-        attrs[1] = str(tx) + ".uv_translate[1]"
-        attrs[2] = str(tx) + ".uv_scale[0]"
-        attrs[3] = str(tx) + ".uv_scale[1]"
-        values = ix.api.CoreStringArray(4)
-        values[0] = str(u_offset)
-        values[1] = str(v_offset)
-        values[2] = str(u_scale)
-        values[3] = str(v_scale)
-        ix.cmds.SetValues(attrs, values)
+        cmds.set_value(str(tx) + ".uv_translate[0]", u_offset)
+        cmds.set_value(str(tx) + ".uv_translate[1]", v_offset)
+        cmds.set_value(str(tx) + ".uv_scale[0]", u_scale)
+        cmds.set_value(str(tx) + ".uv_scale[1]", v_scale)
 
     if animated:
-        ix.cmds.SetValue(str(tx) + ".sequence_mode", [str(1)])
+        cmds.set_value(str(tx) + ".sequence_mode", 1)
+        cmds.barrier()
         tx.call_action("detect_sequence")
-        ix.application.check_for_events()
-        ix.cmds.SetValue(str(tx) + ".pre_behavior", [str(2)])
-        ix.cmds.SetValue(str(tx) + ".post_behavior", [str(2)])
+        pump_events(ix, 'create_terrain', required=True)
+        cmds.set_value(str(tx) + ".pre_behavior", 2)
+        cmds.set_value(str(tx) + ".post_behavior", 2)
 
     disp = ix.cmds.CreateObject(terrain_name + DISPLACEMENT_MAP_SUFFIX, "Displacement",
                                 "Global", str(terrain_ctx))
-    attrs = ix.api.CoreStringArray(6)
-    attrs[0] = str(disp) + ".bound[0]"
-    attrs[1] = str(disp) + ".bound[1]"
-    attrs[2] = str(disp) + ".bound[2]"
-    attrs[3] = str(disp) + ".front_value"
-    attrs[4] = str(disp) + ".front_offset"
-    attrs[5] = str(disp) + ".front_direction"
-    values = ix.api.CoreStringArray(6)
-    values[0] = str(dimensions[2] * 1.1)
-    values[1] = str(dimensions[2] * 1.1)
-    values[2] = str(dimensions[2] * 1.1)
-    values[3] = str(dimensions[2])
-    values[4] = str(-0.5 if use_midpoint else 0)
-    values[5] = str(displacement_mode)
-    ix.cmds.SetValues(attrs, values)
-    ix.application.check_for_events()
-    ix.cmds.SetTexture([str(disp) + ".front_value"], str(reorder_tx if reorder_tx else tx))
+    cmds.set_value(str(disp) + ".bound", [dimensions[2] * 1.1] * 3)
+    cmds.set_value(str(disp) + ".front_value", dimensions[2])
+    cmds.set_value(str(disp) + ".front_offset", -0.5 if use_midpoint else 0)
+    cmds.set_value(str(disp) + ".front_direction", displacement_mode)
+    pump_events(ix, 'create_terrain')
+    cmds.set_texture(str(disp) + ".front_value", str(reorder_tx if reorder_tx else tx))
 
     if generate_proxy:
         switcher_grp = ix.cmds.CreateObject(terrain_name + GROUP_SUFFIX, "Group", "Global", str(terrain_ctx))
         terrain_ctrl = ix.cmds.CombineItems([str(switcher_grp)], str(terrain_ctx))
         ix.cmds.RenameItem(str(terrain_ctrl), 'terrain_ctrl')
-        attrs = ix.api.CoreStringArray(3)
-        attrs[0] = str(terrain_ctrl) + ".translate_offset[0]"
-        attrs[1] = str(terrain_ctrl) + ".translate_offset[1]"
-        attrs[2] = str(terrain_ctrl) + ".translate_offset[2]"
-        values = ix.api.CoreStringArray(3)
-        values[0] = str(position[0])
-        values[1] = str(position[1])
-        values[2] = str(position[2])
-        ix.cmds.SetValues(attrs, values)
+        cmds.set_value(str(terrain_ctrl) + ".translate_offset", list(position))
 
         # Proxy switch boolean
         ix.cmds.CreateCustomAttribute([str(terrain_ctrl)], "proxy", 0,
@@ -1197,42 +1231,42 @@ def create_terrain(heightmap_file, terrain_name='terrain', ctx=None,
                                       ["container", "vhint", "group", "count", "allow_expression"],
                                       ["CONTAINER_SINGLE", "VISUAL_HINT_DEFAULT", "Terrain", "1", "0"])
 
-        ix.cmds.SetValue(str(terrain_ctrl) + ".proxy", [str(1)])
+        cmds.set_value(str(terrain_ctrl) + ".proxy", 1)
         # ix.cmds.SetValue(str(terrain_ctrl) + ".proxy_control_by_lod", [str(0)])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".filename", [heightmap_file])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".terrain_width", [str(dimensions[0])])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".terrain_length", [str(dimensions[1])])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".terrain_height", [str(dimensions[2])])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".adaptive_spans", [str(adaptive_spans)])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".spans_x", [str(spans_x)])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".spans_y", [str(spans_y)])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".proxy_adaptive_spans", [str(int(proxy_adaptive_spans))])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".proxy_spans_x", [str(int(proxy_spans_x))])
-        ix.cmds.SetValue(str(terrain_ctrl) + ".proxy_spans_y", [str(int(proxy_spans_y))])
-
-        ix.application.check_for_events()
-        ix.cmds.SetExpression([str(switcher_grp) + ".inclusion_rule[0]"],
-                              ["get_double('terrain_ctrl.proxy') == 0 ? './terrain_geo' : './proxy_geo'"])
-        ix.cmds.SetExpression([str(terrain_geo) + ".size[0]"],
-                              ["get_double('terrain_ctrl.terrain_width')"])
-        ix.cmds.SetExpression([str(terrain_geo) + ".size[1]"],
-                              ["get_double('terrain_ctrl.terrain_length')"])
-        ix.cmds.SetExpression([str(disp) + ".front_value"],
-                              ["get_double('terrain_ctrl.terrain_height')"])
-        ix.cmds.SetExpression([str(tx) + ".filename"],
-                              ["get_string('terrain_ctrl.filename')"])
-        ix.cmds.SetExpression([str(terrain_geo) + ".displacement_adaptive_span_count"],
-                              ["get_double('terrain_ctrl.adaptive_spans')"])
-        ix.cmds.SetExpression([str(terrain_geo) + ".spans[0]"],
-                              ["get_double('terrain_ctrl.spans_x')"])
-        ix.cmds.SetExpression([str(terrain_geo) + ".spans[1]"],
-                              ["get_double('terrain_ctrl.spans_y')"])
-        ix.cmds.SetExpression([str(proxy_geo) + ".displacement_adaptive_span_count"],
-                              ["get_double('terrain_ctrl.proxy_adaptive_spans')"])
-        ix.cmds.SetExpression([str(proxy_geo) + ".spans[0]"],
-                              ["get_double('terrain_ctrl.proxy_spans_x')"])
-        ix.cmds.SetExpression([str(proxy_geo) + ".spans[1]"],
-                              ["get_double('terrain_ctrl.proxy_spans_y')"])
+        cmds.set_value(str(terrain_ctrl) + ".filename", heightmap_file)
+        cmds.set_value(str(terrain_ctrl) + ".terrain_width", dimensions[0])
+        cmds.set_value(str(terrain_ctrl) + ".terrain_length", dimensions[1])
+        cmds.set_value(str(terrain_ctrl) + ".terrain_height", dimensions[2])
+        cmds.set_value(str(terrain_ctrl) + ".adaptive_spans", adaptive_spans)
+        cmds.set_value(str(terrain_ctrl) + ".spans_x", spans_x)
+        cmds.set_value(str(terrain_ctrl) + ".spans_y", spans_y)
+        cmds.set_value(str(terrain_ctrl) + ".proxy_adaptive_spans", int(proxy_adaptive_spans))
+        cmds.set_value(str(terrain_ctrl) + ".proxy_spans_x", int(proxy_spans_x))
+        cmds.set_value(str(terrain_ctrl) + ".proxy_spans_y", int(proxy_spans_y))
+
+        pump_events(ix, 'create_terrain')
+        cmds.set_expression(str(switcher_grp) + ".inclusion_rule[0]",
+                            "get_double('terrain_ctrl.proxy') == 0 ? './terrain_geo' : './proxy_geo'")
+        cmds.set_expression(str(terrain_geo) + ".size[0]",
+                            "get_double('terrain_ctrl.terrain_width')")
+        cmds.set_expression(str(terrain_geo) + ".size[1]",
+                            "get_double('terrain_ctrl.terrain_length')")
+        cmds.set_expression(str(disp) + ".front_value",
+                            "get_double('terrain_ctrl.terrain_height')")
+        cmds.set_expression(str(tx) + ".filename",
+                            "get_string('terrain_ctrl.filename')")
+        cmds.set_expression(str(terrain_geo) + ".displacement_adaptive_span_count",
+                            "get_double('terrain_ctrl.adaptive_spans')")
+        cmds.set_expression(str(terrain_geo) + ".spans[0]",
+                            "get_double('terrain_ctrl.spans_x')")
+        cmds.set_expression(str(terrain_geo) + ".spans[1]",
+                            "get_double('terrain_ctrl.spans_y')")
+        cmds.set_expression(str(proxy_geo) + ".displacement_adaptive_span_count",
+                            "get_double('terrain_ctrl.proxy_adaptive_spans')")
+        cmds.set_expression(str(proxy_geo) + ".spans[0]",
+                            "get_double('terrain_ctrl.proxy_spans_x')")
+        cmds.set_expression(str(proxy_geo) + ".spans[1]",
+                            "get_double('terrain_ctrl.proxy_spans_y')")
     else:
         terrain_ctrl = terrain_geo
 
@@ -0,0 +1,154 @@
+#!/usr/bin/env python2
+"""
+Converts the textures of a whole library without starting Clarisse.
+Textures are picked with the same classification as the importers and converted with the maketx or iconvert
+executables of a Clarisse installation. Conversions are recorded in the conversion manifests,
+so an interrupted run continues where it stopped when it's started again.
+
+Usage:
+    csk_batch_convert <library_dir> --clarisse-bin-dir <dir> [--extension tx] [--workers 4] [--report report.json]
+"""
+import argparse
+import collections
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+import multiprocessing.dummy as mp
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.utility import get_textures_from_files, get_stream_map_files, get_texture_classifier, \
+    get_conversion_files
+from clarisse_survival_kit.conversion import ConversionQueue, ConversionManifests, build_converter_command
+
+REPORT_FILENAME = 'csk_conversion_report.json'
+
+
+def get_library_textures(library_dir, extension, resolution=None, udim_only=False):
+    """
+    Yields the textures of every directory in the library like get_textures_from_directory would pick them.
+    Files that already have the target extension are not picked. UDIM textures are returned with the <UDIM> token.
+    """
+    image_formats = tuple(f for f in IMAGE_FORMATS if f != extension)
+    classifier = get_texture_classifier()
+    for root, dirs, filenames in os.walk(library_dir):
+        dirs.sort()
+        textures = get_textures_from_files([os.path.join(root, f) for f in filenames], image_formats=image_formats,
+                                           resolution=resolution)
+        if not textures:
+            continue
+        stream_map_files = get_stream_map_files(textures)
+        for key, texture in sorted(textures.items()):
+            if key in stream_map_files:
+                texture = os.path.join(os.path.dirname(texture),
+                                       classifier.to_udim_filename(os.path.basename(texture)))
+            elif udim_only:
+                continue
+            yield texture
+
+
+def get_report(jobs, args, elapsed):
+    """Returns the report of the finished jobs with the totals of the run."""
+    results = [job.to_dict() for job in jobs]
+    converted = [r for r in results if r['success'] and not r['skipped']]
+    totals = {
+        'jobs': len(results),
+        'converted': len(converted),
+        'skipped': len([r for r in results if r['skipped']]),
+        'failed': len([r for r in results if not r['success'] and not r['skipped']]),
+        'source_bytes': sum(r['source_bytes'] or 0 for r in converted),
+        'target_bytes': sum(r['target_bytes'] or 0 for r in converted),
+        'conversion_seconds': round(sum(r['elapsed'] for r in converted), 3),
+        'elapsed': round(elapsed, 3),
+        'states': dict(collections.Counter(r['status'] or 'converted' for r in results)),
+    }
+    return {
+        'library_dir': os.path.abspath(args.library_dir),
+        'extension': args.extension,
+        'clarisse_bin_dir': args.clarisse_bin_dir,
+        'workers': args.workers,
+        'threads': args.threads,
+        'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'totals': totals,
+        'jobs': results,
+    }
+
+
+def write_report(report, path):
+    """Writes the report next to its final location first so a crash can't leave a truncated report."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert the textures of a library with the Clarisse converters.')
+    parser.add_argument('library_dir')
+    parser.add_argument('--clarisse-bin-dir', default=os.environ.get('CLARISSE_BIN_DIR'),
+                        help='Directory of the maketx and iconvert executables. Defaults to $CLARISSE_BIN_DIR.')
+    parser.add_argument('--extension', default='tx', help='Extension of the converted files.')
+    parser.add_argument('--target-folder',
+                        help='Write the converted files to this folder instead of next to the source.')
+    parser.add_argument('--resolution', help='Only convert textures with this resolution in their filename.')
+    parser.add_argument('--udim-only', action='store_true', help='Only convert UDIM textures.')
+    parser.add_argument('--workers', type=int, default=CONVERSION_MAX_PROCESSES,
+                        help='Number of converters that run at the same time.')
+    parser.add_argument('--threads', type=int, default=CONVERSION_THREAD_BUDGET or mp.cpu_count(),
+                        help='Number of threads shared by the converters.')
+    parser.add_argument('--force', action='store_true', help='Convert files that did not change since the last run.')
+    parser.add_argument('--verify-only', action='store_true', help='Only report the state of the converted files.')
+    parser.add_argument('--report', help='Path of the JSON report. Defaults to %s in the library.' % REPORT_FILENAME)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format='%(message)s')
+    if not os.path.isdir(args.library_dir):
+        parser.error('Library directory does not exist: ' + args.library_dir)
+    if not args.clarisse_bin_dir:
+        parser.error('Pass --clarisse-bin-dir or set CLARISSE_BIN_DIR.')
+    report_path = args.report or os.path.join(args.library_dir, REPORT_FILENAME)
+
+    command_string, env = build_converter_command(args.extension, args.clarisse_bin_dir)
+    manifests = None
+    if (CONVERSION_MANIFEST_ENABLED and not args.force) or args.verify_only:
+        manifests = ConversionManifests()
+    queue = ConversionQueue()
+    for texture in get_library_textures(args.library_dir, args.extension, resolution=args.resolution,
+                                        udim_only=args.udim_only):
+        for source, target in get_conversion_files(texture, args.extension, target_folder=args.target_folder):
+            queue.add(source, target, command_string, env=env)
+    print "Found %i files to convert in %s" % (len(queue), args.library_dir)
+
+    start = time.time()
+    batch = queue.start(thread_budget=args.threads, max_processes=args.workers, manifests=manifests,
+                        verify_only=args.verify_only)
+    finished = []
+    try:
+        # The timeout of on_wait keeps the main thread responsive to Ctrl+C.
+        for job in batch.wait(on_wait=lambda: None):
+            finished.append(job)
+            print "[%i/%i] %s" % (len(finished), len(batch.jobs), str(job))
+    except KeyboardInterrupt:
+        print "Interrupted. Finished conversions are kept and skipped on the next run."
+    finally:
+        batch.cancel()
+
+    report = get_report(finished, args, time.time() - start)
+    write_report(report, report_path)
+    totals = report['totals']
+    print "Converted %i, skipped %i, failed %i of %i files in %.2fs" % (totals['converted'], totals['skipped'],
+                                                                        totals['failed'], len(batch.jobs),
+                                                                        totals['elapsed'])
+    print "Report written to " + report_path
+    if not all(job.success for job in batch.jobs):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,802 @@
+#!/usr/bin/env python2
+"""
+Micro-benchmarks for the kit. These run outside of Clarisse, ix is replaced by the FakeIx of fake_ix.
+
+Usage:
+    python -m clarisse_survival_kit.benchmark classifier --count 1000000
+    python -m clarisse_survival_kit.benchmark commands --count 100
+    python -m clarisse_survival_kit.benchmark scan --count 1000
+    python -m clarisse_survival_kit.benchmark contexts --count 5000
+    python -m clarisse_survival_kit.benchmark logging --count 100 --latency 0.00005
+    python -m clarisse_survival_kit.benchmark templates --count 100 --latency 0.0005
+    python -m clarisse_survival_kit.benchmark import --count 5 --latency 0.0005 --report import.json
+"""
+import __builtin__
+import argparse
+import collections
+import functools
+import glob
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import StringIO
+import sys
+import tempfile
+import threading
+import time
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.utility import get_texture_classifier
+from clarisse_survival_kit import command_buffer
+from clarisse_survival_kit import scan
+from clarisse_survival_kit import scan_index
+from clarisse_survival_kit.connection_index import get_connection_index
+from clarisse_survival_kit.event_pump import get_event_pump
+from clarisse_survival_kit.fake_ix import FakeIx, FakeItem, LatencyModel
+from clarisse_survival_kit.library_generator import generate_library
+
+SYNTHETIC_MAP_NAMES = ['Albedo', 'Diffuse', 'baseColor', 'Specular', 'Roughness', 'Gloss', 'Normal', 'NormalBump',
+                       'Bump', 'Opacity', 'Translucency', 'Displacement', 'AO', 'Cavity', 'Metalness', 'Preview',
+                       'Fuzz', 'Mask']
+
+
+def generate_texture_filenames(count, seed=0):
+    """Returns a deterministic list of Megascans, Substance and UDIM style filenames without extension."""
+    rng = random.Random(seed)
+    filenames = []
+    for i in range(count):
+        map_name = rng.choice(SYNTHETIC_MAP_NAMES)
+        style = rng.randint(0, 3)
+        if style == 0:
+            filename = 'rock_%s_%s_%s' % (i, rng.choice(IMAGE_RESOLUTIONS), map_name)
+        elif style == 1:
+            filename = 'rock_%s_%s_%s_LOD%i' % (i, rng.choice(IMAGE_RESOLUTIONS), map_name, rng.randint(0, 5))
+        elif style == 2:
+            filename = 'asset%s_%s.%i' % (i, map_name.lower(), 1001 + rng.randint(0, 99))
+        else:
+            filename = map_name.lower()
+        filenames.append(filename)
+    return filenames
+
+
+def classify_legacy(filename, filename_match_template=FILENAME_MATCH_TEMPLATE, lod_match_template=LOD_MATCH_TEMPLATE):
+    """The pattern loop get_textures_from_directory used before the TextureClassifier."""
+    roles = []
+    lod_level = None
+    for key, pattern in filename_match_template.iteritems():
+        match = re.search(pattern, filename, re.IGNORECASE)
+        if match:
+            roles.append(key)
+            lod_match = re.search(lod_match_template, filename, re.IGNORECASE)
+            if lod_match:
+                lod_level = int(lod_match.group('lod')) if lod_match.group('lod') else -1
+    return roles, lod_level
+
+
+def benchmark_classifier(count=1000000, seed=0):
+    """Compares the single pass TextureClassifier with the legacy per pattern loop."""
+    print "Generating %i synthetic filenames..." % count
+    filenames = generate_texture_filenames(count, seed=seed)
+
+    start = time.time()
+    legacy_results = [classify_legacy(filename) for filename in filenames]
+    legacy_time = time.time() - start
+
+    start = time.time()
+    classifier = get_texture_classifier()
+    classify = classifier.classify
+    results = [classify(filename) for filename in filenames]
+    classifier_time = time.time() - start
+
+    mismatches = 0
+    for legacy_result, result in zip(legacy_results, results):
+        legacy_roles, legacy_lod = legacy_result
+        if set(legacy_roles) != set(result.roles) or (legacy_roles and legacy_lod != result.lod):
+            mismatches += 1
+
+    print "Legacy loop:       %.3fs (%.2f us/file)" % (legacy_time, legacy_time / count * 1000000)
+    print "TextureClassifier: %.3fs (%.2f us/file)" % (classifier_time, classifier_time / count * 1000000)
+    print "Speedup:           %.2fx" % (legacy_time / classifier_time if classifier_time else 0)
+    print "Mismatches:        %i" % mismatches
+    return {'legacy': legacy_time, 'classifier': classifier_time, 'mismatches': mismatches}
+
+
+def build_commands_scene(ix, count):
+    """Builds count surfaces with every texture and a set of selectors for each of them."""
+    from clarisse_survival_kit.surface import Surface
+    from clarisse_survival_kit import selectors
+
+    textures = dict((index, '/library/rock_%s.exr' % index) for index in TEXTURE_SETTINGS if index != 'preview')
+    for i in range(count):
+        with command_buffer.get_command_buffer(ix):
+            surface = Surface(ix, projection='triplanar', uv_scale=(2, 2))
+            ctx = ix.application.get_working_context()
+            surface.create_mtl('surface%i' % i, ctx)
+            surface.create_textures(textures, {}, clip_opacity=True)
+            selectors.create_height_selector(ctx, 'mix%i' % i, '_height', ix)
+            selectors.create_slope_selector(ctx, 'mix%i' % i, '_slope', ix)
+            selectors.create_ao_selector(ctx, 'mix%i' % i, '_ao', ix)
+            selectors.create_triplanar_selector(ctx, 'mix%i' % i, '_triplanar', ix)
+            selectors.create_fractal_selector(ctx, 'mix%i' % i, '_fractal', ix)
+
+
+def benchmark_commands(count=100, seed=0):
+    """
+    Compares the number of ix.cmds calls and event dispatches of the builders with and without the command buffer
+    and the event pump throttling.
+    """
+    results = {}
+    enabled = command_buffer.COMMAND_BUFFER_ENABLED
+    try:
+        for label, buffered in (('unbuffered', False), ('buffered', True)):
+            command_buffer.COMMAND_BUFFER_ENABLED = buffered
+            ix = FakeIx()
+            if not buffered:
+                get_event_pump(ix).interval = 0
+            random.seed(seed)
+            start = time.time()
+            build_commands_scene(ix, count)
+            results[label] = (ix.calls, time.time() - start)
+    finally:
+        command_buffer.COMMAND_BUFFER_ENABLED = enabled
+
+    setters = ('SetValues', 'SetValue', 'SetTexture', 'SetExpression')
+    print "Built %i surfaces with selectors" % count
+    for label in ('unbuffered', 'buffered'):
+        calls, elapsed = results[label]
+        print "%-11s %6i calls, %6i setter calls (%s) in %.3fs" % (
+            label + ':', sum(calls.values()), sum(calls[name] for name in setters),
+            ', '.join('%s %i' % (name, calls[name]) for name in setters if calls[name]), elapsed)
+    before = sum(results['unbuffered'][0][name] for name in setters)
+    after = sum(results['buffered'][0][name] for name in setters)
+    print "Setter calls:  %.2fx fewer" % (float(before) / after if after else 0)
+    print "Event pumps:   %i before, %i after" % (results['unbuffered'][0]['check_for_events'],
+                                                  results['buffered'][0]['check_for_events'])
+    return dict((label, dict(calls)) for label, (calls, elapsed) in results.items())
+
+
+SYNTHETIC_ASSET_TYPES = ('surface', '3d', '3dplant', 'atlas', 'substance')
+
+
+class FilesystemCounter(object):
+    """
+    Counts the filesystem calls made while the counter is active. Only the outermost call is counted,
+    the os.listdir that glob.glob makes isn't. Works across threads.
+    """
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.originals = []
+
+    def get_targets(self):
+        targets = [(os, 'listdir'), (os, 'stat'), (os.path, 'isdir'), (os.path, 'isfile'), (os.path, 'exists'),
+                   (os.path, 'getmtime'), (os.path, 'getsize'), (glob, 'glob'), (__builtin__, 'open')]
+        if scan.scandir:
+            targets.append((scan, 'scandir'))
+        return targets
+
+    def _wrap(self, module, name):
+        func = getattr(module, name)
+        label = name if module is __builtin__ else 'os.path.' + name if module is os.path else \
+            '%s.%s' % (module.__name__, name)
+
+        @functools.wraps(func)
+        def counted(*args, **kwargs):
+            depth = getattr(self.local, 'depth', 0)
+            if not depth:
+                with self.lock:
+                    self.calls[label] += 1
+            self.local.depth = depth + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.local.depth = depth
+
+        self.originals.append((module, name, func))
+        setattr(module, name, counted)
+
+    def __enter__(self):
+        for module, name in self.get_targets():
+            self._wrap(module, name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for module, name, func in reversed(self.originals):
+            setattr(module, name, func)
+        self.originals = []
+        return False
+
+
+def _import_assets(ix, asset_directories):
+    from clarisse_survival_kit.app import import_controller
+    for asset_directory in asset_directories:
+        import_controller(asset_directory, ix=ix)
+
+
+def _get_asset_ctx(ix, asset_directory):
+    return ix.item_exists(str(ix.application.get_working_context()) + '/' + os.path.basename(asset_directory))
+
+
+def setup_import_controller(ix, library):
+    asset_directories = [d for asset_type in SYNTHETIC_ASSET_TYPES for d in library['assets'][asset_type]]
+    return lambda: _import_assets(ix, asset_directories)
+
+
+def setup_import_ms_library(ix, library):
+    from clarisse_survival_kit.providers.megascans import import_ms_library
+    return lambda: import_ms_library(library['directory'], ix=ix)
+
+
+def setup_replace_surface(ix, library):
+    """Replaces the first surface with every other surface in turn."""
+    from clarisse_survival_kit.app import replace_surface
+    surfaces = library['assets']['surface']
+    _import_assets(ix, surfaces[:1])
+    ctx = _get_asset_ctx(ix, surfaces[0])
+
+    def operation():
+        for surface_directory in surfaces[1:]:
+            replace_surface(ctx, surface_directory, ix=ix)
+    return operation
+
+
+def setup_swap_resolution(ix, library):
+    """Switches every surface to each of its resolutions with replace_surface."""
+    from clarisse_survival_kit.app import replace_surface
+    surfaces = library['assets']['surface']
+    _import_assets(ix, surfaces)
+    swaps = []
+    for surface_directory in surfaces:
+        resolutions = set()
+        for filename in os.listdir(surface_directory):
+            match = re.search(RESOLUTION_MATCH_TEMPLATE, filename, re.IGNORECASE)
+            if match:
+                resolutions.add(match.group('resolution'))
+        ctx = _get_asset_ctx(ix, surface_directory)
+        swaps.extend((ctx, surface_directory, resolution) for resolution in sorted(resolutions))
+
+    def operation():
+        for ctx, surface_directory, resolution in swaps:
+            replace_surface(ctx, surface_directory, resolution=resolution, ix=ix)
+    return operation
+
+
+def setup_mix_surfaces(ix, library):
+    """Mixes every surface with the last one. Each base surface is assigned to a geometry."""
+    from clarisse_survival_kit.app import mix_surfaces
+    from clarisse_survival_kit.utility import get_mtl_from_context
+    surfaces = library['assets']['surface']
+    _import_assets(ix, surfaces)
+    srf_ctxs = [_get_asset_ctx(ix, d) for d in surfaces[:-1]]
+    for i, srf_ctx in enumerate(srf_ctxs):
+        geometry = ix.cmds.CreateObject('geometry%i' % i, 'GeometryPolygrid', 'Global', str(srf_ctx.get_parent()))
+        geometry.get_module().assign_material(get_mtl_from_context(srf_ctx, ix=ix).get_module(), 0)
+    cover_ctx = _get_asset_ctx(ix, surfaces[-1])
+    return lambda: mix_surfaces(srf_ctxs, cover_ctx, ix=ix)
+
+
+def setup_create_tiled_terrain(ix, library):
+    """Creates a terrain of count x count tiles."""
+    from clarisse_survival_kit.app import create_tiled_terrain
+    divisions = library['count']
+    return lambda: create_tiled_terrain(divisions, divisions, heightmap_file=library['heightmap'],
+                                        terrain_name='terrain', dimensions=(2048, 2048, 400), ix=ix)
+
+
+def setup_toggle_map_file_stream(ix, library):
+    """Switches every map file of the surfaces to a streamed map file."""
+    from clarisse_survival_kit.utility import get_items, toggle_map_file_stream
+    surfaces = library['assets']['surface']
+    _import_assets(ix, surfaces)
+    textures = []
+    for surface_directory in surfaces:
+        textures.extend(get_items(_get_asset_ctx(ix, surface_directory), kind=('TextureMapFile',), ix=ix))
+
+    def operation():
+        with get_connection_index(ix) as connection_index:
+            connection_index.add(textures)
+            for tx in textures:
+                toggle_map_file_stream(tx, ix=ix)
+    return operation
+
+
+def setup_toggle_surface_complexity(ix, library):
+    """Switches every surface assigned to a geometry to its simple version in one batch."""
+    from clarisse_survival_kit.app import toggle_surfaces_complexity
+    from clarisse_survival_kit.utility import get_mtl_from_context
+    surfaces = library['assets']['surface']
+    _import_assets(ix, surfaces)
+    srf_ctxs = [_get_asset_ctx(ix, d) for d in surfaces]
+    for i, srf_ctx in enumerate(srf_ctxs):
+        geometry = ix.cmds.CreateObject('geometry%i' % i, 'GeometryPolygrid', 'Global', str(srf_ctx.get_parent()))
+        geometry.get_module().assign_material(get_mtl_from_context(srf_ctx, ix=ix).get_module(), 0)
+    return lambda: toggle_surfaces_complexity(srf_ctxs, ix=ix)
+
+
+IMPORT_SCENARIOS = collections.OrderedDict([
+    ('import_controller', setup_import_controller),
+    ('import_ms_library', setup_import_ms_library),
+    ('replace_surface', setup_replace_surface),
+    ('swap_resolution', setup_swap_resolution),
+    ('mix_surfaces', setup_mix_surfaces),
+    ('create_tiled_terrain', setup_create_tiled_terrain),
+    ('toggle_map_file_stream', setup_toggle_map_file_stream),
+    ('toggle_surface_complexity', setup_toggle_surface_complexity),
+])
+
+
+def run_scenario(name, setup, library, latency, verbose=False):
+    """
+    Runs a scenario on an empty fake scene with an empty scan index. Only the operation that setup returns is
+    measured, the assets it needs are imported before.
+    """
+    ix = FakeIx(latency=latency)
+    scan_index._scan_index = scan_index.ScanIndex(os.path.join(library['directory'], name + '.sqlite'))
+    stdout = sys.stdout
+    if not verbose:
+        sys.stdout = StringIO.StringIO()
+    try:
+        operation = setup(ix, library)
+        ix.reset_stats()
+        with FilesystemCounter() as fs:
+            start = time.time()
+            operation()
+            elapsed = time.time() - start
+    finally:
+        sys.stdout = stdout
+        scan_index._scan_index = None
+    return {
+        'wall': elapsed,
+        'latency': ix.latency.elapsed if not ix.latency.sleep else 0.0,
+        'ix_calls': dict(ix.calls),
+        'fs_calls': dict(fs.calls),
+        'warnings': len(ix.warnings),
+    }
+
+
+def benchmark_import(count=5, seed=0, latency=0.0, event_latency=0.0, sleep=False, scenarios=None, report=None,
+                     verbose=False):
+    """
+    Times the importers and scene operations against a synthetic library with count assets of every type.
+    Reports the wall time, the modelled latency of the ix calls, the ix calls by command and the filesystem calls.
+    Without sleep the latency is added to the wall time instead of being waited for.
+    """
+    library_dir = tempfile.mkdtemp(prefix='csk_benchmark_')
+    try:
+        counts = collections.OrderedDict((asset_type, max(count, 2)) for asset_type in SYNTHETIC_ASSET_TYPES)
+        assets = generate_library(library_dir, seed=seed, counts=counts, custom_ratio=0, mtime=time.time() - 3600)
+        heightmap = os.path.join(library_dir, 'heightmap.exr')
+        open(heightmap, 'w').close()
+        library = {'directory': library_dir, 'assets': assets, 'count': count, 'heightmap': heightmap}
+        print "Synthetic library with %i assets of each type in %s" % (max(count, 2), library_dir)
+
+        results = collections.OrderedDict()
+        for name, setup in IMPORT_SCENARIOS.items():
+            if scenarios and name not in scenarios:
+                continue
+            latency_model = LatencyModel(default=latency, commands={'check_for_events': event_latency}, sleep=sleep)
+            results[name] = run_scenario(name, setup, library, latency_model, verbose=verbose)
+    finally:
+        shutil.rmtree(library_dir, ignore_errors=True)
+
+    print "%-24s %9s %9s %9s %9s %9s" % ('Scenario', 'Wall', 'Latency', 'Total', 'ix calls', 'fs calls')
+    for name, result in results.items():
+        print "%-24s %8.3fs %8.3fs %8.3fs %9i %9i" % (name, result['wall'], result['latency'],
+                                                       result['wall'] + result['latency'],
+                                                       sum(result['ix_calls'].values()),
+                                                       sum(result['fs_calls'].values()))
+        print "    ix: " + ', '.join('%s %i' % call for call in
+                                    collections.Counter(result['ix_calls']).most_common(8))
+        print "    fs: " + ', '.join('%s %i' % call for call in
+                                    collections.Counter(result['fs_calls']).most_common())
+        if result['warnings']:
+            print "    %i warnings" % result['warnings']
+    if report:
+        write_benchmark_report({'count': count, 'seed': seed, 'latency': latency, 'event_latency': event_latency,
+                                'scenarios': results}, report)
+    return results
+
+
+def _scan_library(library_dir):
+    from clarisse_survival_kit.providers.megascans import iter_library_assets, inspect_asset
+    for category_library_dir, category_dir_name, asset_directory in iter_library_assets(library_dir):
+        inspect_asset(asset_directory, scan=scan.get_asset_scan(asset_directory))
+    scan_index.flush_scan_index()
+
+
+def benchmark_scan(count=1000, seed=0, report=None):
+    """
+    Times scanning and inspecting every asset of a synthetic library without the scan index,
+    while rebuilding the index and with the rebuilt index. Reports the filesystem calls of each pass.
+    """
+    library_dir = tempfile.mkdtemp(prefix='csk_benchmark_')
+    results = collections.OrderedDict()
+    try:
+        # The library is aged so the scan index doesn't consider the listings too recent to cache.
+        assets = generate_library(library_dir, count=count, seed=seed, mtime=time.time() - 3600)
+        print "Synthetic library with %i assets in %s" % (count, library_dir)
+        index = scan_index.ScanIndex(os.path.join(library_dir, 'scan_index.sqlite'))
+        passes = (('no index', False, lambda: _scan_library(library_dir)),
+                  ('rebuild index', index, lambda: scan_index.rebuild(library_dir)),
+                  ('indexed', index, lambda: _scan_library(library_dir)))
+        for name, pass_index, operation in passes:
+            scan_index._scan_index = pass_index
+            with FilesystemCounter() as fs:
+                start = time.time()
+                operation()
+                elapsed = time.time() - start
+            results[name] = {'wall': elapsed, 'fs_calls': dict(fs.calls)}
+    finally:
+        scan_index._scan_index = None
+        shutil.rmtree(library_dir, ignore_errors=True)
+
+    for name, result in results.items():
+        print "%-14s %8.3fs %9i fs calls (%s)" % (name + ':', result['wall'], sum(result['fs_calls'].values()),
+                                                 ', '.join('%s %i' % call for call in
+                                                           collections.Counter(result['fs_calls']).most_common()))
+    if report:
+        write_benchmark_report({'count': count, 'seed': seed, 'passes': results}, report)
+    return results
+
+
+class StrCounter(object):
+    """
+    Counts the conversions of fake items to strings. In Clarisse every str() on an item is a call into the
+    application. Only the outermost conversion is counted, not the parent contexts it converts.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.depth = 0
+        self.original = None
+
+    def __enter__(self):
+        self.original = original = FakeItem.__str__
+
+        def counted(item):
+            if not self.depth:
+                self.count += 1
+            self.depth += 1
+            try:
+                return original(item)
+            finally:
+                self.depth -= 1
+
+        FakeItem.__str__ = counted
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        FakeItem.__str__ = self.original
+        return False
+
+
+def _log_eager(items):
+    """The concatenating logging the kit used before, the string is built even if it's never emitted."""
+    for item in items:
+        logging.debug("Checking ctx member" + str(item))
+
+
+def _log_deferred(items):
+    for item in items:
+        logging.debug("Checking ctx member: %s", item)
+
+
+def _log_guarded(items):
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    for item in items:
+        if debug:
+            logging.debug("Checking ctx member: %s", item)
+
+
+def _load_surfaces(ix, ctxs):
+    from clarisse_survival_kit.surface import Surface
+    for ctx in ctxs:
+        Surface(ix).load(ctx)
+
+
+def benchmark_logging(count=100, seed=0, latency=0.0, report=None):
+    """
+    Measures the cost of debug logging while the DEBUG level is disabled, like it is by default.
+    Compares eager, deferred and guarded logging of every item of count surfaces, then loads every surface with
+    debug logging disabled and enabled. latency is the modelled cost in seconds of a str() on an item.
+    """
+    ix = FakeIx()
+    random.seed(seed)
+    build_commands_scene(ix, count)
+    items = list(ix.iter_objects())
+    ctxs = [ctx for ctx in ix.scene.children.values() if ctx.is_context()]
+    logger = logging.getLogger()
+    level = logger.level
+    handler = logging.NullHandler()
+    logger.addHandler(handler)
+    passes = (('eager', logging.ERROR, lambda: _log_eager(items)),
+              ('deferred', logging.ERROR, lambda: _log_deferred(items)),
+              ('guarded', logging.ERROR, lambda: _log_guarded(items)),
+              ('load', logging.ERROR, lambda: _load_surfaces(ix, ctxs)),
+              ('load debug', logging.DEBUG, lambda: _load_surfaces(ix, ctxs)))
+    results = collections.OrderedDict()
+    try:
+        for name, pass_level, operation in passes:
+            logger.setLevel(pass_level)
+            with StrCounter() as counter:
+                start = time.time()
+                operation()
+                elapsed = time.time() - start
+            results[name] = {'wall': elapsed, 'str_calls': counter.count, 'latency': counter.count * latency}
+    finally:
+        logger.setLevel(level)
+        logger.removeHandler(handler)
+
+    print "Logged %i items of %i surfaces" % (len(items), len(ctxs))
+    for name, result in results.items():
+        print "%-12s %8.4fs %8.3fs latency %7i str() calls" % (name + ':', result['wall'], result['latency'],
+                                                               result['str_calls'])
+    if report:
+        write_benchmark_report({'count': count, 'seed': seed, 'latency': latency, 'passes': results}, report)
+    return results
+
+
+def _snapshot_surface(surface):
+    return (surface.projection, surface.object_space, surface.uv_scale, surface.height, str(surface.mtl),
+            dict((index, str(tx)) for index, tx in surface.textures.items()))
+
+
+def benchmark_manifest(count=100, seed=0, passes=5, report=None):
+    """
+    Loads count moistened surfaces from their role manifests and by scanning their contexts, like scenes without
+    manifests are loaded. Checks that both find the same material, settings and textures.
+    """
+    from clarisse_survival_kit import surface_manifest
+    from clarisse_survival_kit.app import moisten_surface
+    from clarisse_survival_kit.surface import Surface
+    ix = FakeIx()
+    random.seed(seed)
+    build_commands_scene(ix, count)
+    ctxs = [ctx for ctx in ix.scene.children.values() if ctx.is_context()]
+    for ctx in ctxs:
+        moisten_surface(ctx, ix=ix)
+    results = collections.OrderedDict()
+    snapshots = {}
+    for name, enabled in (('scan', False), ('manifest', True)):
+        surface_manifest.SURFACE_MANIFEST_ENABLED = enabled
+        try:
+            start = time.time()
+            for _ in range(passes):
+                surfaces = [Surface(ix) for _ in ctxs]
+                for surface, ctx in zip(surfaces, ctxs):
+                    surface.load(ctx)
+            elapsed = time.time() - start
+        finally:
+            surface_manifest.SURFACE_MANIFEST_ENABLED = SURFACE_MANIFEST_ENABLED
+        snapshots[name] = [_snapshot_surface(surface) for surface in surfaces]
+        results[name] = {'wall': elapsed, 'per_surface': elapsed / (passes * len(ctxs))}
+    # The manifest also has the nodes that don't have a suffix, like the metallic blend. The scan can match nodes
+    # of other tools, the moisture AO blend ends with the suffix of the AO blend.
+    mismatches = 0
+    differing_roles = collections.Counter()
+    for scanned, read in zip(snapshots['scan'], snapshots['manifest']):
+        if scanned[:5] != read[:5]:
+            mismatches += 1
+        differing_roles.update(index for index, tx in scanned[5].items() if read[5].get(index) != tx)
+    results['mismatches'] = mismatches
+    results['differing_roles'] = dict(differing_roles)
+
+    print "Loaded %i surfaces %i times" % (len(ctxs), passes)
+    for name in ('scan', 'manifest'):
+        print "%-10s %8.4fs %8.1f us/surface" % (name + ':', results[name]['wall'],
+                                                results[name]['per_surface'] * 1000000)
+    print "Speedup:   %.2fx" % (results['scan']['wall'] / results['manifest']['wall']
+                                if results['manifest']['wall'] else 0)
+    print "Mismatches: %i" % mismatches
+    if differing_roles:
+        print "Roles the scan matched to other nodes: " + ', '.join('%s %i' % role for role in
+                                                                  differing_roles.most_common())
+    if report:
+        write_benchmark_report({'count': count, 'seed': seed, 'passes': passes, 'results': results}, report)
+    return results
+
+
+def get_scene_values(ix):
+    """Returns every attribute value and texture of the scene by path, without the role manifests."""
+    values = {}
+    for obj in ix.iter_objects():
+        for name, attr in obj.attributes.items():
+            if name == SURFACE_MANIFEST_ATTRIBUTE:
+                continue
+            values[str(obj) + '.' + name] = (tuple(str(value) for value in attr.values), str(attr.texture))
+    return values
+
+
+def build_template_surfaces(ix, count, seed=0):
+    """
+    Builds count surfaces with 4 different sets of maps. Every surface has its own files, scan area and height,
+    so only the network can be shared.
+    """
+    from clarisse_survival_kit.surface import Surface
+    random.seed(seed)
+    indices = [index for index in TEXTURE_SETTINGS if index != 'preview']
+    role_sets = [indices, indices[:len(indices) / 2], ['diffuse', 'roughness', 'normal', 'displacement'],
+                 ['diffuse', 'specular', 'gloss', 'bump', 'opacity']]
+    ctx = ix.application.get_working_context()
+    for i in range(count):
+        textures = dict((index, '/library/surface%i/surface%i_%s.exr' % (i, i, index))
+                        for index in role_sets[i % len(role_sets)])
+        scan_area = [random.choice([1, 2, 4]), random.choice([1, 2, 4])]
+        surface = Surface(ix, projection='triplanar', uv_scale=scan_area, height=random.choice([0.02, 0.2]))
+        surface.build('surface%i' % i, ctx, textures, {'diffuse': 'sRGB'}, streamed_maps=['displacement'])
+
+
+def benchmark_templates(count=100, seed=0, latency=0.0, report=None):
+    """
+    Builds count surfaces node by node and from surface templates. Compares the ix calls and the wall time with the
+    modelled latency and checks that both scenes have the same values.
+    """
+    from clarisse_survival_kit.surface_template import get_surface_templates
+    results = collections.OrderedDict()
+    values = {}
+    for name, templated in (('direct', False), ('templates', True)):
+        ix = FakeIx(latency=LatencyModel(default=latency, sleep=False))
+        start = time.time()
+        with command_buffer.get_command_buffer(ix):
+            if templated:
+                with get_surface_templates(ix):
+                    build_template_surfaces(ix, count, seed)
+            else:
+                build_template_surfaces(ix, count, seed)
+        elapsed = time.time() - start
+        values[name] = get_scene_values(ix)
+        results[name] = {'wall': elapsed, 'latency': ix.latency.elapsed, 'ix_calls': dict(ix.calls)}
+    results['mismatches'] = len(set(values['direct'].items()) ^ set(values['templates'].items()))
+
+    print "Built %i surfaces" % count
+    print "%-10s %9s %9s %9s %9s" % ('', 'Wall', 'Latency', 'Total', 'ix calls')
+    for name in ('direct', 'templates'):
+        result = results[name]
+        print "%-10s %8.3fs %8.3fs %8.3fs %9i" % (name + ':', result['wall'], result['latency'],
+                                                  result['wall'] + result['latency'],
+                                                  sum(result['ix_calls'].values()))
+        print "    ix: " + ', '.join('%s %i' % call for call in
+                                    collections.Counter(result['ix_calls']).most_common(8))
+    print "Mismatches: %i" % results['mismatches']
+    if report:
+        write_benchmark_report({'count': count, 'seed': seed, 'latency': latency, 'results': results}, report)
+    return results
+
+
+def get_sub_contexts_legacy(ctx, max_depth=0, current_depth=0):
+    """The recursive get_sub_contexts with list deduplication the kit used before iter_sub_contexts."""
+    current_depth += 1
+    results = []
+    for i in range(ctx.get_context_count()):
+        sub_context = ctx.get_context(i)
+        results.append(sub_context)
+        if current_depth < max_depth or max_depth == 0:
+            for result in get_sub_contexts_legacy(sub_context, max_depth, current_depth):
+                if result not in results:
+                    results.append(result)
+    return results
+
+
+def get_items_legacy(ix, ctx, kind=(), return_first_hit=False):
+    """The get_items the kit used before iter_items. It checks every kind on every object."""
+    items = ix.api.OfItemVector()
+    sub_ctxs = [ctx] + get_sub_contexts_legacy(ctx, current_depth=1)
+    for sub_ctx in sub_ctxs:
+        if sub_ctx.get_object_count():
+            objects_array = ix.api.OfObjectArray(sub_ctx.get_object_count())
+            sub_ctx.get_all_objects(objects_array, ix.api.CoreBitFieldHelper(), False)
+            for i_obj in range(sub_ctx.get_object_count()):
+                if kind:
+                    for k in kind:
+                        if objects_array[i_obj].is_kindof(k):
+                            if return_first_hit:
+                                return objects_array[i_obj]
+                            items.add(objects_array[i_obj])
+                else:
+                    items.add(objects_array[i_obj])
+    return [item for item in items]
+
+
+def build_library_scene(ix, count):
+    """Builds count asset contexts with a surface context and texture sub contexts like an imported library."""
+    library_ctx = ix.cmds.CreateContext('library', 'Global', str(ix.scene))
+    for i in range(count):
+        asset_ctx = ix.cmds.CreateContext('asset%i' % i, 'Global', str(library_ctx))
+        ix.cmds.CreateObject('asset%i_geo' % i, 'GeometryPolyfile', 'Global', str(asset_ctx))
+        surface_ctx = ix.cmds.CreateContext('surface', 'Global', str(asset_ctx))
+        ix.cmds.CreateObject('asset%i_mtl' % i, 'MaterialPhysicalStandard', 'Global', str(surface_ctx))
+        for sub_ctx_name in ('diffuse', 'specular', 'normal'):
+            sub_ctx = ix.cmds.CreateContext(sub_ctx_name, 'Global', str(surface_ctx))
+            ix.cmds.CreateObject('asset%i_%s_tx' % (i, sub_ctx_name), 'TextureMapFile', 'Global', str(sub_ctx))
+    return library_ctx
+
+
+def benchmark_contexts(count=5000, seed=0, report=None):
+    """
+    Compares the legacy and iterative context traversal on libraries of up to count asset contexts with
+    5 contexts each. Times listing every sub context, every texture and the first material of the library.
+    """
+    from clarisse_survival_kit.utility import get_sub_contexts, get_items
+    kind = ('TextureMapFile', 'TextureStreamedMapFile')
+    results = collections.OrderedDict()
+    for size in sorted(set([max(count / 8, 1), max(count / 4, 1), max(count / 2, 1), count])):
+        ix = FakeIx()
+        library_ctx = build_library_scene(ix, size)
+        passes = (('sub contexts', lambda: get_sub_contexts_legacy(library_ctx),
+                   lambda: get_sub_contexts(library_ctx, ix=ix)),
+                  ('textures', lambda: get_items_legacy(ix, library_ctx, kind=kind),
+                   lambda: get_items(library_ctx, kind=kind, ix=ix)),
+                  ('first material', lambda: get_items_legacy(ix, library_ctx, kind=('MaterialPhysicalStandard',),
+                                                              return_first_hit=True),
+                   lambda: get_items(library_ctx, kind=('MaterialPhysicalStandard',), return_first_hit=True,
+                                     ix=ix)))
+        size_results = results[size] = collections.OrderedDict()
+        for name, legacy, operation in passes:
+            start = time.time()
+            legacy_result = legacy()
+            legacy_time = time.time() - start
+            start = time.time()
+            result = operation()
+            elapsed = time.time() - start
+            size_results[name] = {'legacy': legacy_time, 'iterative': elapsed,
+                                  'match': legacy_result == result}
+
+    print "%-8s %-16s %10s %10s %8s" % ('Assets', 'Operation', 'Legacy', 'Iterative', 'Speedup')
+    for size, size_results in results.items():
+        for name, result in size_results.items():
+            print "%-8i %-16s %9.4fs %9.4fs %7.1fx%s" % (
+                size, name, result['legacy'], result['iterative'],
+                result['legacy'] / result['iterative'] if result['iterative'] else 0,
+                '' if result['match'] else '  MISMATCH')
+    if report:
+        write_benchmark_report({'count': count, 'seed': seed, 'sizes': results}, report)
+    return results
+
+
+def write_benchmark_report(results, path):
+    with open(path, 'w') as report_file:
+        json.dump(results, report_file, indent=2, sort_keys=True)
+    print "Report written to " + path
+
+
+BENCHMARKS = {
+    'classifier': lambda args: benchmark_classifier(count=args.count or 1000000, seed=args.seed),
+    'commands': lambda args: benchmark_commands(count=args.count or 100, seed=args.seed),
+    'scan': lambda args: benchmark_scan(count=args.count or 1000, seed=args.seed, report=args.report),
+    'contexts': lambda args: benchmark_contexts(count=args.count or 5000, seed=args.seed, report=args.report),
+    'logging': lambda args: benchmark_logging(count=args.count or 100, seed=args.seed, latency=args.latency,
+                                              report=args.report),
+    'manifest': lambda args: benchmark_manifest(count=args.count or 100, seed=args.seed, report=args.report),
+    'templates': lambda args: benchmark_templates(count=args.count or 100, seed=args.seed, latency=args.latency,
+                                                  report=args.report),
+    'import': lambda args: benchmark_import(count=args.count or 5, seed=args.seed, latency=args.latency,
+                                            event_latency=args.event_latency, sleep=args.sleep,
+                                            scenarios=args.scenario, report=args.report, verbose=args.verbose),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clarisse Survival Kit micro-benchmarks.')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS.keys()))
+    parser.add_argument('--count', type=int, help='Number of synthetic items.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated seconds per ix call or str() of an item.')
+    parser.add_argument('--event-latency', type=float, default=0.0,
+                        help='Simulated seconds per ix.application.check_for_events call.')
+    parser.add_argument('--sleep', action='store_true', help='Wait for the simulated latency instead of adding it.')
+    parser.add_argument('--scenario', action='append', choices=IMPORT_SCENARIOS.keys(),
+                        help='Only run this import scenario. Can be repeated.')
+    parser.add_argument('--report',
+                        help='Write the results of the benchmark to this JSON file.')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the kit.')
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
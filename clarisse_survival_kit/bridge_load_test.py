@@ -0,0 +1,315 @@
+#!/usr/bin/env python2
+"""
+Load test of the Bridge importer without Bridge or Clarisse.
+Simulated artists post JSON arrays like Bridge exports to the listener of ms_bridge_importer, which queues the assets
+and sends their import scripts to the command port stand-in of command_port_server. The stand-in takes latency
+seconds per script like an import in Clarisse.
+Reports the time from posting an asset until its script reached the command port, the throughput and the memory
+of the process, which runs the listener.
+
+Usage:
+    python -m clarisse_survival_kit.bridge_load_test --artists 8 --rate 0.5 --duration 30 --latency 0.2
+        [--assets-per-payload 3] [--components 8] [--duplicate-ratio 0.1] [--report load.json]
+"""
+import argparse
+import collections
+import functools
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from clarisse_survival_kit import ms_bridge_importer
+from clarisse_survival_kit.command_port_server import CommandPortServer
+
+BRIDGE_ASSET_TYPES = collections.OrderedDict([('surface', 4), ('3d', 3), ('3dplant', 1), ('atlas', 1)])
+BRIDGE_RESOLUTIONS = ('1K', '2K', '4K', '8K')
+BRIDGE_COMPONENTS = ('albedo', 'roughness', 'specular', 'normal', 'displacement', 'ao', 'cavity', 'gloss', 'bump',
+                     'opacity', 'translucency', 'metalness', 'fuzz')
+BRIDGE_TAGS = ('rock', 'cliff', 'nature', 'rough', 'wet', 'mossy', 'grey', 'brown', 'ground', 'forest', 'desert')
+IMPORT_SCRIPT_PATH = re.compile(r'import_asset\((".*?"), ')
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+
+def _get_weighted(rng, weights):
+    value = rng.uniform(0, sum(weights.values()))
+    for key, weight in weights.items():
+        value -= weight
+        if value <= 0:
+            return key
+    return key
+
+
+def generate_bridge_asset(rng, directory, index, components=8):
+    """Returns the export data of an asset like Bridge sends it. The asset directory is created empty."""
+    asset_type = _get_weighted(rng, BRIDGE_ASSET_TYPES)
+    asset_id = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(6))
+    name = '%s %s %i' % (rng.choice(BRIDGE_TAGS).title(), rng.choice(BRIDGE_TAGS).title(), index)
+    resolution = rng.choice(BRIDGE_RESOLUTIONS)
+    path = os.path.join(directory, '%s_%s_%s' % (name.replace(' ', '_'), asset_id, asset_type))
+    os.makedirs(path)
+    texture_components = []
+    for component in BRIDGE_COMPONENTS[:components]:
+        filename = '%s_%s_%s.%s' % (asset_id, resolution, component.title(),
+                                    'exr' if component == 'displacement' else 'jpg')
+        texture_components.append({'type': component, 'name': component.title(), 'resolution': resolution,
+                                   'format': os.path.splitext(filename)[-1][1:], 'path': os.path.join(path, filename),
+                                   'colorSpace': 'sRGB' if component == 'albedo' else 'Linear'})
+    meshes = []
+    lods = []
+    active_lod = None
+    if asset_type in ('3d', '3dplant'):
+        active_lod = rng.choice(('high', 'lod0', 'lod1', 'lod2'))
+        for lod in range(4):
+            lods.append({'lod': 'lod%i' % lod, 'format': 'obj',
+                         'path': os.path.join(path, '%s_LOD%i.obj' % (asset_id, lod))})
+        meshes.append({'type': 'original', 'format': 'obj', 'path': os.path.join(path, asset_id + '_High.obj')})
+    return {'id': asset_id, 'name': name, 'path': path, 'type': asset_type, 'category': asset_type,
+            'resolution': resolution, 'resolutionValue': int(resolution[:-1]) * 1024, 'activeLOD': active_lod,
+            'textureFormat': 'jpg', 'components': texture_components, 'packedTextures': [], 'meshList': meshes,
+            'lodList': lods, 'tags': rng.sample(BRIDGE_TAGS, 4), 'categories': [asset_type, rng.choice(BRIDGE_TAGS)],
+            'meta': [{'key': 'height', 'name': 'Height', 'value': '%.2f m' % rng.uniform(0.01, 0.3)},
+                     {'key': 'scanArea', 'name': 'Scan Area', 'value': '2x2 m'}],
+            'averageColor': '#%06x' % rng.randint(0, 0xffffff), 'previewImage': os.path.join(path, 'preview.png')}
+
+
+def get_memory_usage():
+    """Returns the resident memory of the process in bytes, or the peak where the current one can't be read."""
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        threading.Thread.__init__(self, name='MemorySampler')
+        self.daemon = True
+        self.interval = interval
+        self.baseline = get_memory_usage()
+        self.peak = self.baseline
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            memory = get_memory_usage()
+            if memory is not None:
+                self.peak = max(self.peak, memory)
+
+
+class BridgeSimulator(object):
+    """
+    Posts payloads of assets_per_payload assets from a pool to the listener like artists exporting from Bridge.
+    Each artist sends rate payloads per second on average. duplicate_ratio of the payloads repeat the previous
+    payload of the artist, like an export that was clicked twice.
+    """
+
+    def __init__(self, port, assets, artists=4, rate=1.0, duration=10.0, assets_per_payload=1, duplicate_ratio=0.1,
+                 seed=0):
+        self.port = port
+        self.assets = assets
+        self.artists = artists
+        self.rate = rate
+        self.duration = duration
+        self.assets_per_payload = assets_per_payload
+        self.duplicate_ratio = duplicate_ratio
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.sent = collections.defaultdict(list)
+        self.stats = collections.Counter()
+
+    def run(self):
+        threads = [threading.Thread(target=self._run_artist, args=(i,), name='Artist%i' % i)
+                   for i in range(self.artists)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _run_artist(self, index):
+        rng = random.Random('%s-%i' % (self.seed, index))
+        end = time.time() + self.duration
+        payload = None
+        while True:
+            time.sleep(rng.expovariate(self.rate) if self.rate else 0)
+            if time.time() >= end:
+                break
+            if payload is None or rng.random() >= self.duplicate_ratio:
+                payload = rng.sample(self.assets, min(self.assets_per_payload, len(self.assets)))
+            data = json.dumps(payload)
+            now = time.time()
+            try:
+                client = socket.create_connection(('127.0.0.1', self.port))
+                client.sendall(data)
+                client.close()
+            except socket.error:
+                with self.lock:
+                    self.stats['connection_errors'] += 1
+                continue
+            with self.lock:
+                self.stats['payloads'] += 1
+                self.stats['assets'] += len(payload)
+                self.stats['bytes'] += len(data)
+                for asset in payload:
+                    self.sent[asset['path']].append(now)
+
+
+def get_latencies(sent, arrivals):
+    """
+    Matches the scripts that arrived at the command port with the posts of their asset. A script serves every post
+    of its asset since the previous script of the asset, the latency is measured from the first of them.
+    """
+    latencies = []
+    served = collections.defaultdict(int)
+    for arrival, path in sorted(arrivals):
+        posts = sent.get(path, [])
+        first = served[path]
+        last = first
+        while last < len(posts) and posts[last] <= arrival:
+            last += 1
+        if last > first:
+            latencies.append(arrival - posts[first])
+        served[path] = last
+    return sorted(latencies)
+
+
+def _get_percentile(values, percentile):
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * percentile / 100.0), len(values) - 1)]
+
+
+def run_load_test(artists=4, rate=1.0, duration=10.0, assets_per_payload=1, pool_size=50, components=8,
+                  duplicate_ratio=0.1, latency=0.2, jitter=0.05, batch_size=ms_bridge_importer.IMPORT_BATCH_SIZE,
+                  window=ms_bridge_importer.IMPORT_BATCH_WINDOW, seed=0, verbose=False, report=None):
+    """Runs the listener, queue and command port stand-in in this process under the load of the simulator."""
+    directory = tempfile.mkdtemp(prefix='csk_bridge_load_')
+    arrivals = []
+
+    def record_script(mode, command):
+        match = IMPORT_SCRIPT_PATH.search(command)
+        if match:
+            arrivals.append((time.time(), json.loads(match.group(1))))
+        return True, None
+
+    stdout = sys.stdout
+    try:
+        rng = random.Random(seed)
+        assets = [generate_bridge_asset(rng, directory, i, components) for i in range(pool_size)]
+        server = CommandPortServer(port=0, handler=record_script, latency=latency, jitter=jitter, seed=seed)
+        server.start()
+        client = ms_bridge_importer.ClarisseNet(port=server.port)
+        statuses = collections.Counter()
+
+        def count_status(asset, status, error=None):
+            if status not in (import_queue.QUEUED, import_queue.IMPORTING):
+                statuses[status] += 1
+
+        import_queue = ms_bridge_importer.ImportQueue(
+            send=functools.partial(ms_bridge_importer.send_to_command_port, client=client), batch_size=batch_size,
+            window=window, on_status=count_status)
+        if not verbose:
+            sys.stdout = open(os.devnull, 'w')
+        sampler = MemorySampler()
+        sampler.start()
+        listener = ms_bridge_importer.BridgeListener(
+            functools.partial(ms_bridge_importer.ms_asset_importer, import_queue=import_queue), port=0)
+        listener.start()
+        simulator = BridgeSimulator(listener.port, assets, artists=artists, rate=rate, duration=duration,
+                                    assets_per_payload=assets_per_payload, duplicate_ratio=duplicate_ratio, seed=seed)
+        start = time.time()
+        simulator.run()
+        sent_time = time.time() - start
+        # Everything that was received is imported before the queue stops.
+        listener.shutdown()
+        import_queue.shutdown()
+        ms_bridge_importer.shutdown_io_pool()
+        elapsed = time.time() - start
+        sampler.stopped.set()
+        sampler.join()
+        client.close()
+        server.shutdown()
+        server.server_close()
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+        shutil.rmtree(directory, ignore_errors=True)
+
+    latencies = get_latencies(simulator.sent, arrivals)
+    results = collections.OrderedDict([
+        ('payloads', simulator.stats['payloads']), ('assets_posted', simulator.stats['assets']),
+        ('payload_bytes', simulator.stats['bytes']), ('connection_errors', simulator.stats['connection_errors']),
+        ('listener', dict(listener.stats)), ('statuses', dict(statuses)), ('scripts', len(arrivals)),
+        ('sending_time', sent_time), ('total_time', elapsed),
+        ('throughput', len(arrivals) / elapsed if elapsed else 0.0),
+        ('command_port_busy', server.busy / elapsed if elapsed else 0.0),
+        ('latency', {'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                     'p50': _get_percentile(latencies, 50), 'p95': _get_percentile(latencies, 95),
+                     'p99': _get_percentile(latencies, 99), 'max': latencies[-1] if latencies else 0.0}),
+        ('memory', {'baseline': sampler.baseline, 'peak': sampler.peak}),
+    ])
+
+    print "%i artists posting %.2f payloads/s of %i assets for %.1fs, scripts take %.3fs" % (
+        artists, rate, assets_per_payload, duration, latency)
+    print "Posted:     %i payloads, %i assets, %.1f KB" % (results['payloads'], results['assets_posted'],
+                                                          results['payload_bytes'] / 1024.0)
+    print "Imports:    " + ', '.join('%s %i' % status for status in sorted(statuses.items()))
+    print "Throughput: %.2f imports/s, command port busy %.0f%%, drained %.2fs after the last post" % (
+        results['throughput'], results['command_port_busy'] * 100, elapsed - sent_time)
+    print "Latency:    mean %(mean).3fs, p50 %(p50).3fs, p95 %(p95).3fs, p99 %(p99).3fs, max %(max).3fs" % \
+        results['latency']
+    if sampler.baseline is not None:
+        print "Memory:     %.1f MB baseline, %.1f MB peak" % (sampler.baseline / 1048576.0,
+                                                             sampler.peak / 1048576.0)
+    if results['connection_errors'] or listener.stats['rejected'] or listener.stats['errors']:
+        print "Errors:     %i connection errors, %i rejected payloads, %i importer errors" % (
+            results['connection_errors'], listener.stats['rejected'], listener.stats['errors'])
+    if report:
+        with open(report, 'w') as report_file:
+            json.dump(results, report_file, indent=2, sort_keys=True)
+        print "Report written to " + report
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test of the Bridge importer.')
+    parser.add_argument('--artists', type=int, default=4, help='Number of artists posting at the same time.')
+    parser.add_argument('--rate', type=float, default=1.0, help='Payloads per second of each artist.')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds the artists keep posting.')
+    parser.add_argument('--assets-per-payload', type=int, default=1)
+    parser.add_argument('--pool-size', type=int, default=50, help='Number of different assets to post.')
+    parser.add_argument('--components', type=int, default=8, help='Textures of each asset in the payload.')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1,
+                        help='Ratio of payloads that repeat the previous one of the artist.')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds each import script takes.')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Seconds the import time varies by.')
+    parser.add_argument('--batch-size', type=int, default=ms_bridge_importer.IMPORT_BATCH_SIZE)
+    parser.add_argument('--window', type=float, default=ms_bridge_importer.IMPORT_BATCH_WINDOW)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the importer.')
+    parser.add_argument('--report', help='Writes the results as JSON to this path.')
+    args = parser.parse_args(argv)
+    run_load_test(artists=args.artists, rate=args.rate, duration=args.duration,
+                  assets_per_payload=args.assets_per_payload, pool_size=args.pool_size, components=args.components,
+                  duplicate_ratio=args.duplicate_ratio, latency=args.latency, jitter=args.jitter,
+                  batch_size=args.batch_size, window=args.window, seed=args.seed, verbose=args.verbose,
+                  report=args.report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import re
+import logging
+import functools
+import collections
+
+from clarisse_survival_kit.settings import *
+
+VALUE = 'value'
+TEXTURE = 'texture'
+EXPRESSION = 'expression'
+
+_active_buffers = {}
+
+# Attributes like enable_layer_2 that switch other attributes on. Writes after them can depend on them.
+TOGGLE_ATTRIBUTE_MATCH = re.compile(r'\.enable_\w+(\[\d+\])?$')
+
+
+def _to_string(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+def _get_base_attr(attr):
+    """Returns the attribute path without the component index, project://a/b.color[0] becomes project://a/b.color."""
+    return re.sub(r'\[\d+\]$', '', attr)
+
+
+class CommandSegment(object):
+    """Commands that don't depend on each other and can be sent in any order. toggles is True for toggle writes."""
+
+    def __init__(self, toggles=False):
+        self.toggles = toggles
+        self.commands = {VALUE: collections.OrderedDict(), TEXTURE: collections.OrderedDict(),
+                         EXPRESSION: collections.OrderedDict()}
+        self.kinds = {}
+
+    def conflicts(self, kind, attr):
+        """Returns True if the attribute is already set by a command of another kind in this segment."""
+        other_kind = self.kinds.get(_get_base_attr(attr))
+        return other_kind is not None and other_kind != kind
+
+    def add(self, kind, attr, value):
+        commands = self.commands[kind]
+        # A later write to the same attribute moves to the end so it's still applied after writes to its components.
+        commands.pop(attr, None)
+        commands[attr] = value
+        self.kinds[_get_base_attr(attr)] = kind
+
+    def __len__(self):
+        return sum(len(commands) for commands in self.commands.values())
+
+
+class CommandBuffer(object):
+    """
+    Records SetValue, SetTexture and SetExpression intents and sends them as the fewest possible bulk commands.
+    Use it as a context manager, the commands are sent when the outermost block exits:
+
+        with get_command_buffer(ix) as cmds:
+            cmds.set_value(str(tx) + ".mode", 7)
+            cmds.set_texture(str(tx) + ".input1", str(other_tx))
+
+    Values are sent with a single SetValues, textures with one SetTexture per texture and expressions with a single
+    SetExpression. Commands are only reordered if they write different attributes. Setting an attribute with another
+    kind of command starts a new segment that is sent after the previous one. Toggles like enable_layer_2 are sent in
+    their own segments so the writes after a toggle see it and a toggle that is switched back is sent last.
+    Commands that read or rename items don't see the recorded commands, call barrier before them.
+    """
+
+    def __init__(self, ix, enabled=None):
+        self.ix = ix
+        self.enabled = COMMAND_BUFFER_ENABLED if enabled is None else enabled
+        self.segments = []
+        self.depth = 0
+        self.intents = 0
+        self.calls = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            _active_buffers[id(self.ix)] = self
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            _active_buffers.pop(id(self.ix), None)
+            # Commands recorded before an error are still sent, like they would have been without the buffer.
+            self.flush()
+        return False
+
+    def set_value(self, attr, value):
+        """Sets a value. Lists with more than one value are set per component: attr[0], attr[1]..."""
+        if isinstance(value, (list, tuple)):
+            if len(value) != 1:
+                for i, component in enumerate(value):
+                    self.set_value('%s[%i]' % (attr, i), component)
+                return
+            value = value[0]
+        self._add(VALUE, str(attr), _to_string(value))
+
+    def set_values(self, attrs, values):
+        """Sets one value per attribute."""
+        for attr, value in zip(attrs, values):
+            self.set_value(attr, value)
+
+    def set_texture(self, attr, texture):
+        self._add(TEXTURE, str(attr), str(texture))
+
+    def set_expression(self, attr, expression):
+        self._add(EXPRESSION, str(attr), expression)
+
+    def _add(self, kind, attr, value):
+        self.intents += 1
+        toggle = bool(TOGGLE_ATTRIBUTE_MATCH.search(attr))
+        if not self.segments or self.segments[-1].toggles != toggle or self.segments[-1].conflicts(kind, attr):
+            self.segments.append(CommandSegment(toggle))
+        self.segments[-1].add(kind, attr, value)
+        if not self.enabled or self.depth == 0:
+            self.flush()
+
+    def barrier(self):
+        """Sends the recorded commands so the following code sees their result."""
+        self.flush()
+
+    def flush(self):
+        segments = self.segments
+        self.segments = []
+        for segment in segments:
+            self._send(segment)
+
+    def _send(self, segment):
+        calls = self.calls
+        values = segment.commands[VALUE]
+        if values:
+            attrs = self.ix.api.CoreStringArray(len(values))
+            strings = self.ix.api.CoreStringArray(len(values))
+            for i, (attr, value) in enumerate(values.iteritems()):
+                attrs[i] = attr
+                strings[i] = value
+            self.ix.cmds.SetValues(attrs, strings)
+            self.calls += 1
+        textures = collections.OrderedDict()
+        for attr, texture in segment.commands[TEXTURE].iteritems():
+            textures.setdefault(texture, []).append(attr)
+        for texture, attrs in textures.iteritems():
+            self.ix.cmds.SetTexture(attrs, texture)
+            self.calls += 1
+        expressions = segment.commands[EXPRESSION]
+        if expressions:
+            self.ix.cmds.SetExpression(expressions.keys(), expressions.values())
+            self.calls += 1
+        logging.debug("Sent %i commands in %i calls", len(segment), self.calls - calls)
+
+
+def get_command_buffer(ix):
+    """Returns the command buffer that is active for ix, so nested builders share it, or a new one."""
+    command_buffer = _active_buffers.get(id(ix))
+    if command_buffer is None:
+        command_buffer = CommandBuffer(ix)
+    return command_buffer
+
+
+def flush_commands(ix):
+    """Sends the commands of the active command buffer of ix. Call it before reading attributes."""
+    command_buffer = _active_buffers.get(id(ix))
+    if command_buffer:
+        command_buffer.barrier()
+
+
+def buffer_commands(func):
+    """
+    Decorator that records the commands of the function and of the builders it calls in one command buffer.
+    ix is taken from the ix keyword argument like get_ix does. The function gets the buffer with get_command_buffer.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from clarisse_survival_kit.utility import get_ix
+        with get_command_buffer(get_ix(kwargs.get("ix"))):
+            return func(*args, **kwargs)
+
+    return wrapper
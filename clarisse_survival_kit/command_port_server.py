@@ -0,0 +1,123 @@
+#!/usr/bin/env python2
+"""
+Stand-in for the command port of Clarisse, to try the Bridge importer without Clarisse.
+It speaks the protocol of ClarisseNet: commands and results are framed with their size as a little endian 4 byte
+integer. Commands start with the mode, results with the status, 1 if the command ran and 0 if it failed.
+Commands run one at a time like in Clarisse and are recorded in the order they ran. Scripts take latency
+seconds, give or take jitter, to simulate the imports.
+
+    python command_port_server.py --port 55000 --latency 0.5
+"""
+import argparse
+import random
+import socket
+import SocketServer
+import struct
+import threading
+import time
+
+
+class CommandPortHandler(SocketServer.BaseRequestHandler):
+    """Reads the commands of one connection and sends their results back in order."""
+
+    def handle(self):
+        while True:
+            header = self._recv(4)
+            if header is None:
+                break
+            data = self._recv(struct.unpack("<I", header)[0])
+            if not data:
+                break
+            result = self.server.execute(int(data[0]), data[1:])
+            if result is None:
+                break
+            ok, value = result
+            result = ('1' if ok else '0') + (value or '')
+            try:
+                self.request.sendall(struct.pack("<I", len(result)) + result)
+            except socket.error:
+                # The client gave up waiting for the result.
+                break
+
+    def _recv(self, size):
+        """Returns size bytes or None if the connection was closed before."""
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            try:
+                count = self.request.recv_into(view[received:], size - received)
+            except socket.error:
+                return None
+            if not count:
+                return None
+            received += count
+        return bytes(data)
+
+
+class CommandPortServer(SocketServer.ThreadingTCPServer):
+    """
+    Accepts any number of connections. handler is called with the mode and command and returns whether the command
+    ran and its result, or None to close the connection without a result. Without handler every command runs.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='localhost', port=55000, handler=None, latency=0.0, jitter=0.0, seed=0):
+        SocketServer.ThreadingTCPServer.__init__(self, (host, port), CommandPortHandler)
+        self.handler = handler
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.commands = []
+        self.lock = threading.Lock()
+        self.busy = 0.0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def execute(self, mode, command):
+        with self.lock:
+            start = time.time()
+            self.commands.append((start, mode, command))
+            try:
+                if mode == 0 and (self.latency or self.jitter):
+                    time.sleep(max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0.0))
+                if self.handler:
+                    return self.handler(mode, command)
+                return True, None
+            finally:
+                self.busy += time.time() - start
+
+    def start(self):
+        """Serves on a thread until shutdown is called."""
+        thread = threading.Thread(target=self.serve_forever, name='CommandPortServer')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in for the command port of Clarisse.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=55000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each script takes.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Seconds the latency varies by.')
+    args = parser.parse_args()
+
+    def print_command(mode, command):
+        print "Received %s:\n%s" % ('statement' if mode else 'script', command)
+        return True, None
+
+    server = CommandPortServer(args.host, args.port, handler=print_command, latency=args.latency, jitter=args.jitter)
+    print "Command port listening on %s:%i" % (args.host, server.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
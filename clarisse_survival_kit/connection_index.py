@@ -0,0 +1,235 @@
+import logging
+import functools
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.command_buffer import flush_commands
+
+VALUE = 'value'
+TEXTURE = 'texture'
+RULE = 'rule'
+
+SHADING_LAYER_COLUMNS = ('material', 'clip_map', 'displacement')
+# Only strings that are item paths can reference items, filenames and other strings aren't indexed.
+ITEM_PATH_PREFIX = 'project:/'
+
+_active_indices = {}
+
+
+class Connection(object):
+    """
+    An attribute, attribute value or shading layer rule column of owner that references target.
+    kind is VALUE for object references set with SetValues, TEXTURE for textures and strings set with SetTexture
+    and RULE for shading layer rules, which have a row and column instead of an attribute.
+    """
+    __slots__ = ('owner', 'owner_class', 'attr_name', 'index', 'row', 'column', 'kind', 'target')
+
+    def __init__(self, owner, owner_class, kind, target, attr_name=None, index=None, row=None, column=None):
+        self.owner = owner
+        self.owner_class = owner_class
+        self.kind = kind
+        self.target = target
+        self.attr_name = attr_name
+        self.index = index
+        self.row = row
+        self.column = column
+
+    def get_attr(self):
+        """Returns the attribute path, with the value index for attributes with a list of values."""
+        if self.kind == RULE:
+            return self.owner
+        attr = self.owner + '.' + self.attr_name
+        if self.index is not None:
+            attr += '[%i]' % self.index
+        return attr
+
+    def __repr__(self):
+        if self.kind == RULE:
+            return '<Connection %s rule %i %s -> %s>' % (self.owner, self.row, self.column, self.target)
+        return '<Connection %s -> %s>' % (self.get_attr(), self.target)
+
+
+class ConnectionIndex(object):
+    """
+    Maps items to the attributes and shading layer rules that reference them. Each output object is scanned once,
+    so replacing the connections of many items doesn't scan the same materials and shading layers again.
+    Use it as a context manager around a batch operation, the index is dropped when the outermost block exits:
+
+        with get_connection_index(ix) as index:
+            for tx in textures:
+                toggle_map_file_stream(tx, ix=ix)
+
+    Items and attributes are stored by path. Connections changed with replace and items renamed with rename are kept
+    up to date. Call invalidate_item for items that got new outputs by other means and forget for deleted objects.
+    """
+
+    def __init__(self, ix):
+        self.ix = ix
+        self.depth = 0
+        self.connections = {}
+        self.scanned = {}
+        self.outputs_known = set()
+        self.scans = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            _active_indices[id(self.ix)] = self
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            _active_indices.pop(id(self.ix), None)
+            logging.debug("Connection index scanned %i objects", self.scans)
+            self.invalidate()
+        return False
+
+    def add(self, items):
+        """Finds the outputs of the items that aren't indexed yet in one sweep and scans the new ones."""
+        paths = []
+        new_items = []
+        for item in items:
+            path = str(item)
+            if item and path not in self.outputs_known and path not in paths:
+                paths.append(path)
+                new_items.append(item)
+        if not new_items:
+            return
+        flush_commands(self.ix)
+        items_array = self.ix.api.OfItemArray(len(new_items))
+        for i, item in enumerate(new_items):
+            items_array[i] = item
+        output_items = self.ix.api.OfItemVector()
+        self.ix.application.get_factory().get_items_outputs(items_array, output_items, False)
+        for i_output in range(0, output_items.get_count()):
+            out_item = output_items[i_output]
+            if out_item.is_object():
+                self._scan(out_item.to_object())
+        self.outputs_known.update(paths)
+
+    def _scan(self, obj):
+        owner = str(obj)
+        if owner in self.scanned:
+            return
+        self.scans += 1
+        owner_class = obj.get_class_name()
+        connections = []
+        # Shading layer inputs can't be read from attributes, only with get_rule_value.
+        if obj.is_kindof('ShadingLayer'):
+            sl_module = obj.get_module()
+            for row in range(0, sl_module.get_rules().get_count()):
+                for column in SHADING_LAYER_COLUMNS:
+                    target = str(sl_module.get_rule_value(row, column))
+                    if target:
+                        connections.append(Connection(owner, owner_class, RULE, target, row=row, column=column))
+        else:
+            for i_attr in range(0, obj.get_attribute_count()):
+                attr = obj.get_attribute(i_attr)
+                attr_name = attr.get_name()
+                attr_type = attr.get_type()
+                # Object references
+                if attr_type in [5, 6]:
+                    if attr.get_container() in [1, 2]:
+                        objects = self.ix.api.OfObjectVector()
+                        attr.get_values(objects)
+                        for i_obj in range(0, objects.get_count()):
+                            if objects[i_obj]:
+                                connections.append(Connection(owner, owner_class, VALUE, str(objects[i_obj]),
+                                                              attr_name=attr_name, index=i_obj))
+                    elif attr.get_object():
+                        connections.append(Connection(owner, owner_class, VALUE, str(attr.get_object()),
+                                                      attr_name=attr_name))
+                # String references
+                elif attr_type in [3, 4]:
+                    if str(attr.get_string()).startswith(ITEM_PATH_PREFIX):
+                        connections.append(Connection(owner, owner_class, TEXTURE, str(attr.get_string()),
+                                                      attr_name=attr_name))
+                # Texture inputs
+                elif attr.is_textured():
+                    connections.append(Connection(owner, owner_class, TEXTURE, str(attr.get_texture()),
+                                                  attr_name=attr_name))
+        self.scanned[owner] = connections
+        for connection in connections:
+            self.connections.setdefault(connection.target, []).append(connection)
+
+    def get_connections(self, item):
+        """Returns the connections that reference the item."""
+        self.add([item])
+        return list(self.connections.get(str(item), []))
+
+    def replace(self, new_item, connections):
+        """Points the connections at new_item. Only updates the index, the caller sends the commands."""
+        new_path = str(new_item)
+        for connection in connections:
+            old_connections = self.connections.get(connection.target)
+            if old_connections and connection in old_connections:
+                old_connections.remove(connection)
+            connection.target = new_path
+            self.connections.setdefault(new_path, []).append(connection)
+
+    def rename(self, old_path, new_path):
+        """Updates the paths of a renamed item and of the items inside it if it's a context."""
+        def renamed(path):
+            if path == old_path or path.startswith(old_path + '/'):
+                return new_path + path[len(old_path):]
+            return path
+
+        connections = self.connections
+        self.connections = {}
+        for target, target_connections in connections.iteritems():
+            self.connections.setdefault(renamed(target), []).extend(target_connections)
+        scanned = self.scanned
+        self.scanned = {}
+        for owner, owner_connections in scanned.iteritems():
+            self.scanned[renamed(owner)] = owner_connections
+        for owner_connections in self.scanned.itervalues():
+            for connection in owner_connections:
+                connection.owner = renamed(connection.owner)
+                connection.target = renamed(connection.target)
+        self.outputs_known = set(renamed(path) for path in self.outputs_known)
+
+    def invalidate_item(self, item):
+        """Looks up the outputs of the item again the next time, use it after connecting it without the index."""
+        self.outputs_known.discard(str(item))
+
+    def forget(self, items):
+        """Removes deleted objects with their own connections and the connections that referenced them."""
+        for item in items:
+            path = str(item)
+            self.outputs_known.discard(path)
+            for connection in self.scanned.pop(path, []):
+                target_connections = self.connections.get(connection.target)
+                if target_connections and connection in target_connections:
+                    target_connections.remove(connection)
+            # Clarisse clears the references to deleted items.
+            for connection in self.connections.pop(path, []):
+                owner_connections = self.scanned.get(connection.owner)
+                if owner_connections and connection in owner_connections:
+                    owner_connections.remove(connection)
+
+    def invalidate(self):
+        self.connections = {}
+        self.scanned = {}
+        self.outputs_known = set()
+
+
+def get_connection_index(ix):
+    """Returns the connection index that is active for ix, so nested operations share it, or a new one."""
+    connection_index = _active_indices.get(id(ix))
+    if connection_index is None:
+        connection_index = ConnectionIndex(ix)
+    return connection_index
+
+
+def index_connections(func):
+    """
+    Decorator that shares one connection index between all connection lookups of the function.
+    ix is taken from the ix keyword argument like get_ix does.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from clarisse_survival_kit.utility import get_ix
+        with get_connection_index(get_ix(kwargs.get("ix"))):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,499 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import platform
+import threading
+import subprocess
+import collections
+import Queue
+import multiprocessing.dummy as mp
+
+from clarisse_survival_kit.settings import *
+
+
+# Manifest states of a conversion job.
+UP_TO_DATE = 'up to date'
+UNTRACKED = 'untracked'
+MISSING_SOURCE = 'missing source'
+MISSING_OUTPUT = 'missing output'
+SOURCE_CHANGED = 'source changed'
+OUTPUT_CHANGED = 'output changed'
+FLAGS_CHANGED = 'flags changed'
+CANCELLED = 'cancelled'
+
+
+def get_file_hash(path, record=None, prefix=''):
+    """
+    Returns the SHA1 of the file contents or None if the file can't be read.
+    If the record holds a hash for the same size and mtime it is returned without reading the file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if record and record.get(prefix + 'size') == stat.st_size and record.get(prefix + 'mtime') == stat.st_mtime:
+        return record.get(prefix + 'hash')
+    sha1 = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+    except IOError:
+        return None
+    return sha1.hexdigest()
+
+
+def get_command_flags(command_string):
+    """Returns the converter name and arguments without the converter location and thread count."""
+    match = re.match(r'\s*"([^"]*)"(.*)$', command_string)
+    if match:
+        converter = os.path.splitext(os.path.basename(match.group(1)))[0]
+        arguments = match.group(2)
+    else:
+        converter = ''
+        arguments = command_string
+    arguments = re.sub(r'\s*--threads \{threads\}', '', arguments)
+    return (converter + arguments).strip()
+
+
+def build_converter_command(extension, clarisse_dir):
+    """
+    Returns the command string and environment of the converter that writes the specified extension.
+    clarisse_dir is the directory holding the maketx and iconvert executables, usually CLARISSE_BIN_DIR.
+    """
+    env = dict(os.environ)
+    if platform.system().lower().startswith("linux"):
+        env['LD_LIBRARY_PATH'] = os.path.normpath(clarisse_dir)
+    elif platform.system().lower() == "darwin":
+        env['DYLD_LIBRARY_PATH'] = os.path.normpath(clarisse_dir)
+
+    if extension == 'tx':
+        executable_name = 'maketx'
+        command_string = r'"{converter}" -v -u --oiio --resize --threads {threads} "{old_file}" -o "{new_file}"'
+    else:
+        executable_name = 'iconvert'
+        command_string = r'"{converter}" --threads {threads} "{old_file}" "{new_file}"'
+    if platform.system().lower() == "windows":
+        executable_name += '.exe'
+    converter_path = os.path.normpath(os.path.join(clarisse_dir, executable_name))
+    command_string = command_string.replace('{converter}', converter_path.replace('{', '{{').replace('}', '}}'))
+    logging.debug('Command string:')
+    logging.debug(command_string)
+    return command_string, env
+
+
+class ConversionJob(object):
+    """A single source to target conversion. The command string is formatted with old_file, new_file and threads."""
+
+    def __init__(self, source, target, command_string, env=None):
+        self.source = os.path.normpath(source)
+        self.target = os.path.normpath(target)
+        self.command_string = command_string
+        self.env = env
+        self.threads = 1
+        self.returncode = None
+        self.output = ''
+        self.error = ''
+        self.elapsed = 0.0
+        self.success = False
+        self.skipped = False
+        self.status = None
+        self.source_hash = None
+        self.done = False
+        self.process = None
+
+    @property
+    def key(self):
+        return os.path.normcase(self.source), os.path.normcase(self.target)
+
+    def get_command(self):
+        return self.command_string.format(old_file=self.source, new_file=self.target, threads=self.threads)
+
+    def run(self):
+        """Runs the converter and checks if the target file was written."""
+        command = self.get_command()
+        logging.debug(command)
+        start = time.time()
+        try:
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True,
+                                            env=self.env)
+            self.output, self.error = self.process.communicate()
+            self.returncode = self.process.returncode
+        except OSError as e:
+            self.error = str(e)
+        self.elapsed = time.time() - start
+        self.success = self.returncode == 0 and os.path.exists(self.target) and os.path.getsize(self.target) >= 10
+        if self.success:
+            try:
+                os.utime(self.target, None)
+            except OSError:
+                logging.debug('******ERROR couldn\'t set utime in file******')
+        return self
+
+    def cancel(self):
+        """Kills the converter if it's running."""
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+
+    def to_dict(self):
+        """Returns the result of the job with the file sizes in bytes. Sizes of missing files are None."""
+        sizes = []
+        for path in (self.source, self.target):
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(None)
+        return {'source': self.source, 'target': self.target, 'status': self.status, 'success': self.success,
+                'skipped': self.skipped, 'returncode': self.returncode, 'threads': self.threads,
+                'elapsed': round(self.elapsed, 3), 'source_bytes': sizes[0], 'target_bytes': sizes[1],
+                'error': (self.error or '').strip() if not self.success else ''}
+
+    def __str__(self):
+        if self.skipped:
+            return '%s: %s' % (self.status.capitalize(), self.target)
+        if self.success:
+            return 'Converted %s (%.2fs, %i threads)' % (self.target, self.elapsed, self.threads)
+        return 'ERROR: Failed to convert %s to %s: %s' % (self.source, self.target, (self.error or '').strip())
+
+
+class ThreadBudget(object):
+    """Splits a fixed number of threads between the jobs that run at the same time."""
+
+    def __init__(self, total, max_per_job=MAX_CONVERTER_THREADS):
+        self.total = max(total, 1)
+        self.max_per_job = max_per_job
+        self.available = self.total
+        self.lock = threading.Lock()
+
+    def acquire(self, share):
+        """Returns the threads for a job that starts now. The free threads are divided by share."""
+        with self.lock:
+            threads = max(1, min(self.available // max(share, 1), self.max_per_job))
+            self.available -= threads
+            return threads
+
+    def release(self, threads):
+        with self.lock:
+            self.available += threads
+
+
+class ConversionManifest(object):
+    """
+    The conversion records of one target directory, stored as a JSON sidecar next to the converted files.
+    Records are keyed by the target filename and store the source path relative to the directory,
+    so the manifest stays valid when the directory is copied to another location.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.normpath(directory)
+        self.path = os.path.join(self.directory, CONVERSION_MANIFEST_FILENAME)
+        self.records = {}
+        self.dirty = False
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as manifest_file:
+                    records = json.load(manifest_file).get('records', {})
+                # Paths are handled as byte strings everywhere else.
+                for target_name, record in records.iteritems():
+                    record['source'] = record.get('source', u'').encode('utf-8')
+                    self.records[target_name.encode('utf-8')] = record
+            except (IOError, ValueError) as e:
+                logging.error('Could not read conversion manifest %s: %s', self.path, e)
+
+    def get_source_name(self, source):
+        try:
+            return os.path.relpath(source, self.directory)
+        except ValueError:
+            # Source is on another drive.
+            return source
+
+    def get_status(self, job, check_flags=True):
+        """Returns the manifest state of the job. Stores the source hash on the job so it can be recorded later."""
+        if not os.path.isfile(job.source):
+            return MISSING_SOURCE
+        record = self.records.get(os.path.basename(job.target))
+        if record and record.get('source') != self.get_source_name(job.source):
+            record = None
+        job.source_hash = get_file_hash(job.source, record, 'source_')
+        if not record:
+            return UNTRACKED
+        if not os.path.isfile(job.target):
+            return MISSING_OUTPUT
+        if record.get('source_hash') != job.source_hash:
+            return SOURCE_CHANGED
+        if check_flags and record.get('flags') != get_command_flags(job.command_string):
+            return FLAGS_CHANGED
+        if record.get('output_hash') != get_file_hash(job.target, record, 'output_'):
+            return OUTPUT_CHANGED
+        self._update_stats(record, job)
+        return UP_TO_DATE
+
+    def _update_stats(self, record, job):
+        """
+        Stores the current size and mtime of the files of an up to date record. Copied or restored files match by
+        hash only, without it they'd be hashed again on every run.
+        """
+        for prefix, path in (('source_', job.source), ('output_', job.target)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if record.get(prefix + 'size') != stat.st_size or record.get(prefix + 'mtime') != stat.st_mtime:
+                record[prefix + 'size'] = stat.st_size
+                record[prefix + 'mtime'] = stat.st_mtime
+                self.dirty = True
+
+    def record(self, job):
+        """Records a successful conversion."""
+        source_stat = os.stat(job.source)
+        output_stat = os.stat(job.target)
+        if not job.source_hash:
+            job.source_hash = get_file_hash(job.source)
+        self.records[os.path.basename(job.target)] = {
+            'source': self.get_source_name(job.source),
+            'source_hash': job.source_hash,
+            'source_size': source_stat.st_size,
+            'source_mtime': source_stat.st_mtime,
+            'flags': get_command_flags(job.command_string),
+            'output_hash': get_file_hash(job.target),
+            'output_size': output_stat.st_size,
+            'output_mtime': output_stat.st_mtime,
+        }
+        self.dirty = True
+
+    def save(self):
+        """Writes the manifest to a temporary file first so an interrupted save doesn't corrupt it."""
+        if not self.dirty:
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as manifest_file:
+                json.dump({'version': 1, 'records': self.records}, manifest_file, indent=1, sort_keys=True)
+            if os.path.exists(self.path):
+                # os.rename doesn't replace existing files on Windows.
+                os.remove(self.path)
+            os.rename(temp_path, self.path)
+            self.dirty = False
+        except (IOError, OSError) as e:
+            logging.error('Could not write conversion manifest %s: %s', self.path, e)
+
+
+class ConversionManifests(object):
+    """Loads the manifests of the target directories on demand. Can be shared between threads."""
+
+    def __init__(self):
+        self.manifests = {}
+        self.lock = threading.Lock()
+
+    def get_manifest(self, target):
+        directory = os.path.dirname(os.path.normpath(target))
+        with self.lock:
+            manifest = self.manifests.get(directory)
+            if manifest is None:
+                manifest = ConversionManifest(directory)
+                self.manifests[directory] = manifest
+            return manifest
+
+    def get_record(self, target):
+        return self.get_manifest(target).records.get(os.path.basename(os.path.normpath(target)))
+
+    def get_status(self, job):
+        return self.get_manifest(job.target).get_status(job)
+
+    def record(self, job):
+        manifest = self.get_manifest(job.target)
+        with self.lock:
+            manifest.record(job)
+
+    def save(self):
+        with self.lock:
+            for manifest in self.manifests.values():
+                manifest.save()
+
+    def verify(self, directory):
+        """Returns (target, state) tuples for all records in the manifest of the directory without converting."""
+        manifest = self.get_manifest(os.path.join(directory, CONVERSION_MANIFEST_FILENAME))
+        results = []
+        for target_name, record in sorted(manifest.records.items()):
+            source = os.path.normpath(os.path.join(manifest.directory, record.get('source', '')))
+            job = ConversionJob(source, os.path.join(manifest.directory, target_name), '')
+            # The converter command is unknown outside of a conversion so only the files are compared.
+            results.append((job.target, manifest.get_status(job, check_flags=False)))
+        return results
+
+
+class ConversionQueue(object):
+    """Collects conversion jobs, drops duplicate source and target pairs and runs them on a bounded process pool."""
+
+    def __init__(self):
+        self.jobs = collections.OrderedDict()
+        self.targets = {}
+
+    def add(self, source, target, command_string, env=None):
+        """Adds a job and returns it. If the same conversion was already added that job is returned instead."""
+        job = ConversionJob(source, target, command_string, env=env)
+        if job.key in self.jobs:
+            logging.debug('Skipping duplicate conversion: %s', job.source)
+            return self.jobs[job.key]
+        other_job = self.targets.get(job.key[1])
+        if other_job:
+            # Two converters can't write the same file at the same time.
+            logging.warning('Skipping %s because %s is already converted to %s', job.source, other_job.source,
+                            job.target)
+            return other_job
+        self.jobs[job.key] = job
+        self.targets[job.key[1]] = job
+        return job
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def start(self, thread_budget=CONVERSION_THREAD_BUDGET, max_processes=CONVERSION_MAX_PROCESSES,
+              manifests=None, verify_only=False):
+        """
+        Starts all jobs in the background and returns a ConversionBatch to poll them.
+        When manifests are passed, jobs whose source, flags and output still match the manifest are skipped
+        and successful conversions are recorded. With verify_only nothing is converted and every job
+        is skipped with its manifest state.
+        """
+        return ConversionBatch(self.jobs.values(), thread_budget=thread_budget, max_processes=max_processes,
+                               manifests=manifests, verify_only=verify_only)
+
+    def run(self, thread_budget=CONVERSION_THREAD_BUDGET, max_processes=CONVERSION_MAX_PROCESSES, on_wait=None,
+            on_job_done=None, manifests=None, verify_only=False):
+        """
+        Runs all jobs and returns them in the order they were added.
+        on_wait is called while waiting for jobs to finish and on_job_done with every finished job.
+        Both are called from the calling thread. See start for the other arguments.
+        """
+        batch = self.start(thread_budget=thread_budget, max_processes=max_processes, manifests=manifests,
+                           verify_only=verify_only)
+        try:
+            for job in batch.wait(on_wait=on_wait):
+                if on_job_done:
+                    on_job_done(job)
+        finally:
+            batch.cancel()
+        return batch.jobs
+
+
+class ConversionBatch(object):
+    """
+    Conversion jobs that run in the background. The converters run as separate processes,
+    the threads of the pool only wait for them. Finished jobs are collected with poll or wait.
+    The largest source files are started first, which keeps the pool busy until the end.
+    """
+
+    def __init__(self, jobs, thread_budget=CONVERSION_THREAD_BUDGET, max_processes=CONVERSION_MAX_PROCESSES,
+                 manifests=None, verify_only=False):
+        self.jobs = list(jobs)
+        self.manifests = manifests
+        self.verify_only = verify_only
+        self.finished = Queue.Queue()
+        self.finished_count = 0
+        self.cancelled = False
+        if not thread_budget:
+            thread_budget = mp.cpu_count()
+        self.process_count = max(1, min(len(self.jobs), max_processes, thread_budget))
+        self.budget = ThreadBudget(thread_budget)
+        self.counts = {'waiting': len(self.jobs), 'running': 0}
+        self.lock = threading.Lock()
+        self.pool = None
+        if self.jobs:
+            logging.debug('Running %i conversions in %i processes with %i threads', len(self.jobs),
+                          self.process_count, thread_budget)
+            self.pool = mp.Pool(self.process_count)
+            for job in sorted(self.jobs, key=self._get_size, reverse=True):
+                self.pool.apply_async(self._run_job, (job,))
+            self.pool.close()
+
+    @staticmethod
+    def _get_size(job):
+        try:
+            return os.path.getsize(job.source)
+        except OSError:
+            return 0
+
+    def _run_job(self, job):
+        try:
+            if self.cancelled:
+                job.status = CANCELLED
+                job.skipped = True
+                return
+            if self.manifests is not None:
+                job.status = self.manifests.get_status(job)
+                if self.verify_only or job.status == UP_TO_DATE:
+                    job.skipped = True
+                    job.success = job.status == UP_TO_DATE
+                    return
+            with self.lock:
+                # Share the free threads with the jobs that can start next to this one.
+                share = min(self.counts['waiting'], self.process_count - self.counts['running'])
+                self.counts['waiting'] -= 1
+                self.counts['running'] += 1
+            job.threads = self.budget.acquire(share)
+            try:
+                job.run()
+                if job.success and self.manifests is not None:
+                    self.manifests.record(job)
+            finally:
+                self.budget.release(job.threads)
+                with self.lock:
+                    self.counts['running'] -= 1
+        except Exception as e:
+            job.success = False
+            job.error = str(e)
+        finally:
+            with self.lock:
+                if job.skipped:
+                    self.counts['waiting'] -= 1
+            job.done = True
+            self.finished.put(job)
+
+    def poll(self):
+        """Returns the jobs that finished since the last call without blocking."""
+        jobs = []
+        while True:
+            try:
+                jobs.append(self.finished.get_nowait())
+            except Queue.Empty:
+                break
+        self._collect(jobs)
+        return jobs
+
+    def wait(self, on_wait=None):
+        """Yields the jobs as they finish. on_wait is called repeatedly while waiting."""
+        while not self.is_done():
+            try:
+                job = self.finished.get(timeout=0.05 if on_wait else None)
+            except Queue.Empty:
+                on_wait()
+                continue
+            self._collect([job])
+            yield job
+
+    def _collect(self, jobs):
+        for job in jobs:
+            logging.debug("%s", job)
+        self.finished_count += len(jobs)
+        if jobs and self.manifests is not None:
+            # Saved after every batch of finished jobs so an interrupted batch still keeps its records.
+            self.manifests.save()
+        if self.pool and self.is_done():
+            self.pool.join()
+            self.pool = None
+
+    def is_done(self):
+        return self.finished_count >= len(self.jobs)
+
+    def cancel(self):
+        """Stops running converters. Jobs that didn't start yet finish as cancelled."""
+        self.cancelled = True
+        for job in self.jobs:
+            job.cancel()
@@ -23,6 +23,7 @@ def get_selected_textures(items=None):
 
 def converter_gui():
     logging.debug("Converter GUI started")
+    background_conversions = []
 
     class EventRewire(ix.api.EventObject):
         def path_refresh(self, sender, evtid):
@@ -52,19 +53,25 @@ def converter_gui():
             if directory and not os.path.isdir(str(directory)):
                 ix.log_warning("No valid directory specified")
                 return None
+            textures = []
+            for i in range(0, selection_list.get_item_count()):
+                tx = ix.get_item(selection_list.get_item_name(i))
+                if tx:
+                    textures.append(tx)
+            if background_checkbox.get_value():
+                # Textures are swapped in by poll_conversions as soon as their files are converted.
+                background_conversions.append(
+                    start_texture_conversion(textures, extension=extension_list.get_selected_item_name(),
+                                             replace=replace_checkbox.get_value(), target_folder=directory,
+                                             verify_only=verify_checkbox.get_value(), ix=ix))
+                return None
             ix.begin_command_batch("Convert")
-            count = selection_list.get_item_count()
             progress = ix.application.create_progress_bar('Converting textures...')
             progress.set_value(0.0)
-            progress.set_step_count(count)
             progress.start()
-            for i in range(0, count):
-                tx = ix.get_item(selection_list.get_item_name(i))
-                if tx:
-                    convert_tx(tx, extension=extension_list.get_selected_item_name(),
-                               replace=replace_checkbox.get_value(), target_folder=directory, ix=ix)
-                progress.step(i)
-                ix.application.check_for_events()
+            convert_textures(textures, extension=extension_list.get_selected_item_name(),
+                             replace=replace_checkbox.get_value(), target_folder=directory, progress=progress,
+                             verify_only=verify_checkbox.get_value(), ix=ix)
             progress.destroy()
             ix.end_command_batch()
 
@@ -97,6 +104,14 @@ def converter_gui():
     replace_checkbox = ix.api.GuiCheckbox(panel, 180, 130, "")
     replace_checkbox.set_value(True)
 
+    verify_label = ix.api.GuiLabel(panel, 320, 130, 150, 22, "Verify only: ")
+    verify_checkbox = ix.api.GuiCheckbox(panel, 480, 130, "")
+    verify_checkbox.set_value(False)
+
+    background_label = ix.api.GuiLabel(panel, 320, 100, 150, 22, "Run in background: ")
+    background_checkbox = ix.api.GuiCheckbox(panel, 480, 100, "")
+    background_checkbox.set_value(True)
+
     selection_label = ix.api.GuiLabel(panel, 10, 160, 350, 22, "Textures that will be converted: ")
     textures = get_selected_textures()
     selection_list = ix.api.GuiListView(panel, 10, 180, 580, 90)
@@ -126,9 +141,22 @@ def converter_gui():
                          event_rewire.run)
 
     # Send all info to clarisse to generate window
+    def poll_conversions():
+        for conversion in background_conversions[:]:
+            conversion.poll()
+            if conversion.is_done():
+                background_conversions.remove(conversion)
+                print "Background conversion finished"
+
     window.show()
-    while window.is_shown():    ix.application.check_for_events()
+    while window.is_shown():
+        ix.application.check_for_events()
+        poll_conversions()
     window.destroy()
+    # Keep swapping in converted textures after the window was closed.
+    while background_conversions:
+        ix.application.check_for_events()
+        poll_conversions()
 
 
 converter_gui()
@@ -0,0 +1,89 @@
+import time
+import logging
+import collections
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.command_buffer import flush_commands
+
+_event_pumps = {}
+
+
+class EventPump(object):
+    """
+    Dispatches the UI events of Clarisse with ix.application.check_for_events.
+    Each dispatch redraws the interface, so pumps that aren't required are skipped until EVENT_PUMP_INTERVAL
+    seconds passed since the last dispatch. Pumps and requests are counted per operation.
+    """
+
+    def __init__(self, ix, interval=None):
+        self.ix = ix
+        self.interval = EVENT_PUMP_INTERVAL if interval is None else interval
+        self.last_pump = 0
+        self.requests = collections.Counter()
+        self.pumps = collections.Counter()
+        self.waited = 0.0
+
+    def pump(self, operation='other', required=False):
+        """
+        Dispatches the events if required or if the time slice passed. Required pumps are for code that depends
+        on the result of the previous commands, like setting attributes that only exist after another is set.
+        Returns True if the events were dispatched.
+        """
+        self.requests[operation] += 1
+        now = time.time()
+        if not required and now - self.last_pump < self.interval:
+            return False
+        if required:
+            flush_commands(self.ix)
+        self.ix.application.check_for_events()
+        self.last_pump = time.time()
+        self.pumps[operation] += 1
+        return True
+
+    def wait_until(self, condition, operation='other', timeout=EVENT_PUMP_TIMEOUT, poll_interval=0.01):
+        """
+        Dispatches events until condition returns True. Replaces fixed sleeps before dependent commands.
+        Returns the last result of condition so the caller can handle a timeout.
+        """
+        start = time.time()
+        result = condition()
+        while not result and time.time() - start < timeout:
+            self.pump(operation, required=True)
+            result = condition()
+            if not result:
+                time.sleep(poll_interval)
+        self.waited += time.time() - start
+        if not result:
+            logging.warning("Timed out after %.2fs waiting for %s", timeout, operation)
+        return result
+
+    def get_stats(self):
+        """Returns the number of requested and dispatched pumps per operation."""
+        return dict((operation, {'requests': count, 'pumps': self.pumps[operation]})
+                    for operation, count in self.requests.iteritems())
+
+    def log_stats(self):
+        requests = sum(self.requests.values())
+        pumps = sum(self.pumps.values())
+        logging.debug("Pumped events %i of %i times, waited %.2fs", pumps, requests, self.waited)
+        for operation, stats in sorted(self.get_stats().items()):
+            logging.debug("    %s: %i of %i", operation, stats['pumps'], stats['requests'])
+        return requests, pumps
+
+    def reset(self):
+        self.requests.clear()
+        self.pumps.clear()
+        self.waited = 0.0
+
+
+def get_event_pump(ix):
+    """Returns the event pump of ix. The counters are kept for the session."""
+    event_pump = _event_pumps.get(id(ix))
+    if event_pump is None:
+        event_pump = _event_pumps[id(ix)] = EventPump(ix)
+    return event_pump
+
+
+def pump_events(ix, operation='other', required=False):
+    """Dispatches the events of Clarisse, see EventPump.pump."""
+    return get_event_pump(ix).pump(operation, required=required)
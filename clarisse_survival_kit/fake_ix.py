@@ -0,0 +1,796 @@
+"""
+In-process stand-in for the ix module of Clarisse so the kit can be run and measured without Clarisse.
+It covers the subset of ix.cmds, ix.api, contexts, attributes and items outputs the kit uses.
+Every command is counted by name and can be slowed down with a LatencyModel to mimic a busy scene.
+
+    ix = FakeIx(latency=LatencyModel(default=0.001))
+    import_controller(asset_directory, ix=ix)
+    print ix.calls.most_common(10)
+"""
+import collections
+import functools
+import os
+import re
+import threading
+import time
+
+from clarisse_survival_kit.settings import *
+
+ROOT_PATH = 'project:/'
+SCENE_NAME = 'scene'
+
+# Kinds that match every class starting with their name, like TextureMapFile for Texture.
+BASE_CLASSES = ('Texture', 'Material', 'MaterialPhysical', 'Geometry', 'SceneObject')
+
+TYPE_LONG = 1
+TYPE_DOUBLE = 2
+TYPE_STRING = 3
+TYPE_REFERENCE = 5
+TYPE_NAMES = {TYPE_LONG: 'TYPE_LONG', TYPE_DOUBLE: 'TYPE_DOUBLE', TYPE_STRING: 'TYPE_STRING',
+              TYPE_REFERENCE: 'TYPE_REFERENCE'}
+
+
+class LatencyModel(object):
+    """
+    Simulated cost in seconds of a call into Clarisse. commands overrides the default per command name,
+    check_for_events and get_items_outputs included. Without sleep the latency is only added up in elapsed.
+    """
+
+    def __init__(self, default=0.0, commands=None, sleep=True):
+        self.default = default
+        self.commands = commands or {}
+        self.sleep = sleep
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self, name):
+        latency = self.commands.get(name, self.default)
+        if not latency:
+            return
+        with self.lock:
+            self.elapsed += latency
+        if self.sleep:
+            time.sleep(latency)
+
+
+class FakeArray(list):
+    """Stand-in for the OfObjectArray, OfItemVector and CoreStringArray containers."""
+
+    def add(self, item):
+        self.append(item)
+
+    def get_count(self):
+        return len(self)
+
+
+def _to_number(value):
+    """Returns the value like attrs does: numbers for numeric strings and the rest as is."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, basestring):
+        for cast in (int, float):
+            try:
+                return cast(value)
+            except ValueError:
+                pass
+    return value
+
+
+class FakeAttribute(object):
+    def __init__(self, item, name):
+        self.item = item
+        self.name = name
+        self.values = []
+        self.texture = None
+        self.expression = None
+
+    def __str__(self):
+        return str(self.item) + '.' + self.name
+
+    def set(self, values, index=None):
+        values = [self.item.ix.to_value(value) for value in values]
+        if index is None:
+            self.values = values
+            return
+        if len(self.values) <= index:
+            self.values.extend([0] * (index + 1 - len(self.values)))
+        self.values[index] = values[0] if values else 0
+
+    def get(self, index):
+        if index < len(self.values):
+            return _to_number(self.values[index])
+        return 0
+
+    def get_name(self):
+        return self.name
+
+    def get_parent_object(self):
+        return self.item
+
+    def get_type(self):
+        if any(isinstance(value, FakeItem) for value in self.values):
+            return TYPE_REFERENCE
+        if any(isinstance(_to_number(value), basestring) for value in self.values):
+            return TYPE_STRING
+        if any(isinstance(_to_number(value), float) for value in self.values):
+            return TYPE_DOUBLE
+        return TYPE_LONG
+
+    def get_type_name(self, attr_type):
+        return TYPE_NAMES.get(attr_type, 'TYPE_LONG')
+
+    def get_container(self):
+        return 1 if len(self.values) > 1 else 0
+
+    def get_values(self, vector):
+        for value in self.values:
+            vector.add(value)
+
+    def get_object(self):
+        for value in self.values:
+            if isinstance(value, FakeItem):
+                return value
+        return None
+
+    def get_string(self):
+        return str(self.values[0]) if self.values else ''
+
+    def get_bool(self):
+        return bool(self.get(0))
+
+    def is_textured(self):
+        return self.texture is not None
+
+    def get_texture(self):
+        return self.texture
+
+    def is_locked(self):
+        return False
+
+    def is_editable(self):
+        return True
+
+
+class FakeAttributeValues(object):
+    """What item.attrs.name returns: indexable values with the attribute in .attr."""
+
+    def __init__(self, attr):
+        self.attr = attr
+
+    def __getitem__(self, index):
+        return self.attr.get(index)
+
+    def __setitem__(self, index, value):
+        self.attr.item.ix.call('SetValue')
+        self.attr.set([value], index)
+
+    def __str__(self):
+        return str([str(value) if isinstance(value, FakeItem) else _to_number(value) for value in self.attr.values])
+
+
+class FakeAttrs(object):
+    def __init__(self, item):
+        object.__setattr__(self, 'item', item)
+
+    def __getattr__(self, name):
+        return FakeAttributeValues(self.item.get_attribute(name))
+
+    def __setattr__(self, name, value):
+        self.item.ix.call('SetValue')
+        self.item.get_attribute(name).set(value if isinstance(value, (list, tuple)) else [value])
+
+
+class FakeRules(object):
+    def __init__(self, rules):
+        self.rules = rules
+
+    def get_count(self):
+        return len(self.rules)
+
+
+class FakeModule(object):
+    """Module of an item. Covers the geometry shading groups and the shading layer rules."""
+
+    def __init__(self, item):
+        self.item = item
+
+    def get_shading_group_count(self):
+        return self.item.ix.shading_groups
+
+    def get_geometry(self):
+        return self
+
+    def get_shading_group_names(self):
+        return FakeArray('group%i' % i for i in range(self.item.ix.shading_groups))
+
+    def _assign(self, attr_name, module, index):
+        self.item.ix.call('SetValue')
+        self.item.get_attribute(attr_name).set([module.item], index)
+
+    def assign_material(self, module, index):
+        self._assign('materials', module, index)
+
+    def assign_clip_map(self, module, index):
+        self._assign('clip_maps', module, index)
+
+    def assign_displacement(self, module, index):
+        self._assign('displacements', module, index)
+
+    def get_rules(self):
+        return FakeRules(self.item.rules)
+
+    def get_rule_value(self, row, column):
+        return self.item.rules[row].get(column, '')
+
+    def set_rule_value(self, row, column, value):
+        self.item.ix.call('SetShadingLayerRulesProperty')
+        self.item.rules[row][column] = str(value)
+
+
+class FakeItem(object):
+    def __init__(self, ix, name, class_name, parent):
+        self.ix = ix
+        self.name = name
+        self.class_name = class_name
+        self.parent = parent
+        self.deleted = False
+
+    def __str__(self):
+        return self.get_full_name()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.class_name, self.get_full_name())
+
+    def get_full_name(self):
+        if self.parent is None:
+            return ROOT_PATH
+        return str(self.parent) + '/' + self.name
+
+    def get_name(self):
+        return self.name
+
+    def get_contextual_name(self):
+        return self.name
+
+    def get_class_name(self):
+        return self.class_name
+
+    def get_context(self):
+        return self.parent
+
+    def get_parent(self):
+        return self.parent
+
+    def is_kindof(self, kind):
+        return self.class_name == kind or (kind in BASE_CLASSES and self.class_name.startswith(kind))
+
+    def is_local(self):
+        return True
+
+    def is_editable(self):
+        return True
+
+    def is_content_locked(self):
+        return False
+
+    def is_remote(self):
+        return False
+
+    def is_object(self):
+        return not self.is_context()
+
+    def to_object(self):
+        return self
+
+    def get_module(self):
+        return FakeModule(self)
+
+
+class FakeChildren(collections.OrderedDict):
+    """The items of a context by name. Contexts and objects are split once per change, like Clarisse indexes them."""
+
+    def __init__(self):
+        collections.OrderedDict.__init__(self)
+        self.split = None
+
+    def __setitem__(self, name, item, *args):
+        self.split = None
+        collections.OrderedDict.__setitem__(self, name, item, *args)
+
+    def __delitem__(self, name, *args):
+        self.split = None
+        collections.OrderedDict.__delitem__(self, name, *args)
+
+    def get_split(self):
+        if self.split is None:
+            contexts = [child for child in self.values() if child.is_context()]
+            objects = [child for child in self.values() if not child.is_context()]
+            self.split = (contexts, objects)
+        return self.split
+
+
+class FakeContext(FakeItem):
+    def __init__(self, ix, name, parent, class_name='OfContext'):
+        FakeItem.__init__(self, ix, name, class_name, parent)
+        self.children = FakeChildren()
+
+    def is_context(self):
+        return True
+
+    def get_contexts(self):
+        return list(self.children.get_split()[0])
+
+    def get_objects(self):
+        return list(self.children.get_split()[1])
+
+    def get_context_count(self):
+        return len(self.children.get_split()[0])
+
+    def get_context(self, index=None):
+        if index is None:
+            return self.parent
+        return self.children.get_split()[0][index]
+
+    def get_object_count(self):
+        return len(self.children.get_split()[1])
+
+    def get_all_objects(self, array, flags=None, recursive=False):
+        objects = self.get_objects()
+        if recursive:
+            for ctx in self.get_contexts():
+                ctx.get_all_objects(objects, flags, recursive)
+        array[:] = objects
+
+
+class FakeObject(FakeItem):
+    def __init__(self, ix, name, class_name, parent):
+        FakeItem.__init__(self, ix, name, class_name, parent)
+        self.attributes = collections.OrderedDict()
+        self.attrs = FakeAttrs(self)
+        self.rules = []
+        self.enabled = True
+
+    def is_context(self):
+        return False
+
+    def is_enabled(self):
+        return self.enabled
+
+    def attribute_exists(self, name):
+        return True
+
+    def get_attribute(self, name):
+        if isinstance(name, int):
+            return self.attributes.values()[name]
+        attr = self.attributes.get(name)
+        if attr is None:
+            attr = self.attributes[name] = FakeAttribute(self, name)
+        return attr
+
+    def get_attribute_count(self):
+        return len(self.attributes)
+
+    def call_action(self, name):
+        self.ix.call('call_action')
+
+
+class FakeCommands(object):
+    """ix.cmds. Commands the kit uses change the fake scene, any other command is only counted."""
+
+    def __init__(self, ix):
+        self.ix = ix
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            self.ix.call(name)
+        return command
+
+
+def _set_command(name):
+    """Adds the function as a command of FakeCommands. Calls are counted under the name of the command."""
+    def decorator(func):
+        @functools.wraps(func)
+        def command(self, *args, **kwargs):
+            self.ix.call(name)
+            return func(self, *args, **kwargs)
+        setattr(FakeCommands, name, command)
+        return func
+    return decorator
+
+
+@_set_command('CreateObject')
+def _create_object(self, name, class_name, mode='Global', ctx=None):
+    return self.ix.add_item(FakeObject, name, class_name, ctx)
+
+
+@_set_command('CreateContext')
+def _create_context(self, name, mode='Global', ctx=None):
+    return self.ix.add_item(FakeContext, name, 'OfContext', ctx)
+
+
+@_set_command('CreateFileReference')
+def _create_file_reference(self, ctx, files):
+    name = re.sub(r'\W', '_', os.path.splitext(os.path.basename(files[0]))[0])
+    return self.ix.add_item(FakeContext, name, 'OfContextReference', ctx)
+
+
+@_set_command('DisableItems')
+def _disable_items(self, items, disable=True):
+    for item in items:
+        self.ix.get_item(item).enabled = not disable
+
+
+@_set_command('SetValue')
+def _set_value(self, attr, values):
+    self.ix.set_attribute(attr, values)
+
+
+@_set_command('SetValues')
+def _set_values(self, attrs, values):
+    for attr, value in zip(attrs, values):
+        self.ix.set_attribute(attr, [value])
+
+
+@_set_command('AddValues')
+def _add_values(self, attrs, values):
+    for attr in attrs:
+        attr = self.ix.get_attribute(attr)
+        attr.set(attr.values + list(values))
+
+
+@_set_command('RemoveValue')
+def _remove_value(self, attrs, indices):
+    for attr in attrs:
+        attr = self.ix.get_attribute(attr)
+        attr.values = [value for i, value in enumerate(attr.values) if i not in indices]
+
+
+@_set_command('SetTexture')
+def _set_texture(self, attrs, texture):
+    texture = self.ix.get_item(texture) if texture else None
+    for attr in attrs:
+        self.ix.get_attribute(attr).texture = texture
+
+
+@_set_command('SetExpression')
+def _set_expression(self, attrs, expressions):
+    for attr, expression in zip(attrs, expressions):
+        self.ix.get_attribute(attr).expression = expression
+
+
+@_set_command('CreateCustomAttribute')
+def _create_custom_attribute(self, items, name, attr_type, *args):
+    for item in items:
+        self.ix.get_item(item).get_attribute(name)
+
+
+@_set_command('RenameItem')
+def _rename_item(self, item, name):
+    item = self.ix.get_item(item)
+    if item.name == name:
+        return
+    del item.parent.children[item.name]
+    item.name = self.ix.get_unique_name(item.parent, name)
+    item.parent.children[item.name] = item
+
+
+@_set_command('DeleteItems')
+def _delete_items(self, items):
+    for item in items:
+        item = self.ix.get_item(item)
+        if item is not None:
+            del item.parent.children[item.name]
+            item.deleted = True
+
+
+@_set_command('MoveItemsTo')
+def _move_items_to(self, items, ctx):
+    ctx = self.ix.get_item(ctx)
+    for item in items:
+        item = self.ix.get_item(item)
+        del item.parent.children[item.name]
+        item.parent = ctx
+        item.name = self.ix.get_unique_name(ctx, item.name)
+        ctx.children[item.name] = item
+
+
+def _copy_item(ix, item, ctx, copies):
+    """Copies the item into ctx, contexts with everything inside them. copies maps the items to their copies."""
+    if item.is_context():
+        copy = ix.add_item(FakeContext, item.name, item.class_name, ctx)
+        for child in item.children.values():
+            _copy_item(ix, child, copy, copies)
+    else:
+        copy = ix.add_item(FakeObject, item.name, item.class_name, ctx)
+        copy.enabled = item.enabled
+        copy.rules = [dict(rule) for rule in item.rules]
+        for name, attr in item.attributes.iteritems():
+            copy_attr = copy.get_attribute(name)
+            copy_attr.values = list(attr.values)
+            copy_attr.texture = attr.texture
+            copy_attr.expression = attr.expression
+    copies[item] = copy
+    return copy
+
+
+@_set_command('Instantiate')
+def _instantiate(self, items):
+    """Copies the items next to them. References between the copied items are moved to the copies."""
+    instances = FakeArray()
+    copies = {}
+    for item in items:
+        item = self.ix.get_item(item)
+        instances.add(_copy_item(self.ix, item, item.parent, copies))
+    for copy in copies.values():
+        if copy.is_context():
+            continue
+        for attr in copy.attributes.itervalues():
+            attr.values = [copies.get(value, value) if isinstance(value, FakeItem) else value
+                           for value in attr.values]
+            attr.texture = copies.get(attr.texture, attr.texture)
+    return instances
+
+
+@_set_command('CombineItems')
+def _combine_items(self, items, ctx):
+    combiner = self.ix.add_item(FakeObject, 'combiner', 'SceneObjectCombiner', ctx)
+    combiner.get_attribute('objects').set([str(item) for item in items])
+    return combiner
+
+
+@_set_command('AddShadingLayerRule')
+def _add_shading_layer_rule(self, shading_layer, index, properties):
+    shading_layer = self.ix.get_item(shading_layer)
+    shading_layer.rules.insert(index, dict(zip(properties[::2], properties[1::2])))
+
+
+@_set_command('SetShadingLayerRulesProperty')
+def _set_shading_layer_rules_property(self, shading_layer, rows, name, values):
+    shading_layer = self.ix.get_item(shading_layer)
+    if len(values) != len(rows):
+        raise RuntimeError("SetShadingLayerRulesProperty takes one value per row")
+    for row, value in zip(rows, values):
+        shading_layer.rules[row][name] = value
+
+
+class FakeFactory(object):
+    def __init__(self, ix):
+        self.ix = ix
+
+    def get_items_outputs(self, items, output_items, recursive=False):
+        """Adds the objects with an attribute that references or is textured by one of the items."""
+        self.ix.call('get_items_outputs')
+        items = [item for item in items if item is not None]
+        for obj in self.ix.iter_objects():
+            for attr in obj.attributes.itervalues():
+                if any(attr.texture is item or any(value is item for value in attr.values) for item in items):
+                    output_items.add(obj)
+                    break
+
+    def get_vars(self):
+        return self
+
+    def get(self, name):
+        return FakeVariable()
+
+
+class FakeVariable(object):
+    def get_string(self):
+        return ''
+
+
+class FakeApplication(object):
+    def __init__(self, ix):
+        self.ix = ix
+
+    def get_working_context(self):
+        return self.ix.scene
+
+    def check_for_events(self):
+        self.ix.call('check_for_events')
+
+    def get_factory(self):
+        return FakeFactory(self.ix)
+
+    def select_next_outputs(self):
+        self.ix.call('select_next_outputs')
+        outputs = FakeArray()
+        self.get_factory().get_items_outputs(list(self.ix.selection), outputs)
+        self.ix.selection.items = list(outputs)
+
+    def get_max_thread_count(self):
+        return 8
+
+
+class FakeSelection(object):
+    def __init__(self, ix):
+        self.ix = ix
+        self.items = []
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def select(self, item):
+        self.ix.call('select')
+        if item not in self.items:
+            self.items.append(item)
+
+    def deselect_all(self):
+        self.ix.call('deselect_all')
+        self.items = []
+
+
+class FakeColorIO(object):
+    @staticmethod
+    def get_color_space_names():
+        """Every color space of the presets is installed."""
+        names = []
+        for preset in COLOR_SPACE_PRESETS.values():
+            for choices in preset.values():
+                names.extend(name for name in choices if name not in names)
+        return names
+
+
+class FakeApi(object):
+    ColorIO = FakeColorIO
+
+    @staticmethod
+    def OfObjectArray(count=0):
+        return FakeArray([None] * count)
+
+    @staticmethod
+    def OfItemArray(count=0):
+        return FakeArray([None] * count)
+
+    @staticmethod
+    def OfObjectVector():
+        return FakeArray()
+
+    @staticmethod
+    def OfItemVector():
+        return FakeArray()
+
+    @staticmethod
+    def CoreStringArray(count=0):
+        return FakeArray([''] * count)
+
+    @staticmethod
+    def CoreBitFieldHelper():
+        return None
+
+
+class FakeIx(object):
+    """
+    Stand-in for the ix module. The scene starts with the project:/ root and the project://scene working context.
+    Objects have every attribute, attributes are created when they're first read or set.
+    Every geometry has shading_groups shading groups.
+    """
+
+    def __init__(self, latency=None, shading_groups=1):
+        self.latency = latency or LatencyModel()
+        self.shading_groups = shading_groups
+        self.calls = collections.Counter()
+        self.calls_lock = threading.Lock()
+        self.warnings = []
+        self.root = FakeContext(self, '', None)
+        self.scene = FakeContext(self, SCENE_NAME, self.root)
+        self.root.children[SCENE_NAME] = self.scene
+        self.cmds = FakeCommands(self)
+        self.api = FakeApi()
+        self.application = FakeApplication(self)
+        self.selection = FakeSelection(self)
+
+    def call(self, name):
+        """Counts a call into Clarisse and waits for its simulated latency."""
+        with self.calls_lock:
+            self.calls[name] += 1
+        self.latency.wait(name)
+
+    def reset_stats(self):
+        self.calls.clear()
+        self.latency.elapsed = 0.0
+        self.warnings = []
+
+    def get_unique_name(self, ctx, name):
+        unique_name = name
+        i = 1
+        while unique_name in ctx.children:
+            unique_name = '%s%i' % (name, i)
+            i += 1
+        return unique_name
+
+    def add_item(self, item_class, name, class_name, ctx):
+        ctx = self.get_item(ctx) if ctx is not None else self.scene
+        name = self.get_unique_name(ctx, name)
+        if item_class is FakeContext:
+            item = FakeContext(self, name, ctx, class_name)
+        else:
+            item = item_class(self, name, class_name, ctx)
+        ctx.children[name] = item
+        return item
+
+    def iter_objects(self, ctx=None):
+        """Yields every object in the scene."""
+        stack = [ctx or self.root]
+        while stack:
+            ctx = stack.pop()
+            for child in ctx.children.values():
+                if child.is_context():
+                    stack.append(child)
+                else:
+                    yield child
+
+    def to_value(self, value):
+        """Values that are paths of items are stored as the item so they follow renames."""
+        if isinstance(value, basestring) and value.startswith(ROOT_PATH):
+            item = self.item_exists(value)
+            if isinstance(item, FakeItem):
+                return item
+        return value
+
+    def _find_item(self, path):
+        if isinstance(path, (FakeItem, FakeAttribute)):
+            return path
+        path = str(path)
+        if not path.startswith(ROOT_PATH):
+            return None
+        attr_name = None
+        index = None
+        match = re.match(r'^(.*/[^/.]*)\.(\w+)(?:\[(\d+)\])?$', path)
+        if match:
+            path, attr_name, index = match.groups()
+        item = self.root
+        for name in path[len(ROOT_PATH):].split('/'):
+            if not name:
+                continue
+            if not item.is_context():
+                return None
+            item = item.children.get(name)
+            if item is None:
+                return None
+        if attr_name:
+            if item.is_context():
+                return None
+            return item.get_attribute(attr_name)
+        return item
+
+    def item_exists(self, path):
+        return self._find_item(path)
+
+    def get_item(self, path):
+        item = self._find_item(path)
+        if item is None:
+            self.log_error('Item not found: ' + str(path))
+        return item
+
+    def get_attribute(self, path):
+        return self._find_item(re.sub(r'\[\d+\]$', '', str(path)))
+
+    def set_attribute(self, path, values):
+        match = re.search(r'\[(\d+)\]$', str(path))
+        attr = self.get_attribute(path)
+        if attr is None:
+            self.log_error('Attribute not found: ' + str(path))
+            return
+        attr.set(values, int(match.group(1)) if match else None)
+
+    def begin_command_batch(self, name):
+        self.call('begin_command_batch')
+
+    def end_command_batch(self):
+        self.call('end_command_batch')
+
+    def log_info(self, message):
+        pass
+
+    def log_warning(self, message):
+        self.warnings.append(message)
+
+    def log_error(self, message):
+        self.warnings.append(message)
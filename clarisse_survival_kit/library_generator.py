@@ -0,0 +1,291 @@
+#!/usr/bin/env python2
+"""
+Writes synthetic Megascans and Substance libraries for scale testing the scans and importers.
+Files follow the naming FILENAME_MATCH_TEMPLATE and LOD_MATCH_TEMPLATE expect, images are empty, tiny or sparse.
+The same seed and settings always write the same library.
+
+Usage:
+    python -m clarisse_survival_kit.library_generator <output_dir> --count 10000 [--seed 0]
+        [--types surface=4,3d=3,3dplant=1,atlas=1,substance=1] [--resolutions 1K=1,2K=4,4K=2,8K=1]
+        [--udim-ratio 0.1] [--image-mode sparse --image-size 4194304]
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import string
+import sys
+import time
+
+from clarisse_survival_kit.settings import *
+
+ASSET_TYPE_WEIGHTS = collections.OrderedDict([('surface', 4), ('3d', 3), ('3dplant', 1), ('atlas', 1),
+                                              ('substance', 1)])
+RESOLUTION_WEIGHTS = collections.OrderedDict([('1K', 1), ('2K', 4), ('4K', 2), ('8K', 1)])
+
+SURFACE_MAPS = ('Albedo', 'Roughness', 'Specular', 'Normal', 'Displacement', 'AO', 'Cavity')
+OPTIONAL_SURFACE_MAPS = ('Gloss', 'Bump', 'Opacity', 'Translucency', 'Metalness', 'Fuzz')
+ATLAS_MAPS = ('Albedo', 'Roughness', 'Specular', 'Normal', 'Displacement', 'Opacity', 'Translucency')
+SUBSTANCE_MAPS = ('BaseColor', 'Roughness', 'Metallic', 'Normal', 'Height', 'AO', 'Emissive')
+# Maps that are written as floating point images.
+EXR_MAPS = ('Displacement', 'Height')
+SUBSTANCE_CATEGORIES = ('metal', 'wood', 'fabric', 'plastic', 'stone')
+MEGASCANS_NAMES = ('rock', 'sand', 'moss', 'bark', 'soil', 'grass', 'gravel', 'snow', 'concrete', 'brick')
+IMAGE_MODES = ('empty', 'tiny', 'sparse')
+
+
+class LibraryGenerator(object):
+    """
+    Generates the assets from a single random generator so a seed always gives the same library.
+    Weights are relative: types={'surface': 3, '3d': 1} writes three surfaces for every 3d asset.
+    Megascans assets are written to Downloaded/<type>, custom_ratio of the surfaces to Downloaded/My Assets/surfaces
+    and Substance materials to Substance/<category>.
+    If mtime is set every file and directory gets that modification time, otherwise the scan index considers
+    the library too recent to be cached for the first seconds.
+    """
+
+    def __init__(self, output_dir, count=100, seed=0, types=None, resolutions=None, max_resolutions=2, lods=4,
+                 variations=3, udim_ratio=0.1, max_udims=10, extra_format_ratio=0.05, optional_map_ratio=0.2,
+                 custom_ratio=0.05, image_mode='empty', image_size=64, mtime=None):
+        self.output_dir = output_dir
+        self.count = count
+        self.rng = random.Random(seed)
+        self.types = types or ASSET_TYPE_WEIGHTS
+        self.resolutions = resolutions or RESOLUTION_WEIGHTS
+        self.max_resolutions = max(max_resolutions, 1)
+        self.lods = lods
+        self.variations = max(variations, 1)
+        self.udim_ratio = udim_ratio
+        self.max_udims = max(max_udims, 1)
+        self.extra_format_ratio = extra_format_ratio
+        self.optional_map_ratio = optional_map_ratio
+        self.custom_ratio = custom_ratio
+        self.image_mode = image_mode
+        self.image_size = image_size
+        self.mtime = mtime
+        self.asset_ids = set()
+        self.stats = collections.Counter()
+
+    def choice(self, weights):
+        """Returns a key of the weights dictionary, picked by weight."""
+        total = sum(weights.values())
+        pick = self.rng.uniform(0, total)
+        for key, weight in weights.items():
+            pick -= weight
+            if pick <= 0:
+                return key
+        return weights.keys()[-1]
+
+    def get_asset_id(self):
+        """Returns a new Megascans style id. Ids have no digits so they can't be mistaken for a UDIM tile."""
+        while True:
+            asset_id = ''.join(self.rng.choice(string.ascii_lowercase) for i in range(8))
+            if asset_id not in self.asset_ids:
+                self.asset_ids.add(asset_id)
+                return asset_id
+
+    def get_resolutions(self):
+        count = self.rng.randint(1, min(self.max_resolutions, len(self.resolutions)))
+        resolutions = []
+        while len(resolutions) < count:
+            resolution = self.choice(self.resolutions)
+            if resolution not in resolutions:
+                resolutions.append(resolution)
+        return resolutions
+
+    def write_file(self, path, image=False):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'wb') as f:
+            if image and self.image_mode == 'tiny':
+                f.write('\0' * self.image_size)
+            elif image and self.image_mode == 'sparse' and self.image_size:
+                f.seek(self.image_size - 1)
+                f.write('\0')
+        self.stats['images' if image else 'files'] += 1
+
+    def write_json(self, path, data):
+        self.write_file(path)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def write_textures(self, directory, prefix, map_names, resolutions, udims=0, lod_normals=0):
+        """Writes the maps of every resolution, as UDIM tile sets if udims is set."""
+        tiles = ['.%i' % (1001 + i) for i in range(udims)] or ['']
+        for resolution in resolutions:
+            names = ['%s_%s_%s' % (prefix, resolution, map_name) for map_name in map_names]
+            names += ['%s_%s_Normal_LOD%i' % (prefix, resolution, lod) for lod in range(lod_normals)]
+            for name in names:
+                extension = 'exr' if name.rsplit('_', 1)[-1] in EXR_MAPS else 'jpg'
+                extensions = [extension]
+                if self.rng.random() < self.extra_format_ratio:
+                    extensions.append('exr' if extension != 'exr' else 'tif')
+                for tile in tiles:
+                    for extension in extensions:
+                        self.write_file(os.path.join(directory, '%s%s.%s' % (name, tile, extension)), image=True)
+        preview = os.path.join(directory, prefix + '_Preview.png')
+        self.write_file(preview, image=True)
+
+    def get_map_names(self, map_names):
+        optional_maps = tuple(m for m in OPTIONAL_SURFACE_MAPS if self.rng.random() < self.optional_map_ratio)
+        return map_names + optional_maps
+
+    def get_json_data(self, asset_id, name, asset_type, resolutions):
+        """Returns the data of a Megascans JSON file with the meta, categories and maps _read_json_data reads."""
+        scan_area = self.rng.choice((0.5, 1, 2, 4))
+        return {
+            'id': asset_id,
+            'name': name,
+            'categories': [asset_type, self.rng.choice(MEGASCANS_NAMES)],
+            'tags': [self.rng.choice(MEGASCANS_NAMES) for i in range(3)],
+            'meta': [
+                {'key': 'height', 'name': 'Height', 'value': '%s m' % self.rng.choice((0.01, 0.02, 0.05, 0.2))},
+                {'key': 'scanArea', 'name': 'Scan Area', 'value': '%sx%s m' % (scan_area, scan_area)},
+                {'key': 'tileable', 'name': 'Tileable', 'value': asset_type == 'surface'},
+            ],
+            'maps': [{'type': 'displacement', 'resolution': '%sx%s' % (int(r[:-1]) * 1024, int(r[:-1]) * 1024),
+                      'minIntensity': self.rng.randint(0, 100), 'maxIntensity': self.rng.randint(150, 260)}
+                     for r in resolutions],
+        }
+
+    def write_megascans_asset(self, asset_type):
+        asset_id = self.get_asset_id()
+        name = '%s_%s' % (self.rng.choice(MEGASCANS_NAMES), asset_id)
+        if asset_type == 'surface' and self.rng.random() < self.custom_ratio:
+            directory = os.path.join(self.output_dir, 'Downloaded', 'My Assets', 'surfaces', name)
+        else:
+            directory = os.path.join(self.output_dir, 'Downloaded', asset_type, name)
+        resolutions = self.get_resolutions()
+        self.write_json(os.path.join(directory, asset_id + '.json'),
+                        self.get_json_data(asset_id, name, asset_type, resolutions))
+        udims = 0
+        if asset_type in ('surface', '3d') and self.rng.random() < self.udim_ratio:
+            udims = self.rng.randint(2, max(self.max_udims, 2))
+        if asset_type == 'surface':
+            self.write_textures(directory, asset_id, self.get_map_names(SURFACE_MAPS), resolutions, udims=udims)
+        elif asset_type == '3d':
+            self.write_textures(directory, asset_id, self.get_map_names(SURFACE_MAPS), resolutions, udims=udims,
+                                lod_normals=self.lods)
+            for lod in range(self.lods):
+                self.write_file(os.path.join(directory, '%s_LOD%i.obj' % (asset_id, lod)))
+            self.write_file(os.path.join(directory, '%s_High.obj' % asset_id))
+        elif asset_type == 'atlas':
+            self.write_textures(directory, asset_id, ATLAS_MAPS, resolutions)
+            self.write_file(os.path.join(directory, asset_id + '.obj'))
+        elif asset_type == '3dplant':
+            for sub_directory in ('Atlas', 'Billboard'):
+                self.write_textures(os.path.join(directory, 'Textures', sub_directory), asset_id, ATLAS_MAPS,
+                                    resolutions)
+            for variation in range(1, self.rng.randint(1, self.variations) + 1):
+                # LOD3 is the billboard.
+                for lod in range(4):
+                    self.write_file(os.path.join(directory, 'Var%i' % variation,
+                                                 '%s_Var%i_LOD%i.obj' % (asset_id, variation, lod)))
+        return directory
+
+    def write_substance_asset(self):
+        """Writes a Substance Painter export without JSON, these are picked up by the generic provider."""
+        name = '%s_%s' % (self.rng.choice(SUBSTANCE_CATEGORIES), self.get_asset_id())
+        directory = os.path.join(self.output_dir, 'Substance', name.split('_')[0], name)
+        for map_name in SUBSTANCE_MAPS:
+            extension = 'exr' if map_name in EXR_MAPS else 'png'
+            self.write_file(os.path.join(directory, '%s_%s.%s' % (name, map_name, extension)), image=True)
+        if self.rng.random() < 0.5:
+            self.write_file(os.path.join(directory, name + '.obj'))
+        return directory
+
+    def generate(self, counts=None, progress_interval=0):
+        """
+        Writes the library and returns the asset directories by type.
+        Pass a dictionary of counts by type to write exactly that many assets of each type instead.
+        """
+        if counts:
+            asset_types = [asset_type for asset_type, count in counts.items() for i in range(count)]
+        else:
+            asset_types = [self.choice(self.types) for i in range(self.count)]
+        assets = collections.OrderedDict((asset_type, []) for asset_type in counts or self.types)
+        for i, asset_type in enumerate(asset_types):
+            if asset_type == 'substance':
+                directory = self.write_substance_asset()
+            else:
+                directory = self.write_megascans_asset(asset_type)
+            assets[asset_type].append(directory)
+            self.stats[asset_type] += 1
+            if progress_interval and (i + 1) % progress_interval == 0:
+                print "Generated %i/%i assets..." % (i + 1, len(asset_types))
+        if self.mtime is not None:
+            self.set_mtime(self.mtime)
+        return assets
+
+    def set_mtime(self, mtime):
+        for root, dirs, filenames in os.walk(self.output_dir, topdown=False):
+            for name in filenames + [root]:
+                os.utime(os.path.join(root, name), (mtime, mtime))
+
+
+def generate_library(output_dir, count=100, seed=0, counts=None, **kwargs):
+    """Writes a synthetic library, see LibraryGenerator for the settings. Returns the asset directories by type."""
+    return LibraryGenerator(output_dir, count=count, seed=seed, **kwargs).generate(counts=counts)
+
+
+def parse_weights(value):
+    """Parses surface=4,3d=1 into an ordered dictionary of weights."""
+    weights = collections.OrderedDict()
+    for item in value.split(','):
+        key, _, weight = item.partition('=')
+        weights[key.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic Megascans and Substance library.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--count', type=int, default=1000, help='Number of assets.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--types', type=parse_weights, help='Weights of the asset types: surface=4,3d=3,...')
+    parser.add_argument('--resolutions', type=parse_weights, help='Weights of the resolutions: 2K=4,4K=1,...')
+    parser.add_argument('--max-resolutions', type=int, default=2, help='Maximum number of resolutions per asset.')
+    parser.add_argument('--lods', type=int, default=4, help='Number of LODs of the 3d assets.')
+    parser.add_argument('--variations', type=int, default=3, help='Maximum number of 3dplant variations.')
+    parser.add_argument('--udim-ratio', type=float, default=0.1, help='Share of surfaces and 3d assets with UDIMs.')
+    parser.add_argument('--max-udims', type=int, default=10, help='Maximum number of UDIM tiles.')
+    parser.add_argument('--extra-format-ratio', type=float, default=0.05,
+                        help='Share of maps that also exist in another format.')
+    parser.add_argument('--optional-map-ratio', type=float, default=0.2,
+                        help='Chance of each optional map like Gloss or Opacity.')
+    parser.add_argument('--custom-ratio', type=float, default=0.05, help='Share of surfaces in My Assets.')
+    parser.add_argument('--image-mode', choices=IMAGE_MODES, default='empty',
+                        help='Write empty images, tiny images of image-size bytes or sparse images of that size.')
+    parser.add_argument('--image-size', type=int, default=64, help='Size in bytes of tiny and sparse images.')
+    parser.add_argument('--mtime', type=float, help='Modification time of every file as a Unix timestamp.')
+    args = parser.parse_args(argv)
+
+    if args.types:
+        unknown_types = [t for t in args.types if t not in ASSET_TYPE_WEIGHTS]
+        if unknown_types:
+            parser.error('Unknown asset types: ' + ', '.join(unknown_types))
+    if args.resolutions:
+        unknown_resolutions = [r for r in args.resolutions if r not in IMAGE_RESOLUTIONS]
+        if unknown_resolutions:
+            parser.error('Unknown resolutions: ' + ', '.join(unknown_resolutions))
+    start = time.time()
+    generator = LibraryGenerator(args.output_dir, count=args.count, seed=args.seed, types=args.types,
+                                 resolutions=args.resolutions, max_resolutions=args.max_resolutions,
+                                 lods=args.lods, variations=args.variations, udim_ratio=args.udim_ratio,
+                                 max_udims=args.max_udims, extra_format_ratio=args.extra_format_ratio,
+                                 optional_map_ratio=args.optional_map_ratio, custom_ratio=args.custom_ratio,
+                                 image_mode=args.image_mode, image_size=args.image_size, mtime=args.mtime)
+    generator.generate(progress_interval=1000)
+    stats = generator.stats
+    print "Wrote %i assets, %i images and %i other files to %s in %.2fs" % (
+        args.count, stats['images'], stats['files'], args.output_dir, time.time() - start)
+    for asset_type in ASSET_TYPE_WEIGHTS:
+        if stats[asset_type]:
+            print "    %-10s %i" % (asset_type + ':', stats[asset_type])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,9 +3,46 @@ import json, sys, socket, time, threading, os
 import struct
 import socket
 import re
+import errno
+import select
+import signal
+import Queue
+import collections
+import multiprocessing.dummy as mp
 
 host, port = '127.0.0.1', 24981
 
+# Payloads of Bridge are read into a buffer that starts at RECV_BUFFER_SIZE and doubles up to MAX_PAYLOAD_SIZE.
+RECV_BUFFER_SIZE = 4096 * 2
+MAX_PAYLOAD_SIZE = 64 * 1024 * 1024
+LISTEN_BACKLOG = 64
+# Seconds the listener waits for sockets before it checks if it should shut down.
+SELECT_TIMEOUT = 0.5
+
+# Seconds a command may take to return its result.
+COMMAND_TIMEOUT = 600.0
+CONNECT_TIMEOUT = 5.0
+# Commands sent before their results are read.
+PIPELINE_DEPTH = 16
+RECONNECT_RETRIES = 5
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 8.0
+
+# Queued assets are sent in batches of at most IMPORT_BATCH_SIZE once the oldest one waited IMPORT_BATCH_WINDOW seconds.
+IMPORT_BATCH_SIZE = 8
+IMPORT_BATCH_WINDOW = 0.5
+# An asset sent again within this many seconds after it was imported is skipped.
+IMPORT_DUPLICATE_WINDOW = 30.0
+# Lower numbers are imported first, surfaces build faster than models.
+IMPORT_PRIORITIES = {'surface': 0, 'atlas': 0, '3d': 1, '3dplant': 2}
+
+# Threads that look for and write the JSON files of the assets, so slow storage doesn't block the listener.
+SIDECAR_WORKERS = 4
+# Written next to converted textures by the kit, it isn't the JSON file of the asset. Same as in settings.py.
+CONVERSION_MANIFEST_FILENAME = '.csk_conversion.json'
+# Seconds an import waits for the JSON file of its asset before it's imported without one.
+SIDECAR_TIMEOUT = 60.0
+
 
 class ClarisseNetError(Exception):
     def __init__(self, command, value):
@@ -19,7 +56,35 @@ class ClarisseNetError(Exception):
         return '%s\n%s' % (self.value, self.command)
 
 
+class ClarisseNetUnknownResult(ClarisseNetError):
+    """A command was sent but its result was lost. Clarisse might have run it, so it isn't sent again."""
+
+
+class ClarisseNetTimeout(ClarisseNetUnknownResult):
+    """The result of a command didn't arrive in time. Clarisse might still run it, so it isn't sent again."""
+
+
+class CommandResult(object):
+    """The result of a command sent with ClarisseNet.run_many. error is set if the command failed."""
+    __slots__ = ('command', 'value', 'error', 'attempts')
+
+    def __init__(self, command, value=None, error=None, attempts=0):
+        self.command = command
+        self.value = value
+        self.error = error
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
 class ClarisseNet:
+    """
+    Client of the command port of Clarisse. Each command is framed with its size as a little endian 4 byte integer
+    followed by the mode and the command, results are framed the same way with a status instead of the mode.
+    The connection is kept open between commands and is opened again with a backoff when it fails.
+    """
     class Status:
         Ok = 1
         Error = -1
@@ -28,144 +93,648 @@ class ClarisseNet:
         Script = 0
         Statement = 1
 
-    def __init__(self, host="localhost", port=55000):
+    def __init__(self, host="localhost", port=55000, timeout=COMMAND_TIMEOUT):
         self.status = self.Status.Error
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._socket = None
+        self._buffer = bytearray(RECV_BUFFER_SIZE)
+        self._header = bytearray(4)
         self.connect(host, port)
 
-    def connect(self, host, port):
+    def connect(self, host=None, port=None):
         self.close()
-        self.status = self.Status.Error
+        self.host = host or self.host
+        self.port = port or self.port
         try:
-            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-            self._socket.connect((host, port))
-        except:
-            raise ValueError('Failed to connect to ' + host + ':' + str(port))
+            self._socket = socket.create_connection((self.host, self.port), CONNECT_TIMEOUT)
+            # The frames of pipelined commands are sent at once, there's no need to wait for more data.
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (socket.error, OverflowError):
+            raise ValueError('Failed to connect to ' + self.host + ':' + str(self.port))
         self.status = self.Status.Ok
 
+    def reconnect(self, retries=RECONNECT_RETRIES):
+        """Connects again, waiting twice as long after each failed attempt."""
+        delay = RECONNECT_DELAY
+        for attempt in range(retries + 1):
+            try:
+                return self.connect()
+            except ValueError:
+                if attempt == retries:
+                    raise
+            print "Reconnecting to Clarisse in %.1fs..." % delay
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
     def run(self, script):
         self._send(script, self.Mode.Script)
 
     def evaluate(self, statement):
         return self._send(statement, self.Mode.Statement)
 
+    def run_many(self, scripts, mode=Mode.Script, timeout=None, retries=RECONNECT_RETRIES):
+        """
+        Sends the scripts pipelined, PIPELINE_DEPTH at a time, and returns a CommandResult for each of them.
+        timeout is the time each result may take. Scripts are sent at most once: when a result times out or the
+        connection fails, the scripts of that batch without a result get a ClarisseNetUnknownResult since Clarisse
+        might still run them. Only the scripts that weren't sent yet continue on a new connection.
+        """
+        results = [CommandResult(script) for script in scripts]
+        pending = list(results)
+        failures = 0
+        while pending:
+            if self.status != self.Status.Ok or self._is_closed():
+                try:
+                    self.reconnect(retries)
+                except ValueError as e:
+                    for result in pending:
+                        result.error = e
+                    break
+            batch = pending[:PIPELINE_DEPTH]
+            del pending[:len(batch)]
+            answered = 0
+            try:
+                for result in batch:
+                    result.attempts += 1
+                results_iter = self._pipeline([result.command for result in batch], mode, timeout)
+                for result in batch:
+                    result.value, result.error = next(results_iter)
+                    answered += 1
+            except ClarisseNetTimeout as e:
+                self.close()
+                batch[answered].error = e
+                for result in batch[answered + 1:]:
+                    result.error = ClarisseNetUnknownResult(result.command, 'Sent before %s timed out' %
+                                                            batch[answered].command)
+            except (socket.error, EOFError) as e:
+                self.close()
+                for result in batch[answered:]:
+                    result.error = ClarisseNetUnknownResult(result.command, 'Lost connection to Clarisse: %s' % e)
+                failures += 1
+                if failures > retries:
+                    for result in pending:
+                        result.error = e
+                    break
+                print "Lost connection to Clarisse, %i commands without a result" % (len(batch) - answered)
+        return results
+
     def close(self):
-        if (self.status == self.Status.Ok):
+        if self.status == self.Status.Ok:
             self._socket.close()
+        self.status = self.Status.Error
 
     def __del__(self):
         self.close()
 
     def _send(self, command, mode):
-        if (self.status != self.Status.Ok):
-            raise RuntimeError('Not connected to Clarisse')
-        command_size = len(command) + 1
-        command_size = struct.pack("<I", command_size)
-        self._socket.send(command_size)
-        packet = str(mode) + command
-        self._socket.send(packet)
-        result_size = self._socket.recv(4)
-        result_size = struct.unpack("<I", result_size)[0]
-        must_recv = True
-        result = ''
-        remaining = result_size
-        while (must_recv):
-            result += self._socket.recv(remaining)
-            remaining = result_size - len(result)
-            if remaining == 0: must_recv = False
-
-        if (result[0] == '0'):
-            raise ClarisseNetError(result[1:], command)
-        else:
-            result = result[1:]
-            if (result == ''):
-                return None
+        if self.status != self.Status.Ok:
+            self.reconnect()
+        try:
+            value, error = next(self._pipeline([command], mode, None))
+        except (socket.error, EOFError, ClarisseNetTimeout):
+            # The next result could be the one of this command, the connection can't be used anymore.
+            self.close()
+            raise
+        if error:
+            raise error
+        return value
+
+    def _is_closed(self):
+        """
+        Returns True if Clarisse closed the idle connection, like after a restart. Nothing is pending between
+        commands, so a readable socket can only be the end of the connection.
+        """
+        try:
+            return bool(select.select([self._socket], [], [], 0)[0])
+        except (select.error, socket.error):
+            return True
+
+    def _pipeline(self, commands, mode, timeout):
+        """Sends the commands in one buffer and yields the result and error of each command in order."""
+        frames = bytearray()
+        for command in commands:
+            frames += struct.pack("<I", len(command) + 1)
+            frames += str(mode)
+            frames += command
+        self._socket.settimeout(timeout or self.timeout)
+        self._socket.sendall(frames)
+        for command in commands:
+            try:
+                self._recv_into(self._header, 4)
+                result_size = struct.unpack("<I", bytes(self._header))[0]
+                if result_size > len(self._buffer):
+                    self._buffer = bytearray(result_size)
+                self._recv_into(self._buffer, result_size)
+            except socket.timeout:
+                raise ClarisseNetTimeout(command, 'No result after %.1fs' % (timeout or self.timeout))
+            if result_size == 0:
+                raise EOFError('Empty result')
+            result = bytes(self._buffer[1:result_size])
+            if self._buffer[0] == ord('0'):
+                yield None, ClarisseNetError(command, result)
             else:
-                return result
+                yield result or None, None
+
+    def _recv_into(self, buffer, size):
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = self._socket.recv_into(view[received:size], size - received)
+            if not count:
+                raise EOFError('Connection closed by Clarisse')
+            received += count
+
 
+class BridgeClient(object):
+    """A connection of Bridge. Bridge sends one JSON document and closes the connection."""
 
-class ms_Init(threading.Thread):
-    def __init__(self, importer):
-        threading.Thread.__init__(self)
-        self.importer = importer
+    def __init__(self, client_socket, address, buffer_size=RECV_BUFFER_SIZE, max_size=MAX_PAYLOAD_SIZE):
+        self.socket = client_socket
+        self.address = address
+        self.max_size = max_size
+        self.buffer = bytearray(min(buffer_size, max_size))
+        self.size = 0
 
-    def run(self):
-        print "Starting up..."
-        time.sleep(0.1)
+    def read(self):
+        """
+        Reads what arrived into the buffer. Returns False once the connection is closed.
+        The buffer doubles when it's full so a payload is copied a few times at most, not once per packet.
+        """
+        if self.size == len(self.buffer):
+            if self.size >= self.max_size:
+                raise ValueError('Payload of %s exceeds %i bytes' % (self.address[0], self.max_size))
+            self.buffer.extend(bytearray(min(len(self.buffer), self.max_size - self.size)))
         try:
-            print "Making socket on port " + str(port)
-            socket_ = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            socket_.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-            socket_.bind((host, port))
-            print "Socket bound"
-            print "Listening to incoming Bridge requests..."
+            received = self.socket.recv_into(memoryview(self.buffer)[self.size:])
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return True
+            raise
+        self.size += received
+        return received > 0
+
+    def get_payload(self):
+        return bytes(self.buffer[:self.size])
+
+    def close(self):
+        try:
+            self.socket.close()
+        except socket.error:
+            pass
+
+
+class BridgeListener(object):
+    """
+    Accepts the connections of Bridge on one thread with select for the life of the process.
+    Complete payloads are handed to handler on a worker thread in the order they arrived, so a slow import doesn't
+    block the connections of the next exports. shutdown stops accepting and lets the worker finish the queue.
+    """
+
+    def __init__(self, handler, host=host, port=port, max_payload_size=MAX_PAYLOAD_SIZE):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.max_payload_size = max_payload_size
+        self.payloads = Queue.Queue()
+        self.clients = {}
+        self.stopped = threading.Event()
+        self.socket = None
+        self.worker = None
+        self.stats = {'accepted': 0, 'payloads': 0, 'rejected': 0, 'errors': 0, 'bytes': 0}
+
+    def bind(self):
+        print "Making socket on port " + str(self.port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if os.name != 'nt':
+            # Allows restarting right after the previous listener stopped. On Windows it would allow sharing the port.
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(LISTEN_BACKLOG)
+        self.socket.setblocking(0)
+        # The port that was assigned if port is 0.
+        self.port = self.socket.getsockname()[1]
+        print "Socket bound"
+
+    def serve_forever(self):
+        """Binds the socket if needed and handles connections until shutdown is called."""
+        if not self.socket:
+            self.bind()
+        self._start_worker()
+        print "Listening to incoming Bridge requests..."
+        try:
+            while not self.stopped.is_set():
+                try:
+                    readable = select.select([self.socket] + self.clients.keys(), [], [], SELECT_TIMEOUT)[0]
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                for readable_socket in readable:
+                    if readable_socket is self.socket:
+                        self._accept()
+                    else:
+                        self._read(self.clients[readable_socket])
+        finally:
+            self._close()
+
+    def start(self):
+        """Runs serve_forever on a thread. Returns once the socket is bound."""
+        self.bind()
+        self._start_worker()
+        thread = threading.Thread(target=self.serve_forever, name='BridgeListener')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def shutdown(self, wait=True):
+        """Stops accepting connections. The payloads that were received are still imported."""
+        self.stopped.set()
+        if wait and self.worker:
+            self.worker.join()
+
+    def _accept(self):
+        try:
+            client_socket, address = self.socket.accept()
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            raise
+        client_socket.setblocking(0)
+        self.clients[client_socket] = BridgeClient(client_socket, address, max_size=self.max_payload_size)
+        self.stats['accepted'] += 1
+
+    def _read(self, client):
+        try:
+            if client.read():
+                return
+        except (socket.error, ValueError) as e:
+            print 'Dropped connection of {}: {}'.format(client.address[0], e)
+            self.stats['rejected'] += 1
+            self._remove(client)
+            return
+        self._remove(client)
+        if client.size:
+            self.stats['payloads'] += 1
+            self.stats['bytes'] += client.size
+            self.payloads.put(client.get_payload())
+
+    def _remove(self, client):
+        self.clients.pop(client.socket, None)
+        client.close()
+
+    def _close(self):
+        for client in self.clients.values():
+            self._remove(client)
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+        # Wakes the worker up after the queued payloads.
+        self.payloads.put(None)
+
+    def _start_worker(self):
+        if self.worker:
+            return
+        self.worker = threading.Thread(target=self._work, name='BridgeImporter')
+        self.worker.daemon = True
+        self.worker.start()
+
+    def _work(self):
+        while True:
+            payload = self.payloads.get()
+            if payload is None:
+                break
+            try:
+                self.handler(payload)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print('Error Line : {}'.format(sys.exc_info()[-1].tb_lineno), type(e).__name__, e)
+
+
+_command_port_client = None
+_command_port_lock = threading.Lock()
+
+
+def get_command_port_client():
+    """Returns the connection to the command port that is shared by all imports of the process."""
+    global _command_port_client
+    if _command_port_client is None:
+        _command_port_client = ClarisseNet()
+    return _command_port_client
+
+
+def get_import_script(asset):
+    """Returns the script that imports an asset in Clarisse."""
+    asset_path = str(json.dumps(asset['path']))
+    resolution = str(asset['resolution'])
+    lod = None
+    if asset.get('lod'):
+        # Check if LOD is on drugs :)
+        if str(asset.get('lod')).lower() == 'high':
+            lod = -1
+        else:
+            lod = re.match('.*?([0-9]+)$', asset.get('lod')).group(1)
+    return 'from clarisse_survival_kit.providers.megascans import *\n\n' + \
+           'import_asset(' + asset_path + ', resolution="{}", lod={}, ix=ix)\n'.format(resolution, str(lod))
+
+
+def send_to_command_port(assets, client=None):
+    """
+    Imports each asset with its own script, on the shared connection unless client is set.
+    Only the JSON files of these assets are waited for. Returns a CommandResult per asset.
+    """
+    wait_for_sidecars(assets)
+    print [asset['path'] for asset in assets]
+    with _command_port_lock:
+        results = (client or get_command_port_client()).run_many([get_import_script(asset) for asset in assets])
+    for asset, result in zip(assets, results):
+        if not result.ok:
+            print 'Import of {} failed: {}'.format(asset['path'], result.error)
+    return results
+
+
+class QueuedAsset(object):
+    __slots__ = ('key', 'asset', 'priority', 'queued', 'status', 'finished', 'error')
+
+    def __init__(self, key, asset, priority):
+        self.key = key
+        self.asset = asset
+        self.priority = priority
+        self.queued = time.time()
+        self.status = ImportQueue.QUEUED
+        self.finished = None
+        self.error = None
+
+    def is_ready(self):
+        """Returns False while the JSON file of the asset is being written."""
+        sidecar = self.asset.get('sidecar')
+        return sidecar is None or sidecar.ready()
+
+
+class ImportQueue(object):
+    """
+    Queues the assets Bridge sends until they're imported. Assets are the same if their id, resolution and LOD are,
+    an asset that is queued, importing or was imported less than duplicate_window seconds ago is skipped.
+    Queued assets are sent to Clarisse batch_size at a time by priority and age, once the oldest one waited window
+    seconds or a batch is full. on_status is called with the asset and its status whenever the status changes.
+    Assets whose result was lost are UNKNOWN, Clarisse might have imported them so they're skipped like imported ones.
+    """
+    QUEUED = 'queued'
+    IMPORTING = 'importing'
+    IMPORTED = 'imported'
+    FAILED = 'failed'
+    UNKNOWN = 'unknown'
+    SKIPPED = 'skipped'
+
+    def __init__(self, send=None, batch_size=IMPORT_BATCH_SIZE, window=IMPORT_BATCH_WINDOW,
+                 duplicate_window=IMPORT_DUPLICATE_WINDOW, on_status=None):
+        self.send = send or send_to_command_port
+        self.batch_size = batch_size
+        self.window = window
+        self.duplicate_window = duplicate_window
+        self.on_status = on_status or print_import_status
+        self.condition = threading.Condition()
+        self.queued = collections.OrderedDict()
+        self.assets = {}
+        self.stopped = False
+        self.thread = None
+        self.stats = collections.Counter()
+
+    def get_key(self, asset):
+        return asset['id'], str(asset.get('resolution')), str(asset.get('lod'))
+
+    def put(self, assets, priority=None):
+        """Queues the assets that aren't duplicates. Returns the status of each asset."""
+        statuses = []
+        now = time.time()
+        with self.condition:
+            for asset in assets:
+                key = self.get_key(asset)
+                known = self.assets.get(key)
+                if known and (known.status in (self.QUEUED, self.IMPORTING) or
+                              (known.status in (self.IMPORTED, self.UNKNOWN) and
+                               now - known.finished < self.duplicate_window)):
+                    self.stats[self.SKIPPED] += 1
+                    self._notify(asset, self.SKIPPED)
+                    statuses.append(self.SKIPPED)
+                    continue
+                asset_priority = priority
+                if asset_priority is None:
+                    asset_priority = IMPORT_PRIORITIES.get(asset.get('type'), 1)
+                self.assets[key] = self.queued[key] = QueuedAsset(key, asset, asset_priority)
+                self.stats[self.QUEUED] += 1
+                self._notify(asset, self.QUEUED)
+                statuses.append(self.QUEUED)
+            self.condition.notify()
+        self.start()
+        return statuses
+
+    def get_status(self, asset):
+        queued_asset = self.assets.get(self.get_key(asset))
+        return queued_asset.status if queued_asset else None
+
+    def start(self):
+        with self.condition:
+            if self.thread:
+                return
+            self.thread = threading.Thread(target=self._run, name='ImportQueue')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def shutdown(self, wait=True):
+        """Sends what is queued without waiting for the window and stops."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+            thread = self.thread
+        if wait and thread:
+            thread.join()
+
+    def _next_batch(self):
+        """Waits for the next batch, None once the queue is shut down and empty."""
+        with self.condition:
             while True:
-                socket_.listen(5)
-                client, addr = socket_.accept()
-                data = ""
-                buffer_size = 4096 * 2
-                data = client.recv(buffer_size)
-                if data != "":
-                    self.TotalData = b""
-                    self.TotalData += data
-                    while True:
-                        data = client.recv(4096 * 2)
-                        if data:
-                            self.TotalData += data
-                        else:
-                            self.importer(self.TotalData)
-                            break
+                if self.queued:
+                    wait = min(queued_asset.queued for queued_asset in self.queued.itervalues()) + self.window - \
+                        time.time()
+                    if self.stopped or len(self.queued) >= self.batch_size or wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                elif self.stopped:
+                    return None
+                else:
+                    self.condition.wait()
+            queued_assets = sorted(self.queued.itervalues(), key=lambda queued_asset: (queued_asset.priority,
+                                                                                       queued_asset.queued))
+            # Assets with JSON files that are still being written are left for a later batch if others are ready.
+            ready = [queued_asset for queued_asset in queued_assets if queued_asset.is_ready()]
+            batch = (ready or queued_assets)[:self.batch_size]
+            for queued_asset in batch:
+                del self.queued[queued_asset.key]
+                queued_asset.status = self.IMPORTING
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            for queued_asset in batch:
+                self._notify(queued_asset.asset, self.IMPORTING)
+            try:
+                results = self.send([queued_asset.asset for queued_asset in batch])
+            except Exception as e:
+                results = [CommandResult(None, error=e) for _ in batch]
+            with self.condition:
+                for queued_asset, result in zip(batch, results):
+                    if result.ok:
+                        queued_asset.status = self.IMPORTED
+                    elif isinstance(result.error, ClarisseNetUnknownResult):
+                        queued_asset.status = self.UNKNOWN
+                    else:
+                        queued_asset.status = self.FAILED
+                    queued_asset.error = result.error
+                    queued_asset.finished = time.time()
+                    self.stats[queued_asset.status] += 1
+            for queued_asset in batch:
+                self._notify(queued_asset.asset, queued_asset.status, queued_asset.error)
+
+    def _notify(self, asset, status, error=None):
+        try:
+            self.on_status(asset, status, error)
         except Exception as e:
             print('Error Line : {}'.format(sys.exc_info()[-1].tb_lineno), type(e).__name__, e)
 
 
-def send_to_command_port(assets):
-    rclarisse = ClarisseNet()
-    import_command = 'from clarisse_survival_kit.providers.megascans import *\n\n'
-    print assets
+def print_import_status(asset, status, error=None):
+    if error:
+        print '{}: {} ({})'.format(asset['path'], status, error)
+    else:
+        print '{}: {}'.format(asset['path'], status)
+
+
+_import_queue = None
+
+
+def get_import_queue():
+    """Returns the import queue of the process."""
+    global _import_queue
+    if _import_queue is None:
+        _import_queue = ImportQueue()
+    return _import_queue
+
+
+_io_pool = None
+_io_pool_lock = threading.Lock()
+
+
+def get_io_pool():
+    """Returns the threads that write the JSON files."""
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            _io_pool = mp.Pool(SIDECAR_WORKERS)
+        return _io_pool
+
+
+def shutdown_io_pool():
+    """Waits until the JSON files that were started are written."""
+    global _io_pool
+    with _io_pool_lock:
+        io_pool = _io_pool
+        _io_pool = None
+    if io_pool:
+        io_pool.close()
+        io_pool.join()
+
+
+def has_json_file(directory):
+    """Returns whether the directory has the JSON file of the asset, hidden files like the conversion manifest aside."""
+    for f in os.listdir(directory):
+        if f.startswith('.') or f == CONVERSION_MANIFEST_FILENAME:
+            continue
+        if os.path.splitext(f)[-1] == ".json" and os.path.isfile(os.path.join(directory, f)):
+            return True
+    return False
+
+
+def write_file_atomic(path, data):
+    """Writes next to path and renames the file, so a reader never sees a partially written file."""
+    tmp_path = '%s.%i.%i.tmp' % (path, os.getpid(), threading.current_thread().ident)
+    with open(tmp_path, 'w') as outfile:
+        outfile.write(data)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Windows doesn't replace files on rename. The file that exists was written for the same export.
+        os.remove(tmp_path)
+        if not os.path.isfile(path):
+            raise
+
+
+def write_sidecar(json_data):
+    """
+    Writes the data Bridge sent as <id>.json into the asset directory if it doesn't have a JSON file yet, the
+    importer reads the surface height and scan area from it. Returns the path of the file if it was written.
+    """
+    directory = os.path.normpath(json_data['path'])
+    if has_json_file(directory):
+        return None
+    json_file = os.path.join(directory, json_data['id'] + '.json')
+    write_file_atomic(json_file, json.dumps(json_data, indent=4))
+    return json_file
+
+
+def wait_for_sidecars(assets, timeout=SIDECAR_TIMEOUT):
+    """Waits until the JSON files of the assets are written. Assets whose file failed are imported without it."""
     for asset in assets:
-        asset_path = str(json.dumps(asset['path']))
-        resolution = str(asset['resolution'])
-        lod = None
-        if asset.get('lod'):
-            # Check if LOD is on drugs :)
-            if str(asset.get('lod')).lower() == 'high':
-                lod = -1
-            else:
-                lod = re.match('.*?([0-9]+)$', asset.get('lod')).group(1)
-        import_command += 'import_asset(' + asset_path + \
-                          ', resolution="{}", lod={}, ix=ix)\n'.format(resolution, str(lod))
-    rclarisse.run(import_command)
+        sidecar = asset.pop('sidecar', None)
+        if sidecar is None:
+            continue
+        try:
+            sidecar.get(timeout)
+        except Exception as e:
+            print 'Could not write the JSON file of {}: {} {}'.format(asset['path'], type(e).__name__, e)
 
 
-def ms_asset_importer(imported_data):
+def ms_asset_importer(imported_data, import_queue=None):
     print "Imported json data"
     try:
         json_array = json.loads(imported_data)
         assets = []
+        io_pool = get_io_pool()
         for json_data in json_array:
-            assets.append({'path': json_data['path'], 'id': json_data['id'],
-                           'resolution': json_data['resolution'], 'lod': json_data.get('activeLOD')})
-            files = [f for f in os.listdir(json_data['path']) if os.path.isfile(os.path.join(json_data['path'], f))]
-            json_exists = False
-            for f in files:
-                filename, extension = os.path.splitext(f)
-                if extension == ".json":
-                    json_exists = True
-            if not json_exists:
-                json_file = os.path.join(os.path.normpath(json_data['path']), json_data['id'] + '.json')
-                with open(json_file, 'w') as outfile:
-                    outfile.write(json.dumps(json_data, indent=4))
+            assets.append({'path': json_data['path'], 'id': json_data['id'], 'type': json_data.get('type'),
+                           'resolution': json_data['resolution'], 'lod': json_data.get('activeLOD'),
+                           'sidecar': io_pool.apply_async(write_sidecar, (json_data,))})
         if assets:
-            send_to_command_port(assets)
-        threaded_server = ms_Init(ms_asset_importer)
-        threaded_server.start()
+            (import_queue or get_import_queue()).put(assets)
 
     except Exception as e:
         print('Error Line : {}'.format(sys.exc_info()[-1].tb_lineno), type(e).__name__, e)
         pass
 
 
-print "Running Megascans Bridge client"
-t = ms_Init(ms_asset_importer)
-t.start()
+def main():
+    print "Running Megascans Bridge client"
+    listener = BridgeListener(ms_asset_importer)
+
+    def stop(signum, frame):
+        print "Shutting down..."
+        listener.shutdown(wait=False)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        listener.serve_forever()
+    except Exception as e:
+        print('Error Line : {}'.format(sys.exc_info()[-1].tb_lineno), type(e).__name__, e)
+    # Imports that were already received are finished before the process exits.
+    listener.shutdown()
+    get_import_queue().shutdown()
+    shutdown_io_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Stage profiling of the importers and builders.
+Functions decorated with profiled and blocks inside a span are recorded when PROFILING_ENABLED is set,
+for example from user_settings.py. When the outermost span ends a Chrome trace and a summary per stage are written
+to the .csk folder. Open the trace in chrome://tracing or ui.perfetto.dev.
+When profiling is disabled a decorated function only costs a flag check.
+
+    @profiled
+    def import_3d(asset_directory, ...):
+        with span('shading_layer'):
+            ...
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from clarisse_survival_kit import user_path
+from clarisse_survival_kit.settings import *
+
+
+class Span(object):
+    __slots__ = ('name', 'category', 'args', 'start', 'child_time')
+
+    def __init__(self, name, category='csk', args=None):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+        self.child_time = 0.0
+
+    def __enter__(self):
+        _profiler.begin(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _profiler.end(self, error=exc_type is not None)
+        return False
+
+
+class NullSpan(object):
+    """Returned by span when profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_span = NullSpan()
+
+
+class Profiler(object):
+    """
+    Collects the spans of all threads. Each stage keeps its call count, total time, self time without its child
+    spans and the longest call. The trace and summary are exported and reset when no span is open anymore.
+    """
+
+    def __init__(self, enabled=False, directory=None):
+        self.enabled = enabled
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.events = []
+        self.stages = {}
+        self.thread_names = {}
+        self.open_spans = 0
+        self.epoch = time.time()
+
+    def begin(self, span):
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(span)
+        thread = threading.current_thread()
+        with self.lock:
+            self.open_spans += 1
+            self.thread_names[thread.ident] = thread.name
+        span.start = time.time()
+
+    def end(self, span, error=False):
+        duration = time.time() - span.start
+        stack = self.local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_time += duration
+        event = {'name': span.name, 'cat': span.category, 'ph': 'X', 'pid': os.getpid(),
+                 'tid': threading.current_thread().ident,
+                 'ts': int((span.start - self.epoch) * 1000000), 'dur': int(duration * 1000000)}
+        if span.args or error:
+            event['args'] = dict(span.args or {}, error=error)
+        key = span.category + '.' + span.name
+        with self.lock:
+            self.events.append(event)
+            stage = self.stages.get(key)
+            if stage is None:
+                stage = self.stages[key] = {'count': 0, 'total': 0.0, 'self': 0.0, 'max': 0.0}
+            stage['count'] += 1
+            stage['total'] += duration
+            stage['self'] += duration - span.child_time
+            stage['max'] = max(stage['max'], duration)
+            self.open_spans -= 1
+            finished = self.open_spans == 0
+        if finished and self.directory:
+            self.export()
+            self.reset()
+
+    def get_summary(self):
+        """Returns the stages sorted by self time, the stage that took the longest by itself first."""
+        with self.lock:
+            stages = [dict(stage, name=key, mean=stage['total'] / stage['count'])
+                      for key, stage in self.stages.items()]
+        return sorted(stages, key=lambda stage: stage['self'], reverse=True)
+
+    def get_trace(self):
+        with self.lock:
+            metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                        for tid, name in self.thread_names.items()]
+            return {'traceEvents': metadata + list(self.events), 'displayTimeUnit': 'ms'}
+
+    def export(self, directory=None):
+        """Writes the Chrome trace and the summary. Returns the paths of both files."""
+        directory = directory or self.directory
+        summary = self.get_summary()
+        trace_path = os.path.join(directory, PROFILING_TRACE_FILENAME)
+        summary_path = os.path.join(directory, PROFILING_SUMMARY_FILENAME)
+        _write_json(self.get_trace(), trace_path)
+        _write_json({'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'stages': summary}, summary_path)
+        logging.debug("Profile written to %s", trace_path)
+        for stage in summary[:PROFILING_SUMMARY_LOG_COUNT]:
+            logging.debug("    %(name)s: %(count)i calls, %(self).3fs self, %(total).3fs total, "
+                          "%(max).3fs max", stage)
+        return trace_path, summary_path
+
+    def reset(self):
+        with self.lock:
+            self.events = []
+            self.stages = {}
+            self.thread_names = {}
+            self.epoch = time.time()
+
+
+def _write_json(data, path):
+    """Writes next to the final location first so a crash can't leave a truncated file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+_profiler = Profiler(enabled=PROFILING_ENABLED, directory=user_path)
+
+
+def get_profiler():
+    return _profiler
+
+
+def set_profiling_enabled(enabled):
+    """Switches profiling on or off for the session, PROFILING_ENABLED is the default."""
+    _profiler.enabled = enabled
+
+
+def span(name, category='csk', **kwargs):
+    """Returns a context manager that records the block as a stage. Keyword arguments are stored in the trace."""
+    if not _profiler.enabled:
+        return _null_span
+    return Span(name, category, kwargs)
+
+
+def _get_span_args(args):
+    """The first string argument, mostly the asset directory or texture index, is stored in the trace."""
+    for arg in args:
+        if isinstance(arg, basestring):
+            return {'arg': arg}
+    return None
+
+
+def profiled(func):
+    """Decorator that records every call of the function as a stage named after its module and name."""
+    category = func.__module__.rsplit('.', 1)[-1]
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profiler.enabled:
+            return func(*args, **kwargs)
+        with Span(name, category, _get_span_args(args)):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -1,32 +1,41 @@
 from clarisse_survival_kit.settings import *
 from clarisse_survival_kit.utility import *
 from clarisse_survival_kit.surface import Surface
+from clarisse_survival_kit.command_buffer import buffer_commands
+from clarisse_survival_kit.profiling import profiled
+from clarisse_survival_kit.scan import get_asset_scan
 
 
-def inspect_asset(asset_directory):
+@profiled
+def inspect_asset(asset_directory, scan=None):
     report = {}
-    if get_textures_from_directory(asset_directory):
+    scan = get_asset_scan(asset_directory, scan)
+    if scan.get_textures():
         report['has_textures'] = True
-        if get_geometry_from_directory(asset_directory):
+        if scan.get_meshes():
             report['has_geometry'] = True
     return report
 
 
-def import_asset(asset_directory, report, **kwargs):
+@profiled
+@buffer_commands
+def import_asset(asset_directory, report, scan=None, **kwargs):
     surface = None
+    scan = get_asset_scan(asset_directory, scan)
     if report.get('has_textures'):
-        logging.debug('Importing surface with arguments: ' + str(kwargs))
-        surface = import_surface(asset_directory, **kwargs)
+        logging.debug('Importing surface with arguments: %s', kwargs)
+        surface = import_surface(asset_directory, scan=scan, **kwargs)
     if report.get('has_geometry'):
         target_ctx = None
         if surface:
             target_ctx = surface.ctx
-        geometry = import_geometry(asset_directory, target_ctx=target_ctx, surface=surface, **kwargs)
+        geometry = import_geometry(asset_directory, target_ctx=target_ctx, surface=surface, scan=scan, **kwargs)
 
 
+@profiled
 def import_surface(asset_directory, target_ctx=None, ior=DEFAULT_IOR, metallic_ior=DEFAULT_METALLIC_IOR,
                    projection_type="triplanar", object_space=0, clip_opacity=True,
-                   color_spaces=(), triplanar_blend=0.5, **kwargs):
+                   color_spaces=None, triplanar_blend=0.5, scan=None, **kwargs):
     # Initial data
     ix = get_ix(kwargs.get("ix"))
     if not target_ctx:
@@ -37,7 +46,9 @@ def import_surface(asset_directory, target_ctx=None, ior=DEFAULT_IOR, metallic_i
     if not os.path.isdir(asset_directory):
         ix.log_warning("Invalid directory specified: " + asset_directory)
         return None
-    logging.debug("Asset directory: " + asset_directory)
+    if not color_spaces:
+        color_spaces = get_color_spaces(DEFAULT_COLOR_SPACES, ix=ix)
+    logging.debug("Asset directory: %s", asset_directory)
 
     logging.debug("Importing generic surface:")
     surface_height = DEFAULT_DISPLACEMENT_HEIGHT
@@ -45,28 +56,29 @@ def import_surface(asset_directory, target_ctx=None, ior=DEFAULT_IOR, metallic_i
     tileable = True
     asset_name = os.path.basename(os.path.normpath(asset_directory))
 
-    textures = get_textures_from_directory(asset_directory)
+    textures = get_asset_scan(asset_directory, scan).get_textures()
     if not textures:
         ix.log_warning("No textures found in directory.")
         return None
     logging.debug("Found textures: ")
-    logging.debug(str(textures))
+    logging.debug("%s", textures)
     streamed_maps = get_stream_map_files(textures)
     if streamed_maps:
         logging.debug("Streamed maps: ")
-        logging.debug(str(streamed_maps))
+        logging.debug("%s", streamed_maps)
 
     surface = Surface(ix, projection=projection_type, uv_scale=scan_area, height=surface_height, tile=tileable,
                       object_space=object_space, triplanar_blend=triplanar_blend, ior=ior, metallic_ior=metallic_ior)
-    mtl = surface.create_mtl(asset_name, target_ctx)
-    surface.create_textures(textures, color_spaces, streamed_maps, clip_opacity=clip_opacity)
+    mtl = surface.build(asset_name, target_ctx, textures, color_spaces, streamed_maps, clip_opacity=clip_opacity)
 
     logging.debug("Finished importing surface.")
     logging.debug("+++++++++++++++++++++++++++++++")
     return surface
 
 
-def import_geometry(asset_directory, target_ctx=None, surface=None, clip_opacity=True, obj_scale=0.01, **kwargs):
+@profiled
+def import_geometry(asset_directory, target_ctx=None, surface=None, clip_opacity=True, obj_scale=0.01, scan=None,
+                    **kwargs):
     ix = get_ix(kwargs.get("ix"))
     if not target_ctx:
         target_ctx = ix.application.get_working_context()
@@ -76,17 +88,17 @@ def import_geometry(asset_directory, target_ctx=None, surface=None, clip_opacity
     if not os.path.isdir(asset_directory):
         ix.log_warning("Invalid directory specified: " + asset_directory)
         return None
-    logging.debug("Geo directory: " + asset_directory)
+    logging.debug("Geo directory: %s", asset_directory)
 
     logging.debug("Importing geometry:")
     asset_name = os.path.basename(os.path.normpath(asset_directory))
 
-    geometry = get_geometry_from_directory(asset_directory)
+    geometry = get_asset_scan(asset_directory, scan).get_meshes()
     if not geometry:
         ix.log_warning("No geometry found in directory.")
         return None
     logging.debug("Found geometry: ")
-    logging.debug(str(geometry))
+    logging.debug("%s", geometry)
 
     geo_items = []
 
@@ -2,16 +2,25 @@ import json
 import logging
 import os
 import multiprocessing.dummy as mp
+import Queue
+import collections
 import glob
 import bisect
 
 from clarisse_survival_kit.settings import *
 from clarisse_survival_kit.utility import *
 from clarisse_survival_kit.surface import Surface
+from clarisse_survival_kit.command_buffer import buffer_commands
+from clarisse_survival_kit.event_pump import get_event_pump, pump_events
+from clarisse_survival_kit.profiling import profiled, span
+from clarisse_survival_kit.scan import get_asset_scan, is_hidden_file
+from clarisse_survival_kit.scan_index import get_scan_index, flush_scan_index, list_sub_directories
+from clarisse_survival_kit.surface_template import template_surfaces
 
 
-def inspect_asset(asset_directory):
-    json_data = get_json_data_from_directory(asset_directory)
+@profiled
+def inspect_asset(asset_directory, scan=None):
+    json_data = get_json_data_from_directory(asset_directory, scan=scan)
     if json_data:
         json_data['displacement_multiplier'] = 0.2
         return json_data
@@ -19,28 +28,33 @@ def inspect_asset(asset_directory):
         return None
 
 
-def import_asset(asset_directory, report=None, **kwargs):
+@profiled
+@buffer_commands
+def import_asset(asset_directory, report=None, scan=None, **kwargs):
     ix = get_ix(kwargs.get('ix'))
     asset_directory = os.path.join(os.path.normpath(asset_directory), '')
+    scan = get_asset_scan(asset_directory, scan)
     if not report:
-        report = inspect_asset(asset_directory)
+        report = inspect_asset(asset_directory, scan=scan)
     if report:
         if not kwargs.get('color_spaces'):
             kwargs['color_spaces'] = get_color_spaces(MEGASCANS_COLOR_SPACES, ix=ix)
         asset_type = report.get('type')
         if asset_type:
             if asset_type == 'surface':
-                import_surface(asset_directory, **kwargs)
+                import_surface(asset_directory, scan=scan, **kwargs)
             elif asset_type == '3d':
-                import_3d(asset_directory, **kwargs)
+                import_3d(asset_directory, scan=scan, **kwargs)
             elif asset_type == '3dplant':
-                import_3dplant(asset_directory, **kwargs)
+                import_3dplant(asset_directory, scan=scan, **kwargs)
             elif asset_type == 'atlas':
-                import_atlas(asset_directory, **kwargs)
+                import_atlas(asset_directory, scan=scan, **kwargs)
 
 
+@profiled
 def import_surface(asset_directory, target_ctx=None, ior=DEFAULT_IOR, projection_type='triplanar', object_space=0,
-                   clip_opacity=True, color_spaces=None, triplanar_blend=0.5, resolution=None, lod=None, **kwargs):
+                   clip_opacity=True, color_spaces=None, triplanar_blend=0.5, resolution=None, lod=None, scan=None,
+                   **kwargs):
     """Imports a Megascans surface."""
     logging.debug("++++++++++++++++++++++.")
     logging.debug("Import Megascans surface called.")
@@ -53,22 +67,23 @@ def import_surface(asset_directory, target_ctx=None, ior=DEFAULT_IOR, projection
         return ix.log_warning('Invalid directory specified: ' + asset_directory)
     if not color_spaces:
         color_spaces = get_color_spaces(MEGASCANS_COLOR_SPACES, ix=ix)
-    logging.debug('Asset directory: ' + asset_directory)
+    logging.debug('Asset directory: %s', asset_directory)
 
     # Initial data
-    json_data = get_json_data_from_directory(asset_directory)
+    scan = get_asset_scan(asset_directory, scan)
+    json_data = get_json_data_from_directory(asset_directory, scan=scan)
     logging.debug('JSON data:')
-    logging.debug(str(json_data))
+    logging.debug("%s", json_data)
     if not json_data:
         ix.log_warning('Could not find a Megascans JSON file. Defaulting to standard settings.')
     surface_height = json_data.get('surface_height', DEFAULT_DISPLACEMENT_HEIGHT)
     displacement_offset = DEFAULT_DISPLACEMENT_OFFSET
-    logging.debug('Surface height JSON test: ' + str(surface_height))
+    logging.debug('Surface height JSON test: %s', surface_height)
     scan_area = json_data.get('scan_area', DEFAULT_UV_SCALE)
-    logging.debug('Scan area JSON test: ' + str(scan_area))
+    logging.debug('Scan area JSON test: %s', scan_area)
     tileable = json_data.get('tileable', True)
     asset_name = os.path.basename(os.path.normpath(asset_directory))
-    logging.debug('Asset name: ' + asset_name)
+    logging.debug('Asset name: %s', asset_name)
     if scan_area[0] >= 2 and scan_area[1] >= 2:
         height = 0.2
     else:
@@ -77,38 +92,38 @@ def import_surface(asset_directory, target_ctx=None, ior=DEFAULT_IOR, projection
     # All assets except 3dplant have the material in the root directory of the asset.
     logging.debug('Searching for textures: ')
     lod_match_template = r'(?:_LOD(?P<lod>[0-9]*)|_NormalBump$)'
-    textures = get_textures_from_directory(asset_directory, resolution=resolution, lod=lod,
-                                           lod_match_template=lod_match_template)
+    textures = scan.get_textures(resolution=resolution, lod=lod, lod_match_template=lod_match_template)
     if not textures:
         ix.log_warning('No textures found in directory. Directory is empty or resolution is invalid.')
         return None
     logging.debug('Found textures: ')
-    logging.debug(str(textures))
+    logging.debug("%s", textures)
     streamed_maps = get_stream_map_files(textures)
     if streamed_maps:
         logging.debug('Streamed maps: ')
-        logging.debug(str(streamed_maps))
+        logging.debug("%s", streamed_maps)
 
     surface = Surface(ix, projection=projection_type, uv_scale=scan_area, height=height, tile=tileable,
                       object_space=object_space, triplanar_blend=triplanar_blend, ior=ior, specular_strength=1,
                       displacement_offset=displacement_offset)
-    mtl = surface.create_mtl(asset_name, target_ctx)
-    surface.create_textures(textures, color_spaces=color_spaces,
-                            streamed_maps=streamed_maps, clip_opacity=clip_opacity)
+    mtl = surface.build(asset_name, target_ctx, textures, color_spaces=color_spaces, streamed_maps=streamed_maps,
+                        clip_opacity=clip_opacity)
     logging.debug("Import Megascans surface done.")
     logging.debug("++++++++++++++++++++++.")
     return surface
 
 
-def import_3d(asset_directory, target_ctx=None, lod=None, resolution=None, clip_opacity=True, **kwargs):
+@profiled
+def import_3d(asset_directory, target_ctx=None, lod=None, resolution=None, clip_opacity=True, scan=None, **kwargs):
     """Imports a Megascans 3D object."""
     ix = get_ix(kwargs.get('ix'))
     logging.debug("*******************************")
     logging.debug("Importing Megascans 3d asset...")
     # Force projection to uv
     kwargs['projection_type'] = 'uv'
+    scan = get_asset_scan(asset_directory, scan)
     surface = import_surface(asset_directory=asset_directory, target_ctx=target_ctx, clip_opacity=clip_opacity,
-                             resolution=resolution, lod=lod, **kwargs)
+                             resolution=resolution, lod=lod, scan=scan, **kwargs)
     if not surface:
         logging.debug('Material creation failed. Specified resolution is probably not valid.')
         return None
@@ -116,43 +131,26 @@ def import_3d(asset_directory, target_ctx=None, lod=None, resolution=None, clip_
     mtl = surface.mtl
     ctx = surface.ctx
 
-    files = [f for f in os.listdir(asset_directory) if os.path.isfile(os.path.join(asset_directory, f))]
-    lod_files = {}
-    for f in files:
-        filename, extension = os.path.splitext(f)
-        if extension.lower() == ".obj":
-            if filename.lower().endswith('_high'):
-                if not lod_files.get(-1):
-                    lod_files[-1] = []
-                lod_files[-1].append(os.path.normpath(os.path.join(asset_directory, f)))
-            else:
-                lod_level_match = re.search(r'.*?LOD(?P<lod>[0-9]*)$', filename, re.IGNORECASE)
-                if lod_level_match:
-                    lod_level = int(lod_level_match.group('lod'))
-                    if not lod_files.get(lod_level):
-                        lod_files[lod_level] = []
-                    lod_files[lod_level].append(os.path.normpath(os.path.join(asset_directory, f)))
-            logging.debug("Found obj: " + f)
-        elif extension.lower() == ".abc":
-            abc_reference = ix.cmds.CreateFileReference(str(ctx),
-                                                        [os.path.normpath(os.path.join(asset_directory, f))])
-            for item in get_items(abc_reference, kind=('GeometryAbcMesh', 'AbcXform'), ix=ix):
-                if not item.attrs.parent[0]:
-                    item.attrs.scale_offset[0] = .01
-                    item.attrs.scale_offset[1] = .01
-                    item.attrs.scale_offset[2] = .01
+    lod_files = scan.get_mesh_lods()
+    for f in scan.get_files(extensions=('abc',)):
+        abc_reference = ix.cmds.CreateFileReference(str(ctx), [f])
+        for item in get_items(abc_reference, kind=('GeometryAbcMesh', 'AbcXform'), ix=ix):
+            if not item.attrs.parent[0]:
+                item.attrs.scale_offset[0] = .01
+                item.attrs.scale_offset[1] = .01
+                item.attrs.scale_offset[2] = .01
 
     if lod_files:
         logging.debug('Lod files:')
-        logging.debug(str(lod_files))
+        logging.debug("%s", lod_files)
         keys = lod_files.keys()
         keys.sort()
         search_key = lod if lod is not None else -1
         search_key_index = bisect.bisect(keys, search_key)
-        logging.debug(str(search_key_index))
+        logging.debug("%s", search_key_index)
         files = lod_files.get(keys[search_key_index - 1])
         logging.debug('Files:')
-        logging.debug(str(files))
+        logging.debug("%s", files)
         if files:
             for f in files:
                 filename, extension = os.path.splitext(os.path.basename(f))
@@ -166,7 +164,7 @@ def import_3d(asset_directory, target_ctx=None, lod=None, resolution=None, clip_
                 for i in range(geo.get_shading_group_count()):
                     logging.debug('Applying material to geometry')
                     geo.assign_material(mtl.get_module(), i)
-                    ix.application.check_for_events()
+                    pump_events(ix, 'import_3d')
                     if clip_opacity and surface.get('opacity'):
                         logging.debug('Applying clip map')
                         geo.assign_clip_map(surface.get('opacity').get_module(), i)
@@ -175,22 +173,25 @@ def import_3d(asset_directory, target_ctx=None, lod=None, resolution=None, clip_
                         geo.assign_displacement(surface.get('displacement_map').get_module(), i)
 
     logging.debug("Creating shading layers..")
-    shading_layer = ix.cmds.CreateObject(asset_name + SHADING_LAYER_SUFFIX, "ShadingLayer", "Global",
-                                         str(ctx))
-    ix.cmds.AddShadingLayerRule(str(shading_layer), 0, ["filter", "", "is_visible", "1"])
-    ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "filter", ["./*"])
-    if lod in MESH_LOD_DISPLACEMENT_LEVELS and surface.get('displacement_map'):
-        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "displacement",
-                                             [str(surface.get('displacement_map'))])
-    ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "material", [str(mtl)])
-    if surface.get('opacity') and clip_opacity:
-        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "clip_map",
-                                             [str(surface.get('opacity'))])
+    with span('shading_layer', 'megascans'):
+        shading_layer = ix.cmds.CreateObject(asset_name + SHADING_LAYER_SUFFIX, "ShadingLayer", "Global",
+                                             str(ctx))
+        ix.cmds.AddShadingLayerRule(str(shading_layer), 0, ["filter", "", "is_visible", "1"])
+        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "filter", ["./*"])
+        if lod in MESH_LOD_DISPLACEMENT_LEVELS and surface.get('displacement_map'):
+            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "displacement",
+                                                 [str(surface.get('displacement_map'))])
+        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "material", [str(mtl)])
+        if surface.get('opacity') and clip_opacity:
+            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "clip_map",
+                                                 [str(surface.get('opacity'))])
     logging.debug("...done creating shading layers and importing 3d object.")
     logging.debug("********************************************************")
 
 
-def import_atlas(asset_directory, target_ctx=None, lod=None, clip_opacity=True, resolution=None, use_displacement=True, **kwargs):
+@profiled
+def import_atlas(asset_directory, target_ctx=None, lod=None, clip_opacity=True, resolution=None, use_displacement=True,
+                 scan=None, **kwargs):
     """Imports a Megascans 3D object."""
     ix = get_ix(kwargs.get('ix'))
     logging.debug("*******************")
@@ -198,8 +199,9 @@ def import_atlas(asset_directory, target_ctx=None, lod=None, clip_opacity=True,
 
     # Force projection to UV
     kwargs['projection_type'] = 'uv'
+    scan = get_asset_scan(asset_directory, scan)
     surface = import_surface(asset_directory=asset_directory, target_ctx=target_ctx, clip_opacity=clip_opacity,
-                             double_sided=True, resolution=resolution, **kwargs)
+                             double_sided=True, resolution=resolution, scan=scan, **kwargs)
     if not surface:
         logging.debug('Material creation failed. Specified resolution is probably not valid.')
         return None
@@ -207,12 +209,12 @@ def import_atlas(asset_directory, target_ctx=None, lod=None, clip_opacity=True,
     mtl = surface.mtl
     ctx = surface.ctx
 
-    files = [f for f in os.listdir(asset_directory) if os.path.isfile(os.path.join(asset_directory, f))]
+    files = [os.path.basename(f) for f in scan.get_files()]
     polyfiles = []
     for key, f in enumerate(files):
         filename, extension = os.path.splitext(f)
         if extension.lower() == ".obj":
-            logging.debug("Found obj: " + f)
+            logging.debug("Found obj: %s", f)
             polyfile = ix.cmds.CreateObject(filename, "GeometryPolyfile", "Global",
                                             str(ctx))
             polyfile.attrs.filename = os.path.normpath(os.path.join(asset_directory, f))
@@ -225,22 +227,23 @@ def import_atlas(asset_directory, target_ctx=None, lod=None, clip_opacity=True,
                     geo.assign_displacement(surface.get('displacement').get_module(), i)
             polyfiles.append(polyfile)
         elif extension.lower() == ".abc":
-            logging.debug("Found abc: " + f)
+            logging.debug("Found abc: %s", f)
             abc_reference = ix.cmds.CreateFileReference(str(ctx),
                                                         [os.path.normpath(os.path.join(asset_directory, f))])
     logging.debug("Setting up shading layer: ")
-    if files:
-        shading_layer = ix.cmds.CreateObject("shading_layer", "ShadingLayer", "Global",
-                                             str(ctx))
-        ix.cmds.AddShadingLayerRule(str(shading_layer), 0, ["filter", "", "is_visible", "1"])
-        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "filter", ["./*"])
-        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "material", [str(mtl)])
-        if surface.get('opacity'):
-            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "clip_map",
-                                                 [str(surface.get('opacity'))])
-        if surface.get('displacement'):
-            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "displacement",
-                                                 [str(surface.get('displacement_map'))])
+    with span('shading_layer', 'megascans'):
+        if files:
+            shading_layer = ix.cmds.CreateObject("shading_layer", "ShadingLayer", "Global",
+                                                 str(ctx))
+            ix.cmds.AddShadingLayerRule(str(shading_layer), 0, ["filter", "", "is_visible", "1"])
+            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "filter", ["./*"])
+            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "material", [str(mtl)])
+            if surface.get('opacity'):
+                ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "clip_map",
+                                                     [str(surface.get('opacity'))])
+            if surface.get('displacement'):
+                ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [0], "displacement",
+                                                     [str(surface.get('displacement_map'))])
     logging.debug("...done setting up shading layer")
     logging.debug("Setting up group: ")
     group = ix.cmds.CreateObject(asset_name + GROUP_SUFFIX, "Group", "Global", str(ctx))
@@ -252,9 +255,10 @@ def import_atlas(asset_directory, target_ctx=None, lod=None, clip_opacity=True,
     logging.debug("**********************************")
 
 
+@profiled
 def import_3dplant(asset_directory, target_ctx=None, ior=DEFAULT_IOR, object_space=0, clip_opacity=True,
                    use_displacement=True, color_spaces=MEGASCANS_COLOR_SPACES, triplanar_blend=0.5,
-                   resolution=None, lod=None, **kwargs):
+                   resolution=None, lod=None, scan=None, **kwargs):
     """Imports a Megascans 3D object."""
     ix = get_ix(kwargs.get('ix'))
     logging.debug("*******************")
@@ -269,76 +273,74 @@ def import_3dplant(asset_directory, target_ctx=None, ior=DEFAULT_IOR, object_spa
     asset_directory = os.path.normpath(asset_directory)
     if not os.path.isdir(asset_directory):
         return ix.log_warning("Invalid directory specified: " + asset_directory)
-    logging.debug("Asset directory: " + asset_directory)
+    logging.debug("Asset directory: %s", asset_directory)
 
     # Initial data
-    json_data = get_json_data_from_directory(asset_directory)
+    scan = get_asset_scan(asset_directory, scan)
+    json_data = get_json_data_from_directory(asset_directory, scan=scan)
     logging.debug("JSON data:")
-    logging.debug(str(json_data))
+    logging.debug("%s", json_data)
     if not json_data:
         ix.log_warning("Could not find a Megascans JSON file. Defaulting to standard settings.")
     asset_type = json_data.get('type', 'surface')
-    logging.debug("Asset type from JSON test: " + asset_type)
+    logging.debug("Asset type from JSON test: %s", asset_type)
     surface_height = json_data.get('surface_height', DEFAULT_DISPLACEMENT_HEIGHT)
-    logging.debug("Surface height JSON test: " + str(surface_height))
+    logging.debug("Surface height JSON test: %s", surface_height)
     scan_area = json_data.get('scan_area', DEFAULT_UV_SCALE)
-    logging.debug("Scan area JSON test: " + str(scan_area))
+    logging.debug("Scan area JSON test: %s", scan_area)
     tileable = json_data.get('tileable', True)
     asset_name = os.path.basename(os.path.normpath(asset_directory))
-    logging.debug("Asset name: " + asset_name)
+    logging.debug("Asset name: %s", asset_name)
     logging.debug(os.path.join(asset_directory, 'Textures/Atlas/'))
-    atlas_textures = get_textures_from_directory(os.path.join(asset_directory, 'Textures/Atlas/'),
-                                                 resolution=resolution)
+    atlas_textures = scan.get_textures('Textures/Atlas/', resolution=resolution)
     if not atlas_textures:
         ix.log_warning("No atlas textures found in directory. Files might have been exported flattened from Bridge.\n"
                        "Testing import as Atlas.")
         import_atlas(asset_directory, target_ctx=target_ctx, use_displacement=use_displacement,
-                     clip_opacity=clip_opacity, resolution=resolution, **kwargs)
+                     clip_opacity=clip_opacity, resolution=resolution, scan=scan, **kwargs)
         return None
     logging.debug("Atlas textures: ")
-    logging.debug(str(atlas_textures))
+    logging.debug("%s", atlas_textures)
     streamed_maps = get_stream_map_files(atlas_textures)
     logging.debug("Atlas streamed maps: ")
-    logging.debug(str(streamed_maps))
+    logging.debug("%s", streamed_maps)
 
     atlas_surface = Surface(ix, projection='uv', uv_scale=scan_area, height=scan_area[0],
                             tile=tileable, object_space=object_space, triplanar_blend=triplanar_blend, ior=ior,
                             double_sided=True, specular_strength=1, displacement_multiplier=0.1)
     plant_root_ctx = ix.cmds.CreateContext(asset_name, "Global", str(target_ctx))
-    atlas_mtl = atlas_surface.create_mtl(ATLAS_CTX, plant_root_ctx)
-    atlas_surface.create_textures(atlas_textures, color_spaces=color_spaces, streamed_maps=streamed_maps,
-                                  clip_opacity=clip_opacity)
+    atlas_mtl = atlas_surface.build(ATLAS_CTX, plant_root_ctx, atlas_textures, color_spaces=color_spaces,
+                                    streamed_maps=streamed_maps, clip_opacity=clip_opacity)
     atlas_ctx = atlas_surface.ctx
     # Find the textures of the Billboard and create the material.
-    billboard_textures = get_textures_from_directory(os.path.join(asset_directory, 'Textures/Billboard/'),
-                                                     resolution=resolution)
+    billboard_textures = scan.get_textures('Textures/Billboard/', resolution=resolution)
     if not billboard_textures:
         ix.log_warning("No textures found in directory.")
         return None
     logging.debug("Billboard textures: ")
-    logging.debug(str(billboard_textures))
+    logging.debug("%s", billboard_textures)
 
     streamed_maps = get_stream_map_files(billboard_textures)
     logging.debug("Billboard streamed maps: ")
-    logging.debug(str(streamed_maps))
+    logging.debug("%s", streamed_maps)
     billboard_surface = Surface(ix, projection='uv', uv_scale=scan_area, height=scan_area[0],
                                 tile=tileable, object_space=object_space, triplanar_blend=triplanar_blend, ior=ior,
                                 double_sided=True, specular_strength=1, displacement_multiplier=0.1)
-    billboard_mtl = billboard_surface.create_mtl(BILLBOARD_CTX, plant_root_ctx)
-    billboard_surface.create_textures(billboard_textures, color_spaces=color_spaces, streamed_maps=streamed_maps,
-                                      clip_opacity=clip_opacity)
+    billboard_mtl = billboard_surface.build(BILLBOARD_CTX, plant_root_ctx, billboard_textures,
+                                            color_spaces=color_spaces, streamed_maps=streamed_maps,
+                                            clip_opacity=clip_opacity)
     billboard_ctx = billboard_surface.ctx
 
-    for dir_name in os.listdir(asset_directory):
+    for dir_name in scan.get_sub_directories():
         variation_dir = os.path.join(asset_directory, dir_name)
-        if os.path.isdir(variation_dir) and dir_name.startswith('Var'):
-            logging.debug("Variation dir found: " + variation_dir)
-            files = [f for f in os.listdir(variation_dir) if os.path.isfile(os.path.join(variation_dir, f))]
+        if dir_name.startswith('Var'):
+            logging.debug("Variation dir found: %s", variation_dir)
+            files = [os.path.basename(f) for f in scan.get_files(dir_name)]
             # Search for models files and apply material
             for f in files:
                 filename, extension = os.path.splitext(f)
                 if extension.lower() == ".obj":
-                    logging.debug("Found obj: " + f)
+                    logging.debug("Found obj: %s", f)
                     filename, extension = os.path.splitext(f)
                     polyfile = ix.cmds.CreateObject(filename, "GeometryPolyfile", "Global", str(plant_root_ctx))
                     ix.cmds.SetValue(str(polyfile) + ".filename",
@@ -361,44 +363,54 @@ def import_3dplant(asset_directory, target_ctx=None, ior=DEFAULT_IOR, object_spa
                             if int(lod_level_match) in ATLAS_LOD_DISPLACEMENT_LEVELS and use_displacement:
                                 geo.assign_displacement(atlas_surface.get('displacement_map').get_module(), i)
                 elif extension.lower() == ".abc":
-                    logging.debug("Found abc: " + f)
+                    logging.debug("Found abc: %s", f)
                     abc_reference = ix.cmds.CreateFileReference(str(plant_root_ctx),
                                                                 [os.path.normpath(os.path.join(variation_dir, f))])
 
-    shading_layer = ix.cmds.CreateObject(asset_name + SHADING_LAYER_SUFFIX, "ShadingLayer", "Global",
-                                         str(plant_root_ctx))
-    logging.debug("Creating shading layers and groups...")
-    for i in range(0, 4):
-        ix.cmds.AddShadingLayerRule(str(shading_layer), i, ["filter", "", "is_visible", "1"])
-        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "filter", ["./*LOD" + str(i) + "*"])
-        ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "material", [str(atlas_mtl)])
-        if atlas_surface.get('opacity') and clip_opacity:
-            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "clip_map",
-                                                 [str(atlas_surface.get('opacity'))])
-        if atlas_surface.get('displacement') and i in ATLAS_LOD_DISPLACEMENT_LEVELS and use_displacement:
-            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "displacement",
-                                                 [str(atlas_surface.get('displacement_map'))])
-
-        group = ix.cmds.CreateObject(asset_name + "_LOD" + str(i) + GROUP_SUFFIX, "Group", "Global",
-                                     str(plant_root_ctx))
-        group.attrs.inclusion_rule = "./*LOD" + str(i) + "*"
-        ix.cmds.AddValues([group.get_full_name() + ".filter"], ["GeometryAbcMesh"])
-        ix.cmds.AddValues([group.get_full_name() + ".filter"], ["GeometryPolyfile"])
-        ix.cmds.RemoveValue([group.get_full_name() + ".filter"], [2, 0, 1])
+    with span('shading_layers', 'megascans'):
+        shading_layer = ix.cmds.CreateObject(asset_name + SHADING_LAYER_SUFFIX, "ShadingLayer", "Global",
+                                             str(plant_root_ctx))
+        logging.debug("Creating shading layers and groups...")
+        for i in range(0, 4):
+            ix.cmds.AddShadingLayerRule(str(shading_layer), i, ["filter", "", "is_visible", "1"])
+            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "filter", ["./*LOD" + str(i) + "*"])
+            ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "material", [str(atlas_mtl)])
+            if atlas_surface.get('opacity') and clip_opacity:
+                ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "clip_map",
+                                                     [str(atlas_surface.get('opacity'))])
+            if atlas_surface.get('displacement') and i in ATLAS_LOD_DISPLACEMENT_LEVELS and use_displacement:
+                ix.cmds.SetShadingLayerRulesProperty(str(shading_layer), [i], "displacement",
+                                                     [str(atlas_surface.get('displacement_map'))])
+
+            group = ix.cmds.CreateObject(asset_name + "_LOD" + str(i) + GROUP_SUFFIX, "Group", "Global",
+                                             str(plant_root_ctx))
+            group.attrs.inclusion_rule = "./*LOD" + str(i) + "*"
+            ix.cmds.AddValues([group.get_full_name() + ".filter"], ["GeometryAbcMesh"])
+            ix.cmds.AddValues([group.get_full_name() + ".filter"], ["GeometryPolyfile"])
+            ix.cmds.RemoveValue([group.get_full_name() + ".filter"], [2, 0, 1])
 
     logging.debug("...done setting up shading rules, groups and 3d plant")
     logging.debug("*****************************************************")
 
 
-def get_json_data_from_directory(directory):
+def get_json_data_from_directory(directory, scan=None):
     """Get the JSON data contents required for material setup."""
+    scan = get_asset_scan(directory, scan)
+    if 'json_data' not in scan.cache:
+        scan.cache['json_data'] = _read_json_data(directory, scan)
+    json_data = scan.cache['json_data']
+    return dict(json_data) if json_data is not None else None
+
+
+@profiled
+def _read_json_data(directory, scan):
     logging.debug("Searching for JSON...")
-    files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
+    files = [os.path.basename(f) for f in scan.get_files()]
     # Search for any JSON file. Custom Mixer scans don't have a suffix like the ones from the library.
     data = {}
     for f in files:
         filename, extension = os.path.splitext(f)
-        if extension == ".json":
+        if extension == ".json" and not is_hidden_file(f):
             logging.debug("...JSON found!!!")
             json_file = os.path.join(directory, filename + ".json")
             with open(json_file) as json_file:
@@ -406,11 +418,11 @@ def get_json_data_from_directory(directory):
                 if not json_data:
                     return None
                 meta_data = json_data.get('meta')
-                logging.debug("Meta JSON Data: " + str(meta_data))
+                logging.debug("Meta JSON Data: %s", meta_data)
                 if not meta_data:
                     return None
                 categories = json_data.get('categories')
-                logging.debug("Categories JSON Data: " + str(categories))
+                logging.debug("Categories JSON Data: %s", categories)
                 if not categories:
                     return None
                 maps = json_data.get('maps')
@@ -442,9 +454,84 @@ def get_json_data_from_directory(directory):
     return data
 
 
+def iter_library_assets(library_dir, custom_assets=True, skip_categories=()):
+    """
+    Yields the library directory, category directory name and asset directory of every asset in the library.
+    Directory listings are served from the scan index when it's enabled.
+    """
+    if os.path.isdir(os.path.join(library_dir, "Downloaded")):
+        library_dir = os.path.join(library_dir, "Downloaded")
+    for category_dir_name in list_sub_directories(library_dir):
+        logging.debug("Checking if directory contains matches keywords: %s", category_dir_name)
+        if category_dir_name in MEGASCANS_LIBRARY_CATEGORIES and category_dir_name not in skip_categories:
+            category_dir_path = os.path.join(library_dir, category_dir_name)
+            for asset_directory_name in list_sub_directories(category_dir_path):
+                yield library_dir, category_dir_name, os.path.join(category_dir_path, asset_directory_name)
+    if custom_assets and os.path.isdir(os.path.join(library_dir, "My Assets")):
+        logging.debug("My Assets exists...")
+        for asset in iter_library_assets(os.path.join(library_dir, "My Assets"), custom_assets=False,
+                                         skip_categories=skip_categories):
+            yield asset
+
+
+def prescan_assets(asset_directories, threads=LIBRARY_SCAN_THREADS, queue_size=LIBRARY_SCAN_QUEUE_SIZE,
+                   on_wait=None, progress=None):
+    """
+    Scans and inspects asset directories on a thread pool ahead of the consumer.
+    Yields (asset_directory, scan, report, error) tuples in the order the scans finish.
+    At most queue_size directories are scanned or waiting to be consumed at any time.
+    on_wait is called repeatedly while the consumer waits for a result, e.g. to process Clarisse events.
+    If a progress dictionary is passed its 'scanned' key holds the number of finished scans.
+    """
+    pending = iter(asset_directories)
+    results = Queue.Queue()
+    pool = mp.Pool(max(threads, 1))
+    in_flight = 0
+    consumed = 0
+    if progress is None:
+        progress = {}
+
+    def prescan_asset(asset_directory):
+        try:
+            scan = get_asset_scan(asset_directory)
+            report = inspect_asset(asset_directory, scan=scan)
+            results.put((asset_directory, scan, report, None))
+        except Exception as e:
+            results.put((asset_directory, None, None, e))
+
+    def submit():
+        for asset_directory in pending:
+            pool.apply_async(prescan_asset, (asset_directory,))
+            return True
+        return False
+
+    try:
+        while in_flight < max(queue_size, 1) and submit():
+            in_flight += 1
+        while in_flight:
+            try:
+                result = results.get(timeout=0.05 if on_wait else None)
+            except Queue.Empty:
+                on_wait()
+                continue
+            in_flight -= 1
+            consumed += 1
+            if submit():
+                in_flight += 1
+            progress['scanned'] = consumed + results.qsize()
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+@profiled
+@template_surfaces
 def import_ms_library(library_dir, target_ctx=None, lod=None, custom_assets=True, resolution=None,
                       skip_categories=(), **kwargs):
     """Imports the whole Megascans Library. Point it to the Downloaded folder inside your library folder.
+    Asset directories are scanned on LIBRARY_SCAN_THREADS threads while the scene is built on the main thread.
     """
     logging.debug("Importing Megascans library...")
 
@@ -455,32 +542,48 @@ def import_ms_library(library_dir, target_ctx=None, lod=None, custom_assets=True
         return None
     if not os.path.isdir(library_dir):
         return None
-    if os.path.isdir(os.path.join(library_dir, "Downloaded")):
-        library_dir = os.path.join(library_dir, "Downloaded")
-    logging.debug("Directory set to: " + library_dir)
+    logging.debug("Directory set to: %s", library_dir)
     print "Scanning folders in " + library_dir
 
-    for category_dir_name in os.listdir(library_dir):
-        category_dir_path = os.path.join(library_dir, category_dir_name)
-        logging.debug("Checking if directory contains matches keywords: " + category_dir_name)
-        if category_dir_name in ["3d", "3dplant", "surface", "surfaces", "atlas", "atlases"]:
-            if category_dir_name not in skip_categories and os.path.isdir(category_dir_path):
-                context_name = category_dir_name
-                if os.path.basename(library_dir) == "My Assets" and category_dir_name == "surfaces":
-                    context_name = LIBRARY_MIXER_CTX
-                ctx = ix.item_exists(str(target_ctx) + "/" + MEGASCANS_LIBRARY_CATEGORY_PREFIX + context_name)
-                if not ctx:
-                    ctx = ix.cmds.CreateContext(MEGASCANS_LIBRARY_CATEGORY_PREFIX + context_name,
-                                                "Global", str(target_ctx))
-                print "Importing library folder: " + category_dir_name
-                for asset_directory_name in os.listdir(category_dir_path):
-                    asset_directory_path = os.path.join(category_dir_path, asset_directory_name)
-                    if os.path.isdir(asset_directory_path):
-                        if not ix.item_exists(str(ctx) + "/" + asset_directory_name):
-                            print "Importing asset: " + asset_directory_path
-                            import_asset(asset_directory_path, resolution=resolution, lod=lod, target_ctx=ctx, ix=ix)
-    if custom_assets and os.path.isdir(os.path.join(library_dir, "My Assets")):
-        logging.debug("My Assets exists...")
-        import_ms_library(os.path.join(library_dir, "My Assets"), target_ctx=target_ctx,
-                          skip_categories=skip_categories, lod=lod, resolution=resolution,
-                          custom_assets=False, ix=ix)
+    category_contexts = {}
+    asset_contexts = collections.OrderedDict()
+    for category_library_dir, category_dir_name, asset_directory_path in \
+            iter_library_assets(library_dir, custom_assets=custom_assets, skip_categories=skip_categories):
+        ctx = category_contexts.get((category_library_dir, category_dir_name))
+        if not ctx:
+            context_name = category_dir_name
+            if os.path.basename(category_library_dir) == "My Assets" and category_dir_name == "surfaces":
+                context_name = LIBRARY_MIXER_CTX
+            ctx = ix.item_exists(str(target_ctx) + "/" + MEGASCANS_LIBRARY_CATEGORY_PREFIX + context_name)
+            if not ctx:
+                ctx = ix.cmds.CreateContext(MEGASCANS_LIBRARY_CATEGORY_PREFIX + context_name,
+                                            "Global", str(target_ctx))
+            category_contexts[(category_library_dir, category_dir_name)] = ctx
+            print "Found library folder: " + category_dir_name
+        asset_directory_name = os.path.basename(asset_directory_path)
+        if not ix.item_exists(str(ctx) + "/" + asset_directory_name):
+            asset_contexts[asset_directory_path] = ctx
+    asset_count = len(asset_contexts)
+    print "Found %i assets to import" % asset_count
+
+    built = 0
+    progress = {}
+    get_event_pump(ix).reset()
+    for asset_directory_path, scan, report, error in prescan_assets(asset_contexts.keys(), progress=progress,
+                                                                    on_wait=ix.application.check_for_events):
+        if error:
+            ix.log_warning("Could not scan asset %s: %s" % (asset_directory_path, str(error)))
+            continue
+        built += 1
+        print "Scanned %i/%i, importing %i/%i: %s" % (progress['scanned'], asset_count, built, asset_count,
+                                                      asset_directory_path)
+        import_asset(asset_directory_path, report=report, scan=scan, resolution=resolution, lod=lod,
+                     target_ctx=asset_contexts[asset_directory_path], ix=ix)
+        pump_events(ix, 'import_ms_library')
+    flush_scan_index()
+    requests, pumps = get_event_pump(ix).log_stats()
+    print "Pumped events %i of %i times" % (pumps, requests)
+    index = get_scan_index()
+    if index:
+        print "Scan index: %(hits)i hits, %(misses)i misses, %(listing_hits)i listing hits, " \
+              "%(listing_misses)i listing misses" % index.get_stats()
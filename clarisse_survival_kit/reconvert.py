@@ -26,20 +26,19 @@ def reconverter_gui():
     if not textures:
         return
     ix.begin_command_batch("Reconvert")
-    progress = ix.application.create_progress_bar('Converting textures...')
-    progress.set_value(0.0)
-    progress.set_step_count(len(textures))
-    progress.start()
-    i = 0
+    textures_by_extension = {}
     for tx in textures:
         if tx:
             filename = tx.attrs.filename.attr.get_string()
             if filename:
                 extension = os.path.splitext(filename)[-1].lstrip('.')
-                convert_tx(tx, extension=extension, replace=True, update=True, ix=ix)
-        progress.step(i)
-        i += 1
-        ix.application.check_for_events()
+                textures_by_extension.setdefault(extension, []).append(tx)
+    progress = ix.application.create_progress_bar('Converting textures...')
+    progress.set_value(0.0)
+    progress.start()
+    for extension, extension_textures in textures_by_extension.iteritems():
+        convert_textures(extension_textures, extension=extension, replace=True, update=True, progress=progress,
+                         ix=ix)
     progress.destroy()
     ix.end_command_batch()
 
@@ -0,0 +1,184 @@
+import os
+import re
+import logging
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.utility import get_textures_from_files
+from clarisse_survival_kit.profiling import profiled
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def list_directory(directory):
+    """Returns the file and directory names inside a directory. Uses scandir when available to avoid a stat per entry."""
+    files = []
+    dirs = []
+    try:
+        if scandir:
+            for entry in scandir(directory):
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+        else:
+            for name in os.listdir(directory):
+                if os.path.isdir(os.path.join(directory, name)):
+                    dirs.append(name)
+                else:
+                    files.append(name)
+    except OSError as e:
+        logging.debug("Could not list directory: %s", e)
+    return files, dirs
+
+
+def is_hidden_file(path):
+    """Returns whether the file is hidden, like the conversion manifest that is written next to the textures."""
+    filename = os.path.basename(path)
+    return filename.startswith('.') or filename == CONVERSION_MANIFEST_FILENAME
+
+
+class AssetScan(object):
+    """
+    Lists an asset directory exactly once so inspection and import can share the results.
+    Paths are stored relative to the asset directory, '' being the asset directory itself.
+    """
+    __slots__ = ('directory', 'files', 'dirs', 'files_by_extension', 'cache')
+
+    def __init__(self, directory, listing=None):
+        self.directory = os.path.normpath(directory)
+        self.files = {}
+        self.dirs = {}
+        self.files_by_extension = {}
+        self.cache = {}
+        if listing is None:
+            self.scan()
+        else:
+            self.files = listing['files']
+            self.dirs = listing['dirs']
+            self.cache = listing.get('cache', {})
+            self._group_by_extension()
+
+    @profiled
+    def scan(self):
+        """Walks the directory top-down like os.walk."""
+        logging.debug("Scanning asset directory: %s", self.directory)
+        self.files = {}
+        self.dirs = {}
+        self.cache = {}
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            files, dirs = list_directory(os.path.join(self.directory, rel_dir))
+            self.files[rel_dir] = files
+            self.dirs[rel_dir] = dirs
+            for d in reversed(dirs):
+                stack.append(os.path.join(rel_dir, d))
+        self._group_by_extension()
+        logging.debug("Scanned %i directories", len(self.files))
+
+    def _group_by_extension(self):
+        self.files_by_extension = {}
+        for rel_dir in self.iter_dirs():
+            for f in self.files[rel_dir]:
+                extension = os.path.splitext(f)[-1].lower().lstrip('.')
+                self.files_by_extension.setdefault(extension, []).append(os.path.join(rel_dir, f))
+
+    def to_dict(self):
+        """Returns the listing and cached data so the scan can be stored and recreated with AssetScan(directory, listing)."""
+        return {'files': self.files, 'dirs': self.dirs, 'cache': self.cache}
+
+    def _rel_dir(self, sub_directory):
+        if not sub_directory:
+            return ''
+        rel_dir = os.path.normpath(sub_directory)
+        return '' if rel_dir == '.' else rel_dir
+
+    def path(self, *parts):
+        """Returns the absolute path of a file or directory relative to the asset directory."""
+        return os.path.normpath(os.path.join(self.directory, *parts))
+
+    def exists(self, sub_directory=''):
+        """Returns True if the sub directory was found while scanning."""
+        return self._rel_dir(sub_directory) in self.files
+
+    def get_files(self, sub_directory='', recursive=False, extensions=None):
+        """Returns the absolute paths of the files in the sub directory, optionally filtered by extension."""
+        rel_dir = self._rel_dir(sub_directory)
+        if rel_dir not in self.files:
+            return []
+        rel_dirs = [rel_dir]
+        if recursive:
+            rel_dirs = list(self.iter_dirs(rel_dir))
+        paths = []
+        for d in rel_dirs:
+            for f in self.files[d]:
+                if extensions and os.path.splitext(f)[-1].lower().lstrip('.') not in extensions:
+                    continue
+                paths.append(self.path(d, f))
+        return paths
+
+    def get_sub_directories(self, sub_directory=''):
+        """Returns the directory names directly inside the sub directory."""
+        return list(self.dirs.get(self._rel_dir(sub_directory), []))
+
+    def iter_dirs(self, sub_directory=''):
+        """Yields the relative path of the sub directory and all of its descendants in os.walk order."""
+        stack = [self._rel_dir(sub_directory)]
+        while stack:
+            rel_dir = stack.pop()
+            yield rel_dir
+            for d in reversed(self.dirs.get(rel_dir, [])):
+                stack.append(os.path.join(rel_dir, d))
+
+    def get_textures(self, sub_directory='', **kwargs):
+        """Returns the classified textures. Takes the same keyword arguments as get_textures_from_files."""
+        logging.debug("Searching for textures inside: %s", self.path(sub_directory))
+        return get_textures_from_files(self.get_files(sub_directory, recursive=True), **kwargs)
+
+    def get_meshes(self, sub_directory='', recursive=True):
+        """Returns the mesh files."""
+        meshes = self.get_files(sub_directory, recursive=recursive, extensions=MESH_FORMATS)
+        logging.debug("Meshes found: %s", meshes)
+        return meshes
+
+    def get_json_files(self, sub_directory=''):
+        """Returns the JSON sidecar files next to the asset. Hidden files like the conversion manifest are skipped."""
+        return [f for f in self.get_files(sub_directory) if os.path.splitext(f)[-1] == '.json' and
+                not is_hidden_file(f)]
+
+    def get_mesh_lods(self, sub_directory=''):
+        """
+        Returns a dictionary of the .obj files keyed by LOD level.
+        High poly meshes ending with _high are stored under LOD level -1.
+        """
+        lod_files = {}
+        for path in self.get_files(sub_directory, extensions=('obj',)):
+            filename = os.path.splitext(os.path.basename(path))[0]
+            if filename.lower().endswith('_high'):
+                lod_files.setdefault(-1, []).append(path)
+            else:
+                lod_level_match = re.search(r'.*?LOD(?P<lod>[0-9]*)$', filename, re.IGNORECASE)
+                if lod_level_match:
+                    lod_level = int(lod_level_match.group('lod'))
+                    lod_files.setdefault(lod_level, []).append(path)
+        return lod_files
+
+
+def get_asset_scan(asset_directory, scan=None):
+    """
+    Returns the passed scan if it belongs to the directory.
+    Otherwise the scan is looked up in the scan index or the directory is scanned.
+    """
+    if scan is not None and scan.directory == os.path.normpath(asset_directory):
+        return scan
+    from clarisse_survival_kit.scan_index import get_scan_index
+    index = get_scan_index()
+    if index:
+        return index.get_scan(asset_directory)
+    return AssetScan(asset_directory)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python2
+"""
+Persistent index of asset directory scans stored in the .csk user folder.
+Entries are invalidated when the mtime or size of any scanned directory or JSON sidecar changes.
+
+Usage:
+    python -m clarisse_survival_kit.scan_index rebuild <library_dir>
+    python -m clarisse_survival_kit.scan_index verify [--deep] [--prune]
+    python -m clarisse_survival_kit.scan_index stats
+    python -m clarisse_survival_kit.scan_index clear
+"""
+import argparse
+import atexit
+import logging
+import os
+import threading
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from clarisse_survival_kit import user_path
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.scan import AssetScan, list_directory
+
+SCHEMA_VERSION = 1
+# Number of new or changed scans that are kept in memory before they are written to disk.
+FLUSH_INTERVAL = 100
+# Directories modified less than this many seconds ago are not stored.
+# Their mtime could still change within the resolution of the file system timestamps.
+RACY_SECONDS = 2
+
+
+def get_signature(directory, rel_paths):
+    """Returns a list of (relative path, mtime, size) tuples. Paths that can't be accessed have no mtime or size."""
+    signature = []
+    for rel_path in rel_paths:
+        try:
+            stat = os.stat(os.path.join(directory, rel_path))
+            signature.append((rel_path, stat.st_mtime, stat.st_size))
+        except OSError:
+            signature.append((rel_path, None, None))
+    return signature
+
+
+def get_scan_signature(scan):
+    """Returns the signature of every directory of the scan and its JSON sidecars."""
+    rel_paths = list(scan.iter_dirs())
+    rel_paths += [os.path.basename(f) for f in scan.get_json_files()]
+    return get_signature(scan.directory, rel_paths)
+
+
+def is_racy(signature):
+    """Returns True if any of the paths was modified too recently to be trusted."""
+    now = time.time()
+    for rel_path, mtime, size in signature:
+        if mtime is None or mtime > now - RACY_SECONDS:
+            return True
+    return False
+
+
+class ScanIndex(object):
+    """SQLite backed cache of AssetScan listings and directory listings. Can be shared between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.text_factory = str
+        self.pending = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.listing_hits = 0
+        self.listing_misses = 0
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            row = cursor.execute('SELECT value FROM meta WHERE key = ?', ('schema_version',)).fetchone()
+            if not row or row[0] != str(SCHEMA_VERSION):
+                logging.debug("Creating scan index tables in: %s", self.path)
+                cursor.execute('DROP TABLE IF EXISTS assets')
+                cursor.execute('DROP TABLE IF EXISTS listings')
+                cursor.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('schema_version', str(SCHEMA_VERSION)))
+            cursor.execute('CREATE TABLE IF NOT EXISTS assets '
+                           '(path TEXT PRIMARY KEY, signature BLOB, scan BLOB, updated REAL)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS listings '
+                           '(path TEXT PRIMARY KEY, mtime REAL, size INTEGER, dirs BLOB)')
+            self.connection.commit()
+
+    def get_scan(self, directory):
+        """Returns the AssetScan of the directory. Only rescans the directory if it changed since it was indexed."""
+        directory = os.path.normpath(directory)
+        with self.lock:
+            pending = self.pending.get(directory)
+            row = None
+            if not pending:
+                row = self.connection.execute('SELECT signature, scan FROM assets WHERE path = ?',
+                                              (directory,)).fetchone()
+        if pending:
+            scan, signature, cache_keys = pending
+            if get_signature(directory, [p[0] for p in signature]) == signature:
+                self._count('hits')
+                return scan
+        elif row:
+            signature = pickle.loads(str(row[0]))
+            if get_signature(directory, [p[0] for p in signature]) == signature:
+                self._count('hits')
+                scan = AssetScan(directory, pickle.loads(str(row[1])))
+                self._track(scan, signature, set(scan.cache))
+                return scan
+            logging.debug("Scan index entry is outdated: %s", directory)
+        self._count('misses')
+        scan = AssetScan(directory)
+        self._track(scan, get_scan_signature(scan), None)
+        return scan
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _track(self, scan, signature, cache_keys):
+        """Keeps the scan until the next flush so data cached on it afterwards is stored as well."""
+        with self.lock:
+            if len(self.pending) >= FLUSH_INTERVAL:
+                self.flush()
+            self.pending[scan.directory] = (scan, signature, cache_keys)
+
+    def list_sub_directories(self, directory):
+        """Returns the names of the directories inside the directory. Cached by the mtime and size of the directory."""
+        directory = os.path.normpath(directory)
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            return []
+        with self.lock:
+            row = self.connection.execute('SELECT mtime, size, dirs FROM listings WHERE path = ?',
+                                          (directory,)).fetchone()
+        if row and row[0] == stat.st_mtime and row[1] == stat.st_size:
+            self._count('listing_hits')
+            return pickle.loads(str(row[2]))
+        self._count('listing_misses')
+        files, dirs = list_directory(directory)
+        if not is_racy([(directory, stat.st_mtime, stat.st_size)]):
+            with self.lock:
+                self.connection.execute('INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?)',
+                                        (directory, stat.st_mtime, stat.st_size,
+                                         sqlite3.Binary(pickle.dumps(dirs, 2))))
+                self.dirty = True
+        return dirs
+
+    def flush(self):
+        """Writes new and changed scans to disk."""
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+            rows = []
+            now = time.time()
+            for directory, (scan, signature, cache_keys) in pending.iteritems():
+                if cache_keys is not None and cache_keys == set(scan.cache):
+                    continue
+                if is_racy(signature):
+                    continue
+                rows.append((directory, sqlite3.Binary(pickle.dumps(signature, 2)),
+                             sqlite3.Binary(pickle.dumps(scan.to_dict(), 2)), now))
+            try:
+                if rows:
+                    self.connection.executemany('INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?)', rows)
+                if rows or self.dirty:
+                    self.connection.commit()
+                    logging.debug("Scan index flushed %i entries", len(rows))
+                self.dirty = False
+            except sqlite3.Error as e:
+                logging.error("Could not write scan index: %s", e)
+
+    def clear(self):
+        with self.lock:
+            self.pending = {}
+            self.connection.execute('DELETE FROM assets')
+            self.connection.execute('DELETE FROM listings')
+            self.connection.commit()
+
+    def verify(self, deep=False, prune=False):
+        """
+        Checks every entry against the disk and returns the number of valid, stale and missing entries.
+        With deep the valid asset entries are rescanned and compared with the stored listing.
+        With prune the entries that are not valid are removed.
+        """
+        self.flush()
+        result = {'valid': 0, 'stale': 0, 'missing': 0, 'mismatch': 0}
+        invalid_assets = []
+        with self.lock:
+            rows = self.connection.execute('SELECT path, signature, scan FROM assets').fetchall()
+        for path, signature, listing in rows:
+            signature = pickle.loads(str(signature))
+            if not os.path.isdir(path):
+                result['missing'] += 1
+            elif get_signature(path, [p[0] for p in signature]) != signature:
+                result['stale'] += 1
+            elif deep and AssetScan(path).to_dict()['files'] != pickle.loads(str(listing))['files']:
+                result['mismatch'] += 1
+            else:
+                result['valid'] += 1
+                continue
+            invalid_assets.append((path,))
+        invalid_listings = []
+        with self.lock:
+            rows = self.connection.execute('SELECT path, mtime, size FROM listings').fetchall()
+        for path, mtime, size in rows:
+            signature = get_signature(path, [''])[0]
+            if signature[1] != mtime or signature[2] != size:
+                invalid_listings.append((path,))
+        result['stale_listings'] = len(invalid_listings)
+        result['valid_listings'] = len(rows) - len(invalid_listings)
+        if prune:
+            with self.lock:
+                self.connection.executemany('DELETE FROM assets WHERE path = ?', invalid_assets)
+                self.connection.executemany('DELETE FROM listings WHERE path = ?', invalid_listings)
+                self.connection.commit()
+        return result
+
+    def get_stats(self):
+        """Returns the hit and miss counters of this session and the number of stored entries."""
+        with self.lock:
+            assets = self.connection.execute('SELECT COUNT(*) FROM assets').fetchone()[0]
+            listings = self.connection.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses,
+                'listing_hits': self.listing_hits, 'listing_misses': self.listing_misses,
+                'assets': assets, 'listings': listings}
+
+
+_scan_index = None
+_scan_index_lock = threading.Lock()
+
+
+def get_scan_index():
+    """Returns the scan index of the user folder or None if it's disabled or can't be opened."""
+    global _scan_index
+    if not SCAN_INDEX_ENABLED or sqlite3 is None:
+        return None
+    with _scan_index_lock:
+        if _scan_index is None:
+            try:
+                _scan_index = ScanIndex(os.path.join(user_path, SCAN_INDEX_FILENAME))
+            except sqlite3.Error as e:
+                logging.error("Could not open scan index: %s", e)
+                _scan_index = False
+    return _scan_index or None
+
+
+def flush_scan_index():
+    if _scan_index:
+        _scan_index.flush()
+
+
+atexit.register(flush_scan_index)
+
+
+def list_sub_directories(directory):
+    """Returns the names of the directories inside the directory using the scan index when it's enabled."""
+    index = get_scan_index()
+    if index:
+        return index.list_sub_directories(directory)
+    return list_directory(directory)[1]
+
+
+def rebuild(library_dir):
+    """Clears the index and indexes every asset in the Megascans library."""
+    from clarisse_survival_kit.providers.megascans import iter_library_assets, get_json_data_from_directory
+    index = get_scan_index()
+    if not index:
+        print "Scan index is disabled or can't be opened."
+        return None
+    index.clear()
+    start = time.time()
+    count = 0
+    for category_library_dir, category_dir_name, asset_directory in iter_library_assets(library_dir):
+        get_json_data_from_directory(asset_directory, scan=index.get_scan(asset_directory))
+        count += 1
+        if count % 500 == 0:
+            print "Indexed %i assets..." % count
+    index.flush()
+    print "Indexed %i assets in %.2fs" % (count, time.time() - start)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clarisse Survival Kit scan index.')
+    sub_parsers = parser.add_subparsers(dest='command')
+    rebuild_parser = sub_parsers.add_parser('rebuild', help='Rebuild the index from a Megascans library.')
+    rebuild_parser.add_argument('library_dir')
+    verify_parser = sub_parsers.add_parser('verify', help='Check the index against the disk.')
+    verify_parser.add_argument('--deep', action='store_true', help='Rescan valid entries and compare the listings.')
+    verify_parser.add_argument('--prune', action='store_true', help='Remove entries that are not valid.')
+    sub_parsers.add_parser('stats', help='Print the number of indexed entries.')
+    sub_parsers.add_parser('clear', help='Remove all entries.')
+    args = parser.parse_args(argv)
+
+    index = get_scan_index()
+    if not index:
+        print "Scan index is disabled or can't be opened."
+        return 1
+    if args.command == 'rebuild':
+        rebuild(args.library_dir)
+    elif args.command == 'verify':
+        result = index.verify(deep=args.deep, prune=args.prune)
+        for key in sorted(result.keys()):
+            print "%-16s %i" % (key + ':', result[key])
+    elif args.command == 'clear':
+        index.clear()
+    for key, value in sorted(index.get_stats().items()):
+        print "%-16s %i" % (key + ':', value)
+    return 0
+
+
+if __name__ == '__main__':
+    main()
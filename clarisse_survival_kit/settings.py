@@ -3,6 +3,7 @@ import collections
 
 # File handling. If multiple extensions exist in the folder the most left extension will be picked.
 IMAGE_FORMATS = ('tx', 'tex', 'exr', 'sxr', 'hdr', 'tif', 'tiff', 'tga', 'png', 'jpg', 'jpeg')
+MESH_FORMATS = ('obj', 'abc', 'lwo')
 
 
 FILENAME_MATCH_TEMPLATE = {'diffuse': r'(?:_Diffuse|_Albedo|_baseColor|_color|albedo|^diffuse$|^color$)',
@@ -24,9 +25,52 @@ FILENAME_MATCH_TEMPLATE = {'diffuse': r'(?:_Diffuse|_Albedo|_baseColor|_color|al
                            'preview': r'(?:_preview|^preview$|_render)'}
 
 LOD_MATCH_TEMPLATE = r'_LOD(?P<lod>[0-9]*)'
+UDIM_MATCH_TEMPLATE = r'((?<!\d)\d{4}(?!\d))'
+RESOLUTION_MATCH_TEMPLATE = r'(?<![0-9a-z])(?P<resolution>[0-9]+K)(?![a-z])'
 
 PROVIDERS = ['megascans', 'generic']
 
+# Scan index. Caches asset directory listings and Megascans JSON summaries in the .csk user folder.
+SCAN_INDEX_ENABLED = True
+SCAN_INDEX_FILENAME = 'scan_index.sqlite'
+# Library imports scan asset folders on a thread pool while the scene is built on the main thread.
+# The queue size limits how many folders are scanned ahead of the scene building.
+LIBRARY_SCAN_THREADS = 8
+LIBRARY_SCAN_QUEUE_SIZE = 32
+
+# Texture conversion. Converter processes run in parallel and share the thread budget.
+# A thread budget of 0 uses all threads of the machine.
+CONVERSION_MAX_PROCESSES = 4
+CONVERSION_THREAD_BUDGET = 0
+MAX_CONVERTER_THREADS = 32
+# Conversions are recorded in a manifest in the target folder. Files whose source, converter flags and output
+# didn't change since they were recorded are not converted again.
+CONVERSION_MANIFEST_ENABLED = True
+CONVERSION_MANIFEST_FILENAME = '.csk_conversion.json'
+# Attribute changes of the builders are sent as bulk SetValues and SetTexture commands.
+# Disable to send every change as a separate command.
+COMMAND_BUFFER_ENABLED = True
+# UI events are dispatched at most once per interval in seconds unless the next command depends on them.
+# An interval of 0 dispatches events on every request.
+EVENT_PUMP_INTERVAL = 0.1
+# Seconds to wait for an item or attribute to become available before giving up.
+EVENT_PUMP_TIMEOUT = 5
+# Stage profiling of the importers and builders. When enabled a Chrome trace and a summary per stage are written
+# to the .csk folder after each operation. Enable it in user_settings.py with PROFILING_ENABLED = True.
+PROFILING_ENABLED = False
+PROFILING_TRACE_FILENAME = 'csk_trace.json'
+PROFILING_SUMMARY_FILENAME = 'csk_profile_summary.json'
+# Number of the slowest stages that are written to the log.
+PROFILING_SUMMARY_LOG_COUNT = 10
+# Surfaces store which node has which texture role in a string attribute of their material, so tools don't have
+# to scan every node of the context. Surfaces without it, like those of older scenes, are still scanned.
+SURFACE_MANIFEST_ENABLED = True
+SURFACE_MANIFEST_ATTRIBUTE = 'csk_manifest'
+# During library imports the first surface with a set of maps and settings is kept as a template. Later surfaces
+# with the same signature are duplicated from it and only get their own names, filenames and scan area.
+SURFACE_TEMPLATES_ENABLED = True
+SURFACE_TEMPLATES_CTX = 'csk_templates'
+
 IMAGE_RESOLUTIONS = ['8K', '4K', '2K', '1K']
 
 SRGB_COLOR_SPACES = ['sRGB', 'Utility - sRGB - Texture']
@@ -170,6 +214,10 @@ TEXTURE_SETTINGS['emissive'] = {'single_channel': False, 'suffix': EMISSIVE_SUFF
                                 'connection': 'emission_color'}
 TEXTURE_SETTINGS['preview'] = {'single_channel': False, 'suffix': PREVIEW_SUFFIX}
 
+# Order in which texture roles are tried when a filename matches more than one FILENAME_MATCH_TEMPLATE pattern.
+# Roles that are not listed here are tried last in alphabetical order.
+TEXTURE_MATCH_PRIORITY = list(TEXTURE_SETTINGS.keys())
+
 # Other Suffixes & Variables
 BLUR_SUFFIX = "_blur"
 DEFAULT_BLUR_QUALITY = 4
@@ -181,6 +229,7 @@ SHADING_LAYER_SUFFIX = "_shading_layer"
 GROUP_SUFFIX = "_grp"
 MEGASCANS_LIBRARY_CATEGORY_PREFIX = "megascans_"
 LIBRARY_MIXER_CTX = "mixer"
+MEGASCANS_LIBRARY_CATEGORIES = ["3d", "3dplant", "surface", "surfaces", "atlas", "atlases"]
 IMPORTER_PATH_DELIMITER = "|"
 DECIMATE_SUFFIX = "_decimate"
 POINTCLOUD_SUFFIX = "_pc"
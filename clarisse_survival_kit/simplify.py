@@ -9,12 +9,14 @@ def toggle_surface_complexity_gui():
         selection_copy.append(selection)
     if check_selection(selection_copy, is_kindof=["MaterialPhysicalStandard", "MaterialPhysicalBlend",
                                                   "OfContext"]):
+        ctxs = []
         for selected in selection_copy:
             if selected.is_context():
                 ctx = selected
             else:
                 ctx = selected.get_context()
-            toggle_surface_complexity(ctx, ix=ix)
+            ctxs.append(ctx)
+        toggle_surfaces_complexity(ctxs, ix=ix)
         ix.end_command_batch()
         for selection in selection_copy:
             ix.selection.add(selection)
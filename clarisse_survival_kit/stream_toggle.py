@@ -1,5 +1,6 @@
 from clarisse_survival_kit.app import *
 from clarisse_survival_kit.utility import check_selection
+from clarisse_survival_kit.connection_index import get_connection_index
 
 
 def toggle_tx_stream_gui():
@@ -9,17 +10,21 @@ def toggle_tx_stream_gui():
     new_selection = []
     if check_selection(selection_copy, is_kindof=["TextureMapFile", "TextureStreamedMapFile", "OfContext"]):
         ix.begin_command_batch("Toggle texture stream")
-        for selected in selection_copy:
-            if selected.is_context():
-                texture_maps = get_items(selected, kind=["TextureMapFile", "TextureStreamedMapFile"], ix=ix)
-                for texture_map in texture_maps:
-                    tx = toggle_map_file_stream(tx=texture_map, ix=ix)
+        with get_connection_index(ix) as connection_index:
+            # The outputs of all selected textures are found in one sweep.
+            connection_index.add(selection_copy)
+            for selected in selection_copy:
+                if selected.is_context():
+                    texture_maps = get_items(selected, kind=["TextureMapFile", "TextureStreamedMapFile"], ix=ix)
+                    connection_index.add(texture_maps)
+                    for texture_map in texture_maps:
+                        tx = toggle_map_file_stream(tx=texture_map, ix=ix)
+                        if tx:
+                            new_selection.append(tx)
+                else:
+                    tx = toggle_map_file_stream(tx=selected, ix=ix)
                     if tx:
                         new_selection.append(tx)
-            else:
-                tx = toggle_map_file_stream(tx=selected, ix=ix)
-                if tx:
-                    new_selection.append(tx)
         ix.end_command_batch()
         ix.selection.deselect_all()
         ix.application.check_for_events()
@@ -1,7 +1,49 @@
 from clarisse_survival_kit.utility import *
+from clarisse_survival_kit.command_buffer import get_command_buffer, flush_commands
+from clarisse_survival_kit.connection_index import get_connection_index
+from clarisse_survival_kit.event_pump import pump_events
+from clarisse_survival_kit.profiling import profiled
+from clarisse_survival_kit.surface_manifest import read_surface_manifest, write_surface_manifest
+from clarisse_survival_kit.surface_template import get_active_surface_templates
 
 PROJECTIONS = ['planar', 'cylindrical', 'spherical', 'cubic', 'camera', 'parametric', 'uv']
 
+# A step of an update plan: the Surface method to call and its keyword arguments.
+SurfaceEdit = collections.namedtuple('SurfaceEdit', ['action', 'kwargs'])
+
+
+def _get_color_space(color_space, single_channel=False):
+    """Returns the color space a texture ends up with, None for raw data."""
+    if not color_space or single_channel:
+        return None
+    return color_space
+
+
+def _is_close(value, other_value):
+    if value is None or other_value is None:
+        return value is other_value
+    if isinstance(value, (list, tuple)):
+        return len(value) == len(other_value) and all(_is_close(v, o) for v, o in zip(value, other_value))
+    return abs(float(value) - float(other_value)) < 1e-6
+
+
+def get_target_state(name, textures, streamed_maps=(), color_spaces=None, ior=DEFAULT_IOR,
+                     metallic_ior=DEFAULT_METALLIC_IOR, height=DEFAULT_DISPLACEMENT_HEIGHT,
+                     displacement_offset=DEFAULT_DISPLACEMENT_OFFSET, clip_opacity=True, projection='triplanar',
+                     uv_scale=DEFAULT_UV_SCALE, object_space=0, triplanar_blend=0.5, available_maps=None):
+    """
+    Returns the state a surface should have after an update, see Surface.plan_update.
+    color_spaces are the names resolved by get_color_spaces, roles without one use raw data. available_maps are
+    the roles the asset has in any resolution, textures of those roles are kept if textures misses them. By default
+    every role textures misses is removed.
+    """
+    return {'name': name, 'textures': textures, 'streamed_maps': list(streamed_maps),
+            'available_maps': list(available_maps) if available_maps is not None else None,
+            'color_spaces': color_spaces or {}, 'ior': ior,
+            'metallic_ior': metallic_ior, 'height': height, 'displacement_offset': displacement_offset,
+            'clip_opacity': clip_opacity, 'projection': projection, 'uv_scale': uv_scale,
+            'object_space': object_space, 'triplanar_blend': triplanar_blend}
+
 
 class Surface:
     def __init__(self, ix, **kwargs):
@@ -23,21 +65,24 @@ class Surface:
         self.streamed_maps = []
         self.displacement_offset = kwargs.get('displacement_offset', 0.5)
 
+    @profiled
     def create_mtl(self, name, target_ctx):
         """Creates a new PhysicalStandard material and context."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating material...")
         self.name = name
         ctx = self.ix.cmds.CreateContext(name, "Global", str(target_ctx))
         self.ctx = ctx
         mtl = self.ix.cmds.CreateObject(name + MATERIAL_SUFFIX, "MaterialPhysicalStandard", "Global", str(ctx))
         if mtl.attribute_exists('sidedness') and self.double_sided:
-            self.ix.cmds.SetValues([str(mtl) + ".sidedness"], ["1"])
-        self.ix.cmds.SetValue(str(mtl) + ".specular_1_index_of_refraction", [str(self.ior)])
-        self.ix.cmds.SetValue(str(mtl) + ".specular_1_strength", [str(self.specular_strength)])
+            cmds.set_value(str(mtl) + ".sidedness", "1")
+        cmds.set_value(str(mtl) + ".specular_1_index_of_refraction", self.ior)
+        cmds.set_value(str(mtl) + ".specular_1_strength", self.specular_strength)
         self.mtl = mtl
         logging.debug("...done creating material")
         return mtl
 
+    @profiled
     def create_textures(self, textures, color_spaces, streamed_maps=(), clip_opacity=True):
         """Creates all textures from a index:filename dict."""
         logging.debug("Creating textures...")
@@ -45,37 +90,138 @@ class Surface:
             if index in textures:
                 if index == 'opacity' and clip_opacity:
                     texture_settings['connection'] = None
-                logging.debug("Using these settings for texture: " + str(texture_settings))
+                logging.debug("Using these settings for texture: %s", texture_settings)
                 color_space = color_spaces.get(index)
                 filename = textures[index]
                 tx = self.create_tx(index, filename, color_space=color_space,
                                     streamed=index in streamed_maps, **texture_settings)
+        self.write_manifest()
         logging.debug("...done creating textures")
 
+    @profiled
+    def build(self, name, target_ctx, textures, color_spaces, streamed_maps=(), clip_opacity=True):
+        """
+        Creates the material and textures like create_mtl and create_textures. During a batch with surface templates
+        a surface is duplicated from the template of its signature, the first one of a signature becomes the template.
+        """
+        surface_templates = get_active_surface_templates(self.ix)
+        if surface_templates is None:
+            mtl = self.create_mtl(name, target_ctx)
+            self.create_textures(textures, color_spaces, streamed_maps=streamed_maps, clip_opacity=clip_opacity)
+            return mtl
+        signature = self.get_template_signature(textures, color_spaces, streamed_maps, clip_opacity)
+        template = surface_templates.get(signature)
+        if template:
+            return self.clone_template(template, name, target_ctx, textures, color_spaces)
+        mtl = self.create_mtl(name, target_ctx)
+        self.create_textures(textures, color_spaces, streamed_maps=streamed_maps, clip_opacity=clip_opacity)
+        surface_templates.record(signature, self)
+        return mtl
+
+    def get_template_signature(self, textures, color_spaces, streamed_maps=(), clip_opacity=True):
+        """
+        Returns what decides the network of a surface: the texture roles with their stream mode and color space and
+        every setting clone_template doesn't set. Surfaces with the same signature share a template.
+        """
+        roles = []
+        for index in sorted(textures):
+            color_space = color_spaces.get(index)
+            if isinstance(color_space, list):
+                color_space = tuple(color_space)
+            roles.append((index, index in streamed_maps, color_space))
+        return (tuple(roles), bool(clip_opacity), self.projection, self.object_space, self.triplanar_blend,
+                self.tile, self.double_sided, self.ior, self.metallic_ior, self.specular_strength)
+
+    @profiled
+    def clone_template(self, template, name, target_ctx, textures, color_spaces):
+        """
+        Duplicates the template into target_ctx and sets what differs between surfaces with the same signature:
+        the names, filenames, scan area and displacement height.
+        """
+        cmds = get_command_buffer(self.ix)
+        logging.debug("Cloning surface template %s...", template.ctx)
+        cmds.barrier()
+        ctx = self.ix.cmds.Instantiate([str(template.ctx)])[0]
+        self.ix.cmds.MoveItemsTo([str(ctx)], str(target_ctx))
+        self.ix.cmds.RenameItem(str(ctx), name)
+        ctx_path = str(ctx)
+        self.ctx = ctx
+        self.mtl = self.ix.get_item(ctx_path + '/' + template.mtl)
+        self.textures = dict((index, self.ix.get_item(ctx_path + '/' + relative_path))
+                             for index, relative_path in template.textures.iteritems())
+        self.streamed_maps = list(template.streamed_maps)
+        for item in [self.mtl] + self.textures.values():
+            item_name = item.get_contextual_name()
+            if item_name.startswith(template.name):
+                self.ix.cmds.RenameItem(str(item), name + item_name[len(template.name):])
+        self.name = name
+        template.clones += 1
+        map_files = []
+        for index, filename in textures.iteritems():
+            tx = self.textures.get(index)
+            if not tx:
+                continue
+            tx_name = str(tx)
+            if index in self.streamed_maps:
+                udim_file = get_texture_classifier().to_udim_filename(os.path.split(filename)[-1])
+                filename = os.path.join(os.path.split(filename)[0], udim_file)
+            cmds.set_value(tx_name + ".filename", filename)
+            if index == 'preview':
+                continue
+            if self.projection != 'uv':
+                cmds.set_value(tx_name + ".uv_scale",
+                               [self.uv_scale[0], (self.uv_scale[0] + self.uv_scale[1]) / 2, self.uv_scale[1]])
+            map_files.append((index, tx_name))
+        # The color space is detected when the files are loaded, all of them are loaded with one dispatch.
+        pump_events(self.ix, 'clone_template', required=True)
+        for index, tx_name in map_files:
+            color_space = color_spaces.get(index)
+            if color_space and not TEXTURE_SETTINGS[index].get('single_channel', False):
+                cmds.set_value(tx_name + ".file_color_space", color_space)
+        disp = self.get('displacement_map')
+        if disp:
+            cmds.set_value(str(disp) + ".bound", [self.height] * 3)
+            cmds.set_value(str(self.get('displacement_offset')) + ".input2", self.displacement_offset)
+            cmds.set_value(str(self.get('displacement_height_scale')) + ".input2", self.height)
+        self.write_manifest()
+        logging.debug("...done cloning surface template")
+        return self.mtl
+
+    @profiled
     def update_textures(self, textures, color_spaces, streamed_maps=()):
         logging.debug("Updating textures...")
         for index, texture_settings in TEXTURE_SETTINGS.items():
             if index in textures:
-                logging.debug("Using these settings for texture: " + str(texture_settings))
+                logging.debug("Using these settings for texture: %s", texture_settings)
                 color_space = color_spaces.get(index)
                 filename = textures[index]
                 tx = self.update_tx(index, filename, color_space=color_space,
                                     streamed=index in streamed_maps, **texture_settings)
+        self.write_manifest()
         logging.debug("...done updating textures")
 
+    @profiled
     def load(self, ctx):
         """Loads and setups the material from an existing context."""
         logging.debug("Loading surface...")
         self.ctx = ctx
         self.name = os.path.basename(str(ctx))
+        manifest = read_surface_manifest(ctx, self.ix)
+        if manifest:
+            return self.load_manifest(manifest)
+        # Surfaces of older scenes don't have a manifest, their nodes are found by name.
         textures = {}
 
         ctx_members = get_items(ctx, ix=self.ix)
 
         mtl = None
         triplanar = False
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
         for ctx_member in ctx_members:
-            logging.debug("Checking ctx member" + str(ctx_member))
+            # Every name lookup is a call into Clarisse.
+            member_name = ctx_member.get_contextual_name()
+            if debug:
+                logging.debug("Checking ctx member: %s", ctx_member)
             if (ctx_member.is_kindof("TextureMapFile") or ctx_member.is_kindof("TextureStreamedMapFile")) \
                     and ctx_member.is_local():
                 self.projection = PROJECTIONS[ctx_member.attrs.projection[0]]
@@ -84,26 +230,31 @@ class Surface:
             if ctx_member.is_kindof("MaterialPhysicalStandard"):
                 if ctx_member.is_local() or not mtl:
                     mtl = ctx_member
-                    logging.debug("Material found:" + str(mtl))
+                    if debug:
+                        logging.debug("Material found: %s", mtl)
             for key, suffix in SUFFIXES.iteritems():
-                if ctx_member.get_contextual_name().endswith(suffix):
+                if member_name.endswith(suffix):
                     textures[key] = ctx_member
-                    logging.debug("Texture found with index:" + str(key))
+                    if debug:
+                        logging.debug("Texture found with index: %s", key)
             if ctx_member.is_kindof("Displacement"):
                 self.height = ctx_member.attrs.front_value[0]
-                logging.debug("Displacement found:" + str(ctx_member))
-            if ctx_member.get_contextual_name().endswith(TRIPLANAR_SUFFIX):
+                if debug:
+                    logging.debug("Displacement found: %s", ctx_member)
+            if member_name.endswith(TRIPLANAR_SUFFIX):
                 triplanar = True
-                logging.debug("Triplanar tx found:" + str(ctx_member))
+                if debug:
+                    logging.debug("Triplanar tx found: %s", ctx_member)
                 for key, suffix in SUFFIXES.iteritems():
-                    if ctx_member.get_contextual_name().endswith(suffix + TRIPLANAR_SUFFIX):
+                    if member_name.endswith(suffix + TRIPLANAR_SUFFIX):
                         textures[key + '_triplanar'] = ctx_member
-            if ctx_member.get_contextual_name().endswith(SINGLE_CHANNEL_SUFFIX):
+            if member_name.endswith(SINGLE_CHANNEL_SUFFIX):
                 for key, suffix in SUFFIXES.iteritems():
-                    if ctx_member.get_contextual_name().endswith(suffix + SINGLE_CHANNEL_SUFFIX):
+                    if member_name.endswith(suffix + SINGLE_CHANNEL_SUFFIX):
                         textures[key + '_reorder'] = ctx_member
                         self.streamed_maps.append(key)
-                        logging.debug("Reorder node for stream maps found:" + str(ctx_member))
+                        if debug:
+                            logging.debug("Reorder node for stream maps found: %s", ctx_member)
         if not mtl or not textures:
             self.ix.log_warning("No valid material found.")
             logging.debug("No material or textures found.")
@@ -111,89 +262,225 @@ class Surface:
         if triplanar:
             self.projection = 'triplanar'
         self.textures = textures
-        logging.debug("Textures found:" + str(textures))
+        logging.debug("Textures found: %s", textures)
         self.mtl = mtl
         return mtl
 
+    def load_manifest(self, manifest):
+        """Loads the material from the manifest of its context. Only the nodes of the manifest are read."""
+        textures = manifest.textures
+        if not textures:
+            self.ix.log_warning("No valid material found.")
+            logging.debug("No textures found in manifest.")
+            return None
+        for index in TEXTURE_SETTINGS:
+            tx = textures.get(index)
+            if tx and tx.is_local():
+                self.projection = PROJECTIONS[tx.attrs.projection[0]]
+                self.object_space = tx.attrs.object_space[0]
+                self.uv_scale = [tx.attrs.uv_scale[0], tx.attrs.uv_scale[2]]
+                break
+        disp = textures.get('displacement_map')
+        if disp:
+            self.height = disp.attrs.front_value[0]
+        if any(index.endswith('_triplanar') for index in textures):
+            self.projection = 'triplanar'
+        self.streamed_maps = list(manifest.streamed_maps)
+        self.textures = dict(textures)
+        logging.debug("Textures found in manifest: %s", textures)
+        self.mtl = manifest.mtl
+        return self.mtl
+
+    def get_state(self):
+        """
+        Returns a snapshot of the loaded surface with the same keys as get_target_state.
+        Textures are the map files by role with their filename, color space and whether they're streamed.
+        Settings that can't be read, like those of nodes that don't exist, are None.
+        """
+        get_command_buffer(self.ix).barrier()
+        textures = {}
+        for index, tx in self.textures.iteritems():
+            if not (tx.is_kindof("TextureMapFile") or tx.is_kindof("TextureStreamedMapFile")):
+                continue
+            textures[index] = {'filename': tx.attrs.filename.attr.get_string(),
+                               'streamed': tx.is_kindof("TextureStreamedMapFile"),
+                               'color_space': None if tx.attrs.use_raw_data[0] else
+                               tx.attrs.file_color_space.attr.get_string()}
+        ior = None
+        if self.mtl.get_attribute('specular_1_index_of_refraction').is_editable():
+            ior = self.mtl.attrs.specular_1_index_of_refraction[0]
+        disp = self.get('displacement_map')
+        disp_offset_tx = self.get('displacement_offset')
+        return {'name': self.name, 'textures': textures, 'ior': ior,
+                'height': disp.attrs.bound[0] if disp else None,
+                'displacement_offset': disp_offset_tx.attrs.input2[0] if disp_offset_tx else None,
+                'opacity_connected': bool(self.ix.get_item(str(self.mtl) + '.opacity').get_texture()),
+                'projection': self.projection, 'uv_scale': list(self.uv_scale) if self.uv_scale else None,
+                'object_space': self.object_space}
+
+    def plan_update(self, target, state=None):
+        """
+        Returns the edits that turn the loaded surface into the target state of get_target_state as a list of
+        SurfaceEdit. Textures are only destroyed, created or updated if their role, file, color space or stream
+        mode changed and every other step is left out if its settings already match.
+        """
+        if state is None:
+            state = self.get_state()
+        textures = target['textures']
+        streamed_maps = target['streamed_maps']
+        color_spaces = target['color_spaces']
+        available_maps = target.get('available_maps')
+        destroyed = [index for index in state['textures'] if index not in textures and
+                     (available_maps is None or index not in available_maps)]
+        created = dict((index, filename) for index, filename in textures.iteritems() if index not in self.textures)
+        kept = [index for index in state['textures'] if index in textures]
+        updated = {}
+        switched = []
+        for index in kept:
+            current = state['textures'][index]
+            single_channel = TEXTURE_SETTINGS.get(index, {}).get('single_channel', False)
+            if current['streamed'] != (index in streamed_maps):
+                switched.append(index)
+            elif current['filename'] == textures[index] and \
+                    current['color_space'] == _get_color_space(color_spaces.get(index), single_channel):
+                continue
+            updated[index] = textures[index]
+        plan = [SurfaceEdit('destroy_tx', {'index': index}) for index in destroyed]
+        if created:
+            plan.append(SurfaceEdit('create_textures', {'textures': created, 'color_spaces': color_spaces,
+                                                        'streamed_maps': streamed_maps,
+                                                        'clip_opacity': target['clip_opacity']}))
+        # Fresnel textures change whether the IOR can be edited.
+        fresnel_changed = any(index in ('ior', 'f0', 'metallic') for index in destroyed + created.keys() + switched)
+        if fresnel_changed or (state['ior'] is not None and not _is_close(state['ior'], target['ior'])):
+            plan.append(SurfaceEdit('update_ior', {'ior': target['ior'], 'metallic_ior': target['metallic_ior']}))
+        if updated:
+            plan.append(SurfaceEdit('update_textures', {'textures': updated, 'color_spaces': color_spaces,
+                                                        'streamed_maps': streamed_maps}))
+        if state['name'] != target['name']:
+            plan.append(SurfaceEdit('update_names', {'name': target['name']}))
+        if not _is_close(state['height'], target['height']) or \
+                not _is_close(state['displacement_offset'], target['displacement_offset']):
+            plan.append(SurfaceEdit('update_displacement', {'height': target['height'],
+                                                            'displacement_offset': target['displacement_offset']}))
+        if 'opacity' in kept and state['opacity_connected'] == target['clip_opacity']:
+            plan.append(SurfaceEdit('update_opacity', {'clip_opacity': target['clip_opacity'],
+                                                       'found_textures': textures, 'update_textures': kept}))
+        if state['projection'] != target['projection'] or state['object_space'] != target['object_space'] or \
+                not _is_close(state['uv_scale'], list(target['uv_scale'])):
+            plan.append(SurfaceEdit('update_projection', {'projection': target['projection'],
+                                                          'uv_scale': target['uv_scale'],
+                                                          'triplanar_blend': target['triplanar_blend'],
+                                                          'object_space': target['object_space'], 'tile': True}))
+        if destroyed or created or switched:
+            plan.append(SurfaceEdit('clean', {}))
+        return plan
+
+    @profiled
+    def apply_plan(self, plan):
+        """Applies the edits of plan_update in order."""
+        for edit in plan:
+            logging.debug("Applying surface edit %s: %s", edit.action, edit.kwargs)
+            getattr(self, edit.action)(**edit.kwargs)
+
+    def write_manifest(self):
+        """Stores the nodes of the surface on its material so load doesn't have to search the context."""
+        write_surface_manifest(self.ix, self.ctx, self.mtl, self.textures, self.streamed_maps)
+
+    @profiled
     def update_projection(self, projection="triplanar", uv_scale=DEFAULT_UV_SCALE,
                           triplanar_blend=0.5, object_space=0, tile=True):
         """Updates the projections in each TextureMapFile."""
+        cmds = get_command_buffer(self.ix)
         print "PROJECTION SET TO: " + projection
-        logging.debug("Projection set to:" + projection)
-        for key, tx in self.textures.iteritems():
-            if (tx.is_kindof("TextureMapFile") or tx.is_kindof("TextureStreamedMapFile")) and tx.is_local():
-                if key == "preview":
-                    continue
-                if projection == "uv":
-                    self.ix.cmds.SetValue(str(tx) + ".projection", [str(PROJECTIONS.index('uv'))])
-                else:
-                    attrs = self.ix.api.CoreStringArray(6)
-                    attrs[0] = str(tx) + ".projection"
-                    attrs[1] = str(tx) + ".axis"
-                    attrs[2] = str(tx) + ".object_space"
-                    attrs[3] = str(tx) + ".uv_scale[0]"
-                    attrs[4] = str(tx) + ".uv_scale[1]"
-                    attrs[5] = str(tx) + ".uv_scale[2]"
-                    values = self.ix.api.CoreStringArray(6)
-                    values[0] = str(
-                        PROJECTIONS.index('cubic') if projection == "triplanar" else PROJECTIONS.index(projection))
-                    values[1] = str(1)
-                    values[2] = str(object_space)
-                    values[3] = str(uv_scale[0])
-                    values[4] = str((uv_scale[0] + uv_scale[1]) / 2)
-                    values[5] = str(uv_scale[1])
-                    self.ix.cmds.SetValues(attrs, values)
-                if not tile:
-                    repeat_mode = 0 if tx.is_kindof("TextureStreamedMapFile") else 2
-                    attrs = self.ix.api.CoreStringArray(2)
-                    attrs[0] = str(tx) + ".u_repeat_mode"
-                    attrs[1] = str(tx) + ".v_repeat_mode"
-                    values = self.ix.api.CoreStringArray(2)
-                    values[0] = str(repeat_mode)
-                    values[1] = str(repeat_mode)
-                    self.ix.cmds.SetValues(attrs, values)
-            if (tx.is_kindof("TextureMapFile") or tx.is_kindof("TextureStreamedMapFile")) and \
-                    self.projection != "triplanar" and projection == "triplanar":
-                tx_to_triplanar(tx, blend=triplanar_blend, object_space=object_space, ix=self.ix)
-            if tx.is_kindof("TextureTriplanar") and projection != "triplanar":
-                input_tx = self.ix.get_item(str(tx) + ".right").get_texture()
-                replace_connections(input_tx, tx, ignored_attributes=['runtime_materials', ], ix=self.ix)
-                self.ix.cmds.DeleteItems([str(tx)])
+        logging.debug("Projection set to: %s", projection)
+        # The textures of a surface share the material, which is only scanned once for connections.
+        triplanar_txs = collections.OrderedDict()
+        input_txs = collections.OrderedDict()
+        with get_connection_index(self.ix) as connection_index:
+            if self.projection != "triplanar" and projection == "triplanar":
+                connection_index.add([tx for tx in self.textures.values() if
+                                      tx.is_kindof("TextureMapFile") or tx.is_kindof("TextureStreamedMapFile")])
+            elif projection != "triplanar":
+                connection_index.add([tx for tx in self.textures.values() if tx.is_kindof("TextureTriplanar")])
+            for key, tx in self.textures.iteritems():
+                if (tx.is_kindof("TextureMapFile") or tx.is_kindof("TextureStreamedMapFile")) and tx.is_local():
+                    if key == "preview":
+                        continue
+                    if projection == "uv":
+                        cmds.set_value(str(tx) + ".projection", PROJECTIONS.index('uv'))
+                    else:
+                        cmds.set_value(str(tx) + ".projection",
+                                       PROJECTIONS.index('cubic') if projection == "triplanar" else
+                                       PROJECTIONS.index(projection))
+                        cmds.set_value(str(tx) + ".axis", 1)
+                        cmds.set_value(str(tx) + ".object_space", object_space)
+                        cmds.set_value(str(tx) + ".uv_scale",
+                                       [uv_scale[0], (uv_scale[0] + uv_scale[1]) / 2, uv_scale[1]])
+                    if not tile:
+                        repeat_mode = 0 if tx.is_kindof("TextureStreamedMapFile") else 2
+                        cmds.set_value(str(tx) + ".u_repeat_mode", repeat_mode)
+                        cmds.set_value(str(tx) + ".v_repeat_mode", repeat_mode)
+                if (tx.is_kindof("TextureMapFile") or tx.is_kindof("TextureStreamedMapFile")) and \
+                        self.projection != "triplanar" and projection == "triplanar":
+                    triplanar_txs[key + '_triplanar'] = tx
+                if tx.is_kindof("TextureTriplanar") and projection != "triplanar":
+                    cmds.barrier()
+                    input_txs[tx] = self.ix.get_item(str(tx) + ".right").get_texture()
+            # The connections of all textures are swapped at once.
+            if triplanar_txs:
+                new_txs = txs_to_triplanar(triplanar_txs.values(), blend=triplanar_blend, object_space=object_space,
+                                           ix=self.ix)
+                self.textures.update(zip(triplanar_txs.keys(), new_txs))
+            if input_txs:
+                for key, tx in self.textures.items():
+                    if tx in input_txs:
+                        del self.textures[key]
+                replace_connections_bulk(input_txs, ignored_attributes=['runtime_materials', ], ix=self.ix)
+                flush_commands(self.ix)
+                tx_paths = [str(tx) for tx in input_txs]
+                self.ix.cmds.DeleteItems(tx_paths)
+                connection_index.forget(tx_paths)
         self.projection = projection
         self.object_space = object_space
         self.uv_scale = uv_scale
         self.triplanar_blend = triplanar_blend
+        self.write_manifest()
         logging.debug("Done changing projections")
 
     def pre_create_tx(self, index):
         """"Gets called before creating textures. Returning False will block the textures from being created."""
+        cmds = get_command_buffer(self.ix)
         if index == 'gloss':
             if self.get('roughness'):
                 return False
         if index == 'bump':
             if self.get('normal'):
                 return False
+        if index in ('ior', 'f0', 'metallic'):
+            # The fresnel mode decides which attributes are editable.
+            cmds.barrier()
         if index == 'ior':
             if self.get("f0") or self.get("metallic"):
                 return False
             if not self.mtl.get_attribute('specular_1_index_of_refraction').is_editable():
-                self.ix.cmds.SetValue(str(self.mtl) + ".specular_1_fresnel_mode", [str(0)])
+                cmds.set_value(str(self.mtl) + ".specular_1_fresnel_mode", 0)
         elif index == "f0":
             if self.get("ior") or self.get("metallic"):
                 return False
             if not self.mtl.get_attribute('specular_1_fresnel_reflectivity').is_editable():
-                self.ix.cmds.SetValue(str(self.mtl) + ".specular_1_fresnel_mode", [str(1)])
+                cmds.set_value(str(self.mtl) + ".specular_1_fresnel_mode", 1)
         elif index == "metallic":
             if self.get("ior") or self.get("f0"):
                 return False
             if not self.mtl.get_attribute('specular_1_index_of_refraction').is_editable():
-                self.ix.cmds.SetValue(str(self.mtl) + ".specular_1_fresnel_mode", [str(0)])
+                cmds.set_value(str(self.mtl) + ".specular_1_fresnel_mode", 0)
         if index == "emissive":
-            self.ix.cmds.SetValue(str(self.mtl) + ".emission_strength", [str(1)])
-            self.ix.application.check_for_events()
+            cmds.set_value(str(self.mtl) + ".emission_strength", 1)
+            pump_events(self.ix, 'pre_create_tx')
         if index == 'translucency':
-            self.ix.cmds.SetValue(str(self.mtl) + ".diffuse_back_strength", [str(1)])
-            self.ix.application.check_for_events()
+            cmds.set_value(str(self.mtl) + ".diffuse_back_strength", 1)
+            pump_events(self.ix, 'pre_create_tx')
         return True
 
     def create_sub_ctx(self, index):
@@ -220,106 +507,93 @@ class Surface:
                     return self.ix.get_item(ctx_path)
         return None
 
+    @profiled
     def create_tx(self, index, filename, suffix="_tx", color_space=None, streamed=False, single_channel=False,
                   invert=False,
                   connection=None):
         """Creates a new map or streaming file and if projection is set to triplanar it will be mapped that way."""
+        cmds = get_command_buffer(self.ix)
         if not self.pre_create_tx(index):
             return None
         triplanar_tx = None
         reorder_tx = None
-        logging.debug("create_tx called with arguments:" +
-                      "\n".join(
-                          [index, filename, suffix, str(color_space), str(streamed), str(single_channel),
-                           str(connection)]))
+        logging.debug("create_tx called with arguments:\n%s\n%s\n%s\n%s\n%s\n%s\n%s", index, filename, suffix,
+                      color_space, streamed, single_channel, connection)
         target_ctx = self.create_sub_ctx(index)
         if streamed:
             logging.debug("Setting up TextureStreamedMapFile...")
             tx = self.ix.cmds.CreateObject(self.name + suffix, "TextureStreamedMapFile", "Global", str(target_ctx))
-            udim_file = re.sub(r"((?<!\d)\d{4}(?!\d))", "<UDIM>", os.path.split(filename)[-1], count=1)
+            tx_name = str(tx)
+            udim_file = get_texture_classifier().to_udim_filename(os.path.split(filename)[-1])
             filename = os.path.join(os.path.split(filename)[0], udim_file)
             self.streamed_maps.append(index)
             if single_channel:
                 logging.debug("Creating reorder node...")
                 reorder_tx = self.ix.cmds.CreateObject(self.name + suffix + SINGLE_CHANNEL_SUFFIX, "TextureReorder",
                                                        "Global", str(target_ctx))
-                self.ix.cmds.SetValue(str(reorder_tx) + ".channel_order[0]", ["rrr1"])
-                self.ix.cmds.SetTexture([str(reorder_tx) + ".input"], str(tx))
+                cmds.set_value(str(reorder_tx) + ".channel_order[0]", "rrr1")
+                cmds.set_texture(str(reorder_tx) + ".input", tx_name)
                 self.textures[index + '_reorder'] = reorder_tx
         else:
             logging.debug("Setting up TextureMapFile...")
             tx = self.ix.cmds.CreateObject(self.name + suffix, "TextureMapFile", "Global", str(target_ctx))
+            tx_name = str(tx)
             if index == 'preview':
-                logging.debug("Done creating preview tx: " + str(tx))
-                self.ix.cmds.SetValue(str(tx) + ".filename", [filename])
+                logging.debug("Done creating preview tx: %s", tx)
+                cmds.set_value(tx_name + ".filename", filename)
                 self.textures[index] = tx
                 return tx
+        input_name = str(reorder_tx) if reorder_tx else tx_name
         if self.projection != 'uv':
-            attrs = self.ix.api.CoreStringArray(6)
-            attrs[0] = str(tx) + ".projection"
-            attrs[1] = str(tx) + ".axis"
-            attrs[2] = str(tx) + ".object_space"
-            attrs[3] = str(tx) + ".uv_scale[0]"
-            attrs[4] = str(tx) + ".uv_scale[1]"
-            attrs[5] = str(tx) + ".uv_scale[2]"
-            values = self.ix.api.CoreStringArray(6)
-            values[0] = str(
-                PROJECTIONS.index('cubic') if self.projection == "triplanar" else PROJECTIONS.index(self.projection))
-            values[1] = str(1)
-            values[2] = str(self.object_space)
-            values[3] = str(self.uv_scale[0])
-            values[4] = str((self.uv_scale[0] + self.uv_scale[1]) / 2)
-            values[5] = str(self.uv_scale[1])
-            self.ix.cmds.SetValues(attrs, values)
+            cmds.set_value(tx_name + ".projection",
+                           PROJECTIONS.index('cubic') if self.projection == "triplanar" else
+                           PROJECTIONS.index(self.projection))
+            cmds.set_value(tx_name + ".axis", 1)
+            cmds.set_value(tx_name + ".object_space", self.object_space)
+            cmds.set_value(tx_name + ".uv_scale",
+                           [self.uv_scale[0], (self.uv_scale[0] + self.uv_scale[1]) / 2, self.uv_scale[1]])
         if self.projection == "triplanar":
             logging.debug("Set up triplanar...")
             triplanar_tx = self.ix.cmds.CreateObject(tx.get_contextual_name() + TRIPLANAR_SUFFIX, "TextureTriplanar",
                                                      "Global", str(target_ctx))
-            self.ix.cmds.SetTexture([str(triplanar_tx) + ".right"], str(reorder_tx if reorder_tx else tx))
-            self.ix.cmds.SetTexture([str(triplanar_tx) + ".left"], str(reorder_tx if reorder_tx else tx))
-            self.ix.cmds.SetTexture([str(triplanar_tx) + ".top"], str(reorder_tx if reorder_tx else tx))
-            self.ix.cmds.SetTexture([str(triplanar_tx) + ".bottom"], str(reorder_tx if reorder_tx else tx))
-            self.ix.cmds.SetTexture([str(triplanar_tx) + ".front"], str(reorder_tx if reorder_tx else tx))
-            self.ix.cmds.SetTexture([str(triplanar_tx) + ".back"], str(reorder_tx if reorder_tx else tx))
-            self.ix.cmds.SetValue(str(triplanar_tx) + ".blend", [str(self.triplanar_blend)])
-            self.ix.cmds.SetValue(str(triplanar_tx) + ".object_space", [str(self.object_space)])
+            triplanar_name = str(triplanar_tx)
+            cmds.set_texture(triplanar_name + ".right", input_name)
+            cmds.set_texture(triplanar_name + ".left", input_name)
+            cmds.set_texture(triplanar_name + ".top", input_name)
+            cmds.set_texture(triplanar_name + ".bottom", input_name)
+            cmds.set_texture(triplanar_name + ".front", input_name)
+            cmds.set_texture(triplanar_name + ".back", input_name)
+            cmds.set_value(triplanar_name + ".blend", self.triplanar_blend)
+            cmds.set_value(triplanar_name + ".object_space", self.object_space)
             self.textures[index + '_triplanar'] = triplanar_tx
         default_repeat_mode = 3 if streamed else 0
-        attrs = self.ix.api.CoreStringArray(5 if streamed else 6)
-        attrs[0] = str(tx) + ".color_space_auto_detect"
-        attrs[1] = str(tx) + ".filename"
-        attrs[2] = str(tx) + ".invert"
-        attrs[3] = str(tx) + ".u_repeat_mode"
-        attrs[4] = str(tx) + ".v_repeat_mode"
-        values = self.ix.api.CoreStringArray(5 if streamed else 6)
-        values[0] = '0'
-        values[1] = str(filename)
-        values[2] = str(1 if invert else 0)
-        values[3] = str((2 if not self.tile else default_repeat_mode))
-        values[4] = str((2 if not self.tile else default_repeat_mode))
+        cmds.set_value(tx_name + ".color_space_auto_detect", 0)
+        cmds.set_value(tx_name + ".filename", filename)
+        cmds.set_value(tx_name + ".invert", 1 if invert else 0)
+        cmds.set_value(tx_name + ".u_repeat_mode", 2 if not self.tile else default_repeat_mode)
+        cmds.set_value(tx_name + ".v_repeat_mode", 2 if not self.tile else default_repeat_mode)
         if not streamed:
-            attrs[5] = str(tx) + ".single_channel_file_behavior"
-            values[5] = str((1 if single_channel else 0))
-        self.ix.cmds.SetValues(attrs, values)
-        self.ix.application.check_for_events()
+            cmds.set_value(tx_name + ".single_channel_file_behavior", 1 if single_channel else 0)
+        # The color space is detected when the file is loaded.
+        pump_events(self.ix, 'create_tx', required=True)
         extension = os.path.splitext(filename)[-1].strip('.')
         if not color_space or single_channel:
-            self.ix.cmds.SetValue(str(tx) + ".use_raw_data", [str(1)])
+            cmds.set_value(tx_name + ".use_raw_data", 1)
         else:
-            self.ix.cmds.SetValue(str(tx) + ".file_color_space", [str(color_space)])
+            cmds.set_value(tx_name + ".file_color_space", color_space)
         self.textures[index] = tx
         if connection:
             if self.projection == "triplanar":
-                self.ix.cmds.SetTexture([str(self.mtl) + '.' + connection], str(triplanar_tx))
+                cmds.set_texture(str(self.mtl) + '.' + connection, triplanar_name)
             else:
-                self.ix.cmds.SetTexture([str(self.mtl) + '.' + connection], str(reorder_tx if reorder_tx else tx))
+                cmds.set_texture(str(self.mtl) + '.' + connection, input_name)
         self.post_create_tx(index, tx)
-        logging.debug("Done creating tx: " + str(tx))
+        logging.debug("Done creating tx: %s", tx)
         return tx
 
     def post_create_tx(self, index, tx):
         """Creates certain files at the end of the create_tx function call."""
-        logging.debug("Post create function called for: " + index)
+        logging.debug("Post create function called for: %s", index)
         post_tx = None
         if index == "ao":
             post_tx = self.create_ao_blend()
@@ -335,11 +609,13 @@ class Surface:
             post_tx = self.create_ior_divide_tx()
         elif index == "metallic":
             post_tx = self.create_metallic_blend_tx()
-        logging.debug("Post texture: " + str(post_tx))
+        logging.debug("Post texture: %s", post_tx)
         return post_tx
 
+    @profiled
     def create_displacement_map(self):
         """Creates a Displacement map if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating displacement map...")
         if not self.get('displacement'):
             self.ix.log_warning("No displacement texture was found.")
@@ -353,31 +629,26 @@ class Surface:
                 disp_tx = self.get('displacement')
         disp_offset_tx = self.ix.cmds.CreateObject(self.name + DISPLACEMENT_OFFSET_SUFFIX, "TextureSubtract",
                                                    "Global", str(self.get_sub_ctx('displacement')))
-        self.ix.cmds.SetTexture([str(disp_offset_tx) + ".input1"], str(disp_tx))
-        self.ix.cmds.SetValues([str(disp_offset_tx) + ".input2"], [str(self.displacement_offset)])
+        cmds.set_texture(str(disp_offset_tx) + ".input1", str(disp_tx))
+        cmds.set_value(str(disp_offset_tx) + ".input2", self.displacement_offset)
         disp_height_scale_tx = self.ix.cmds.CreateObject(self.name + DISPLACEMENT_HEIGHT_SCALE_SUFFIX,
                                                          "TextureMultiply", "Global",
                                                          str(self.get_sub_ctx('displacement')))
-        self.ix.cmds.SetTexture([str(disp_height_scale_tx) + ".input1"], str(disp_offset_tx))
-        self.ix.cmds.SetValues([str(disp_height_scale_tx) + ".input2"],
-                               [str(self.height)])
+        cmds.set_texture(str(disp_height_scale_tx) + ".input1", str(disp_offset_tx))
+        cmds.set_value(str(disp_height_scale_tx) + ".input2", self.height)
         disp = self.ix.cmds.CreateObject(self.name + DISPLACEMENT_MAP_SUFFIX, "Displacement",
                                          "Global", str(self.ctx))
-        attrs = self.ix.api.CoreStringArray(3)
-        attrs[0] = str(disp) + ".bound[0]"
-        attrs[1] = str(disp) + ".bound[1]"
-        attrs[2] = str(disp) + ".bound[2]"
-        values = self.ix.api.CoreStringArray(3)
-        values[0] = str(self.height)
-        values[1] = str(self.height)
-        values[2] = str(self.height)
-        self.ix.cmds.SetValues(attrs, values)
-        self.ix.cmds.SetTexture([str(disp) + ".front_value"], str(disp_height_scale_tx))
+        cmds.set_value(str(disp) + ".bound", [self.height] * 3)
+        cmds.set_texture(str(disp) + ".front_value", str(disp_height_scale_tx))
+        self.textures['displacement_offset'] = disp_offset_tx
+        self.textures['displacement_height_scale'] = disp_height_scale_tx
         self.textures['displacement_map'] = disp
         return disp
 
+    @profiled
     def create_normal_map(self):
         """Creates a Normal map if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating normal map...")
         if not self.get('normal'):
             self.ix.log_warning("No normal texture was found.")
@@ -388,13 +659,15 @@ class Surface:
             normal_tx = self.get('normal')
         normal_map = self.ix.cmds.CreateObject(self.name + NORMAL_MAP_SUFFIX, "TextureNormalMap",
                                                "Global", str(self.get_sub_ctx('normal')))
-        self.ix.cmds.SetTexture([str(normal_map) + ".input"], str(normal_tx))
-        self.ix.cmds.SetTexture([str(self.mtl) + ".normal_input"], str(normal_map))
+        cmds.set_texture(str(normal_map) + ".input", str(normal_tx))
+        cmds.set_texture(str(self.mtl) + ".normal_input", str(normal_map))
         self.textures['normal_map'] = normal_map
         return normal_map
 
+    @profiled
     def create_ao_blend(self):
         """Creates a AO blend texture if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating ao blend texture...")
         if not self.get('ao'):
             self.ix.log_warning("No ao texture was found.")
@@ -405,19 +678,21 @@ class Surface:
             logging.error('ERROR: AO could not be properly created.')
             return False
         diffuse_tx = self.get_out_tx('diffuse')
-        logging.debug('Hooking ao to: ' + str(diffuse_tx))
+        logging.debug('Hooking ao to: %s', diffuse_tx)
         ao_blend_tx = self.ix.cmds.CreateObject(self.name + OCCLUSION_BLEND_SUFFIX, "TextureBlend", "Global",
                                                 str(self.get_sub_ctx('diffuse')))
-        self.ix.cmds.SetTexture([str(ao_blend_tx) + ".input2"], str(diffuse_tx))
-        self.ix.cmds.SetTexture([str(ao_blend_tx) + ".input1"], str(ao_tx))
-        self.ix.cmds.SetValue(str(ao_blend_tx) + ".mode", [str(7)])
-        self.ix.cmds.SetValue(str(ao_blend_tx) + ".mix", [str(DEFAULT_AO_BLEND_STRENGTH)])
-        self.ix.cmds.SetTexture([str(self.mtl) + ".diffuse_front_color"], str(ao_blend_tx))
+        cmds.set_texture(str(ao_blend_tx) + ".input2", str(diffuse_tx))
+        cmds.set_texture(str(ao_blend_tx) + ".input1", str(ao_tx))
+        cmds.set_value(str(ao_blend_tx) + ".mode", 7)
+        cmds.set_value(str(ao_blend_tx) + ".mix", DEFAULT_AO_BLEND_STRENGTH)
+        cmds.set_texture(str(self.mtl) + ".diffuse_front_color", str(ao_blend_tx))
         self.textures["ao_blend"] = ao_blend_tx
         return ao_blend_tx
 
+    @profiled
     def create_cavity_blend(self):
         """Creates a cavity blend texture if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating cavity blend texture...")
         if not self.get('cavity'):
             self.ix.log_warning("No cavity texture was found.")
@@ -428,24 +703,26 @@ class Surface:
             logging.error('ERROR: CAVITY could not be properly created.')
             return False
         diffuse_tx = self.get_out_tx('diffuse')
-        logging.debug('Hooking cavity to: ' + str(diffuse_tx))
+        logging.debug('Hooking cavity to: %s', diffuse_tx)
         cavity_remap_tx = self.ix.cmds.CreateObject(self.name + CAVITY_REMAP_SUFFIX, "TextureRemap",
                                                     "Global", str(self.get_sub_ctx('diffuse')))
-        self.ix.cmds.SetTexture([str(cavity_remap_tx) + ".input"], str(cavity_tx))
+        cmds.set_texture(str(cavity_remap_tx) + ".input", str(cavity_tx))
         cavity_blend_tx = self.ix.cmds.CreateObject(self.name + CAVITY_BLEND_SUFFIX, "TextureBlend", "Global",
                                                     str(self.get_sub_ctx('diffuse')))
-        self.ix.cmds.SetTexture([str(cavity_blend_tx) + ".input2"], str(diffuse_tx))
-        self.ix.cmds.SetTexture([str(cavity_blend_tx) + ".input1"], str(cavity_remap_tx))
-        self.ix.cmds.SetValue(str(cavity_blend_tx) + ".mode", [str(7)])
-        self.ix.cmds.SetValue(str(cavity_blend_tx) + ".mix", [str(DEFAULT_CAVITY_BLEND_STRENGTH)])
-        self.ix.cmds.SetTexture([str(self.mtl) + ".diffuse_front_color"], str(cavity_blend_tx))
-        self.ix.cmds.SetValues([str(cavity_remap_tx) + ".pass_through"], ["1"])
+        cmds.set_texture(str(cavity_blend_tx) + ".input2", str(diffuse_tx))
+        cmds.set_texture(str(cavity_blend_tx) + ".input1", str(cavity_remap_tx))
+        cmds.set_value(str(cavity_blend_tx) + ".mode", 7)
+        cmds.set_value(str(cavity_blend_tx) + ".mix", DEFAULT_CAVITY_BLEND_STRENGTH)
+        cmds.set_texture(str(self.mtl) + ".diffuse_front_color", str(cavity_blend_tx))
+        cmds.set_value(str(cavity_remap_tx) + ".pass_through", "1")
         self.textures["cavity_remap"] = cavity_remap_tx
         self.textures["cavity_blend"] = cavity_blend_tx
         return cavity_blend_tx
 
+    @profiled
     def create_bump_map(self):
         """Creates a Bump map if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating bump map...")
         if not self.get('bump'):
             self.ix.log_warning("No bump texture was found.")
@@ -458,13 +735,15 @@ class Surface:
 
         bump_map = self.ix.cmds.CreateObject(self.name + BUMP_MAP_SUFFIX, "TextureBumpMap",
                                              "Global", str(self.get_sub_ctx('bump')))
-        self.ix.cmds.SetTexture([str(bump_map) + ".input"], str(bump_tx))
-        self.ix.cmds.SetTexture([str(self.mtl) + ".normal_input"], str(bump_map))
+        cmds.set_texture(str(bump_map) + ".input", str(bump_tx))
+        cmds.set_texture(str(self.mtl) + ".normal_input", str(bump_map))
         self.textures['bump_map'] = bump_map
         return bump_map
 
+    @profiled
     def create_ior_divide_tx(self):
         """Creates an IOR divide helper texture if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating IOR divide texture...")
         if not self.get('ior'):
             self.ix.log_warning("No ior texture was found.")
@@ -475,24 +754,27 @@ class Surface:
             logging.error('ERROR: IOR could not be properly created.')
             return False
 
-        logging.debug("Using following texture as input2 for divide: " + str(ior_tx))
+        logging.debug("Using following texture as input2 for divide: %s", ior_tx)
         ior_divide_tx = self.ix.cmds.CreateObject(self.name + IOR_DIVIDE_SUFFIX, "TextureDivide",
                                                   "Global", str(self.get_sub_ctx('ior')))
-        ior_divide_tx.attrs.input1[0] = 1.0
-        ior_divide_tx.attrs.input1[1] = 1.0
-        ior_divide_tx.attrs.input1[2] = 1.0
-        self.ix.cmds.SetTexture([str(ior_divide_tx) + ".input2"], str(ior_tx))
-        self.ix.application.check_for_events()
+        cmds.set_value(str(ior_divide_tx) + ".input1[0]", 1.0)
+        cmds.set_value(str(ior_divide_tx) + ".input1[1]", 1.0)
+        cmds.set_value(str(ior_divide_tx) + ".input1[2]", 1.0)
+        cmds.set_texture(str(ior_divide_tx) + ".input2", str(ior_tx))
+        # The fresnel mode decides which attributes are editable.
+        pump_events(self.ix, 'create_ior_divide_tx', required=True)
         self.textures['ior_divide'] = ior_divide_tx
         if self.mtl.get_attribute('specular_1_index_of_refraction').is_editable():
-            self.ix.cmds.SetTexture([str(self.mtl) + ".specular_1_index_of_refraction"], str(ior_divide_tx))
-            self.ix.application.check_for_events()
+            cmds.set_texture(str(self.mtl) + ".specular_1_index_of_refraction", str(ior_divide_tx))
+            pump_events(self.ix, 'create_ior_divide_tx')
         else:
             logging.debug("IOR was locked")
         return ior_divide_tx
 
+    @profiled
     def create_metallic_blend_tx(self):
         """Creates an IOR blend helper texture if it doesn't exist."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Creating IOR blend texture...")
         if not self.get('metallic'):
             self.ix.log_warning("No ior texture was found.")
@@ -505,30 +787,34 @@ class Surface:
 
         metallic_blend_tx = self.ix.cmds.CreateObject(self.name + METALLIC_BLEND_SUFFIX, "TextureBlend",
                                                       "Global", str(self.get_sub_ctx('ior')))
-        metallic_blend_tx.attrs.input2[0] = self.ior
-        metallic_blend_tx.attrs.input2[1] = self.ior
-        metallic_blend_tx.attrs.input2[2] = self.ior
-        metallic_blend_tx.attrs.input1[0] = self.metallic_ior
-        metallic_blend_tx.attrs.input1[1] = self.metallic_ior
-        metallic_blend_tx.attrs.input1[2] = self.metallic_ior
-        self.ix.cmds.SetTexture([str(metallic_blend_tx) + ".mix"], str(self.get('metallic')))
-        self.ix.application.check_for_events()
+        cmds.set_value(str(metallic_blend_tx) + ".input2[0]", self.ior)
+        cmds.set_value(str(metallic_blend_tx) + ".input2[1]", self.ior)
+        cmds.set_value(str(metallic_blend_tx) + ".input2[2]", self.ior)
+        cmds.set_value(str(metallic_blend_tx) + ".input1[0]", self.metallic_ior)
+        cmds.set_value(str(metallic_blend_tx) + ".input1[1]", self.metallic_ior)
+        cmds.set_value(str(metallic_blend_tx) + ".input1[2]", self.metallic_ior)
+        cmds.set_texture(str(metallic_blend_tx) + ".mix", str(self.get('metallic')))
+        # The fresnel mode decides which attributes are editable.
+        pump_events(self.ix, 'create_metallic_blend_tx', required=True)
         self.textures['metallic_blend'] = metallic_blend_tx
         if self.mtl.get_attribute('specular_1_index_of_refraction').is_editable():
-            self.ix.cmds.SetTexture([str(self.mtl) + ".specular_1_index_of_refraction"], str(metallic_blend_tx))
-            self.ix.application.check_for_events()
+            cmds.set_texture(str(self.mtl) + ".specular_1_index_of_refraction", str(metallic_blend_tx))
+            pump_events(self.ix, 'create_metallic_blend_tx')
         else:
             logging.debug("IOR was locked")
         return metallic_blend_tx
 
+    @profiled
     def update_ior(self, ior, metallic_ior=DEFAULT_METALLIC_IOR):
         """Updates the IOR.
         Make sure floats have 1 precision. 1.6 will work, but 1.65 will crash Clarisse.
         """
+        cmds = get_command_buffer(self.ix)
         logging.debug("Updating IOR...")
+        cmds.barrier()
         if self.mtl.get_attribute('specular_1_index_of_refraction').is_editable():
-            self.ix.cmds.SetValue(str(self.mtl) + ".specular_1_index_of_refraction", [str(ior)])
-            self.ix.application.check_for_events()
+            cmds.set_value(str(self.mtl) + ".specular_1_index_of_refraction", ior)
+            pump_events(self.ix, 'update_ior')
             self.ior = ior
         else:
             logging.debug("IOR was locked")
@@ -544,100 +830,95 @@ class Surface:
             tx = self.get(index + '_reorder', index)
         return tx
 
+    @profiled
     def update_tx(self, index, filename, suffix, color_space, streamed=False, single_channel=False,
                   invert=False, connection=None):
         """Updates a texture by changing the filename or color space settings."""
-        logging.debug("update_tx called with arguments:" +
-                      "\n".join([index, filename, suffix, str(color_space), str(streamed), str(single_channel)]))
+        cmds = get_command_buffer(self.ix)
+        logging.debug("update_tx called with arguments:\n%s\n%s\n%s\n%s\n%s\n%s", index, filename, suffix,
+                      color_space, streamed, single_channel)
         tx = self.get(index)
         if tx.is_kindof("TextureStreamedMapFile") != streamed:
             logging.debug("Map is no longer Map file or Stream Map. Switch in progress...")
             self.destroy_tx(index)
             self.create_tx(index, filename, suffix, streamed=streamed, single_channel=single_channel,
                            invert=invert, connection=connection)
-            logging.debug("Texture recreated as: " + str(self.get(index)))
+            logging.debug("Texture recreated as: %s", self.get(index))
             tx = self.get(index)
-        attrs = self.ix.api.CoreStringArray(2 if streamed else 3)
-        attrs[0] = str(tx) + ".filename"
-        attrs[1] = str(tx) + ".invert"
-        values = self.ix.api.CoreStringArray(2 if streamed else 3)
-        values[0] = filename
-        values[1] = str((1 if invert else 0))
+        cmds.set_value(str(tx) + ".filename", filename)
+        cmds.set_value(str(tx) + ".invert", 1 if invert else 0)
         extension = os.path.splitext(filename)[-1].strip('.')
         if not streamed:
-            attrs[2] = str(tx) + ".single_channel_file_behavior"
-            values[2] = str((1 if single_channel else 0))
-        self.ix.cmds.SetValues(attrs, values)
+            cmds.set_value(str(tx) + ".single_channel_file_behavior", 1 if single_channel else 0)
 
         if not color_space or single_channel:
-            self.ix.cmds.SetValue(str(tx) + ".use_raw_data", [str(1)])
+            cmds.set_value(str(tx) + ".use_raw_data", 1)
         else:
-            self.ix.cmds.SetValue(str(tx) + ".use_raw_data", [str(0)])
-            self.ix.application.check_for_events()
-            self.ix.cmds.SetValues([str(color_space)], [str(tx) + ".file_color_space"])
+            cmds.set_value(str(tx) + ".use_raw_data", 0)
+            pump_events(self.ix, 'update_tx', required=True)
+            cmds.set_value(str(tx) + ".file_color_space", color_space)
 
         if connection:
+            cmds.barrier()
             tx_attr = self.mtl.get_attribute(connection).get_texture()
             if not tx_attr:
                 connection_tx = self.get_out_tx(index)
-                self.ix.cmds.SetTexture([str(self.mtl) + '.' + connection], str(connection_tx))
+                cmds.set_texture(str(self.mtl) + '.' + connection, str(connection_tx))
         return tx
 
+    @profiled
     def update_displacement(self, height, displacement_offset=0.5):
         """Updates a Displacement map with new height settings."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Updating displacement...")
         disp = self.get('displacement_map')
         if disp:
-            attrs = self.ix.api.CoreStringArray(3)
-            attrs[0] = str(disp) + ".bound[0]"
-            attrs[1] = str(disp) + ".bound[1]"
-            attrs[2] = str(disp) + ".bound[2]"
-            values = self.ix.api.CoreStringArray(3)
-            values[0] = str(height)
-            values[1] = str(height)
-            values[2] = str(height)
-            self.ix.cmds.SetValues(attrs, values)
+            cmds.set_value(str(disp) + ".bound", [height] * 3)
             if disp.attrs.front_value[0] != 1:
-                disp.attrs.front_value = height
+                cmds.set_value(str(disp) + ".front_value", height)
             if disp.attrs.front_offset[0] != 0:
-                disp.attrs.front_offset = displacement_offset * -1
+                cmds.set_value(str(disp) + ".front_offset", displacement_offset * -1)
         self.height = height
         self.displacement_offset = displacement_offset
         connected_txs = get_textures_connected_to_texture(self.get_out_tx('displacement'), ix=self.ix)
         for connected_tx in connected_txs:
             if connected_tx.get_contextual_name().endswith(DISPLACEMENT_HEIGHT_SCALE_SUFFIX):
-                connected_tx.attrs.input2[0] = height
-                connected_tx.attrs.input2[1] = height
-                connected_tx.attrs.input2[2] = height
+                cmds.set_value(str(connected_tx) + ".input2[0]", height)
+                cmds.set_value(str(connected_tx) + ".input2[1]", height)
+                cmds.set_value(str(connected_tx) + ".input2[2]", height)
             elif connected_tx.get_contextual_name().endswith(DISPLACEMENT_OFFSET_SUFFIX):
-                connected_tx.attrs.input2[0] = displacement_offset
-                connected_tx.attrs.input2[1] = displacement_offset
-                connected_tx.attrs.input2[2] = displacement_offset
+                cmds.set_value(str(connected_tx) + ".input2[0]", displacement_offset)
+                cmds.set_value(str(connected_tx) + ".input2[1]", displacement_offset)
+                cmds.set_value(str(connected_tx) + ".input2[2]", displacement_offset)
 
+    @profiled
     def update_opacity(self, clip_opacity, found_textures, update_textures):
         """Connect/Disconnect the opacity texture depending if clip_opacity is set to False/True."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Updating opacity...")
         if 'opacity' in update_textures and 'opacity' in found_textures:
+            cmds.barrier()
             if clip_opacity and self.ix.get_item(str(self.mtl) + '.opacity').get_texture():
-                self.ix.cmds.SetTexture([str(self.mtl) + ".opacity"], '')
+                cmds.set_texture(str(self.mtl) + ".opacity", '')
             elif not clip_opacity and not self.ix.get_item(str(self.mtl) + '.opacity').get_texture():
-                self.ix.cmds.SetTexture([str(self.mtl) + ".opacity"], str(self.get('opacity')))
+                cmds.set_texture(str(self.mtl) + ".opacity", str(self.get('opacity')))
 
+    @profiled
     def update_names(self, name):
         """Updates all texture names used in the context."""
         logging.debug("Updating names...")
+        flush_commands(self.ix)
         self.ix.cmds.RenameItem(str(self.ctx), name)
 
         ctx_members = get_items(self.ctx, ix=self.ix)
 
         for ctx_member in ctx_members:
             if ctx_member.is_editable() and not ctx_member.is_content_locked():
-                logging.debug(
-                    "Updating name from " + str(ctx_member) + " to " +
-                    ctx_member.get_contextual_name().replace(self.name, name))
-                self.ix.cmds.RenameItem(str(ctx_member), ctx_member.get_contextual_name().replace(self.name, name))
+                new_name = ctx_member.get_contextual_name().replace(self.name, name)
+                logging.debug("Updating name from %s to %s", ctx_member, new_name)
+                self.ix.cmds.RenameItem(str(ctx_member), new_name)
             else:
-                logging.debug('Ctx member %s was locked' % str(ctx_member))
+                logging.debug('Ctx member %s was locked', ctx_member)
         disp_tx = self.get_out_tx('displacement')
         if disp_tx:
             logging.debug('Updating mixes names if they exist')
@@ -650,20 +931,23 @@ class Surface:
 
                     for ctx_member in mix_ctx_members:
                         if ctx_member.is_editable() and not ctx_member.is_content_locked():
-                            logging.debug(
-                                "Updating name from " + str(ctx_member) + " to " +
-                                ctx_member.get_contextual_name().replace(self.name, name))
-                            self.ix.cmds.RenameItem(str(ctx_member),
-                                                    ctx_member.get_contextual_name().replace(self.name, name))
+                            new_name = ctx_member.get_contextual_name().replace(self.name, name)
+                            logging.debug("Updating name from %s to %s", ctx_member, new_name)
+                            self.ix.cmds.RenameItem(str(ctx_member), new_name)
                         else:
-                            logging.debug('Ctx member %s was locked' % str(ctx_member))
+                            logging.debug('Ctx member %s was locked', ctx_member)
         self.name = name
+        self.write_manifest()
 
+    @profiled
     def destroy_tx(self, index):
         """Removes a texture and its pair."""
-        logging.debug("Removing the following index from material: " + index)
+        logging.debug("Removing the following index from material: %s", index)
         if index == 'displacement':
             self.destroy_tx('displacement_map')
+            for helper in ('displacement_height_scale', 'displacement_offset'):
+                if self.get(helper):
+                    self.destroy_tx(helper)
         elif index == 'normal':
             self.destroy_tx('normal_map')
         elif index == 'bump':
@@ -681,9 +965,10 @@ class Surface:
         # Remove triplanar pair. If texture is triplanar avoid infinite recursion.
         if self.projection == 'triplanar' and not index.endswith('_triplanar'):
             self.destroy_tx(index + "_triplanar")
+        flush_commands(self.ix)
         self.ix.cmds.DeleteItems([str(self.get(index))])
         self.textures.pop(index, None)
-        logging.debug("Done removing: " + index)
+        logging.debug("Done removing: %s", index)
 
     def get(self, index, fallback=None):
         """Returns a texture."""
@@ -692,17 +977,21 @@ class Surface:
             tx = self.get(fallback)
         return tx
 
+    @profiled
     def clean(self):
         """Resets the emissive or translucency attributes to 0 when not used."""
+        cmds = get_command_buffer(self.ix)
         logging.debug("Cleanup...")
         if not self.get('emissive'):
             logging.debug("Resetting emission...")
-            self.ix.cmds.SetValue(str(self.mtl) + ".emission_strength", [str(0)])
+            cmds.set_value(str(self.mtl) + ".emission_strength", 0)
         if not self.get('translucency'):
             logging.debug("Resetting translucency...")
-            self.ix.cmds.SetValue(str(self.mtl) + ".diffuse_back_strength", [str(0)])
+            cmds.set_value(str(self.mtl) + ".diffuse_back_strength", 0)
+        self.write_manifest()
+        cmds.barrier()
         sub_ctxs = get_sub_contexts(self.ctx)
         for sub_ctx in sub_ctxs:
-            logging.debug("Cleaning up empty ctx: " + str(sub_ctx))
+            logging.debug("Cleaning up empty ctx: %s", sub_ctx)
             if sub_ctx.get_object_count() == 0:
                 self.ix.cmds.DeleteItems([str(sub_ctx)])
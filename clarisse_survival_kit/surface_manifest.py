@@ -0,0 +1,176 @@
+"""
+Role manifests of surfaces.
+The Surface builder stores which node has which texture role in a compact JSON string attribute of the material:
+
+    {"mtl":"rock_mtl","roles":{"diffuse":"diffuse/rock_diffuse_tx",...},"streamed":["displacement"],"version":1}
+
+Nodes are stored relative to the surface context. Tools read the manifest with one lookup per role instead of
+checking every node of the context against every suffix. Contexts don't have attributes, so the manifest is kept on
+the material, which is named after the context. Tools that change the nodes of a surface without Surface clear the
+manifest with clear_surface_manifest so the next load scans the context.
+"""
+import os
+import json
+import logging
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.command_buffer import get_command_buffer, flush_commands
+
+SURFACE_MANIFEST_VERSION = 1
+
+
+class SurfaceManifest(object):
+    """The material, the nodes by texture role and the roles with streamed maps of a surface context."""
+
+    def __init__(self, ctx, mtl, textures, streamed_maps=()):
+        self.ctx = ctx
+        self.mtl = mtl
+        self.textures = textures
+        self.streamed_maps = list(streamed_maps)
+
+    def get(self, role):
+        return self.textures.get(role)
+
+
+def get_manifest_mtl_path(ctx):
+    """Returns the path of the material that holds the manifest. The builder names it after the context."""
+    return str(ctx) + '/' + os.path.basename(str(ctx)) + MATERIAL_SUFFIX
+
+
+def _get_relative_path(ctx_path, item):
+    path = str(item)
+    if not path.startswith(ctx_path + '/'):
+        return None
+    return path[len(ctx_path) + 1:]
+
+
+def encode_surface_manifest(ctx, mtl, textures, streamed_maps=()):
+    """Returns the manifest string. Nodes outside of the context aren't part of the surface and are left out."""
+    ctx_path = str(ctx)
+    roles = {}
+    for role, tx in textures.iteritems():
+        if not tx:
+            continue
+        relative_path = _get_relative_path(ctx_path, tx)
+        if relative_path:
+            roles[role] = relative_path
+    data = {'version': SURFACE_MANIFEST_VERSION, 'mtl': _get_relative_path(ctx_path, mtl), 'roles': roles,
+            'streamed': sorted(set(streamed_maps))}
+    return json.dumps(data, separators=(',', ':'), sort_keys=True)
+
+
+def write_surface_manifest(ix, ctx, mtl, textures, streamed_maps=()):
+    """Stores the manifest on the material. The value goes through the command buffer."""
+    if not SURFACE_MANIFEST_ENABLED or not ctx or not mtl:
+        return None
+    if not mtl.attribute_exists(SURFACE_MANIFEST_ATTRIBUTE):
+        ix.cmds.CreateCustomAttribute([str(mtl)], SURFACE_MANIFEST_ATTRIBUTE, 3,
+                                      ["container", "vhint", "group", "count", "allow_expression"],
+                                      ["CONTAINER_SINGLE", "VISUAL_HINT_DEFAULT", "Survival Kit", "1", "0"])
+    manifest = encode_surface_manifest(ctx, mtl, textures, streamed_maps)
+    get_command_buffer(ix).set_value(str(mtl) + '.' + SURFACE_MANIFEST_ATTRIBUTE, manifest)
+    logging.debug("Surface manifest written to %s", mtl)
+    return manifest
+
+
+def _get_manifest(ctx, ix):
+    """Returns the material named after the context and its manifest string or None if it has none."""
+    if not SURFACE_MANIFEST_ENABLED:
+        return None, None
+    flush_commands(ix)
+    mtl = ix.item_exists(get_manifest_mtl_path(ctx))
+    if not mtl or not mtl.attribute_exists(SURFACE_MANIFEST_ATTRIBUTE):
+        return None, None
+    manifest = mtl.get_attribute(SURFACE_MANIFEST_ATTRIBUTE).get_string()
+    if not manifest:
+        return None, None
+    return mtl, manifest
+
+
+def clear_surface_manifest(item, ix):
+    """
+    Clears the manifest of the surface that item is part of. Returns the material of the manifest or None if item
+    isn't part of a surface with a manifest. The value goes through the command buffer.
+    """
+    if not SURFACE_MANIFEST_ENABLED:
+        return None
+    ctx = item.get_context()
+    while ctx:
+        mtl = ix.item_exists(get_manifest_mtl_path(ctx))
+        if mtl and mtl.attribute_exists(SURFACE_MANIFEST_ATTRIBUTE):
+            get_command_buffer(ix).set_value(str(mtl) + '.' + SURFACE_MANIFEST_ATTRIBUTE, '')
+            logging.debug("Surface manifest cleared on %s", mtl)
+            return mtl
+        parent = ctx.get_parent()
+        if not parent or str(parent) == str(ctx):
+            break
+        ctx = parent
+    return None
+
+
+def _matches_nodes(textures, streamed_maps):
+    """
+    Returns whether the nodes are still set up like the manifest says: map files are streamed if and only if they're
+    listed as streamed, exactly the streamed single channel maps have a reorder node and either every map or none has
+    a triplanar node. Inputs aren't compared since tools like moisture and blur put nodes in between.
+    """
+    triplanar_roles = 0
+    map_roles = 0
+    for role, settings in TEXTURE_SETTINGS.iteritems():
+        tx = textures.get(role)
+        if not tx:
+            continue
+        streamed = role in streamed_maps
+        if tx.is_kindof('TextureStreamedMapFile') != streamed:
+            return False
+        reorder_tx = textures.get(role + '_reorder')
+        if bool(reorder_tx) != (streamed and settings['single_channel']) or \
+                (reorder_tx and not reorder_tx.is_kindof('TextureReorder')):
+            return False
+        if role == 'preview':
+            continue
+        map_roles += 1
+        triplanar_tx = textures.get(role + '_triplanar')
+        if triplanar_tx:
+            if not triplanar_tx.is_kindof('TextureTriplanar'):
+                return False
+            triplanar_roles += 1
+    return triplanar_roles in (0, map_roles)
+
+
+def get_manifest_mtl(ctx, ix):
+    """Returns the material of a surface context with a manifest without looking up its nodes, otherwise None."""
+    return _get_manifest(ctx, ix)[0]
+
+
+def read_surface_manifest(ctx, ix):
+    """
+    Returns the SurfaceManifest of the context or None if it has none.
+    The manifest is only used when it has the current version, its material is the one it was read from, every
+    node in it still exists and the map files, reorder and triplanar nodes are still set up like it says, otherwise
+    the caller falls back to scanning the context.
+    """
+    mtl, manifest = _get_manifest(ctx, ix)
+    if not manifest:
+        return None
+    ctx_path = str(ctx)
+    try:
+        data = json.loads(manifest)
+    except ValueError:
+        logging.debug("Invalid surface manifest on %s", mtl)
+        return None
+    if data.get('version') != SURFACE_MANIFEST_VERSION or data.get('mtl') != _get_relative_path(ctx_path, mtl):
+        logging.debug("Outdated surface manifest on %s", mtl)
+        return None
+    textures = {}
+    for role, relative_path in data.get('roles', {}).iteritems():
+        tx = ix.item_exists(ctx_path + '/' + relative_path)
+        if not tx:
+            logging.debug("Outdated surface manifest on %s, %s doesn't exist", mtl, relative_path)
+            return None
+        textures[str(role)] = tx
+    streamed_maps = data.get('streamed', ())
+    if not _matches_nodes(textures, streamed_maps):
+        logging.debug("Outdated surface manifest on %s, its nodes were changed", mtl)
+        return None
+    return SurfaceManifest(ctx, mtl, textures, streamed_maps)
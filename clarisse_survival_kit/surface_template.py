@@ -0,0 +1,118 @@
+"""
+Templates of surface networks for repeated imports.
+Surfaces with the same texture roles and settings have the same network, only names, filenames, the scan area and
+the displacement height differ. The first surface of a signature is duplicated into a hidden context as a template,
+every later surface with that signature is a duplicate of the template with those values set in one batch:
+
+    with get_surface_templates(ix):
+        for asset_directory in asset_directories:
+            import_asset(asset_directory, ix=ix)
+
+The templates are deleted when the outermost block exits. Without an active block surfaces are built node by node.
+"""
+import functools
+import logging
+
+from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.command_buffer import flush_commands
+
+_active_templates = {}
+
+
+class SurfaceTemplate(object):
+    """A duplicate of a built surface. Nodes are stored relative to the template context like in the manifest."""
+
+    def __init__(self, ctx, name, mtl, textures, streamed_maps=()):
+        self.ctx = ctx
+        self.name = name
+        self.mtl = mtl
+        self.textures = textures
+        self.streamed_maps = list(streamed_maps)
+        self.clones = 0
+
+
+class SurfaceTemplates(object):
+    """
+    The templates of the surfaces built during a batch import by signature, see Surface.get_template_signature.
+    Use it as a context manager around the import, the templates are deleted when the outermost block exits.
+    """
+
+    def __init__(self, ix):
+        self.ix = ix
+        self.depth = 0
+        self.ctx = None
+        self.templates = {}
+
+    def __enter__(self):
+        if self.depth == 0:
+            _active_templates[id(self.ix)] = self
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            _active_templates.pop(id(self.ix), None)
+            logging.debug("Surface templates: %i templates, %i clones", len(self.templates),
+                          sum(template.clones for template in self.templates.itervalues()))
+            self.clear()
+        return False
+
+    def get(self, signature):
+        return self.templates.get(signature)
+
+    def record(self, signature, surface):
+        """Duplicates the built surface into the templates context and keeps it for the signature."""
+        flush_commands(self.ix)
+        if not self.ctx:
+            self.ctx = self.ix.cmds.CreateContext(SURFACE_TEMPLATES_CTX, "Global",
+                                                  str(self.ix.application.get_working_context()))
+        template_ctx = self.ix.cmds.Instantiate([str(surface.ctx)])[0]
+        self.ix.cmds.MoveItemsTo([str(template_ctx)], str(self.ctx))
+        ctx_path = str(surface.ctx)
+        textures = {}
+        for index, tx in surface.textures.iteritems():
+            if tx and str(tx).startswith(ctx_path + '/'):
+                textures[index] = str(tx)[len(ctx_path) + 1:]
+        template = SurfaceTemplate(template_ctx, surface.name, str(surface.mtl)[len(ctx_path) + 1:], textures,
+                                   surface.streamed_maps)
+        self.templates[signature] = template
+        logging.debug("Recorded surface template %s from %s", template_ctx, surface.ctx)
+        return template
+
+    def clear(self):
+        """Deletes the templates."""
+        if self.ctx:
+            flush_commands(self.ix)
+            self.ix.cmds.DeleteItems([str(self.ctx)])
+        self.ctx = None
+        self.templates = {}
+
+
+def get_surface_templates(ix):
+    """Returns the surface templates that are active for ix or new ones."""
+    surface_templates = _active_templates.get(id(ix))
+    if surface_templates is None:
+        surface_templates = SurfaceTemplates(ix)
+    return surface_templates
+
+
+def get_active_surface_templates(ix):
+    """Returns the surface templates that are active for ix, None outside of a batch or if they're disabled."""
+    if not SURFACE_TEMPLATES_ENABLED:
+        return None
+    return _active_templates.get(id(ix))
+
+
+def template_surfaces(func):
+    """
+    Decorator that shares the surface templates between all surfaces built by the function.
+    ix is taken from the ix keyword argument like get_ix does.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from clarisse_survival_kit.utility import get_ix
+        with get_surface_templates(get_ix(kwargs.get("ix"))):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -1,4 +1,4 @@
-from clarisse_survival_kit.utility import check_selection, tx_to_triplanar
+from clarisse_survival_kit.utility import check_selection, txs_to_triplanar
 
 
 def textures_to_triplanar_gui():
@@ -26,11 +26,8 @@ def textures_to_triplanar_gui():
                 else:
                     ix.log_warning("One or more selected items are not texture objects.")
             ix.begin_command_batch("Textures to Triplanar")
-            triplanar_textures = []
-            for tx in textures:
-                triplanar_textures.append(tx_to_triplanar(tx, blend=ratio_field.get_value(),
-                                                          object_space=result.get('object_space'),
-                                                          ix=ix))
+            triplanar_textures = txs_to_triplanar(textures, blend=ratio_field.get_value(),
+                                                  object_space=result.get('object_space'), ix=ix)
             if triplanar_textures:
                 ix.selection.deselect_all()
                 for tx in triplanar_textures:
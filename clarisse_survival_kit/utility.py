@@ -2,13 +2,19 @@ import os
 import re
 import logging
 import random
-import subprocess
-import platform
 import glob
 import bisect
+import itertools
 import datetime
+import collections
 
 from clarisse_survival_kit.settings import *
+from clarisse_survival_kit.conversion import ConversionQueue, ConversionManifests, build_converter_command
+from clarisse_survival_kit.command_buffer import get_command_buffer, flush_commands
+from clarisse_survival_kit.connection_index import get_connection_index, VALUE, RULE
+from clarisse_survival_kit.event_pump import pump_events
+from clarisse_survival_kit.profiling import profiled
+from clarisse_survival_kit.surface_manifest import get_manifest_mtl, clear_surface_manifest
 
 
 def add_gradient_key(attr, position, color, **kwargs):
@@ -59,104 +65,203 @@ def get_ix(ix_local):
         return ix
 
 
+TextureMatch = collections.namedtuple('TextureMatch', ['role', 'roles', 'lod', 'resolution', 'udim'])
+
+
+class TextureClassifier(object):
+    """
+    Classifies texture filenames against all FILENAME_MATCH_TEMPLATE patterns in a single regex pass.
+
+    All role patterns are compiled once into one alternation of named groups in TEXTURE_MATCH_PRIORITY order.
+    When two roles match at the same position the role with the highest priority wins.
+    """
+
+    def __init__(self, filename_match_template=FILENAME_MATCH_TEMPLATE, lod_match_template=LOD_MATCH_TEMPLATE,
+                 priority=None):
+        if priority is None:
+            priority = TEXTURE_MATCH_PRIORITY
+        roles = [role for role in priority if role in filename_match_template]
+        roles += sorted(role for role in filename_match_template if role not in roles)
+        self.roles = tuple(roles)
+        self._role_rank = dict((role, rank) for rank, role in enumerate(roles))
+        self._group_roles = {}
+        groups = []
+        for rank, role in enumerate(roles):
+            group_name = 'role%i' % rank
+            self._group_roles[group_name] = role
+            groups.append('(?P<%s>%s)' % (group_name, filename_match_template[role]))
+        self._role_regex = re.compile('|'.join(groups), re.IGNORECASE)
+        self._lod_regex = re.compile(lod_match_template, re.IGNORECASE)
+        self._resolution_regex = re.compile(RESOLUTION_MATCH_TEMPLATE, re.IGNORECASE)
+        self._udim_regex = re.compile(UDIM_MATCH_TEMPLATE)
+
+    def classify(self, filename):
+        """
+        Classifies a filename without its extension.
+        Returns a TextureMatch with the primary role, all matched roles in priority order, the LOD level
+        (-1 for a LOD suffix without number, None without LOD suffix), the resolution and the UDIM tile.
+        """
+        roles = []
+        for match in self._role_regex.finditer(filename):
+            role = self._group_roles[match.lastgroup]
+            if role not in roles:
+                roles.append(role)
+        if len(roles) > 1:
+            roles.sort(key=self._role_rank.get)
+        lod_level = None
+        lod_match = self._lod_regex.search(filename)
+        if lod_match:
+            lod_group = lod_match.groupdict().get('lod')
+            lod_level = int(lod_group) if lod_group else -1
+        resolution_match = self._resolution_regex.search(filename)
+        resolution = resolution_match.group('resolution').upper() if resolution_match else None
+        return TextureMatch(roles[0] if roles else None, tuple(roles), lod_level, resolution,
+                            self.get_udim(filename))
+
+    def get_udim(self, filename):
+        """Returns the UDIM tile number found in the filename or None."""
+        udim_match = self._udim_regex.search(filename)
+        if udim_match:
+            return udim_match.group(1)
+        return None
+
+    def to_udim_filename(self, filename):
+        """Replaces the first UDIM tile number in the filename with the <UDIM> token."""
+        return self._udim_regex.sub('<UDIM>', filename, count=1)
+
+
+_texture_classifiers = {}
+
+
+def get_texture_classifier(filename_match_template=FILENAME_MATCH_TEMPLATE, lod_match_template=LOD_MATCH_TEMPLATE):
+    """Returns a shared TextureClassifier for the specified templates. Patterns are only compiled once."""
+    key = (tuple(sorted(filename_match_template.items())), lod_match_template)
+    classifier = _texture_classifiers.get(key)
+    if classifier is None:
+        classifier = TextureClassifier(filename_match_template, lod_match_template)
+        _texture_classifiers[key] = classifier
+    return classifier
+
+
 def get_textures_from_directory(directory, filename_match_template=FILENAME_MATCH_TEMPLATE,
                                 lod_match_template=LOD_MATCH_TEMPLATE, image_formats=IMAGE_FORMATS,
                                 resolution=None, lod=None, lod_keys=('normal',)):
     """Returns texture files which exist in the specified directory."""
-    logging.debug("Searching for textures inside: " + str(directory))
-    logging.debug('Resolution: ' + str(resolution))
-    logging.debug('LOD: ' + str(lod))
+    logging.debug("Searching for textures inside: %s", directory)
+    files = []
+    for root, dirs, filenames in os.walk(directory):
+        for f in filenames:
+            files.append(os.path.join(root, f))
+    textures = get_textures_from_files(files, filename_match_template=filename_match_template,
+                                       lod_match_template=lod_match_template, image_formats=image_formats,
+                                       resolution=resolution, lod=lod, lod_keys=lod_keys)
+    if textures:
+        logging.debug("Textures found in directory: %s", directory)
+    return textures
+
+
+def get_textures_from_files(files, filename_match_template=FILENAME_MATCH_TEMPLATE,
+                            lod_match_template=LOD_MATCH_TEMPLATE, image_formats=IMAGE_FORMATS,
+                            resolution=None, lod=None, lod_keys=('normal',)):
+    """Returns the textures in the specified list of file paths. No filesystem access is done."""
+    logging.debug('Resolution: %s', resolution)
+    logging.debug('LOD: %s', lod)
+    classifier = get_texture_classifier(filename_match_template, lod_match_template)
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
     textures = {}
     lod_files = {}
     for lod_key in lod_keys:
         lod_files[lod_key] = {}
-    for root, dirs, files in os.walk(directory):
-        for f in files:
-            filename, extension = os.path.splitext(f)
-            extension = extension.lower().lstrip('.')
-            lod_check = True
-            if extension in image_formats:
-                logging.debug("Found image: " + str(f))
-                path = os.path.normpath(os.path.join(root, f))
-                for key, pattern in filename_match_template.iteritems():
-                    match = re.search(pattern, filename, re.IGNORECASE)
-                    if match:
-                        logging.debug("Image matches with: " + str(key))
-                        if resolution and resolution not in filename and not 'preview' in filename.lower():
-                            logging.debug("Found texture but without specified resolution: " + str(filename))
-                            continue
-                        lod_match = re.search(lod_match_template, filename, re.IGNORECASE)
-                        if lod_match:
-                            if lod_match.group('lod'):
-                                lod_level = int(lod_match.group('lod'))
-                            else:
-                                lod_level = -1
-                            logging.debug('Texture has LOD level: ' + str(lod_level))
-                        if key in lod_keys:
-                            logging.debug("LOD texture found: " + str(filename))
-                            if lod is not None:
-                                logging.debug("Checking if LOD {} matches with filename".format(str(lod)))
-                                if lod == -1:
-                                    if lod_match:
-                                        lod_check = False
-                                else:
-                                    if lod_match and lod_level != lod:
-                                        logging.debug("Texture did not match with LOD level {}".format(str(lod)))
-                                        lod_check = False
-                                logging.debug("Texture is a LOD normal: " + str(filename))
-                        # Check if another file extension exists.
-                        # If so use the first that occurs in the image_formats list.
-                        if key in textures:
-                            previous_extension = os.path.splitext(textures[key])[-1].lstrip('.')
-                            if image_formats.index(previous_extension) > image_formats.index(extension):
-                                if lod_check:
-                                    textures[key] = path
-                                else:
-                                    lod_files[key][lod_level] = path
+    for file_path in files:
+        f = os.path.basename(file_path)
+        filename, extension = os.path.splitext(f)
+        extension = extension.lower().lstrip('.')
+        lod_check = True
+        if extension in image_formats:
+            if debug:
+                logging.debug("Found image: %s", f)
+            texture_match = classifier.classify(filename)
+            if not texture_match.roles:
+                continue
+            if resolution and resolution not in filename and not 'preview' in filename.lower():
+                if debug:
+                    logging.debug("Found texture but without specified resolution: %s", filename)
+                continue
+            path = os.path.normpath(file_path)
+            lod_level = texture_match.lod
+            if debug and lod_level is not None:
+                logging.debug('Texture has LOD level: %s', lod_level)
+            for key in texture_match.roles:
+                if debug:
+                    logging.debug("Image matches with: %s", key)
+                if key in lod_keys:
+                    if debug:
+                        logging.debug("LOD texture found: %s", filename)
+                    if lod is not None:
+                        if debug:
+                            logging.debug("Checking if LOD %s matches with filename", lod)
+                        if lod == -1:
+                            if lod_level is not None:
+                                lod_check = False
+                        else:
+                            if lod_level is not None and lod_level != lod:
+                                if debug:
+                                    logging.debug("Texture did not match with LOD level %s", lod)
+                                lod_check = False
+                        if debug:
+                            logging.debug("Texture is a LOD normal: %s", filename)
+                # Check if another file extension exists.
+                # If so use the first that occurs in the image_formats list.
+                if key in textures:
+                    previous_extension = os.path.splitext(textures[key])[-1].lstrip('.')
+                    if image_formats.index(previous_extension) > image_formats.index(extension):
+                        if lod_check:
+                            textures[key] = path
                         else:
-                            if lod_check:
-                                textures[key] = path
-                            else:
-                                lod_files[key][lod_level] = path
-    logging.debug(str(lod_files))
+                            lod_files[key][lod_level] = path
+                else:
+                    if lod_check:
+                        textures[key] = path
+                    else:
+                        lod_files[key][lod_level] = path
+    logging.debug("%s", lod_files)
     for lod_key in lod_keys:
         if textures.get(lod_key):
             break
         if not lod_files.get(lod_key):
             logging.debug('No LODs Found.')
             break
-        logging.debug('LOD for key "{}" is missing. Trying to pick texture from next LOD level.'.format(lod_key))
+        logging.debug('LOD for key "%s" is missing. Trying to pick texture from next LOD level.', lod_key)
         keys = lod_files[lod_key].keys()
         keys.sort()
         search_key = lod if lod is not None else -1
         search_key_index = bisect.bisect(keys, search_key)
-        logging.debug(str(search_key_index))
+        logging.debug("%s", search_key_index)
         filename = lod_files[lod_key].get(keys[search_key_index - 1])
-        logging.debug('Chose following file as nearest LOD: ' + filename)
+        logging.debug('Chose following file as nearest LOD: %s', filename)
         textures[lod_key] = filename
 
     if textures:
-        logging.debug("Textures found in directory: " + directory)
-        logging.debug(str(textures))
+        logging.debug("Textures found: %s", textures)
     else:
-        logging.debug("No textures found in directory.")
+        logging.debug("No textures found.")
     return textures
 
 
 def get_geometry_from_directory(directory):
     """Returns texture files which exist in the specified directory."""
-    logging.debug("Searching for meshes inside: " + str(directory))
+    logging.debug("Searching for meshes inside: %s", directory)
     meshes = []
     for root, dirs, files in os.walk(directory):
         for filename in files:
             if filename.lower().endswith(('.obj', '.abc', '.lwo')):
-                logging.debug("Found mesh file: " + str(filename))
+                logging.debug("Found mesh file: %s", filename)
                 path = os.path.join(root, filename)
                 path = os.path.normpath(path)
                 meshes.append(path)
     if meshes:
-        logging.debug("Meshes found in directory: " + directory)
-        logging.debug(str(meshes))
+        logging.debug("Meshes found in directory: %s", directory)
+        logging.debug("%s", meshes)
     else:
         logging.debug("No meshes found in directory.")
     return meshes
@@ -168,8 +273,9 @@ def get_stream_map_files(textures):
     stream_map_files = []
     if not textures:
         return []
+    classifier = get_texture_classifier()
     for index, texture in textures.iteritems():
-        logging.debug("Testing: " + str(textures))
+        logging.debug("Testing: %s", textures)
         if type(texture) == list:
             items = get_stream_map_files({str(i): texture[i] for i in range(0, len(texture))})
             for item in items:
@@ -178,13 +284,12 @@ def get_stream_map_files(textures):
             filename, extension = os.path.splitext(texture)
             extension = extension.lower().lstrip('.')
 
-            udim_match = re.search(r"((?<!\d)\d{4}(?!\d))", os.path.split(filename)[-1])
-            if udim_match or extension == "tx":
+            if classifier.get_udim(os.path.split(filename)[-1]) or extension == "tx":
                 logging.debug("Streamed map file found.")
                 stream_map_files.append(index)
     if stream_map_files:
         logging.debug("...found these streamed map files: ")
-        logging.debug(str(stream_map_files))
+        logging.debug("%s", stream_map_files)
     else:
         logging.debug("...no streamed map files found.")
     return stream_map_files
@@ -193,15 +298,18 @@ def get_stream_map_files(textures):
 def get_mtl_from_context(ctx, **kwargs):
     """"Returns the material from the context."""
     ix = get_ix(kwargs.get("ix"))
+    mtl = get_manifest_mtl(ctx, ix)
+    if mtl:
+        logging.debug("Found material in manifest: %s", mtl)
+        return mtl
     ctx_members = get_items(ctx, kind=["MaterialPhysicalStandard", "MaterialPhysicalBlend"], **kwargs)
-    mtl = None
     for ctx_member in ctx_members:
         if ctx_member.is_local() and ctx_member.get_contextual_name().endswith(MATERIAL_SUFFIX) or not mtl:
             mtl = ctx_member
     if not mtl:
-        logging.debug("No material found in ctx: " + str(ctx))
+        logging.debug("No material found in ctx: %s", ctx)
         return None
-    logging.debug("Found material: " + str(mtl))
+    logging.debug("Found material: %s", mtl)
     return mtl
 
 
@@ -214,9 +322,9 @@ def get_all_mtls_from_context(ctx, **kwargs):
         if ctx_member.get_contextual_name().endswith(MATERIAL_SUFFIX):
             mtls.append(ctx_member)
     if not mtls:
-        logging.debug("No materials found in ctx: " + str(ctx))
+        logging.debug("No materials found in ctx: %s", ctx)
         return []
-    logging.debug("Found %s materials: " % str(len(mtls)))
+    logging.debug("Found %s materials: ", len(mtls))
     return mtls
 
 
@@ -232,17 +340,18 @@ def get_disp_from_context(ctx, **kwargs):
             if ctx_member.is_local() and ctx_member.get_contextual_name().endswith(DISPLACEMENT_MAP_SUFFIX) or not disp:
                 disp = ctx_member
     if not disp:
-        logging.debug("No displacement found in ctx: " + str(ctx))
+        logging.debug("No displacement found in ctx: %s", ctx)
         return None
-    logging.debug("Found displacement: " + str(disp))
+    logging.debug("Found displacement: %s", disp)
     return disp
 
 
 def get_textures_connected_to_texture(item, **kwargs):
     """Returns the connected textures to the specified texture as a list."""
     ix = get_ix(kwargs.get("ix"))
+    flush_commands(ix)
     logging.debug('Get textures connected to texture called')
-    logging.debug(str(item))
+    logging.debug("%s", item)
     textures = []
     if not item:
         return textures
@@ -252,14 +361,17 @@ def get_textures_connected_to_texture(item, **kwargs):
     output_items = ix.api.OfItemVector()
 
     ix.application.get_factory().get_items_outputs(items, output_items, False)
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
     # checks retrieved dependencies
     for i_output in range(0, output_items.get_count()):
         out_item = output_items[i_output]
-        logging.debug(str(out_item))
+        if debug:
+            logging.debug("%s", out_item)
         if out_item.is_object():
             out_obj = out_item.to_object()
-            logging.debug(str(out_obj))
+            if debug:
+                logging.debug("%s", out_obj)
             textures.append(out_obj)
     return textures
 
@@ -312,87 +424,119 @@ def get_color_spaces(preset, **kwargs):
     return color_spaces
 
 
+def iter_sub_contexts(ctx, max_depth=0, current_depth=0, **kwargs):
+    """
+    Yields all subcontexts depth first, each context before its own subcontexts. max_depth 0 is infinite.
+    Contexts are yielded once even if they can be reached twice.
+    """
+    # The contexts are kept so their ids can't be reused by other contexts while iterating.
+    seen = {}
+    # The stack holds the contexts still to visit with their depth, the next one on top.
+    stack = []
+    for i in reversed(range(ctx.get_context_count())):
+        stack.append((ctx.get_context(i), current_depth + 1))
+    while stack:
+        sub_context, depth = stack.pop()
+        if id(sub_context) in seen:
+            continue
+        seen[id(sub_context)] = sub_context
+        yield sub_context
+        if depth < max_depth or max_depth == 0:
+            for i in reversed(range(sub_context.get_context_count())):
+                stack.append((sub_context.get_context(i), depth + 1))
+
+
 def get_sub_contexts(ctx, name="", max_depth=0, current_depth=0, **kwargs):
-    """Gets all subcontexts."""
-    ix = get_ix(kwargs.get("ix"))
-    current_depth += 1
-    results = []
-    for i in range(ctx.get_context_count()):
-        sub_context = ctx.get_context(i)
-        results.append(sub_context)
-        # 0 is infinite
-        if current_depth < max_depth or max_depth == 0:
-            for result in get_sub_contexts(sub_context, name, max_depth, current_depth, ix=ix):
-                if result not in results:
-                    results.append(result)
+    """Gets all subcontexts. If name is set the first subcontext with that name is returned instead."""
+    sub_contexts = iter_sub_contexts(ctx, max_depth=max_depth, current_depth=current_depth)
     if name:
-        for sub_ctx in results:
+        for sub_ctx in sub_contexts:
             if os.path.basename(str(sub_ctx)) == name:
                 return sub_ctx
         return []
-    return results
+    return list(sub_contexts)
 
 
-def get_items(ctx, kind=(), max_depth=0, return_first_hit=False, **kwargs):
-    """Gets all items recursively."""
+def iter_items(ctx, kind=(), max_depth=0, **kwargs):
+    """
+    Yields all items recursively, the objects of a context before the objects of its subcontexts.
+    Stop iterating to skip the remaining contexts. Each class is only checked against kind once.
+    """
     ix = get_ix(kwargs.get("ix"))
-    result = []
-    current_depth = 1
-    items = ix.api.OfItemVector()
-    sub_ctxs = [ctx]
-    if max_depth > 1 or max_depth == 0:
-        sub_ctxs.extend(get_sub_contexts(ctx, max_depth=max_depth, current_depth=current_depth, ix=ix))
+    kind_matches = {}
+    sub_ctxs = itertools.chain([ctx], iter_sub_contexts(ctx, max_depth=max_depth, current_depth=1)
+                               if max_depth > 1 or max_depth == 0 else [])
     for sub_ctx in sub_ctxs:
-        if sub_ctx.get_object_count():
-            objects_array = ix.api.OfObjectArray(sub_ctx.get_object_count())
-            flags = ix.api.CoreBitFieldHelper()
-            sub_ctx.get_all_objects(objects_array, flags, False)
-            for i_obj in range(sub_ctx.get_object_count()):
-                if kind:
-                    for k in kind:
-                        if objects_array[i_obj].is_kindof(k):
-                            if return_first_hit:
-                                return objects_array[i_obj]
-                            items.add(objects_array[i_obj])
-                else:
-                    items.add(objects_array[i_obj])
-    for item in items:
-        result.append(item)
-    return result
+        object_count = sub_ctx.get_object_count()
+        if not object_count:
+            continue
+        objects_array = ix.api.OfObjectArray(object_count)
+        flags = ix.api.CoreBitFieldHelper()
+        sub_ctx.get_all_objects(objects_array, flags, False)
+        for i_obj in range(object_count):
+            obj = objects_array[i_obj]
+            if kind:
+                class_name = obj.get_class_name()
+                matches = kind_matches.get(class_name)
+                if matches is None:
+                    matches = kind_matches[class_name] = any(obj.is_kindof(k) for k in kind)
+                if not matches:
+                    continue
+            yield obj
+
+
+def get_items(ctx, kind=(), max_depth=0, return_first_hit=False, **kwargs):
+    """Gets all items recursively."""
+    items = iter_items(ctx, kind=kind, max_depth=max_depth, **kwargs)
+    if return_first_hit:
+        for item in items:
+            return item
+        return []
+    return list(items)
 
 
 def tx_to_triplanar(tx, blend=0.5, object_space=0, **kwargs):
     """Converts the texture to triplanar."""
-    logging.debug("Converting texture to triplanar: " + str(tx))
-    ix = get_ix(kwargs.get("ix"))
-    ctx = tx.get_context()
-    triplanar_tx = ix.cmds.CreateObject(tx.get_contextual_name() + TRIPLANAR_SUFFIX,
-                                        "TextureTriplanar", "Global", str(ctx))
+    return txs_to_triplanar([tx], blend=blend, object_space=object_space, **kwargs)[0]
 
-    replace_connections(triplanar_tx, tx, ignored_attributes=['runtime_materials', ], ix=ix)
 
-    ix.cmds.SetTexture([str(triplanar_tx) + ".right"], str(tx))
-    ix.cmds.SetTexture([str(triplanar_tx) + ".left"], str(tx))
-    ix.cmds.SetTexture([str(triplanar_tx) + ".top"], str(tx))
-    ix.cmds.SetTexture([str(triplanar_tx) + ".bottom"], str(tx))
-    ix.cmds.SetTexture([str(triplanar_tx) + ".front"], str(tx))
-    ix.cmds.SetTexture([str(triplanar_tx) + ".back"], str(tx))
-    ix.cmds.SetValues([str(triplanar_tx) + '.blend', str(triplanar_tx) + '.object_space'],
-                      [str(blend), str(object_space)])
-    return triplanar_tx
+def txs_to_triplanar(txs, blend=0.5, object_space=0, **kwargs):
+    """Converts the textures to triplanar. The connections of all textures are swapped at once."""
+    ix = get_ix(kwargs.get("ix"))
+    triplanar_txs = collections.OrderedDict()
+    for tx in txs:
+        logging.debug("Converting texture to triplanar: %s", tx)
+        ctx = tx.get_context()
+        triplanar_txs[tx] = ix.cmds.CreateObject(tx.get_contextual_name() + TRIPLANAR_SUFFIX,
+                                                 "TextureTriplanar", "Global", str(ctx))
+        clear_surface_manifest(tx, ix)
+
+    replace_connections_bulk(triplanar_txs, ignored_attributes=['runtime_materials', ], ix=ix)
+
+    connection_index = get_connection_index(ix)
+    with get_command_buffer(ix) as cmds:
+        for tx, triplanar_tx in triplanar_txs.iteritems():
+            for side in ('right', 'left', 'top', 'bottom', 'front', 'back'):
+                cmds.set_texture(str(triplanar_tx) + "." + side, str(tx))
+            cmds.set_value(str(triplanar_tx) + '.blend', blend)
+            cmds.set_value(str(triplanar_tx) + '.object_space', object_space)
+            connection_index.invalidate_item(tx)
+    return triplanar_txs.values()
 
 
 def blur_tx(tx, radius=0.01, quality=DEFAULT_BLUR_QUALITY, **kwargs):
     """Blurs the texture."""
-    logging.debug("Blurring selected texture: " + str(tx))
+    logging.debug("Blurring selected texture: %s", tx)
     ix = get_ix(kwargs.get("ix"))
     ctx = tx.get_context()
     blur = ix.cmds.CreateObject(tx.get_contextual_name() + BLUR_SUFFIX, "TextureBlur", "Global", str(ctx))
 
     replace_connections(blur, tx, ignored_attributes=['runtime_materials', ], ix=ix)
     ix.cmds.SetTexture([str(blur) + ".color"], str(tx))
+    get_connection_index(ix).invalidate_item(tx)
     blur.attrs.radius = radius
     blur.attrs.quality = quality
+    clear_surface_manifest(tx, ix)
     return blur
 
 
@@ -401,7 +545,7 @@ def quick_blend(items, **kwargs):
     ix = get_ix(kwargs.get("ix"))
     item_a = items[0]
     item_b = items[1]
-    logging.debug("Blending selected items: {} {}".format(str(item_a), str(item_b)))
+    logging.debug("Blending selected items: %s %s", item_a, item_b)
     ctx = item_a.get_context()
     if len(items) > 8:
         ix.log_warning("Too many items selected. Up to 8 items can be blended.")
@@ -411,7 +555,7 @@ def quick_blend(items, **kwargs):
         blend_tx = ix.cmds.CreateObject(item_a.get_contextual_name() + MULTI_BLEND_SUFFIX, "TextureMultiBlend",
                                         "Global", str(ctx))
         ix.cmds.SetValue(str(blend_tx) + ".enable_layer_1", [str(1)])
-        ix.application.check_for_events()
+        pump_events(ix, 'quick_blend')
         normal_tx_value = ix.get_item(str(item_a) + ".input")
         if normal_tx_value:
             normal_tx = normal_tx_value.get_texture()
@@ -421,7 +565,7 @@ def quick_blend(items, **kwargs):
             item_index = items.index(item) + 1
             ix.cmds.SetValue(str(blend_tx) + ".enable_layer_{}".format(str(item_index)), [str(1)])
             ix.cmds.SetValue(str(blend_tx) + ".layer_{}_mode".format(str(item_index)), [str(10)])
-            ix.application.check_for_events()
+            pump_events(ix, 'quick_blend')
             item_normal_tx_value = ix.get_item(str(item) + ".input")
             if item_normal_tx_value:
                 item_normal_tx = item_normal_tx_value.get_texture()
@@ -447,12 +591,12 @@ def quick_blend(items, **kwargs):
             ix.cmds.SetTexture([str(blend_tx) + ".input2"], str(item_b))
         else:
             ix.cmds.SetValue(str(blend_tx) + ".enable_layer_1", [str(1)])
-            ix.application.check_for_events()
+            pump_events(ix, 'quick_blend')
             ix.cmds.SetTexture([str(blend_tx) + ".layer_1_color"], str(item_a))
             for item in items[1:]:
                 item_index = items.index(item) + 1
                 ix.cmds.SetValue(str(blend_tx) + ".enable_layer_{}".format(str(item_index)), [str(1)])
-                ix.application.check_for_events()
+                pump_events(ix, 'quick_blend')
                 ix.cmds.SetTexture([str(blend_tx) + ".layer_{}_color".format(str(item_index))], str(item))
         return blend_tx
     elif check_selection(items, ['MaterialPhysical'], min_num=2):
@@ -476,7 +620,7 @@ def quick_blend(items, **kwargs):
             for item in items:
                 item_index = items.index(item) + 1
                 ix.cmds.SetValue(str(blend_mtl) + ".enable_layer_{}".format(str(item_index)), [str(1)])
-                ix.application.check_for_events()
+                pump_events(ix, 'quick_blend')
                 ix.cmds.SetValues([str(blend_mtl) + ".layer_{}".format(str(item_index))], [str(item)])
 
         return blend_mtl
@@ -520,12 +664,12 @@ def quick_blend(items, **kwargs):
             ix.cmds.SetTexture([str(blend_tx) + ".input2"], str(item_disp_offset_txs[1]))
         else:
             ix.cmds.SetValue(str(blend_tx) + ".enable_layer_1", [str(1)])
-            ix.application.check_for_events()
+            pump_events(ix, 'quick_blend')
             ix.cmds.SetTexture([str(blend_tx) + ".layer_1_color"], str(item_disp_offset_txs[0]))
             for item in items[1:]:
                 item_index = items.index(item) + 1
                 ix.cmds.SetValue(str(blend_tx) + ".enable_layer_{}".format(str(item_index)), [str(1)])
-                ix.application.check_for_events()
+                pump_events(ix, 'quick_blend')
                 ix.cmds.SetTexture([str(blend_tx) + ".layer_{}_color".format(str(item_index))],
                                    str(item_disp_offset_txs[items.index(item)]))
 
@@ -543,55 +687,23 @@ def quick_blend(items, **kwargs):
 def get_attrs_connected_to_item(item, **kwargs):
     """
     This searches for occourences of the selected texture item in other textures or objects/shading rules.
+    Uses the active connection index, see connection_index.
     """
     ix = get_ix(kwargs.get("ix"))
-
     connected_attrs = []
     if not item:
         return connected_attrs
 
-    items = ix.api.OfItemArray(1)
-    items[0] = item
-    output_items = ix.api.OfItemVector()
-
-    ix.application.get_factory().get_items_outputs(items, output_items, False)
-
     logging.debug('Retrieving connected attributes')
-    # checks retrieved dependencies
-    for i_output in range(0, output_items.get_count()):
-        out_item = output_items[i_output]
-        if out_item.is_object():
-            out_obj = out_item.to_object()
-            # Shading layers need to be handled differently
-            if out_obj.is_kindof('ShadingLayer'):
-                connected_attrs.append(str(out_obj))
-            else:
-                attr_count = out_obj.get_attribute_count()
-                for i_attr in range(0, attr_count):
-                    attr = out_obj.get_attribute(i_attr)
-                    attr_str = str(attr)
-                    attr_type = attr.get_type()
-                    attr_container = attr.get_container()
-                    # Object references
-                    if attr_type in [5, 6]:
-                        if attr_container in [1, 2]:
-                            objects = ix.api.OfObjectVector()
-                            attr.get_values(objects)
-                            for i_obj in range(0, objects.get_count()):
-                                if str(objects[i_obj]) == str(item):
-                                    connected_attrs.append(attr_str + '[{}]'.format(str(i_obj)))
-                        elif str(attr.get_object()) == str(item):
-                            connected_attrs.append(attr_str)
-                    # String references
-                    elif attr_type in [3, 4]:
-                        if str(attr.get_string()) == str(item):
-                            connected_attrs.append(attr_str)
-                    # Texture inputs
-                    elif attr.is_textured() and str(attr.get_texture()) == str(item):
-                        connected_attrs.append(attr_str)
+    for connection in get_connection_index(ix).get_connections(item):
+        attr = connection.get_attr()
+        # Shading layers are returned once, their rules are checked when the connections are replaced.
+        if attr not in connected_attrs:
+            connected_attrs.append(attr)
     return connected_attrs
 
 
+@profiled
 def replace_connections(new_item, old_item, source_item=None, ignored_attributes=(), ignored_classes=(), **kwargs):
     """Swap existing material/texture connections with another."""
     ix = get_ix(kwargs.get("ix"))
@@ -599,46 +711,62 @@ def replace_connections(new_item, old_item, source_item=None, ignored_attributes
     if not source_item:
         source_item = old_item
 
-    connected_attrs = get_attrs_connected_to_item(source_item, ix=ix)
-    logging.debug('Swapping {} item connections'.format(str(len(connected_attrs))))
-    for connected_attr in connected_attrs:
-        logging.debug(str(connected_attr))
-        attr = ix.get_item(connected_attr)
-        # Ignore object if in ignored classes
-        if hasattr(connected_attr, 'get_class_name') and connected_attr.get_class_name() in ignored_classes:
-            continue
-        # You mustn't fetch shading layer inputs directly via attributes. You need to use get_rule_value
-        elif hasattr(connected_attr, 'is_kindof') and connected_attr.is_kindof('ShadingLayer'):
-            logging.debug('Attribute is Shading Layer')
-            columns = ["material", "clip_map", "displacement"]
-            sl_module = connected_attr.get_module()
-            rules = sl_module.get_rules()
-            for row in range(0, rules.get_count()):
-                for column in columns:
-                    if str(sl_module.get_rule_value(row, column)) == str(old_item):
-                        logging.debug('Swapping rule value index: {}, column: {}'.format(row, column))
-                        sl_module.set_rule_value(row, column, str(new_item))
-                        ix.application.check_for_events()
-        # Attributes
-        else:
-            attr_name = attr.get_name()
-            logging.debug('Attribute name: ' + attr_name)
-            parent_obj = attr.get_parent_object()
-            logging.debug('Parent node: ' + str(parent_obj))
-            logging.debug('Parent class: ' + parent_obj.get_class_name())
-            if attr_name in ignored_attributes:
-                logging.debug('Ignoring attribute')
-                continue
-            # Object references
-            if attr.get_type() in [5, 6]:
-                logging.debug('Type: Object reference')
-                ix.cmds.SetValues([str(connected_attr)], [str(new_item)])
-            # Texture connections
-            else:
-                logging.debug('Type: Texture')
-                ix.cmds.SetTexture([str(connected_attr)], str(new_item))
+    return replace_connections_bulk({source_item: new_item}, ignored_attributes=ignored_attributes,
+                                    ignored_classes=ignored_classes, ix=ix)
 
 
+@profiled
+def replace_connections_bulk(mapping, ignored_attributes=(), ignored_classes=(), **kwargs):
+    """
+    Swaps the connections of many items at once. mapping is a dict of old:new items.
+    The outputs of all old items are found in one sweep. Attribute edits are sent through the command buffer as one
+    SetValues and one SetTexture per new item, shading layer rules as one command per layer, column and new item.
+    Returns the number of swapped connections.
+    """
+    ix = get_ix(kwargs.get("ix"))
+    connection_index = get_connection_index(ix)
+    connection_index.add(mapping.keys())
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    rules = collections.OrderedDict()
+    swapped = 0
+    # The connections are collected first so swapping items with each other doesn't swap them back.
+    swaps = [(new_item, connection_index.get_connections(old_item)) for old_item, new_item in mapping.iteritems()]
+    with get_command_buffer(ix) as cmds:
+        for new_item, connections in swaps:
+            new_path = str(new_item)
+            logging.debug('Swapping %s item connections', len(connections))
+            replaced = []
+            for connection in connections:
+                if debug:
+                    logging.debug("%s", connection)
+                # Ignore object if in ignored classes
+                if connection.owner_class in ignored_classes:
+                    continue
+                # You mustn't fetch shading layer inputs directly via attributes, they're set by rule and column.
+                elif connection.kind == RULE:
+                    rules.setdefault((connection.owner, connection.column, new_path), []).append(connection.row)
+                elif connection.attr_name in ignored_attributes:
+                    logging.debug('Ignoring attribute')
+                    continue
+                # Object references
+                elif connection.kind == VALUE:
+                    cmds.set_value(connection.get_attr(), new_path)
+                # Texture connections
+                else:
+                    cmds.set_texture(connection.get_attr(), new_path)
+                replaced.append(connection)
+            connection_index.replace(new_item, replaced)
+            swapped += len(replaced)
+    for (shading_layer, column, new_path), rows in rules.iteritems():
+        logging.debug('Swapping rule value rows: %s, column: %s', rows, column)
+        # Clarisse takes one value per row.
+        ix.cmds.SetShadingLayerRulesProperty(shading_layer, rows, column, [new_path] * len(rows))
+    if rules:
+        pump_events(ix, 'replace_connections')
+    return swapped
+
+
+@profiled
 def toggle_map_file_stream(tx, **kwargs):
     """Switches from TextureMapFile to TextureStreamedMapFile and vice versa."""
     ix = get_ix(kwargs.get("ix"))
@@ -655,7 +783,7 @@ def toggle_map_file_stream(tx, **kwargs):
         new_tx = ix.cmds.CreateObject(temp_name, "TextureStreamedMapFile", "Global", str(ctx))
         default_color_space = ix.api.ColorIO.get_color_space_names()[0]
         ix.cmds.SetValue(str(new_tx) + '.color_space_auto_detect', [str(0)])
-        ix.application.check_for_events()
+        pump_events(ix, 'toggle_map_file_stream', required=True)
         ix.cmds.SetValue(str(new_tx) + '.color_space', [default_color_space])
 
         single_channel = tx.attrs.single_channel_file_behavior[0] == 1
@@ -669,12 +797,12 @@ def toggle_map_file_stream(tx, **kwargs):
             out_tx = reorder_tx
     elif tx.is_kindof('TextureStreamedMapFile'):
         new_tx = ix.cmds.CreateObject(temp_name, "TextureMapFile", "Global", str(ctx))
-        ix.application.check_for_events()
+        pump_events(ix, 'toggle_map_file_stream', required=True)
         out_tx = new_tx
 
         connected_textures = get_textures_connected_to_texture(tx, ix=ix)
         for connected_texture in connected_textures:
-            logging.debug(str(connected_texture))
+            logging.debug("%s", connected_texture)
             if connected_texture.is_kindof('TextureReorder'):
                 if connected_texture.attrs.channel_order.attr.get_string() in ['rrrr','rrr1']:
                     logging.debug('Found matching reorder node')
@@ -699,16 +827,16 @@ def toggle_map_file_stream(tx, **kwargs):
         # Check if the stream map file has the same attributes.
         # .single_channel_file_behavior isn't available in streamed map files.
         if new_tx.attribute_exists(attr_name):
-            logging.debug("Copying attribute: " + attr_name)
+            logging.debug("Copying attribute: %s", attr_name)
             attr = tx.get_attribute(attr_name)
             if attr.is_locked() or not attr.is_editable():
                 logging.debug("Attribute was locked")
                 continue
             attr_type = attr.get_type_name(attr.get_type())
-            logging.debug("Attr type: " + attr_type)
+            logging.debug("Attr type: %s", attr_type)
             if attr_type == 'TYPE_STRING':
                 value = [r'{}'.format(attr.get_string())]
-                logging.debug(str(value))
+                logging.debug("%s", value)
                 if value and attr_name in ['filename', 'filename_sys']:
                     directory, filename = os.path.split(r"{}".format(value[0]))
                     directory = directory.replace("\\", "/")
@@ -732,7 +860,7 @@ def toggle_map_file_stream(tx, **kwargs):
                                         switch_extension = other_extension
                     if not switch_extension:
                         switch_extension = extension.lstrip('.')
-                    udim_file = re.sub(r"((?<!\d)\d{4}(?!\d))", "<UDIM>", name + '.' + switch_extension, count=1)
+                    udim_file = get_texture_classifier().to_udim_filename(name + '.' + switch_extension)
                     logging.debug(udim_file)
                     if attr_name == 'filename_sys':
                         value = filename_sys_value
@@ -747,129 +875,238 @@ def toggle_map_file_stream(tx, **kwargs):
                 value = [str(v) for v in value_list]
             else:
                 continue
-            logging.debug("Value: " + str(value))
+            logging.debug("Value: %s", value)
             ix.cmds.SetValue(str(new_tx) + '.' + attr_name, value)
+    # The swapped connections still point at the temporary path, they're sent before it's renamed.
+    flush_commands(ix)
     ix.cmds.DeleteItems(delete_items)
+    connection_index = get_connection_index(ix)
+    connection_index.forget(delete_items)
     if new_tx.is_kindof('TextureStreamedMapFile'):
         ix.cmds.SetValue(str(new_tx) + '.interpolation_mode', [str(3)])
         ix.cmds.SetValue(str(new_tx) + '.mipmap_mode', [str(3)])
-    ix.application.check_for_events()
-    ix.cmds.RenameItem(str(new_tx), tx_name)
+    pump_events(ix, 'toggle_map_file_stream')
+    temp_path = str(new_tx)
+    ix.cmds.RenameItem(temp_path, tx_name)
+    connection_index.rename(temp_path, str(new_tx))
+    clear_surface_manifest(new_tx, ix)
     return new_tx
 
 
-def convert_tx(tx, extension, target_folder=None, replace=True, update=False, **kwargs):
-    """Converts the selected texture. Update argument will force newer files to be reconverted."""
-    logging.debug("Converting texture: {} to .{}".format(str(tx), extension))
+def get_converter_command(extension, **kwargs):
+    """Returns the command string and environment of the Clarisse converter that writes the specified extension."""
     ix = get_ix(kwargs.get("ix"))
+    clarisse_dir = ix.application.get_factory().get_vars().get("CLARISSE_BIN_DIR").get_string()
+    return build_converter_command(extension, clarisse_dir)
 
-    file_path = tx.attrs.filename.attr.get_string()
+
+def get_conversion_files(file_path, extension, target_folder=None, update=False, manifests=None):
+    """
+    Returns (source, target) pairs of the files that should be converted for the texture filename.
+    UDIM tokens are expanded. Update argument will only return files that have newer or equal files in the directory.
+    Files that are recorded in the conversion manifests are always returned in update mode,
+    the manifest compares their contents instead of their modification time.
+    """
     file_dir = os.path.split(os.path.join(file_path))[0]
     if not target_folder:
         target_folder = file_dir
     source_filename, source_ext = os.path.splitext(os.path.basename(file_path))
 
-    new_file_path = os.path.normpath(
-        os.path.join(target_folder, source_filename + '.' + extension))
-
-    thread_count = ix.application.get_max_thread_count()
-    if thread_count > 32:
-        thread_count = 32
-
-    command_arguments = {'threads': thread_count}
-    clarisse_dir = ix.application.get_factory().get_vars().get("CLARISSE_BIN_DIR").get_string()
-
-    if extension == 'tx':
-        executable_name = 'maketx'
-        if platform.system().lower() == "windows":
-            executable_name += '.exe'
-        elif platform.system().lower().startswith("linux"):
-            os.environ['LD_LIBRARY_PATH'] = os.path.normpath(clarisse_dir)
-        elif platform.system().lower() == "darwin":
-            os.environ['DYLD_LIBRARY_PATH'] = os.path.normpath(clarisse_dir)
-
-        if not tx.is_kindof('TextureStreamedMapFile') and replace:
-            tx = toggle_map_file_stream(tx, ix=ix)
-        converter_path = os.path.normpath(os.path.join(clarisse_dir, executable_name))
-        command_arguments['converter'] = converter_path
-        command_string = r'"{converter}" -v -u --oiio --resize --threads {threads} "{old_file}" -o "{new_file}"'
-        logging.debug('Command string:')
-        logging.debug(command_string)
-    else:
-        executable_name = 'iconvert'
-        if tx.is_kindof('TextureStreamedMapFile') and source_ext in ['.tx', '.tex'] and replace:
-            tx = toggle_map_file_stream(tx, ix=ix)
-        if platform.system() == "Windows":
-            executable_name += '.exe'
-        elif platform.system().lower().startswith("linux"):
-            os.environ['LD_LIBRARY_PATH'] = os.path.normpath(clarisse_dir)
-        elif platform.system().lower() == "darwin":
-            os.environ['DYLD_LIBRARY_PATH'] = os.path.normpath(clarisse_dir)
-        converter_path = os.path.normpath(os.path.join(clarisse_dir, executable_name))
-        command_arguments['converter'] = converter_path
-        command_string = r'"{converter}" --threads 0 "{old_file}" "{new_file}"'
-        logging.debug('Command string:')
-        logging.debug(command_string)
+    def get_target(conversion_file):
+        new_file = os.path.splitext(conversion_file)[0] + '.' + extension
+        if target_folder != file_dir:
+            new_file = os.path.join(target_folder, os.path.basename(new_file))
+        return new_file
 
     # Search for source and newer files that need to be updated
     conversion_files = []
     source_files = glob.glob(os.path.join(file_dir, source_filename.replace('<UDIM>', '*')) + source_ext)
-    logging.debug('Source files:')
-    logging.debug('\n'.join(source_files))
     other_files = glob.glob(os.path.join(file_dir, source_filename.replace('<UDIM>', '*')) + '.*')
-    logging.debug('Other files:')
-    logging.debug('\n'.join(other_files))
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug('Source files:\n%s', '\n'.join(source_files))
+        logging.debug('Other files:\n%s', '\n'.join(other_files))
     if not source_files == other_files and update:
         for f in other_files:
+            if manifests is not None:
+                record = manifests.get_record(get_target(f))
+                if record and os.path.normpath(os.path.join(os.path.dirname(get_target(f)),
+                                                            record.get('source', ''))) == os.path.normpath(f):
+                    conversion_files.append(f)
+                    continue
             matching_source = os.path.splitext(f)[0] + source_ext
             other_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(f))
             source_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(matching_source))
             if other_mtime >= source_mtime:
-                logging.debug('Found newer or equal file in directy: ' + f)
-                logging.debug('Time of file a: ' + str(other_mtime))
-                logging.debug('Time of file b: ' + str(source_mtime))
+                logging.debug('Found newer or equal file in directy: %s', f)
+                logging.debug('Time of file a: %s', other_mtime)
+                logging.debug('Time of file b: %s', source_mtime)
                 print 'Found newer or equal file in directory: ' + f
                 conversion_files.append(f)
     else:
         conversion_files = source_files
 
-    logging.debug('Conversion files:')
-    logging.debug('\n'.join(conversion_files))
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug('Conversion files:\n%s', '\n'.join(conversion_files))
 
+    pairs = []
     for conversion_file in conversion_files:
-        conversion_file_arguments = command_arguments
-        command_arguments['old_file'] = conversion_file
-        command_arguments['new_file'] = os.path.splitext(conversion_file)[0] + '.' + extension
-        if target_folder != file_dir:
-            command_arguments['new_file'] = os.path.join(target_folder, os.path.basename(command_arguments['new_file']))
-        else:
-            pass
-        if command_arguments['old_file'] == command_arguments['new_file']:
-            logging.debug('File ignored because input same as output: ' + conversion_file)
+        new_file = get_target(conversion_file)
+        if conversion_file == new_file:
+            logging.debug('File ignored because input same as output: %s', conversion_file)
             continue
-        formatted_command_string = command_string.format(**conversion_file_arguments)
-        logging.debug(formatted_command_string)
-        conversion = subprocess.Popen(formatted_command_string, stdout=subprocess.PIPE, shell=True)
-        out, err = conversion.communicate()
-        if out.strip():
-            logging.debug(str(out))
-            print out
-        if err:
-            logging.debug(str(err))
-            print err
-        if err or not os.path.exists(command_arguments['new_file']) or \
-                        os.path.getsize(command_arguments['new_file']) < 10:
-            error_msg = 'ERROR: File has not been converted. Failed to find new converted file: ' + \
-                        command_arguments['new_file']
-            print error_msg
-            ix.log_error(error_msg)
-            return tx
-        try:
-            os.utime(command_arguments['new_file'], None)
-        except Exception:
-            logging.debug('******ERROR couldn\'t set utime in file******')
-            pass
-
-    if replace:
-        tx.attrs.filename = os.path.normpath(new_file_path)
-    return tx
+        pairs.append((conversion_file, new_file))
+    return pairs
+
+
+class TextureConversion(object):
+    """
+    Textures that are being converted in the background. Call poll from the main thread, for example in the event loop
+    of a window. A texture is switched to its converted file as soon as all of its files converted successfully,
+    so a cancelled or partially failed batch still updates the textures that finished.
+    """
+
+    def __init__(self, batch, conversions, extension, replace=True, verify_only=False, swap_command_batch=None,
+                 progress=None, **kwargs):
+        self.ix = get_ix(kwargs.get("ix"))
+        self.batch = batch
+        self.extension = extension
+        self.replace = replace
+        self.verify_only = verify_only
+        self.swap_command_batch = swap_command_batch
+        self.progress = progress
+        self.textures = [tx for tx, new_file_path, jobs in conversions]
+        self.pending = [(index, str(tx), new_file_path, jobs) for index, (tx, new_file_path, jobs) in
+                        enumerate(conversions)]
+        self.converted = 0
+        if progress and batch.jobs:
+            progress.set_step_count(len(batch.jobs))
+
+    def _report(self, job):
+        if job.output.strip():
+            logging.debug("%s", job.output)
+            print job.output
+        print str(job)
+        self.converted += 1
+        if self.progress:
+            self.progress.step(self.converted)
+
+    def poll(self):
+        """Collects finished jobs without blocking and swaps the textures whose files are all converted."""
+        for job in self.batch.poll():
+            self._report(job)
+        return self._swap_finished()
+
+    def wait(self, on_wait=None):
+        """Blocks until all jobs are done while calling on_wait and returns the texture nodes."""
+        for job in self.batch.wait(on_wait=on_wait):
+            self._report(job)
+            self._swap_finished()
+        self._swap_finished()
+        return self.textures
+
+    def is_done(self):
+        return not self.pending
+
+    def cancel(self):
+        self.batch.cancel()
+
+    def _swap_finished(self):
+        finished = [conversion for conversion in self.pending if all(job.done for job in conversion[3])]
+        if not finished:
+            return []
+        finished_indices = set(conversion[0] for conversion in finished)
+        self.pending = [conversion for conversion in self.pending if conversion[0] not in finished_indices]
+        if self.verify_only:
+            return []
+        swapped = []
+        if self.swap_command_batch:
+            self.ix.begin_command_batch(self.swap_command_batch)
+        # The textures share materials and shading layers, which are only scanned once.
+        with get_connection_index(self.ix):
+            for index, tx_name, new_file_path, jobs in finished:
+                failed_jobs = [job for job in jobs if not job.success]
+                if failed_jobs:
+                    error_msg = 'ERROR: File has not been converted. Failed to find new converted file: ' + \
+                                failed_jobs[0].target
+                    print error_msg
+                    self.ix.log_error(error_msg)
+                    continue
+                if not self.replace:
+                    continue
+                tx = self.ix.item_exists(tx_name)
+                if not tx:
+                    logging.debug('Texture was removed during conversion: %s', tx_name)
+                    continue
+                source_ext = os.path.splitext(tx.attrs.filename.attr.get_string())[-1]
+                if self.extension == 'tx' and not tx.is_kindof('TextureStreamedMapFile'):
+                    tx = toggle_map_file_stream(tx, ix=self.ix)
+                elif self.extension != 'tx' and tx.is_kindof('TextureStreamedMapFile') and \
+                        source_ext in ['.tx', '.tex']:
+                    tx = toggle_map_file_stream(tx, ix=self.ix)
+                tx.attrs.filename = new_file_path
+                self.textures[index] = tx
+                swapped.append(tx)
+        if self.swap_command_batch:
+            self.ix.end_command_batch()
+        return swapped
+
+
+def start_texture_conversion(textures, extension, target_folder=None, replace=True, update=False, force=False,
+                             verify_only=False, swap_command_batch="Swap converted textures", progress=None,
+                             **kwargs):
+    """
+    Starts converting the textures in the background and returns a TextureConversion right away.
+    Files shared by multiple textures are converted once. Update argument will force newer files to be reconverted.
+    Files that didn't change since their last conversion are skipped unless force is set.
+    With verify_only the state of every file is printed and nothing is converted or replaced.
+    """
+    ix = get_ix(kwargs.get("ix"))
+    command_string, env = get_converter_command(extension, ix=ix)
+    manifests = None
+    if (CONVERSION_MANIFEST_ENABLED and not force) or verify_only:
+        manifests = ConversionManifests()
+    queue = ConversionQueue()
+    conversions = []
+    for tx in textures:
+        logging.debug("Converting texture: %s to .%s", tx, extension)
+        file_path = tx.attrs.filename.attr.get_string()
+        file_dir = os.path.split(os.path.join(file_path))[0]
+        tx_target_folder = target_folder if target_folder else file_dir
+        source_filename, source_ext = os.path.splitext(os.path.basename(file_path))
+        new_file_path = os.path.normpath(os.path.join(tx_target_folder, source_filename + '.' + extension))
+        jobs = [queue.add(source, target, command_string, env=env) for source, target in
+                get_conversion_files(file_path, extension, target_folder=tx_target_folder, update=update,
+                                     manifests=manifests)]
+        conversions.append((tx, new_file_path, jobs))
+
+    if len(queue):
+        print "Converting %i files..." % len(queue)
+    thread_budget = CONVERSION_THREAD_BUDGET or ix.application.get_max_thread_count()
+    batch = queue.start(thread_budget=thread_budget, manifests=manifests, verify_only=verify_only)
+    return TextureConversion(batch, conversions, extension, replace=replace, verify_only=verify_only,
+                             swap_command_batch=swap_command_batch, progress=progress, ix=ix)
+
+
+@profiled
+def convert_textures(textures, extension, target_folder=None, replace=True, update=False, progress=None,
+                     force=False, verify_only=False, **kwargs):
+    """
+    Converts the textures in parallel and returns the texture nodes, which can change if their type was swapped.
+    Clarisse events are processed while waiting. See start_texture_conversion for the other arguments.
+    If a progress bar is passed it steps once per converted file.
+    """
+    ix = get_ix(kwargs.get("ix"))
+    conversion = start_texture_conversion(textures, extension, target_folder=target_folder, replace=replace,
+                                          update=update, force=force, verify_only=verify_only,
+                                          swap_command_batch=None, progress=progress, ix=ix)
+    try:
+        return conversion.wait(on_wait=ix.application.check_for_events)
+    finally:
+        conversion.cancel()
+
+
+@profiled
+def convert_tx(tx, extension, target_folder=None, replace=True, update=False, **kwargs):
+    """Converts the selected texture. Update argument will force newer files to be reconverted."""
+    return convert_textures([tx], extension, target_folder=target_folder, replace=replace, update=update,
+                            **kwargs)[0]
@@ -215,6 +215,11 @@ setup(
         'develop': PostDevelopCommand,
         'install': PostInstallCommand,
     },
+    entry_points={
+        'console_scripts': [
+            'csk_batch_convert = clarisse_survival_kit.batch_convert:main',
+        ],
+    },
     classifiers=[
         "Programming Language :: Python :: 2",
         "License :: OSI Approved :: GPLv3",